@@ -148,6 +148,91 @@ REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 
+# Job log buffering: entries are written in batches once either threshold is reached
+JOB_LOG_BUFFER_SIZE = env.int("JOB_LOG_BUFFER_SIZE", default=50)
+JOB_LOG_FLUSH_INTERVAL = env.float("JOB_LOG_FLUSH_INTERVAL", default=2.0)
+
+# Number of snapshot rows (ARP entries, routes, ...) inserted per bulk_create statement
+SNAPSHOT_BULK_CREATE_BATCH_SIZE = env.int(
+    "SNAPSHOT_BULK_CREATE_BATCH_SIZE", default=1000
+)
+
+# Store snapshot ARP and route tables as database rows ("rows") or as a compressed blob on the snapshot ("compressed")
+SNAPSHOT_STORAGE_FORMAT = env.str("SNAPSHOT_STORAGE_FORMAT", default="rows")
+
+# Allowed change, in percent, per table when comparing pre and post upgrade snapshots, e.g. {"routes": 5}
+SNAPSHOT_DIFF_THRESHOLDS = env.json("SNAPSHOT_DIFF_THRESHOLDS", default="{}")
+
+# Number of rows fetched per database round trip, and lines sent per chunk, by the streaming exports
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+
+# Async PAN-OS XML API client used by the worker scripts
+PANOS_XML_API_TIMEOUT = env.float("PANOS_XML_API_TIMEOUT", default=60.0)
+PANOS_XML_API_VERIFY_SSL = env.bool("PANOS_XML_API_VERIFY_SSL", default=False)
+# Bytes of a streamed XML API listing kept in memory before it is spooled to disk
+PANOS_XML_API_SPOOL_SIZE = env.int("PANOS_XML_API_SPOOL_SIZE", default=8 * 1024 * 1024)
+
+# Encrypted PAN-OS API key cache, keyed by appliance and profile; a TTL of 0 disables it
+PANOS_API_KEY_CACHE_URL = env.str(
+    "PANOS_API_KEY_CACHE_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
+)
+PANOS_API_KEY_CACHE_TTL = env.int("PANOS_API_KEY_CACHE_TTL", default=3600)
+
+# PAN-OS versions available per platform family, shared by the upgrade jobs so that a single device of each family
+# queries the update server; a TTL of 0 disables the cache
+PANOS_SOFTWARE_CATALOG_URL = env.str(
+    "PANOS_SOFTWARE_CATALOG_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
+)
+PANOS_SOFTWARE_CATALOG_TTL = env.int("PANOS_SOFTWARE_CATALOG_TTL", default=3600)
+
+# Device group of every firewall, indexed by serial number per Panorama appliance and shared by the inventory sync
+# and device refreshes; an inventory sync replaces the index of its appliance, a TTL of 0 disables the cache
+PANORAMA_DEVICE_GROUP_CACHE_URL = env.str(
+    "PANORAMA_DEVICE_GROUP_CACHE_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
+)
+PANORAMA_DEVICE_GROUP_CACHE_TTL = env.int(
+    "PANORAMA_DEVICE_GROUP_CACHE_TTL", default=900
+)
+
+# Requests sent to each Panorama appliance, shared by all workers: token refill rate per second (0 disables the
+# limiter), burst size, requests in flight (0 for no limit), seconds an in-flight slot is held at most, and seconds
+# a request waits at most before being sent anyway
+PANORAMA_RATE_LIMIT_URL = env.str(
+    "PANORAMA_RATE_LIMIT_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"
+)
+PANORAMA_RATE_LIMIT_RATE = env.float("PANORAMA_RATE_LIMIT_RATE", default=10.0)
+PANORAMA_RATE_LIMIT_BURST = env.int("PANORAMA_RATE_LIMIT_BURST", default=20)
+PANORAMA_RATE_LIMIT_CONCURRENCY = env.int("PANORAMA_RATE_LIMIT_CONCURRENCY", default=8)
+PANORAMA_RATE_LIMIT_LEASE = env.float("PANORAMA_RATE_LIMIT_LEASE", default=300.0)
+PANORAMA_RATE_LIMIT_MAX_WAIT = env.float("PANORAMA_RATE_LIMIT_MAX_WAIT", default=600.0)
+
+# Job progress events, published by the workers and streamed to browsers as Server-Sent Events
+JOB_EVENTS_REDIS_URL = env.str(
+    "JOB_EVENTS_REDIS_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+)
+JOB_EVENTS_HEARTBEAT = env.float("JOB_EVENTS_HEARTBEAT", default=15.0)
+# Lifetime in seconds of the signed tokens that open the event stream of a job, in place of the API token
+JOB_EVENTS_TOKEN_MAX_AGE = env.int("JOB_EVENTS_TOKEN_MAX_AGE", default=60)
+
+# Run upgrades as a stepped workflow that reschedules itself instead of sleeping through long waits
+UPGRADE_RELEASE_WORKER_DURING_WAITS = env.bool(
+    "UPGRADE_RELEASE_WORKER_DURING_WAITS", default=True
+)
+
+# Run the downloads, readiness checks and pre-upgrade snapshots of both HA members concurrently; only HA suspension,
+# install and reboot stay serialized
+UPGRADE_HA_PARALLEL_PREWORK = env.bool("UPGRADE_HA_PARALLEL_PREWORK", default=False)
+
+# Polling of PAN-OS software download jobs: first check after the initial wait, then exponentially longer waits up to
+# the maximum, giving up once the download has run past the deadline (seconds)
+SOFTWARE_JOB_POLL_INITIAL = env.float("SOFTWARE_JOB_POLL_INITIAL", default=5.0)
+SOFTWARE_JOB_POLL_MAXIMUM = env.float("SOFTWARE_JOB_POLL_MAXIMUM", default=60.0)
+SOFTWARE_JOB_POLL_BACKOFF = env.float("SOFTWARE_JOB_POLL_BACKOFF", default=2.0)
+SOFTWARE_DOWNLOAD_DEADLINE = env.int("SOFTWARE_DOWNLOAD_DEADLINE", default=3600)
+
+# Seconds between two passes of the upgrade batch orchestrator, also used by workflows waiting for a batch slot
+UPGRADE_BATCH_POLL_INTERVAL = env.int("UPGRADE_BATCH_POLL_INTERVAL", default=30)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -1,8 +1,10 @@
 from django.contrib import admin
+from .models.batches import UpgradeBatch, UpgradeBatchDevice
 from .models.devices import Device, DeviceType, PanosVersion
 from .models.jobs import Job, JobLogEntry
 from .models.profiles import Profile
 from .models.snapshots import Snapshot, ContentVersion, License, NetworkInterface
+from .models.staging import StagedImage
 
 
 class DeviceAdmin(admin.ModelAdmin):
@@ -61,6 +63,7 @@ class JobAdmin(admin.ModelAdmin):
 class JobLogEntryAdmin(admin.ModelAdmin):
     list_display = (
         "job",
+        "sequence_number",
         "timestamp",
         "severity_level",
         "message",
@@ -140,6 +143,40 @@ class NetworkInterfaceAdmin(admin.ModelAdmin):
     search_fields = ("snapshot__uuid", "name")
 
 
+class StagedImageAdmin(admin.ModelAdmin):
+    list_display = (
+        "device",
+        "version",
+        "status",
+        "verified",
+        "updated_at",
+    )
+    list_filter = ("status", "verified", "version")
+    search_fields = ("device__hostname", "version")
+
+
+class UpgradeBatchDeviceInline(admin.TabularInline):
+    model = UpgradeBatchDevice
+    fields = ("device", "wave", "task_id", "status", "phase")
+    readonly_fields = fields
+    extra = 0
+
+
+class UpgradeBatchAdmin(admin.ModelAdmin):
+    list_display = (
+        "uuid",
+        "author",
+        "created_at",
+        "target_version",
+        "wave_by",
+        "current_wave",
+        "status",
+    )
+    list_filter = ("status", "wave_by")
+    search_fields = ("uuid", "target_version")
+    inlines = (UpgradeBatchDeviceInline,)
+
+
 admin.site.register(Device, DeviceAdmin)
 admin.site.register(DeviceType, DeviceTypeAdmin)
 admin.site.register(Job, JobAdmin)
@@ -150,3 +187,5 @@ admin.site.register(Snapshot, SnapshotAdmin)
 admin.site.register(ContentVersion, ContentVersionAdmin)
 admin.site.register(License, LicenseAdmin)
 admin.site.register(NetworkInterface, NetworkInterfaceAdmin)
+admin.site.register(StagedImage, StagedImageAdmin)
+admin.site.register(UpgradeBatch, UpgradeBatchAdmin)
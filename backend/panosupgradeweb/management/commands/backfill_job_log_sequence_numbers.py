@@ -0,0 +1,43 @@
+# backend/panosupgradeweb/management/commands/backfill_job_log_sequence_numbers.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from panosupgradeweb.models import Job, JobLogEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Number the log entries of each job that were stored before sequence numbers were assigned, in the order "
+        "they were logged. Run it after `migrate`."
+    )
+
+    def handle(self, *args, **options):
+        # Jobs with fewer distinct sequence numbers than entries hold duplicates
+        job_ids = list(
+            JobLogEntry.objects.values("job")
+            .annotate(
+                entries=Count("id"),
+                numbers=Count("sequence_number", distinct=True),
+            )
+            .filter(entries__gt=F("numbers"))
+            .values_list("job", flat=True)
+        )
+
+        for job_id in job_ids:
+            with transaction.atomic():
+                # Hold off JobLogBuffer flushes of a job that is still running while it is renumbered
+                Job.objects.select_for_update().only("pk").get(pk=job_id)
+                entries = list(
+                    JobLogEntry.objects.filter(job_id=job_id)
+                    .order_by("sequence_number", "timestamp", "id")
+                    .only("id", "sequence_number")
+                )
+                for sequence_number, entry in enumerate(entries):
+                    entry.sequence_number = sequence_number
+                JobLogEntry.objects.bulk_update(
+                    entries, ["sequence_number"], batch_size=1000
+                )
+
+        self.stdout.write(f"Numbered the log entries of {len(job_ids)} jobs")
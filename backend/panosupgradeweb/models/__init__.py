@@ -7,6 +7,8 @@ from .snapshots import (
     SessionStats,
     Snapshot,
 )
+from .batches import UpgradeBatch, UpgradeBatchDevice
 from .devices import Device, DeviceType, PanosVersion
 from .jobs import Job, JobLogEntry
 from .profiles import Profile
+from .staging import StagedImage
@@ -0,0 +1,174 @@
+# backend/panosupgradeweb/models/batches.py
+
+import uuid
+from typing import Dict
+
+from django.conf import settings
+from django.db import models
+
+from .devices import Device
+from .profiles import Profile
+
+
+class UpgradeBatch(models.Model):
+    """
+    A fleet-wide upgrade of many devices, run in waves with concurrency limits.
+
+    Devices are grouped into waves by device group, platform or HA role; a wave only starts once every device of the
+    previous wave has finished. Within a batch, at most `max_concurrent_installs` devices install or reboot at the
+    same time and at most `max_concurrent_downloads_per_panorama` devices managed by the same Panorama appliance
+    download images at the same time. The batch stops starting devices once the share of failed devices exceeds
+    `max_failure_rate` percent.
+    """
+
+    uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    profile = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="upgrade_batches",
+    )
+    target_version = models.CharField(
+        max_length=100,
+        verbose_name="Target Version",
+    )
+    dry_run = models.BooleanField(
+        default=True,
+        verbose_name="Dry Run",
+    )
+    wave_by = models.CharField(
+        max_length=20,
+        choices=(
+            ("none", "None"),
+            ("device_group", "Device Group"),
+            ("platform", "Platform"),
+            ("ha_role", "HA Role"),
+        ),
+        default="none",
+        verbose_name="Wave By",
+    )
+    max_concurrent_installs = models.PositiveIntegerField(
+        default=2,
+        verbose_name="Max Concurrent Installs",
+    )
+    max_concurrent_downloads_per_panorama = models.PositiveIntegerField(
+        default=5,
+        verbose_name="Max Concurrent Downloads per Panorama",
+    )
+    max_failure_rate = models.FloatField(
+        default=20.0,
+        verbose_name="Max Failure Rate (%)",
+    )
+    current_wave = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Current Wave",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=(
+            ("pending", "Pending"),
+            ("running", "Running"),
+            ("completed", "Completed"),
+            ("stopped", "Stopped"),
+        ),
+        default="pending",
+        verbose_name="Status",
+    )
+
+    def __str__(self) -> str:
+        return str(self.uuid)
+
+    def progress(self) -> Dict:
+        """
+        Return the aggregate progress of the batch.
+
+        Returns:
+            Dict: The number of devices per status, the total, the number of waves, the failure rate in percent
+            and the percentage of devices that have finished.
+        """
+        counts = dict(
+            self.devices.values_list("status")
+            .annotate(count=models.Count("pk"))
+            .order_by()
+        )
+        total = sum(counts.values())
+        finished = sum(
+            counts.get(status, 0) for status in UpgradeBatchDevice.FINISHED_STATUSES
+        )
+        failed = counts.get("errored", 0)
+        waves = self.devices.aggregate(waves=models.Max("wave"))["waves"]
+
+        return {
+            "counts": counts,
+            "total": total,
+            "waves": waves + 1 if waves is not None else 0,
+            "failure_rate": round(failed * 100.0 / finished, 2) if finished else 0.0,
+            "percent_complete": round(finished * 100.0 / total, 2) if total else 0.0,
+        }
+
+
+class UpgradeBatchDevice(models.Model):
+    """
+    A device of an upgrade batch, with the wave it runs in and the upgrade job started for it.
+
+    `phase` is the concurrency slot the device currently holds, "download" or "install", and is claimed and released
+    by the upgrade workflow while the batch row is locked.
+    """
+
+    FINISHED_STATUSES = ("completed", "errored", "skipped", "cancelled")
+
+    batch = models.ForeignKey(
+        UpgradeBatch,
+        on_delete=models.CASCADE,
+        related_name="devices",
+    )
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    wave = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Wave",
+    )
+    task_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name="Upgrade Job Task ID",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=(
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("completed", "Completed"),
+            ("errored", "Errored"),
+            ("skipped", "Skipped"),
+            ("cancelled", "Cancelled"),
+        ),
+        default="queued",
+        verbose_name="Status",
+    )
+    phase = models.CharField(
+        max_length=20,
+        choices=(
+            ("download", "Download"),
+            ("install", "Install"),
+        ),
+        blank=True,
+        null=True,
+        verbose_name="Concurrency Slot",
+    )
+
+    class Meta:
+        ordering = ["wave", "pk"]
+        indexes = [
+            models.Index(fields=["batch", "status"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.batch_id} - {self.device_id}"
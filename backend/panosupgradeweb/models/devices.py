@@ -44,6 +44,12 @@ class Device(models.Model):
         null=True,
         verbose_name="Device Group",
     )
+    fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name="Inventory Sync Fingerprint",
+    )
     ha_enabled = models.BooleanField(
         null=True,
         verbose_name="HA Enabled",
@@ -40,9 +40,16 @@ class Job(models.Model):
             ("upgrade", "Upgrade"),
             ("panorama_sync", "Panorama Sync"),
             ("device_refresh", "Device Refresh"),
+            ("prestage", "Pre-stage"),
+            ("inventory_sync_all", "Inventory Sync of All Panoramas"),
         ),
         verbose_name="Job Type",
     )
+    workflow_state = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Workflow State",
+    )
 
     # Target device fields
     target_current_status = models.CharField(
@@ -111,9 +118,20 @@ class JobLogEntry(models.Model):
         verbose_name="Severity Level",
     )
     message = models.CharField(max_length=40960)
+    sequence_number = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Sequence Number",
+    )
 
     class Meta:
-        ordering = ["timestamp"]
+        ordering = ["sequence_number", "timestamp"]
+        # Sequence numbers are unique per job, as they are the cursor clients resume log tails and event streams
+        # from. JobLogBuffer allocates them under a lock on the Job row; a unique constraint would fail the
+        # migration generated at startup, because entries stored before the column existed all get number 0
+        # until backfill_job_log_sequence_numbers renumbers them after `migrate`.
+        indexes = [
+            models.Index(fields=["job", "sequence_number"]),
+        ]
 
     def __str__(self):
         return f"{self.job.task_id} - {self.timestamp}"
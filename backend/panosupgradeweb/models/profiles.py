@@ -52,6 +52,14 @@ class Profile(models.Model):
     install_retry_interval = models.IntegerField(
         verbose_name="Install Retry Interval",
     )
+    inventory_sync_panorama_workers = models.PositiveIntegerField(
+        default=4,
+        verbose_name="Inventory Sync Panorama Workers",
+    )
+    inventory_sync_workers = models.PositiveIntegerField(
+        default=8,
+        verbose_name="Inventory Sync Workers",
+    )
     ip_sec_tunnels_snapshot = models.BooleanField(
         verbose_name="IPSec Tunnels Snapshot",
     )
@@ -98,6 +106,10 @@ class Profile(models.Model):
     planes_clock_sync = models.BooleanField(
         verbose_name="Planes Clock Sync Check",
     )
+    prestage_workers = models.PositiveIntegerField(
+        default=4,
+        verbose_name="Pre-stage Workers",
+    )
     reboot_retry_interval = models.IntegerField(
         verbose_name="Reboot Retry Interval",
     )
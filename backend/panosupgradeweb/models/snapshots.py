@@ -1,12 +1,27 @@
 # backend/panosupgradeweb/models/snapshots.py
 
+import json
 import uuid
+import zlib
+from typing import Dict, List
+
 from django.db import models
 from .devices import Device
 from .jobs import Job
 
 
 class Snapshot(models.Model):
+    """
+    The state of a device captured before or after an upgrade.
+
+    With the "compressed" storage format, the rows of the largest tables (ARP entries and routes) are not stored as
+    ArpTableEntry and Route rows but packed column-wise into a zlib-compressed JSON blob on the snapshot, which is
+    only decompressed when one of those tables is read.
+    """
+
+    # Child tables that are packed into `tables_blob` with the "compressed" storage format
+    COMPRESSED_TABLES = ("arp_table_entries", "routes")
+
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="snapshots")
     device = models.ForeignKey(
@@ -24,6 +39,76 @@ class Snapshot(models.Model):
         default="pre_upgrade",
         verbose_name="Snapshot Type",
     )
+    storage_format = models.CharField(
+        max_length=20,
+        choices=(
+            ("rows", "Rows"),
+            ("compressed", "Compressed"),
+        ),
+        default="rows",
+        verbose_name="Storage Format",
+    )
+    tables_blob = models.BinaryField(
+        blank=True,
+        null=True,
+        verbose_name="Compressed Tables",
+    )
+
+    @classmethod
+    def table_columns(cls, name: str) -> List[str]:
+        """Return the columns of a child table, without its primary key and snapshot reference."""
+        related_model = cls._meta.get_field(name).related_model
+        return [
+            field.name
+            for field in related_model._meta.concrete_fields
+            if field.name not in ("id", "snapshot")
+        ]
+
+    def pack_tables(self, tables: Dict[str, List[models.Model]]) -> None:
+        """
+        Store the rows of child tables column-wise in `tables_blob` instead of as database rows.
+
+        Args:
+            tables (Dict[str, List[models.Model]]): Unsaved child rows keyed by the name of their table, which must be
+                one of `COMPRESSED_TABLES`.
+        """
+        payload = {}
+        for name, objects in tables.items():
+            columns = self.table_columns(name)
+            payload[name] = {
+                "columns": columns,
+                "rows": [
+                    [getattr(obj, column) for column in columns] for obj in objects
+                ],
+            }
+
+        self.storage_format = "compressed"
+        self.tables_blob = zlib.compress(
+            json.dumps(payload, separators=(",", ":")).encode()
+        )
+        self._tables = payload
+
+    def get_table_rows(self, name: str) -> List[Dict]:
+        """
+        Return the rows of a compressed child table, decompressing the blob on first access.
+
+        Args:
+            name (str): The name of the table, one of `COMPRESSED_TABLES`.
+
+        Returns:
+            List[Dict]: The rows as dictionaries keyed by column name.
+        """
+        if not hasattr(self, "_tables"):
+            self._tables = (
+                json.loads(zlib.decompress(self.tables_blob))
+                if self.tables_blob
+                else {}
+            )
+
+        table = self._tables.get(name)
+        if table is None:
+            return []
+        return [dict(zip(table["columns"], row)) for row in table["rows"]]
 
 
 class ContentVersion(models.Model):
@@ -0,0 +1,60 @@
+# backend/panosupgradeweb/models/staging.py
+
+from django.db import models
+
+from .devices import Device
+from .jobs import Job
+
+
+class StagedImage(models.Model):
+    """
+    A PAN-OS image downloaded onto a device by a pre-stage job, ahead of the maintenance window.
+
+    The upgrade of a device with staged base and target images only confirms with the device that they are still
+    present, instead of asking the update server for the available versions, and then skips their download.
+    `verified` is set when the pre-stage job confirmed with the device that the image was loaded into its software
+    manager after the download.
+    """
+
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name="staged_images",
+    )
+    version = models.CharField(
+        max_length=20,
+        verbose_name="PAN-OS Version",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=(
+            ("staged", "Staged"),
+            ("failed", "Failed"),
+        ),
+        verbose_name="Status",
+    )
+    verified = models.BooleanField(
+        default=False,
+        verbose_name="Verified",
+    )
+    job = models.ForeignKey(
+        Job,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Pre-stage Job",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["device", "version"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "version"],
+                name="unique_staged_image_per_device",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.device_id} - {self.version}"
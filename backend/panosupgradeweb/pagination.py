@@ -0,0 +1,17 @@
+# backend/panosupgradeweb/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class SnapshotCursorPagination(CursorPagination):
+    """
+    Cursor pagination of snapshots, newest first.
+
+    A cursor keeps pages stable while new snapshots are written by running jobs, and does not need the COUNT query
+    of page number pagination.
+    """
+
+    ordering = "-created_at"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
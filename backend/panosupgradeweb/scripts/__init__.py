@@ -1,6 +1,8 @@
 # backend/panosupgradeweb/scripts/__init__.py
 
 from .device_refresh.app import main as run_device_refresh
+from .image_prestage.app import main as run_image_prestage
 from .inventory_sync.app import main as run_inventory_sync
+from .inventory_sync.app import main_all as run_inventory_sync_all
 from .panos_version_sync.app import main as run_panos_version_sync
 from .upgrade_device.app import main as run_upgrade_device
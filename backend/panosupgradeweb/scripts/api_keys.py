@@ -0,0 +1,270 @@
+# backend/panosupgradeweb/scripts/api_keys.py
+
+import base64
+import hashlib
+import hmac
+import logging
+from typing import Optional
+
+# Third party imports
+import redis
+from cryptography.fernet import Fernet, InvalidToken
+from panos.base import PanDevice
+from panos.firewall import Firewall
+
+# Django imports
+from django.conf import settings
+
+
+class ApiKeyCache:
+    """
+    An encrypted, TTL-bounded cache of PAN-OS API keys stored in Redis.
+
+    Keys are cached per appliance and profile, so every connection made with the same profile to the same firewall
+    or Panorama appliance reuses one API key instead of sending a `type=keygen` request. The credentials are part of
+    the cache key fingerprint, so changing the username or password of a profile never returns a stale key.
+
+    API keys are encrypted with a Fernet key derived from the Django `SECRET_KEY` before being written to Redis. Redis
+    being unreachable is never fatal; the cache then behaves as if it were empty.
+
+    Attributes:
+        ttl (int): The number of seconds a cached API key stays valid, 0 disables the cache.
+    """
+
+    PREFIX = "panos-api-key"
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.ttl = ttl if ttl is not None else settings.PANOS_API_KEY_CACHE_TTL
+        self._client = client or redis.Redis.from_url(
+            settings.PANOS_API_KEY_CACHE_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+        secret = settings.SECRET_KEY.encode()
+        self._fernet = Fernet(
+            base64.urlsafe_b64encode(
+                hashlib.sha256(b"panos-api-key-cache:" + secret).digest()
+            )
+        )
+        self._secret = secret
+
+    def cache_key(
+        self,
+        hostname: str,
+        profile_uuid: str,
+        username: str,
+        password: str,
+    ) -> str:
+        """
+        Build the Redis key of an appliance and profile pair.
+
+        Args:
+            hostname (str): The hostname or IP address of the appliance.
+            profile_uuid (str): The UUID of the profile the credentials come from.
+            username (str): The username of the profile.
+            password (str): The password of the profile.
+
+        Returns:
+            str: The Redis key, which does not reveal the hostname or credentials.
+        """
+        fingerprint = hmac.new(
+            self._secret,
+            "\0".join((hostname, str(profile_uuid), username, password)).encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        return f"{self.PREFIX}:{fingerprint}"
+
+    def get(
+        self,
+        hostname: str,
+        profile_uuid: str,
+        username: str,
+        password: str,
+    ) -> Optional[str]:
+        """
+        Return the cached API key of an appliance and profile, or None on a cache miss.
+        """
+        if not self.ttl:
+            return None
+
+        try:
+            token = self._client.get(
+                self.cache_key(hostname, profile_uuid, username, password)
+            )
+        except redis.RedisError as e:
+            logging.debug(f"API key cache unavailable: {str(e)}")
+            return None
+
+        if token is None:
+            return None
+
+        try:
+            return self._fernet.decrypt(token, ttl=self.ttl).decode()
+        except InvalidToken:
+            return None
+
+    def set(
+        self,
+        hostname: str,
+        profile_uuid: str,
+        username: str,
+        password: str,
+        api_key: str,
+    ) -> None:
+        """
+        Cache the API key of an appliance and profile for `ttl` seconds.
+        """
+        if not self.ttl:
+            return
+
+        try:
+            self._client.set(
+                self.cache_key(hostname, profile_uuid, username, password),
+                self._fernet.encrypt(api_key.encode()),
+                ex=self.ttl,
+            )
+        except redis.RedisError as e:
+            logging.debug(f"API key cache unavailable: {str(e)}")
+
+    def invalidate(
+        self,
+        hostname: str,
+        profile_uuid: str,
+        username: str,
+        password: str,
+    ) -> None:
+        """
+        Remove the cached API key of an appliance and profile, for example after it was rejected.
+        """
+        try:
+            self._client.delete(
+                self.cache_key(hostname, profile_uuid, username, password)
+            )
+        except redis.RedisError as e:
+            logging.debug(f"API key cache unavailable: {str(e)}")
+
+
+_api_key_cache = None
+
+
+def get_api_key_cache() -> ApiKeyCache:
+    """
+    Return the API key cache shared by the worker scripts of this process.
+
+    Returns:
+        ApiKeyCache: The shared cache instance, created on first use.
+    """
+    global _api_key_cache
+    if _api_key_cache is None:
+        _api_key_cache = ApiKeyCache()
+    return _api_key_cache
+
+
+def get_api_key(
+    hostname: str,
+    profile_uuid: str,
+    username: str,
+    password: str,
+) -> str:
+    """
+    Return an API key for an appliance, generating and caching one on a cache miss.
+
+    Args:
+        hostname (str): The hostname or IP address of the firewall or Panorama appliance.
+        profile_uuid (str): The UUID of the profile the credentials come from.
+        username (str): The username of the profile.
+        password (str): The password of the profile.
+
+    Returns:
+        str: The API key to pass as `api_key` when creating a `Firewall` or `Panorama` object.
+
+    Example:
+        ```python
+        api_key = get_api_key(ip, profile.uuid, profile.pan_username, profile.pan_password)
+        pan = Panorama(hostname=ip, api_key=api_key)
+        ```
+    """
+    cache = get_api_key_cache()
+    api_key = cache.get(hostname, profile_uuid, username, password)
+    if api_key is None:
+        # The keygen request is the same for firewalls and Panorama appliances
+        api_key = Firewall(
+            hostname=hostname,
+            api_username=username,
+            api_password=password,
+        ).api_key
+        cache.set(hostname, profile_uuid, username, password, api_key)
+
+    return api_key
+
+
+def refresh_api_key(
+    hostname: str,
+    profile_uuid: str,
+    username: str,
+    password: str,
+    rejected_api_key: str,
+) -> str:
+    """
+    Replace a cached API key that an appliance rejected and return the API key to retry with.
+
+    The cached key is only dropped while it is still the rejected one, so workers retrying at the same time reuse the
+    key generated by the first of them instead of each sending a `type=keygen` request.
+
+    Args:
+        hostname (str): The hostname or IP address of the firewall or Panorama appliance.
+        profile_uuid (str): The UUID of the profile the credentials come from.
+        username (str): The username of the profile.
+        password (str): The password of the profile.
+        rejected_api_key (str): The API key the appliance rejected.
+
+    Returns:
+        str: The API key to retry the request with.
+    """
+    cache = get_api_key_cache()
+    if cache.get(hostname, profile_uuid, username, password) == rejected_api_key:
+        cache.invalidate(hostname, profile_uuid, username, password)
+
+    return get_api_key(hostname, profile_uuid, username, password)
+
+
+class CachedApiKeyXapi(PanDevice.XapiWrapper):
+    """
+    The pan-os-python XML API wrapper of a device connected to with an API key from `get_api_key()`.
+
+    A cached key may have been revoked on the appliance, for example after the password of the administrator changed.
+    A request rejected with HTTP 403 therefore replaces the cached key and is sent once more with the new one.
+
+    Attributes:
+        api_key_cache_args (Optional[Tuple[str, str, str, str]]): The hostname, profile UUID, username and password
+            the API key was cached under, or None when the key did not come from the cache.
+    """
+
+    def __init__(self, *args, api_key_cache_args=None, **kwargs):
+        self.api_key_cache_args = api_key_cache_args
+        super().__init__(*args, **kwargs)
+
+    def _send_api_request(self, query):
+        return super()._PanXapi__api_request(query)
+
+    def _PanXapi__api_request(self, query):
+        # Every public method of pan.xapi.PanXapi sends its request through this private method. pan-python is
+        # pinned in requirements.txt, and ApiKeyCacheTestCase fails if a new release stops calling it.
+        response = self._send_api_request(query)
+        if (
+            response is False
+            and self.api_key_cache_args
+            and self.api_key
+            and query.get("key") == self.api_key
+            and str(self.status_detail).startswith("URLError: code: 403")
+        ):
+            self.api_key = query["key"] = refresh_api_key(
+                *self.api_key_cache_args, rejected_api_key=query["key"]
+            )
+            response = self._send_api_request(query)
+
+        return response
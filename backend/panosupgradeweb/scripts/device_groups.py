@@ -0,0 +1,133 @@
+# backend/panosupgradeweb/scripts/device_groups.py
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+# Third party imports
+import redis
+
+# Django imports
+from django.conf import settings
+
+
+def device_group_index(device_group_mappings: List[Dict]) -> Dict[str, str]:
+    """
+    Index the device group mappings of a Panorama appliance by firewall serial number.
+
+    Args:
+        device_group_mappings (List[Dict]): The mappings returned by `get_device_group_mapping`.
+
+    Returns:
+        Dict[str, str]: The name of the device group of every firewall, keyed by serial number.
+
+    Example:
+        ```python
+        device_group_index([{"@name": "branches", "devices": [{"serial": "0123"}]}])
+        {'0123': 'branches'}
+        ```
+    """
+    return {
+        device["serial"]: entry["@name"]
+        for entry in device_group_mappings
+        for device in entry.get("devices", [])
+        if device.get("serial")
+    }
+
+
+class DeviceGroupIndexCache:
+    """
+    A TTL-bounded cache of the device group index of each Panorama appliance, stored in Redis.
+
+    The index is built once from the 'show devicegroups' response of an appliance and shared by the inventory sync
+    and every device refresh, which then no longer query the device groups of Panorama for each firewall. An inventory
+    sync always replaces the index of its appliance. Redis being unreachable is never fatal; the cache then behaves as
+    if it were empty.
+
+    Attributes:
+        ttl (int): The number of seconds a cached index stays valid, 0 disables the cache.
+    """
+
+    PREFIX = "panorama-device-groups"
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.ttl = ttl if ttl is not None else settings.PANORAMA_DEVICE_GROUP_CACHE_TTL
+        self._client = client or redis.Redis.from_url(
+            settings.PANORAMA_DEVICE_GROUP_CACHE_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+
+    def get(self, panorama: str) -> Optional[Dict[str, str]]:
+        """
+        Return the cached device group index of a Panorama appliance, or None on a cache miss.
+
+        Args:
+            panorama (str): The hostname or IP address of the Panorama appliance.
+
+        Returns:
+            Optional[Dict[str, str]]: The device group names keyed by firewall serial number.
+        """
+        if not self.ttl:
+            return None
+
+        try:
+            index = self._client.get(f"{self.PREFIX}:{panorama}")
+        except redis.RedisError as e:
+            logging.debug(f"Device group index cache unavailable: {str(e)}")
+            return None
+
+        return json.loads(index) if index is not None else None
+
+    def set(
+        self,
+        panorama: str,
+        index: Dict[str, str],
+    ) -> None:
+        """
+        Cache the device group index of a Panorama appliance for `ttl` seconds.
+
+        Args:
+            panorama (str): The hostname or IP address of the Panorama appliance.
+            index (Dict[str, str]): The index returned by `device_group_index()`.
+        """
+        if not self.ttl:
+            return
+
+        try:
+            self._client.set(
+                f"{self.PREFIX}:{panorama}",
+                json.dumps(index),
+                ex=self.ttl,
+            )
+        except redis.RedisError as e:
+            logging.debug(f"Device group index cache unavailable: {str(e)}")
+
+    def invalidate(self, panorama: str) -> None:
+        """
+        Remove the cached device group index of a Panorama appliance.
+        """
+        try:
+            self._client.delete(f"{self.PREFIX}:{panorama}")
+        except redis.RedisError as e:
+            logging.debug(f"Device group index cache unavailable: {str(e)}")
+
+
+_device_group_index_cache = None
+
+
+def get_device_group_index_cache() -> DeviceGroupIndexCache:
+    """
+    Return the device group index cache shared by the worker scripts of this process.
+
+    Returns:
+        DeviceGroupIndexCache: The shared cache instance, created on first use.
+    """
+    global _device_group_index_cache
+    if _device_group_index_cache is None:
+        _device_group_index_cache = DeviceGroupIndexCache()
+    return _device_group_index_cache
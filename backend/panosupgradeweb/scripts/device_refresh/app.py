@@ -1,12 +1,12 @@
 # backend/panosupgradeweb/scripts/device_refresh/app.py
-from panos.firewall import Firewall
-from panos.panorama import Panorama
+import asyncio
 
-from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
-from panosupgradeweb.scripts.utilities import (
-    find_devicegroup_by_serial,
-    flatten_xml_to_dict,
+from panosupgradeweb.scripts.device_groups import (
+    device_group_index,
+    get_device_group_index_cache,
 )
+from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.utilities import flatten_xml_to_dict
 
 # import our Django models
 from panosupgradeweb.models import (
@@ -55,14 +55,14 @@ def main(
             D --> E[Retrieve Device, Profile, and Platform objects from the database]
             E --> F{Platform device type?}
             F -->|Firewall and not Panorama-managed| G[Connect to firewall directly]
-            F -->|Firewall and Panorama-managed| H[Connect to firewall through Panorama]
+            F -->|Firewall and Panorama-managed| H[Connect to firewall through Panorama, with device groups unless cached]
             F -->|Panorama| I[Connect to Panorama]
-            G --> J[Retrieve system information]
+            G --> J[Retrieve system information and HA state concurrently]
             H --> J
             I --> J
             J --> K[Store system information in device_data]
             K --> L{Platform device type and HA enabled?}
-            L -->|Firewall and HA enabled| M[Retrieve HA state information]
+            L -->|Firewall and HA enabled| M[Read HA state information]
             L -->|Firewall and HA disabled or Panorama| N[Set ha_enabled to False]
             M --> O[Parse HA state information and store in device_data]
             N --> P[Store additional device information in device_data]
@@ -99,56 +99,37 @@ def main(
     platform = device.platform
     job = Job.objects.get(task_id=job_id)
 
-    # Build the PAN device object
-    try:
-        # If the device is not managed by Panorama, connect to it directly
-        if platform.device_type == "Firewall" and not device.panorama_managed:
-            # Connect to the firewall device using the retrieved credentials
-            pan_device = Firewall(
-                device.ipv4_address,
-                profile.pan_username,
-                profile.pan_password,
-            )
-            device_refresh.logger.log_task(
-                action="success",
-                message=f"Connected to firewall device {device.ipv4_address}",
-            )
+    # Determine which appliance to connect to, proxying through Panorama when the firewall is managed by it
+    if platform.device_type == "Firewall" and device.panorama_managed:
+        hostname = device.panorama_ipv4_address
+        target = device.serial
+    else:
+        hostname = device.ipv4_address
+        target = None
 
-        elif platform.device_type == "Firewall" and device.panorama_managed:
-            # If the device is managed by Panorama, connect to it through Panorama
-            pan_device = Firewall(
-                serial=device.serial,
-            )
-            panorama = Panorama(
-                device.panorama_ipv4_address,
-                profile.pan_username,
-                profile.pan_password,
-            )
-            panorama.add(pan_device)
+    # Reuse the device group index of the Panorama appliance unless it does not list the firewall
+    device_group_index_cache = get_device_group_index_cache()
+    device_groups = device_group_index_cache.get(hostname) if target else None
+    if device_groups is not None and target not in device_groups:
+        device_groups = None
 
-            # Retrieve device group
-            device_group_mappings = DeviceRefresh.get_device_group_mapping(panorama)
-            device_data["device_group"] = find_devicegroup_by_serial(
-                device_group_mappings,
-                device.serial,
-            )
-            device_refresh.logger.log_task(
-                action="success",
-                message=f"Connected to firewall through Panorama device {device.panorama_ipv4_address}",
-            )
-
-        else:
-            # Connect to the Panorama device using the retrieved credentials
-            pan_device = Panorama(
-                device.ipv4_address,
-                profile.pan_username,
-                profile.pan_password,
-            )
-            device_refresh.logger.log_task(
-                action="success",
-                message=f"Connected to Panorama device {device.ipv4_address}",
+    # Connect to the PAN device and retrieve the system information
+    try:
+        # Retrieve the system information, HA state and device groups concurrently
+        device_refresh.logger.log_task(
+            action="search",
+            message=f"Retrieving system information from device {device.ipv4_address}",
+        )
+        device_state = asyncio.run(
+            DeviceRefresh.fetch_device_state(
+                hostname=hostname,
+                username=profile.pan_username,
+                password=profile.pan_password,
+                target=target,
+                include_device_groups=target is not None and device_groups is None,
+                profile_uuid=profile_uuid,
             )
-
+        )
     except Exception as e:
         device_refresh.logger.log_task(
             action="error",
@@ -158,14 +139,25 @@ def main(
         job.save()
         return "errored"
 
-    # Connect to the PAN device and retrieve the system information
     try:
-        # Retrieve the system information from the firewall device
-        device_refresh.logger.log_task(
-            action="search",
-            message=f"Retrieving system information from device {device.ipv4_address}",
-        )
-        system_info = pan_device.show_system_info()
+        if target:
+            if device_groups is None:
+                device_groups = device_group_index(
+                    device_state["device_group_mappings"]
+                )
+                device_group_index_cache.set(hostname, device_groups)
+            device_data["device_group"] = device_groups.get(device.serial)
+            device_refresh.logger.log_task(
+                action="success",
+                message=f"Connected to firewall through Panorama device {device.panorama_ipv4_address}",
+            )
+        else:
+            device_refresh.logger.log_task(
+                action="success",
+                message=f"Connected to {platform.device_type.lower()} device {device.ipv4_address}",
+            )
+
+        system_info = device_state["system_info"]
         device_refresh.logger.log_task(
             action="success",
             message=f"Retrieved system information from device {device.ipv4_address}",
@@ -198,12 +190,8 @@ def main(
         device_data["uptime"] = system_info["system"]["uptime"]
         device_data["platform"] = platform.name
 
-        # Retrieve the HA state information from the firewall device
-        device_refresh.logger.log_task(
-            action="search",
-            message=f"Retrieving HA state information from device {device.ipv4_address}",
-        )
-        ha_info = pan_device.show_highavailability_state()
+        # HA state information retrieved alongside the system information
+        ha_info = device_state["ha_info"]
 
         # Parse the HA state information and store it in the device_data dictionary
         if platform.device_type == "Firewall" and ha_info[0] != "disabled":
@@ -261,10 +249,12 @@ def main(
             action="save",
             message=f"Updating device {device_data['hostname']} in the database",
         )
+        # The refreshed row no longer matches the fingerprint of the last inventory sync, which will rewrite it
         Device.objects.filter(uuid=device_uuid).update(
             app_version=device_data["app_version"],
             author_id=author_id,
             device_group=device_data.get("device_group"),
+            fingerprint=None,
             ha_enabled=device_data["ha_enabled"],
             ipv4_address=device_data["ipv4_address"],
             ipv6_address=device_data["ipv6_address"],
@@ -1,10 +1,13 @@
-from typing import Dict, List
+import asyncio
+from typing import Dict, List, Optional
+from xml.etree import ElementTree as ET
 
 # Palo Alto Networks SDK imports
 from panos.panorama import Panorama
 
 # pan-os-upgrade-web imports
 from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.xml_api import AsyncXmlApiClient
 
 
 class DeviceRefresh:
@@ -66,8 +69,21 @@ class DeviceRefresh:
                 J -->|No| K[Return device group mappings]
             ```
         """
+        return DeviceRefresh.parse_device_group_mapping(pan.op("show devicegroups"))
+
+    @staticmethod
+    def parse_device_group_mapping(device_groups: ET.Element) -> List[Dict]:
+        """
+        Build the device group mappings from a 'show devicegroups' response.
+
+        Args:
+            device_groups (ET.Element): The response element of the 'show devicegroups' operational command.
+
+        Returns:
+            List[Dict]: A list of dictionaries representing the device group mappings, as described in
+            `get_device_group_mapping`.
+        """
         device_group_mappings = []
-        device_groups = pan.op("show devicegroups")
 
         # Iterate over each 'entry' element under 'devicegroups'
         for entry in device_groups.findall(".//devicegroups/entry"):
@@ -92,3 +108,73 @@ class DeviceRefresh:
             device_group_mappings.append(entry_dict)
 
         return device_group_mappings
+
+    @staticmethod
+    async def fetch_device_state(
+        hostname: str,
+        username: str,
+        password: str,
+        target: Optional[str] = None,
+        include_device_groups: bool = False,
+        profile_uuid: Optional[str] = None,
+    ) -> Dict:
+        """
+        Retrieve the system information, HA state and optionally device groups of a device concurrently.
+
+        The requests are sent over a single keep-alive connection to `hostname` with the async XML API client.
+        For a firewall managed by Panorama, `hostname` is the Panorama appliance and `target` is the firewall serial;
+        the device group listing is then requested from Panorama itself. Requests proxied by Panorama go through its
+        shared rate limiter.
+
+        Args:
+            hostname (str): The firewall or Panorama appliance to connect to.
+            username (str): The username used to generate the API key.
+            password (str): The password used to generate the API key.
+            target (Optional[str]): The serial number of a Panorama-managed firewall.
+            include_device_groups (bool): Whether to also retrieve the device group mappings from Panorama.
+            profile_uuid (Optional[str]): The UUID of the profile the credentials come from, to reuse its cached
+                API key.
+
+        Returns:
+            Dict: A dictionary with the following keys:
+                - 'system_info': The result of `show_system_info()`.
+                - 'ha_info': The result of `show_highavailability_state()`.
+                - 'device_group_mappings': The device group mappings, or None when not requested.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Open async XML API client]
+                B --> C[Reuse cached API key or generate one]
+                C --> D[Request system info, HA state and device groups concurrently]
+                D --> E[Close client]
+                E --> F[Return device state]
+            ```
+        """
+        async with AsyncXmlApiClient(
+            hostname,
+            username=username,
+            password=password,
+            profile_uuid=profile_uuid,
+            rate_limited=target is not None,
+        ) as client:
+            await client.ensure_api_key()
+
+            requests = [
+                client.show_system_info(target=target),
+                client.show_highavailability_state(target=target),
+            ]
+            if include_device_groups:
+                requests.append(client.op("show devicegroups"))
+
+            results = await asyncio.gather(*requests)
+
+        return {
+            "system_info": results[0],
+            "ha_info": results[1],
+            "device_group_mappings": (
+                DeviceRefresh.parse_device_group_mapping(results[2])
+                if include_device_groups
+                else None
+            ),
+        }
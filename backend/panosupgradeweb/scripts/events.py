@@ -0,0 +1,317 @@
+# backend/panosupgradeweb/scripts/events.py
+
+import json
+import logging
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+# Third party imports
+import redis
+import redis.asyncio as aioredis
+
+# Django imports
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+
+# Job statuses after which no more events are published for a job
+FINAL_JOB_STATUSES = ("completed", "errored", "skipped")
+
+# Namespaces the signatures of event stream tokens, so no other signed value is accepted as one
+JOB_EVENTS_TOKEN_SALT = "panosupgradeweb.job-events"
+
+_publisher = None
+
+
+def job_events_channel(job_id: str) -> str:
+    """
+    Return the Redis pub/sub channel the events of a job are published to.
+
+    Args:
+        job_id (str): The task ID of the job.
+
+    Returns:
+        str: The channel name.
+    """
+    return f"job-events:{job_id}"
+
+
+def format_sse(
+    event: str,
+    data: Dict,
+    event_id: Optional[int] = None,
+) -> str:
+    """
+    Format an event as a Server-Sent Events message.
+
+    Args:
+        event (str): The event name, for example "status" or "log".
+        data (Dict): The JSON-serializable event payload.
+        event_id (Optional[int]): The event ID, sent back by the browser as `Last-Event-ID` on reconnect.
+
+    Returns:
+        str: The message, terminated by a blank line.
+    """
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, default=str)}\n\n"
+
+
+def sign_job_events_token(
+    job_id: str,
+    user_id: int,
+) -> str:
+    """
+    Sign a token that opens the event stream of one job for one user.
+
+    Browsers cannot set headers on an `EventSource`, so the stream is authenticated by a query parameter. Unlike the
+    API token, which would end up in proxy and access logs, this token only grants access to the events of the job
+    and expires after `JOB_EVENTS_TOKEN_MAX_AGE` seconds.
+
+    Args:
+        job_id (str): The task ID of the job.
+        user_id (int): The primary key of the user the token is issued to.
+
+    Returns:
+        str: The signed token.
+    """
+    return signing.TimestampSigner(salt=JOB_EVENTS_TOKEN_SALT).sign_object(
+        {"job": job_id, "user": user_id}
+    )
+
+
+def unsign_job_events_token(
+    token: str,
+    job_id: str,
+) -> Optional[int]:
+    """
+    Return the user a job event stream token was issued to.
+
+    Args:
+        token (str): The token returned by `sign_job_events_token()`.
+        job_id (str): The task ID of the job whose events are requested.
+
+    Returns:
+        Optional[int]: The primary key of the user, or None when the token is invalid, expired or for another job.
+    """
+    try:
+        data = signing.TimestampSigner(salt=JOB_EVENTS_TOKEN_SALT).unsign_object(
+            token, max_age=settings.JOB_EVENTS_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+
+    return data["user"] if data.get("job") == job_id else None
+
+
+def publish_job_event(
+    job_id: str,
+    event: str,
+    data: Dict,
+) -> None:
+    """
+    Publish an event of a job to the clients streaming its events.
+
+    Publishing is best effort: the database remains the source of truth and an unreachable Redis only means
+    connected clients miss the update until they reconnect.
+
+    Args:
+        job_id (str): The task ID of the job.
+        event (str): The event name, "status" or "log".
+        data (Dict): The JSON-serializable event payload.
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(
+            settings.JOB_EVENTS_REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+
+    try:
+        _publisher.publish(
+            job_events_channel(job_id),
+            json.dumps({"event": event, "data": data}, default=str),
+        )
+    except redis.RedisError as e:
+        logging.debug(f"Unable to publish {event} event of job {job_id}: {str(e)}")
+
+
+def publish_job_logs(
+    job_id: str,
+    entries: Iterable,
+) -> None:
+    """
+    Publish newly written JobLogEntry rows of a job as "log" events.
+
+    Args:
+        job_id (str): The task ID of the job.
+        entries (Iterable[JobLogEntry]): The entries, in the order they were written.
+    """
+    for entry in entries:
+        publish_job_event(
+            job_id,
+            "log",
+            {
+                "message": entry.message,
+                "sequence_number": entry.sequence_number,
+                "severity_level": entry.severity_level,
+                "timestamp": entry.timestamp,
+            },
+        )
+
+
+def job_status_data(job) -> Dict:
+    """
+    Return the payload of a "status" event of a job.
+
+    Args:
+        job (Job): The job.
+
+    Returns:
+        Dict: The job status, current device and step, and the status of the target and peer devices.
+    """
+    return {
+        "current_device": job.current_device,
+        "current_step": job.current_step,
+        "job_status": job.job_status,
+        "peer_current_status": job.peer_current_status,
+        "target_current_status": job.target_current_status,
+    }
+
+
+def publish_job_status(job) -> None:
+    """
+    Publish the status of a job as a "status" event.
+
+    Args:
+        job (Job): The job whose status changed.
+    """
+    publish_job_event(job.task_id, "status", job_status_data(job))
+
+
+def get_job_snapshot(
+    job_id: str,
+    last_sequence_number: Optional[int] = None,
+) -> Tuple[str, List[str], int]:
+    """
+    Build the messages that bring a client up to date with the stored state of a job.
+
+    Args:
+        job_id (str): The task ID of the job.
+        last_sequence_number (Optional[int]): The sequence number of the last log entry the client has received.
+
+    Returns:
+        Tuple[str, List[str], int]: The job status, the Server-Sent Events messages for the current status and the
+        log entries the client has not received yet, and the sequence number of the last of those entries.
+
+    Raises:
+        Job.DoesNotExist: If the job does not exist.
+    """
+    from panosupgradeweb.models import Job
+
+    job = Job.objects.get(task_id=job_id)
+    messages = [
+        format_sse("status", job_status_data(job)),
+    ]
+
+    entries = job.log_entries.all()
+    if last_sequence_number is not None:
+        entries = entries.filter(sequence_number__gt=last_sequence_number)
+
+    last = -1 if last_sequence_number is None else last_sequence_number
+    for entry in entries:
+        messages.append(
+            format_sse(
+                "log",
+                {
+                    "message": entry.message,
+                    "sequence_number": entry.sequence_number,
+                    "severity_level": entry.severity_level,
+                    "timestamp": entry.timestamp,
+                },
+                event_id=entry.sequence_number,
+            )
+        )
+        last = entry.sequence_number
+
+    return job.job_status, messages, last
+
+
+async def stream_job_events(
+    job_id: str,
+    last_sequence_number: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream the stored state of a job followed by the events published for it, as Server-Sent Events messages.
+
+    The channel is subscribed to before the stored state is read, so no event published in between is lost; log
+    events already included in the stored state are skipped. A comment line is sent every `JOB_EVENTS_HEARTBEAT`
+    seconds without events so proxies keep the connection open.
+
+    The stream ends once the job reaches a final status, or when Redis is unreachable, in which case the browser
+    reconnects and resumes from its `Last-Event-ID`.
+
+    Args:
+        job_id (str): The task ID of the job.
+        last_sequence_number (Optional[int]): The sequence number of the last log entry the client has received.
+
+    Yields:
+        str: Server-Sent Events messages.
+    """
+    client = aioredis.Redis.from_url(
+        settings.JOB_EVENTS_REDIS_URL,
+        socket_connect_timeout=1,
+    )
+    pubsub = client.pubsub()
+    try:
+        try:
+            await pubsub.subscribe(job_events_channel(job_id))
+            subscribed = True
+        except (redis.RedisError, OSError) as e:
+            logging.debug(f"Job event stream of job {job_id} unavailable: {str(e)}")
+            subscribed = False
+
+        job_status, messages, last = await sync_to_async(get_job_snapshot)(
+            job_id, last_sequence_number
+        )
+        for message in messages:
+            yield message
+
+        if not subscribed or job_status in FINAL_JOB_STATUSES:
+            return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=settings.JOB_EVENTS_HEARTBEAT,
+            )
+            if message is None:
+                yield ": heartbeat\n\n"
+                continue
+
+            payload = json.loads(message["data"])
+            data = payload["data"]
+            if payload["event"] == "log":
+                if data["sequence_number"] <= last:
+                    continue
+                last = data["sequence_number"]
+
+            yield format_sse(
+                payload["event"],
+                data,
+                event_id=data.get("sequence_number"),
+            )
+
+            if (
+                payload["event"] == "status"
+                and data["job_status"] in FINAL_JOB_STATUSES
+            ):
+                return
+
+    except (redis.RedisError, OSError) as e:
+        logging.debug(f"Job event stream of job {job_id} interrupted: {str(e)}")
+
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
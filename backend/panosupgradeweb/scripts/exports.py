@@ -0,0 +1,204 @@
+# backend/panosupgradeweb/scripts/exports.py
+
+import csv
+import itertools
+import json
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+# Django imports
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, StreamingHttpResponse
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.models import Job, Snapshot
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Snapshot tables that can be exported
+EXPORT_TABLES = (
+    "arp_table_entries",
+    "content_versions",
+    "licenses",
+    "network_interfaces",
+    "routes",
+    "session_stats",
+)
+
+JOB_LOG_COLUMNS = ["sequence_number", "timestamp", "severity_level", "message"]
+
+
+class _EchoBuffer:
+    """A file-like object returning what is written to it, so `csv.writer` formats one row at a time."""
+
+    @staticmethod
+    def write(value: str) -> str:
+        return value
+
+
+def snapshot_table_rows(snapshot: Snapshot, name: str) -> Iterator[Dict]:
+    """
+    Iterate over the rows of a snapshot table without loading the whole table into memory.
+
+    Rows stored in the database are fetched `EXPORT_CHUNK_SIZE` at a time; rows of a compressed table are read
+    from the snapshot blob.
+
+    Args:
+        snapshot (Snapshot): The snapshot.
+        name (str): The name of the table, one of `EXPORT_TABLES`.
+
+    Yields:
+        Dict: The rows of the table.
+    """
+    if snapshot.storage_format == "compressed" and name in Snapshot.COMPRESSED_TABLES:
+        yield from snapshot.get_table_rows(name)
+        return
+
+    yield from (
+        getattr(snapshot, name)
+        .order_by("pk")
+        .values(*Snapshot.table_columns(name))
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+def job_log_rows(job: Job, since: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Iterate over the log entries of a job without loading them all into memory.
+
+    Args:
+        job (Job): The job.
+        since (Optional[int]): Only export the entries after this sequence number.
+
+    Yields:
+        Dict: The log entries, in sequence order.
+    """
+    log_entries = job.log_entries.all()
+    if since is not None:
+        log_entries = log_entries.filter(sequence_number__gt=since)
+
+    yield from log_entries.values(*JOB_LOG_COLUMNS).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    )
+
+
+def format_rows(
+    rows: Iterable[Dict],
+    columns: List[str],
+    export_format: str,
+) -> Iterator[str]:
+    """
+    Format rows as NDJSON lines or CSV records, one row at a time.
+
+    Args:
+        rows (Iterable[Dict]): The rows to format.
+        columns (List[str]): The columns of the rows, in output order.
+        export_format (str): "ndjson" or "csv".
+
+    Yields:
+        str: The CSV header, then one line per row.
+    """
+    if export_format == "csv":
+        writer = csv.writer(_EchoBuffer())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([row[column] for column in columns])
+        return
+
+    for row in rows:
+        yield json.dumps({column: row[column] for column in columns}, default=str)
+        yield "\n"
+
+
+def chunk_lines(lines: Iterator[str]) -> Iterator[str]:
+    """
+    Join formatted lines into chunks of `EXPORT_CHUNK_SIZE` lines, so the server does not write one row at a time.
+
+    Args:
+        lines (Iterator[str]): The formatted lines.
+
+    Yields:
+        str: Chunks of lines.
+    """
+    while True:
+        chunk = "".join(itertools.islice(lines, settings.EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def stream_lines(lines: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Serve a synchronous iterator from an ASGI response without materializing it.
+
+    Django consumes a synchronous iterator of a streaming response in full before sending it under ASGI, so the
+    chunks are pulled in the thread that runs the database queries instead.
+
+    Args:
+        lines (Iterator[str]): The formatted lines.
+
+    Yields:
+        str: Chunks of lines.
+    """
+    chunks = chunk_lines(lines)
+    while True:
+        chunk = await sync_to_async(next)(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_response(
+    request: HttpRequest,
+    rows: Iterable[Dict],
+    columns: List[str],
+    export_format: str,
+    filename: str,
+) -> StreamingHttpResponse:
+    """
+    Build a streaming download of rows, so memory use does not grow with the number of rows.
+
+    Under ASGI the rows are streamed through an asynchronous iterator, while under WSGI, which drains an
+    asynchronous iterator into memory before sending it, they are streamed through a synchronous one.
+
+    Args:
+        request (HttpRequest): The request being answered, either a Django or a DRF request.
+        rows (Iterable[Dict]): The rows to export, typically a lazy iterator.
+        columns (List[str]): The columns of the rows, in output order.
+        export_format (str): "ndjson" or "csv".
+        filename (str): The file name without extension, offered to the browser.
+
+    Returns:
+        StreamingHttpResponse: The download.
+
+    Example:
+        ```python
+        snapshot = Snapshot.objects.get(uuid=snapshot_uuid)
+        return export_response(
+            request,
+            snapshot_table_rows(snapshot, "routes"),
+            Snapshot.table_columns("routes"),
+            "csv",
+            f"{snapshot.uuid}-routes",
+        )
+        ```
+    """
+    lines = format_rows(rows, columns, export_format)
+    # DRF wraps the Django request, which tells the handler serving it apart
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        content = stream_lines(lines)
+    else:
+        content = chunk_lines(lines)
+
+    response = StreamingHttpResponse(
+        content,
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
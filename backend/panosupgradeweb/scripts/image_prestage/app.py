@@ -0,0 +1,251 @@
+# backend/panosupgradeweb/scripts/image_prestage/app.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from django.db import connections
+
+from panosupgradeweb.models import Device, Profile, StagedImage
+from panosupgradeweb.scripts.upgrade_device.upgrade import PanosUpgrade
+from panosupgradeweb.scripts.utilities import parse_version
+
+
+def main(
+    author_id: int,
+    device_uuids: List[str],
+    job_id: str,
+    profile_uuid: str,
+    target_version: str,
+    verify: bool,
+) -> str:
+    """
+    Download the base and target images of a PAN-OS version onto devices, ahead of their upgrade.
+
+    The devices are pre-staged concurrently, at most `prestage_workers` of the profile at a time; requests proxied by
+    Panorama additionally go through its shared rate limiter. Every image is recorded as a `StagedImage` of its
+    device, so the upgrade of the device later skips the update server query and the download.
+
+    Args:
+        author_id (int): The ID of the author initiating the pre-stage job.
+        device_uuids (List[str]): The UUIDs of the devices to pre-stage the images onto.
+        job_id (str): The ID of the pre-stage job.
+        profile_uuid (str): The UUID of the profile whose credentials and download settings are used.
+        target_version (str): The PAN-OS version the devices will be upgraded to.
+        verify (bool): Whether to confirm with each device that the downloaded images were loaded into its software
+            manager.
+
+    Returns:
+        str: "completed" when every device was pre-staged or did not need the images, otherwise "errored".
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Retrieve devices and profile]
+            B --> C[Pre-stage devices concurrently]
+            C --> D{Device already on target version?}
+            D -->|Yes| E[Skip device]
+            D -->|No| F{Target version available?}
+            F -->|No| G[Device errored]
+            F -->|Yes| H[Download missing base and target images]
+            H --> I{Verify?}
+            I -->|Yes| J[Confirm images with software info]
+            I -->|No| K[Record staged images]
+            J --> K
+            K --> L{Any device errored?}
+            E --> L
+            G --> L
+            L -->|Yes| M[Return "errored"]
+            L -->|No| N[Return "completed"]
+        ```
+    """
+    upgrade_job = PanosUpgrade(
+        job_id=job_id,
+        profile_uuid=profile_uuid,
+    )
+    upgrade_job.version_target_parsed = parse_version(version=target_version)
+
+    upgrade_job.logger.log_task(
+        action="start",
+        message=f"Pre-staging PAN-OS {target_version} onto {len(device_uuids)} devices, executed by author id: "
+        f"{author_id} using the profile {profile_uuid}",
+    )
+
+    profile = Profile.objects.get(uuid=profile_uuid)
+    devices = list(
+        Device.objects.filter(uuid__in=device_uuids).select_related("platform")
+    )
+
+    def run_in_thread(db_device):
+        try:
+            return prestage_device(
+                upgrade_job=upgrade_job,
+                db_device=db_device,
+                profile=profile,
+                target_version=target_version,
+                verify=verify,
+            )
+        except Exception as e:
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{db_device.hostname}: Error pre-staging PAN-OS {target_version}: {str(e)}",
+            )
+            return "errored"
+        finally:
+            # Worker threads open their own database connections
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(1, profile.prestage_workers)) as executor:
+        statuses = list(executor.map(run_in_thread, devices))
+
+    upgrade_job.logger.log_task(
+        action="report",
+        message=f"Pre-staged PAN-OS {target_version} onto {statuses.count('staged')} devices, "
+        f"{statuses.count('skipped')} skipped, {statuses.count('errored')} errored.",
+    )
+    upgrade_job.update_current_step(
+        device_name="all",
+        step_name="Completed",
+    )
+
+    return "errored" if "errored" in statuses else "completed"
+
+
+def prestage_device(
+    upgrade_job: PanosUpgrade,
+    db_device: Device,
+    profile: Profile,
+    target_version: str,
+    verify: bool,
+) -> str:
+    """
+    Download the base and target images of a PAN-OS version onto a device, and record them as staged.
+
+    Images already on the device are recorded without being downloaded again.
+
+    Args:
+        upgrade_job (PanosUpgrade): The pre-stage job, with `version_target_parsed` set.
+        db_device (Device): The device to pre-stage the images onto.
+        profile (Profile): The profile whose credentials are used.
+        target_version (str): The PAN-OS version the device will be upgraded to.
+        verify (bool): Whether to confirm with the device that the downloaded images were loaded into its software
+            manager.
+
+    Returns:
+        str: "staged", "skipped" when the device already runs the target version or a newer one, or "errored".
+    """
+    hostname = db_device.hostname
+    if (
+        db_device.sw_version
+        and parse_version(version=db_device.sw_version)
+        >= upgrade_job.version_target_parsed
+    ):
+        upgrade_job.logger.log_task(
+            action="skipped",
+            message=f"{hostname}: Already running PAN-OS {db_device.sw_version}, skipping pre-stage.",
+        )
+        return "skipped"
+
+    device = upgrade_job.connect_device(
+        db_device=db_device,
+        profile=profile,
+    )
+    if not upgrade_job.software_available_check(
+        device=device,
+        target_version=target_version,
+    ):
+        upgrade_job.logger.log_task(
+            action="error",
+            message=f"{hostname}: Target version {target_version} is not available.",
+        )
+        return "errored"
+
+    pan_device = device["pan_device"]
+    retry_interval = upgrade_job.profile["download"]["retry_interval"]
+    major, minor = upgrade_job.version_target_parsed[:2]
+    images = list(dict.fromkeys([f"{major}.{minor}.0", target_version]))
+    for version in images:
+        if pan_device.software.versions[version]["downloaded"]:
+            upgrade_job.logger.log_task(
+                action="report",
+                message=f"{hostname}: Image {version} is already on the device.",
+            )
+            continue
+
+        maximum_attempts = upgrade_job.profile["download"]["maximum_attempts"]
+        for attempt in range(maximum_attempts):
+            downloaded = upgrade_job.software_download(
+                device=device,
+                target_version=version,
+            )
+            if downloaded or attempt == maximum_attempts - 1:
+                break
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{hostname}: Failed to pre-stage image {version}, retrying after {retry_interval} "
+                "seconds.",
+            )
+            time.sleep(retry_interval)
+
+        if not downloaded:
+            record_staged_images(upgrade_job, db_device, [version], "failed")
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{hostname}: Image {version} could not be pre-staged.",
+            )
+            return "errored"
+
+        # Let the image load into the software manager before it is verified or the next one is downloaded
+        time.sleep(retry_interval)
+
+    # Confirm with the device that every image is known to its software manager as downloaded
+    if verify:
+        pan_device.software.info()
+        missing = [
+            version
+            for version in images
+            if not pan_device.software.versions.get(version, {}).get("downloaded")
+        ]
+        if missing:
+            record_staged_images(upgrade_job, db_device, missing, "failed")
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{hostname}: Images {', '.join(missing)} are not on the device after their download.",
+            )
+            return "errored"
+
+    record_staged_images(upgrade_job, db_device, images, "staged", verified=verify)
+    upgrade_job.logger.log_task(
+        action="success",
+        message=f"{hostname}: Images {', '.join(images)} pre-staged{' and verified' if verify else ''}.",
+    )
+    return "staged"
+
+
+def record_staged_images(
+    upgrade_job: PanosUpgrade,
+    db_device: Device,
+    versions: List[str],
+    status: str,
+    verified: bool = False,
+) -> None:
+    """
+    Record the outcome of the pre-stage of images onto a device, replacing the outcome of earlier pre-stage jobs.
+
+    Args:
+        upgrade_job (PanosUpgrade): The pre-stage job.
+        db_device (Device): The device the images were pre-staged onto.
+        versions (List[str]): The versions of the images.
+        status (str): "staged" or "failed".
+        verified (bool): Whether the device confirmed that the images are downloaded.
+    """
+    for version in versions:
+        StagedImage.objects.update_or_create(
+            device=db_device,
+            version=version,
+            defaults={
+                "status": status,
+                "verified": verified,
+                "job_id": upgrade_job.job_id,
+            },
+        )
@@ -1,20 +1,27 @@
 # backend/panosupgradeweb/scripts/inventory_sync/app.py
-from panos.firewall import Firewall
-from panos.panorama import Panorama
 
-from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
-from panosupgradeweb.scripts.utilities import (
-    find_devicegroup_by_serial,
-    flatten_xml_to_dict,
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from django.db import connections
+from django.utils import timezone
+
+from panosupgradeweb.scripts.api_keys import get_api_key
+from panosupgradeweb.scripts.device_groups import (
+    device_group_index,
+    get_device_group_index_cache,
 )
+from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.rate_limit import RateLimitedPanorama
+from panosupgradeweb.scripts.xml_api import entry_to_dict, iter_op_entries
 
 # import our Django models
 from panosupgradeweb.models import (
     Device,
     DeviceType,
+    Job,
     Profile,
 )
-from django.core.exceptions import ObjectDoesNotExist
 
 from .inventory import InventorySync
 
@@ -28,6 +35,7 @@ def main(
     job_id: str,
     panorama_device_uuid: str,
     profile_uuid: str,
+    fast: bool = True,
 ) -> str:
     """
     Perform an inventory sync for a Panorama device.
@@ -36,11 +44,16 @@ def main(
     the corresponding Device objects in the database. It also handles the assignment of peer devices
     for HA deployments.
 
+    In fast mode the devices are built from the 'show devices connected' and 'show devicegroups' responses alone,
+    and only the firewalls missing from or incompletely described by the listing are queried through Panorama.
+    Otherwise the system info and HA state of every firewall are retrieved from the firewall.
+
     Args:
         author_id (int): The ID of the author performing the inventory sync.
         job_id (str): The unique identifier of the inventory sync job.
         panorama_device_uuid (str): The UUID of the Panorama device.
         profile_uuid (str): The UUID of the profile associated with the Panorama device.
+        fast (bool): Whether to build the devices from the Panorama listing instead of querying every firewall.
 
     Returns:
         str: The string representation of the status.
@@ -53,12 +66,9 @@ def main(
         graph TD
             A[Start] --> B[Log inventory sync details]
             B --> C[Retrieve Panorama device and profile from database]
-            C --> D[Connect to Panorama device]
-            D --> E[Retrieve system info and device group mappings]
-            E --> F[Retrieve connected devices]
-            F --> G[Create/update Device objects]
-            G --> H[Update peer device information for HA deployments]
-            H --> I[Return status message]
+            C --> D[Collect devices of the Panorama device]
+            D --> E[Write devices and link HA peers]
+            E --> I[Return status message]
             I --> J[Log any errors and raise exception]
             J --> K[End]
         ```
@@ -86,13 +96,8 @@ def main(
         message="Starting inventory sync",
     )
 
-    # Create placeholders for object created within try/except clauses
-    device_group_mappings = None
-    missing_peer_devices = []
-    pan = None
-    panorama_device = None
-    panorama_hostname = ""
-    result_dict = {}
+    # Create a placeholder for the collected devices, so a failed collection writes nothing
+    collected = None
 
     try:
         # Retrieve the Panorama device and profile objects from the database
@@ -108,229 +113,495 @@ def main(
             message=f"Retrieved profile: {profile.name}",
         )
 
-        # Access the authentication data directly from the profile fields
-        pan_username = profile.pan_username
-        pan_password = profile.pan_password
-
-        # Connect to the Panorama device using the retrieved credentials
-        pan = Panorama(
-            (
-                panorama_device.ipv4_address
-                if panorama_device.ipv4_address
-                else panorama_device.ipv6_address
-            ),
-            pan_username,
-            pan_password,
-        )
-        inventory_sync.logger.log_task(
-            action="info",
-            message=f"Connected to Panorama device: {panorama_device.ipv4_address}",
+        collected = collect_panorama_devices(
+            inventory_sync=inventory_sync,
+            author_id=author_id,
+            panorama_device=panorama_device,
+            profile=profile,
+            fast=fast,
         )
 
-        # Retrieve the system information from the Panorama device
-        system_info = pan.show_system_info()
-        panorama_hostname = system_info["system"]["hostname"]
+    except Exception as e:
         inventory_sync.logger.log_task(
-            action="search",
-            message=f"Connected to Panorama device: {panorama_hostname}",
+            action="error",
+            message=f"Error during initial pass of inventory sync: {str(e)}",
         )
 
-        # Retrieve the device group mappings from the Panorama device
-        device_group_mappings = InventorySync.get_device_group_mapping(pan=pan)
-        inventory_sync.logger.log_task(
-            action="search",
-            message=f"Retrieved device group mappings {device_group_mappings}",
-        )
+    if collected is not None:
+        try:
+            write_synced_devices(
+                inventory_sync=inventory_sync,
+                collected=[collected],
+            )
 
-        # Retrieve the connected devices
-        connected_devices = pan.op("show devices connected")
-        result_dict = flatten_xml_to_dict(element=connected_devices)
-        inventory_sync.logger.log_task(
-            action="search",
-            message=f"Retrieved connected devices {result_dict['result']['devices']}",
-        )
+        except Exception as e:
+            inventory_sync.logger.log_task(
+                action="error",
+                message=f"Error writing the synced devices: {str(e)}",
+            )
 
-    except Exception as e:
-        inventory_sync.logger.log_task(
-            action="error",
-            message=f"Error during 'show devices connected' command: {str(e)}",
-        )
+    return "completed"
 
-    try:
+
+def main_all(
+    author_id: int,
+    job_id: str,
+    profile_uuid: str,
+    fast: bool = True,
+) -> str:
+    """
+    Perform an inventory sync of every Panorama device, as a single job.
+
+    The devices of the Panorama devices are collected concurrently, at most `inventory_sync_panorama_workers` of the
+    profile at a time, as every appliance has its own rate limiter and the firewalls of each are queried with the
+    `inventory_sync_workers` of the profile. The
+    collected devices of all appliances are then written by a single `write_synced_devices` call, so the database
+    sees one bulk write however many appliances are synced. The status of each appliance is kept in the
+    `workflow_state` of the job under "panoramas", and updated as its collection completes.
+
+    Args:
+        author_id (int): The ID of the author performing the inventory sync.
+        job_id (str): The unique identifier of the inventory sync job.
+        profile_uuid (str): The UUID of the profile whose credentials are used for every Panorama device.
+        fast (bool): Whether to build the devices from the Panorama listings instead of querying every firewall.
+
+    Returns:
+        str: "completed" when every Panorama device was synced, "skipped" when there is no Panorama device,
+        otherwise "errored".
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Retrieve profile and Panorama devices]
+            B --> C{Any Panorama device?}
+            C -->|No| D[Return "skipped"]
+            C -->|Yes| E[Collect devices of each Panorama device concurrently]
+            E --> F{Collection succeeded?}
+            F -->|Yes| G[Mark Panorama collected]
+            F -->|No| H[Mark Panorama errored]
+            G --> I[Write devices of all Panorama devices and link HA peers]
+            H --> I
+            I --> J[Mark collected Panorama devices completed]
+            J --> K{Any Panorama errored?}
+            K -->|Yes| L[Return "errored"]
+            K -->|No| M[Return "completed"]
+        ```
+    """
+    inventory_sync = InventorySync(job_id)
+
+    inventory_sync.logger.log_task(
+        action="start",
+        message=f"Running inventory sync for all Panorama devices, executed by author id: {author_id} using the "
+        f"profile {profile_uuid}",
+    )
+
+    profile = Profile.objects.get(uuid=profile_uuid)
+    panorama_devices = list(
+        Device.objects.filter(platform__device_type="Panorama").order_by("hostname")
+    )
+    if not panorama_devices:
         inventory_sync.logger.log_task(
-            action="start",
-            message="Starting device creation/update",
+            action="skipped",
+            message="No Panorama devices to sync.",
         )
-        # Step 1: Create or update Device objects based on the retrieved devices
-        for device in result_dict["result"]["devices"]["entry"]:
-            platform_name = device["model"]
-
-            # Retrieve the DeviceType object based on the platform_name
+        return "skipped"
+
+    panoramas = {
+        panorama_device.hostname: {"status": "running"}
+        for panorama_device in panorama_devices
+    }
+    record_panorama_status(job_id, panoramas)
+
+    def run_in_thread(panorama_device):
+        try:
+            return collect_panorama_devices(
+                inventory_sync=inventory_sync,
+                author_id=author_id,
+                panorama_device=panorama_device,
+                profile=profile,
+                fast=fast,
+            )
+        finally:
+            # Worker threads open their own database connections
+            connections.close_all()
+
+    collected = {}
+    with ThreadPoolExecutor(
+        max_workers=max(
+            1, min(profile.inventory_sync_panorama_workers, len(panorama_devices))
+        )
+    ) as executor:
+        futures = {
+            executor.submit(run_in_thread, panorama_device): panorama_device.hostname
+            for panorama_device in panorama_devices
+        }
+        for future in as_completed(futures):
+            hostname = futures[future]
             try:
-                platform = DeviceType.objects.get(name=platform_name)
-            except ObjectDoesNotExist:
-                # Handle the case when the platform doesn't exist
+                collected[hostname] = future.result()
+            except Exception as e:
                 inventory_sync.logger.log_task(
-                    action="skipped",
-                    message=f"Platform '{platform_name}' not found. Skipping device: {device['@name']}",
+                    action="error",
+                    message=f"Error during inventory sync of Panorama {hostname}: {str(e)}",
                 )
-                continue
+                panoramas[hostname] = {"status": "errored", "error": str(e)}
+            else:
+                panoramas[hostname] = {
+                    "status": "collected",
+                    "devices": len(collected[hostname]["devices"]),
+                }
+            record_panorama_status(job_id, panoramas)
+
+    if collected:
+        try:
+            removed = write_synced_devices(
+                inventory_sync=inventory_sync,
+                collected=[collected[hostname] for hostname in sorted(collected)],
+            )
+        except Exception as e:
             inventory_sync.logger.log_task(
-                action="search",
-                message=f"Retrieved platform: {platform.name}",
+                action="error",
+                message=f"Error writing the synced devices: {str(e)}",
             )
+            for hostname in collected:
+                panoramas[hostname] = {"status": "errored", "error": str(e)}
+        else:
+            for hostname in collected:
+                panoramas[hostname].update(
+                    status="completed",
+                    removed=len(removed[hostname]),
+                )
+        record_panorama_status(job_id, panoramas)
 
-            # Build connection to firewall device through Panorama object
-            firewall = Firewall(serial=device["serial"])
-            pan.add(firewall)
+    errored = [
+        hostname
+        for hostname, state in panoramas.items()
+        if state["status"] == "errored"
+    ]
+    inventory_sync.logger.log_task(
+        action="report",
+        message=f"Synced {len(panoramas) - len(errored)} of {len(panoramas)} Panorama devices"
+        + (f", errored: {', '.join(sorted(errored))}" if errored else ""),
+    )
 
-            # Retrieve the system information from the firewall device
-            info = firewall.show_system_info()
-            inventory_sync.logger.log_task(
-                action="search",
-                message=f"Retrieved system info for device: {info['system']['hostname']}",
-            )
-            inventory_sync.logger.log_task(
-                action="debug",
-                message=f"System info: {info}",
-            )
+    return "errored" if errored else "completed"
 
-            # Retrieve the HA state information from the firewall device
-            ha_info = firewall.show_highavailability_state()
-            inventory_sync.logger.log_task(
-                action="search",
-                message=f"Retrieved HA state for device: {info['system']['hostname']}",
-            )
 
-            ha_enabled = ha_info[0] != "disabled"
-
-            peer_device_uuid = None
-            peer_ip = None
-            peer_state = None
-            local_state = None
-
-            if ha_enabled:
-                ha_details = flatten_xml_to_dict(element=ha_info[1])
-                peer_ip = ha_details["result"]["group"]["peer-info"]["mgmt-ip"].split(
-                    "/"
-                )[0]
-                local_state = ha_details["result"]["group"]["local-info"]["state"]
-
-                try:
-                    peer_device = Device.objects.get(ipv4_address=peer_ip)
-                    peer_device_uuid = str(peer_device.uuid)
-                    peer_state = ha_details["result"]["group"]["peer-info"]["state"]
-                except ObjectDoesNotExist:
-                    # When the peer device doesn't yet exist, we will revisit after creation.
-                    missing_peer_devices.append(firewall)
-
-                    inventory_sync.logger.log_task(
-                        action="skipped",
-                        message=f"Peer device with IP {peer_ip} not found. Skipping HA deployment.",
-                    )
-
-            panorama_appliance_uuid = None
-            if panorama_hostname:
-                try:
-                    panorama_appliance = Device.objects.get(hostname=panorama_hostname)
-                    panorama_appliance_uuid = str(panorama_appliance.uuid)
-                    inventory_sync.logger.log_task(
-                        action="search",
-                        message=f"Retrieved Panorama appliance: {panorama_appliance.hostname}",
-                    )
-                except ObjectDoesNotExist:
-                    inventory_sync.logger.log_task(
-                        action="skipped",
-                        message=f"Panorama appliance '{panorama_hostname}' not found. Skipping assignment.",
-                    )
-
-            # Create or update the Device object
-            Device.objects.update_or_create(
-                hostname=info["system"]["hostname"],
-                defaults={
-                    "app_version": info["system"]["app-version"],
-                    "author_id": author_id,
-                    "device_group": find_devicegroup_by_serial(
-                        device_group_mappings,
-                        device["serial"],
-                    ),
-                    "ha_enabled": ha_enabled,
-                    "ipv4_address": (
-                        info["system"]["ip-address"]
-                        if info["system"]["ip-address"] != "unknown"
-                        else None
-                    ),
-                    "ipv6_address": (
-                        info["system"]["ipv6-address"]
-                        if info["system"]["ipv6-address"] != "unknown"
-                        else None
-                    ),
-                    "local_state": local_state,
-                    "notes": None,
-                    "platform": platform,
-                    "panorama_appliance_id": panorama_appliance_uuid,
-                    "panorama_managed": True,
-                    "panorama_ipv4_address": panorama_device.ipv4_address,
-                    "panorama_ipv6_address": panorama_device.ipv6_address,
-                    "peer_device_id": peer_device_uuid,
-                    "peer_ip": peer_ip,
-                    "peer_state": peer_state,
-                    "serial": info["system"]["serial"],
-                    "sw_version": info["system"]["sw-version"],
-                    "threat_version": info["system"]["threat-version"],
-                    "uptime": info["system"]["uptime"],
-                },
-            )
+def record_panorama_status(
+    job_id: str,
+    panoramas: Dict[str, Dict],
+) -> None:
+    """
+    Store the status of each Panorama device of a multi-Panorama inventory sync in the workflow state of its job.
+
+    Args:
+        job_id (str): The unique identifier of the inventory sync job.
+        panoramas (Dict[str, Dict]): The status of each Panorama device, keyed by hostname.
+    """
+    Job.objects.filter(task_id=job_id).update(
+        workflow_state={"panoramas": panoramas},
+        updated_at=timezone.now(),
+    )
+
+
+def collect_panorama_devices(
+    inventory_sync: InventorySync,
+    author_id: int,
+    panorama_device: Device,
+    profile: Profile,
+    fast: bool,
+) -> Dict:
+    """
+    Collect the devices connected to a Panorama device, without writing them to the database.
+
+    Args:
+        inventory_sync (InventorySync): The inventory sync job.
+        author_id (int): The ID of the author performing the inventory sync.
+        panorama_device (Device): The Panorama device to collect the devices of.
+        profile (Profile): The profile whose credentials are used.
+        fast (bool): Whether to build the devices from the Panorama listing instead of querying every firewall.
+
+    Returns:
+        Dict: The Panorama device under "panorama_device", the unsaved Device objects under "devices", the HA peer
+        management IP and state of each HA-enabled device under "ha_peers", and the serial numbers listed by the
+        Panorama device under "listed_serials".
+
+    Raises:
+        Exception: If the Panorama device cannot be queried.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> D[Connect to Panorama device]
+            D --> E[Retrieve system info, stream device groups and index them by serial]
+            E --> F[Stream connected devices, skipping unknown platforms]
+            F --> L{Fast mode?}
+            L -->|Yes| M[Build facts from listing]
+            M --> N[Query firewalls missing from listing]
+            L -->|No| O[Query every firewall]
+            N --> G[Build Device objects]
+            O --> G
+            G --> H[Return collected devices]
+        ```
+    """
+    ha_peers = {}
+
+    # Access the authentication data directly from the profile fields
+    pan_username = profile.pan_username
+    pan_password = profile.pan_password
+
+    # Connect to the Panorama device, reusing the cached API key of the profile; every request, including the ones
+    # proxied to its firewalls, goes through the shared rate limiter of the appliance, and a cached key Panorama
+    # rejects is regenerated once
+    panorama_address = (
+        panorama_device.ipv4_address
+        if panorama_device.ipv4_address
+        else panorama_device.ipv6_address
+    )
+    api_key_cache_args = (
+        panorama_address,
+        str(profile.uuid),
+        pan_username,
+        pan_password,
+    )
+    pan = RateLimitedPanorama(
+        panorama_address,
+        api_key=get_api_key(*api_key_cache_args),
+        api_key_cache_args=api_key_cache_args,
+    )
+    inventory_sync.logger.log_task(
+        action="info",
+        message=f"Connected to Panorama device: {panorama_device.ipv4_address}",
+    )
+
+    # Retrieve the system information from the Panorama device
+    system_info = pan.show_system_info()
+    panorama_hostname = system_info["system"]["hostname"]
+    inventory_sync.logger.log_task(
+        action="search",
+        message=f"Connected to Panorama device: {panorama_hostname}",
+    )
+
+    # The listings of Panorama are streamed over the XML API and parsed one entry at a time, instead of being
+    # built into an element tree and a dictionary as a whole; the client reads the API key from the cache itself so
+    # it can replace a rejected key as well
+    def iter_listing(cmd, path):
+        return iter_op_entries(
+            panorama_address,
+            cmd,
+            path,
+            profile_uuid=str(profile.uuid),
+            username=pan_username,
+            password=pan_password,
+            rate_limited=True,
+        )
+
+    # Retrieve the device group mappings from the Panorama device and index them by serial number, replacing
+    # the index shared with device refreshes
+    device_group_index_cache = get_device_group_index_cache()
+    device_group_index_cache.invalidate(panorama_address)
+    device_group_mappings = [
+        InventorySync.parse_device_group_entry(entry)
+        for entry in iter_listing("show devicegroups", "result/devicegroups/entry")
+    ]
+    inventory_sync.logger.log_task(
+        action="search",
+        message=f"Retrieved {len(device_group_mappings)} device group mappings",
+    )
+    device_groups = device_group_index(device_group_mappings)
+    device_group_index_cache.set(panorama_address, device_groups)
+
+    inventory_sync.logger.log_task(
+        action="start",
+        message="Starting device creation/update",
+    )
+    # Step 1: Retrieve the connected devices, resolving the platform of each one as it is parsed and skipping
+    # unknown platforms
+    platforms = DeviceType.objects.in_bulk(field_name="name")
+    listed_serials = set()
+    supported_devices = []
+    for entry in iter_listing("show devices connected", "result/devices/entry"):
+        device = entry_to_dict(entry)
+        listed_serials.add(device.get("serial"))
+        platform_name = device.get("model")
+        if platform_name not in platforms:
+            # Handle the case when the platform doesn't exist
             inventory_sync.logger.log_task(
-                action="save",
-                message=f"Created/updated device: {info['system']['hostname']}",
+                action="skipped",
+                message=f"Platform '{platform_name}' not found. Skipping device: {device['@name']}",
             )
+            continue
+        supported_devices.append(device)
 
-    except Exception as e:
+    inventory_sync.logger.log_task(
+        action="search",
+        message=f"Retrieved {len(listed_serials)} connected devices",
+    )
+
+    # Retrieve the Panorama appliance once, as it is shared by every device
+    panorama_appliance = Device.objects.filter(hostname=panorama_hostname).first()
+    if panorama_appliance:
         inventory_sync.logger.log_task(
-            action="error",
-            message=f"Error during initial pass of inventory sync: {str(e)}",
+            action="search",
+            message=f"Retrieved Panorama appliance: {panorama_appliance.hostname}",
+        )
+    else:
+        inventory_sync.logger.log_task(
+            action="skipped",
+            message=f"Panorama appliance '{panorama_hostname}' not found. Skipping assignment.",
         )
 
-    try:
-        # Step 2: Revisit the missing peer devices and update the peer_device_id
+    # Build the facts of the devices from the listing in fast mode, then retrieve the system info and HA state
+    # of the remaining devices concurrently through Panorama
+    fleet_facts, remaining = [], supported_devices
+    if fast:
+        fleet_facts, remaining = InventorySync.facts_from_listing(supported_devices)
+        inventory_sync.logger.log_task(
+            action="search",
+            message=f"Built facts of {len(fleet_facts)} devices from the device listing, "
+            f"{len(remaining)} devices left to query",
+        )
+    if remaining:
+        fleet_facts += inventory_sync.collect_fleet_facts(
+            pan=pan,
+            devices=remaining,
+            max_workers=profile.inventory_sync_workers,
+        )
+
+    # Step 2: Build Device objects from the collected facts
+    devices = []
+    for facts in fleet_facts:
+        device = facts["device"]
+        info = facts["info"]
+        ha_enabled = facts["ha_enabled"]
         inventory_sync.logger.log_task(
-            action="start",
-            message="Starting missing peer device update",
+            action="debug",
+            message=f"System info: {info}",
         )
-        for firewall in missing_peer_devices:
-            ha_info = firewall.show_highavailability_state()
-            ha_details = flatten_xml_to_dict(element=ha_info[1])
+
+        peer_ip = None
+        local_state = None
+
+        if ha_enabled:
+            ha_details = facts["ha_details"]
             peer_ip = ha_details["result"]["group"]["peer-info"]["mgmt-ip"].split("/")[
                 0
             ]
+            local_state = ha_details["result"]["group"]["local-info"]["state"]
+            ha_peers[info["system"]["hostname"]] = (
+                peer_ip,
+                ha_details["result"]["group"]["peer-info"]["state"],
+            )
 
-            try:
-                peer_device = Device.objects.get(ipv4_address=peer_ip)
-                peer_device_uuid = str(peer_device.uuid)
-                peer_state = ha_details["result"]["group"]["peer-info"]["state"]
-                inventory_sync.logger.log_task(
-                    action="search",
-                    message=f"Retrieved peer device: {peer_device.hostname}",
-                )
-            except ObjectDoesNotExist:
+        devices.append(
+            Device(
+                app_version=info["system"]["app-version"],
+                author_id=author_id,
+                device_group=device_groups.get(device["serial"]),
+                ha_enabled=ha_enabled,
+                hostname=info["system"]["hostname"],
+                ipv4_address=(
+                    info["system"]["ip-address"]
+                    if info["system"]["ip-address"] != "unknown"
+                    else None
+                ),
+                ipv6_address=(
+                    info["system"]["ipv6-address"]
+                    if info["system"]["ipv6-address"] != "unknown"
+                    else None
+                ),
+                local_state=local_state,
+                notes=None,
+                platform=platforms[device["model"]],
+                panorama_appliance=panorama_appliance,
+                panorama_managed=True,
+                panorama_ipv4_address=panorama_device.ipv4_address,
+                panorama_ipv6_address=panorama_device.ipv6_address,
+                peer_device=None,
+                peer_ip=peer_ip,
+                peer_state=None,
+                serial=info["system"]["serial"],
+                sw_version=info["system"]["sw-version"],
+                threat_version=info["system"]["threat-version"],
+                uptime=info["system"]["uptime"],
+            )
+        )
+
+    return {
+        "panorama_device": panorama_device,
+        "devices": devices,
+        "ha_peers": ha_peers,
+        "listed_serials": listed_serials,
+    }
+
+
+def write_synced_devices(
+    inventory_sync: InventorySync,
+    collected: List[Dict],
+) -> Dict[str, List[str]]:
+    """
+    Write the devices collected from one or more Panorama devices, then link their HA peers.
+
+    The devices of every Panorama device are merged and written by a single `upsert_devices` call. A device listed
+    by more than one Panorama device is written once, with the facts collected from the first Panorama device of
+    `collected` that lists it.
+
+    Args:
+        inventory_sync (InventorySync): The inventory sync job.
+        collected (List[Dict]): The results of `collect_panorama_devices`.
+
+    Returns:
+        Dict[str, List[str]]: The hostnames of the devices no longer listed, keyed by Panorama device hostname.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Merge devices of every Panorama device by hostname]
+            B --> C[Create new and update changed Device objects]
+            C --> D[Report devices no longer listed by each Panorama device]
+            D --> E[Link HA peers using an index of management IPs]
+            E --> F[Return removed devices]
+        ```
+    """
+    devices = {}
+    ha_peers = {}
+    for result in collected:
+        panorama_hostname = result["panorama_device"].hostname
+        for device in result["devices"]:
+            if device.hostname in devices:
                 inventory_sync.logger.log_task(
-                    action="error",
-                    message=f"Peer device with IP {peer_ip} still not found. Skipping HA deployment.",
+                    action="skipped",
+                    message=f"Device {device.hostname} is also listed by Panorama {panorama_hostname}, keeping "
+                    "the facts collected first.",
                 )
                 continue
+            devices[device.hostname] = device
+            if device.hostname in result["ha_peers"]:
+                ha_peers[device.hostname] = result["ha_peers"][device.hostname]
+
+    # Create the new Device objects and update the changed ones in a single transaction
+    created, updated = InventorySync.upsert_devices(list(devices.values()))
+
+    # Find the devices synced from each Panorama device that it no longer lists
+    removed = {
+        result["panorama_device"].hostname: inventory_sync.find_removed_devices(
+            panorama_device=result["panorama_device"],
+            listed_serials=result["listed_serials"],
+        )
+        for result in collected
+    }
+    inventory_sync.logger.log_task(
+        action="save",
+        message=f"Devices added: {created}, changed: {updated}, "
+        f"removed: {sum(len(hostnames) for hostnames in removed.values())}, "
+        f"unchanged: {len(devices) - created - updated}",
+    )
 
-            Device.objects.filter(serial=firewall.serial).update(
-                peer_device_id=peer_device_uuid, peer_ip=peer_ip, peer_state=peer_state
-            )
-            inventory_sync.logger.log_task(
-                action="save",
-                message=f"Updated peer device for: {firewall.serial}",
-            )
-            return "completed"
+    # Step 3: Link HA peers now that every collected device exists in the database
+    inventory_sync.logger.log_task(
+        action="start",
+        message="Starting HA peer resolution",
+    )
+    inventory_sync.link_ha_peers(ha_peers)
 
-    except Exception as e:
-        inventory_sync.logger.log_task(
-            action="error",
-            message=f"Error during second pass of inventory sync: {str(e)}",
-        )
+    return removed
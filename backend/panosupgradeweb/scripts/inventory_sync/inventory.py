@@ -1,10 +1,22 @@
-from typing import Dict, List
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+
+# Django imports
+from django.db import transaction
+from django.utils import timezone
 
 # Palo Alto Networks SDK imports
+from panos.firewall import Firewall
 from panos.panorama import Panorama
 
 # pan-os-upgrade-web imports
+from panosupgradeweb.models import Device
 from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.rate_limit import RateLimitedFirewall
+from panosupgradeweb.scripts.utilities import flatten_xml_to_dict
 
 
 class InventorySync:
@@ -16,6 +28,50 @@ class InventorySync:
     Inventory is created / updated within the Django database.
     """
 
+    # Device fields written by an inventory sync, for both new and existing rows
+    SYNC_FIELDS = [
+        "app_version",
+        "author",
+        "device_group",
+        "ha_enabled",
+        "ipv4_address",
+        "ipv6_address",
+        "local_state",
+        "notes",
+        "panorama_appliance",
+        "panorama_ipv4_address",
+        "panorama_ipv6_address",
+        "panorama_managed",
+        "peer_device",
+        "peer_ip",
+        "peer_state",
+        "platform",
+        "serial",
+        "sw_version",
+        "threat_version",
+        "uptime",
+    ]
+
+    # Synced fields hashed into the fingerprint of a device. The author and notes do not describe the device, the
+    # uptime changes on every sync and is refreshed on its own, and the peer fields are derived from the facts of both
+    # HA members by `link_ha_peers`
+    FINGERPRINT_FIELDS = [
+        field
+        for field in SYNC_FIELDS
+        if field not in ("author", "notes", "peer_device", "peer_state", "uptime")
+    ]
+
+    # Fields of a 'show devices connected' entry that make up the system info of a device, all required
+    LISTING_SYSTEM_FIELDS = (
+        "app-version",
+        "hostname",
+        "ip-address",
+        "serial",
+        "sw-version",
+        "threat-version",
+        "uptime",
+    )
+
     def __init__(
         self,
         job_id: str,
@@ -97,31 +153,467 @@ class InventorySync:
             ]
             ```
         """
-        device_group_mappings = []
-
         # Query Panorama for device groups using the 'show devicegroups' operational command
         device_groups = pan.op("show devicegroups")
 
         # Iterate over each 'entry' element under 'devicegroups'
-        for entry in device_groups.findall(".//devicegroups/entry"):
-            entry_dict = {"@name": entry.get("name")}
-
-            # Check if the 'entry' has 'devices' element
-            devices_elem = entry.find("devices")
-            if devices_elem is not None:
-                devices = []
-
-                # Iterate over each 'entry' element under 'devices'
-                for device in devices_elem.findall("entry"):
-                    device_dict = {
-                        "@name": device.get("name"),
-                        "serial": device.find("serial").text,
-                        "connected": device.find("connected").text,
+        return [
+            InventorySync.parse_device_group_entry(entry)
+            for entry in device_groups.findall(".//devicegroups/entry")
+        ]
+
+    @staticmethod
+    def parse_device_group_entry(entry: ET.Element) -> Dict:
+        """
+        Convert a device group entry of the 'show devicegroups' response into a device group mapping.
+
+        Args:
+            entry (ET.Element): The `<entry>` element of the device group.
+
+        Returns:
+            Dict: The device group mapping, see `get_device_group_mapping`.
+        """
+        entry_dict = {"@name": entry.get("name")}
+
+        # Check if the 'entry' has 'devices' element
+        devices_elem = entry.find("devices")
+        if devices_elem is not None:
+            entry_dict["devices"] = [
+                {
+                    "@name": device.get("name"),
+                    "serial": device.find("serial").text,
+                    "connected": device.find("connected").text,
+                }
+                for device in devices_elem.findall("entry")
+            ]
+
+        return entry_dict
+
+    @staticmethod
+    def collect_device_facts(
+        firewall: Firewall,
+        device: Dict,
+    ) -> Dict:
+        """
+        Retrieve the system information and HA state of a single firewall through Panorama.
+
+        This function performs the two proxied API calls needed to build a Device row and returns the raw
+        results without touching the database, so it can safely run inside a worker thread.
+
+        Args:
+            firewall (Firewall): The firewall object, already attached to its Panorama parent.
+            device (Dict): The device entry from the 'show devices connected' response.
+
+        Returns:
+            Dict: A dictionary with the following keys:
+                - 'device': The device entry that was passed in.
+                - 'firewall': The firewall object used for the API calls.
+                - 'info': The result of `show_system_info()`.
+                - 'ha_enabled': Whether HA is enabled on the firewall.
+                - 'ha_details': The flattened HA state, or None when HA is disabled.
+        """
+        info = firewall.show_system_info()
+        ha_info = firewall.show_highavailability_state()
+        ha_enabled = ha_info[0] != "disabled"
+
+        return {
+            "device": device,
+            "firewall": firewall,
+            "info": info,
+            "ha_enabled": ha_enabled,
+            "ha_details": (
+                flatten_xml_to_dict(element=ha_info[1]) if ha_enabled else None
+            ),
+        }
+
+    @classmethod
+    def facts_from_listing(
+        cls,
+        devices: List[Dict],
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Build the facts of firewalls from the 'show devices connected' response of their Panorama appliance.
+
+        The listing already holds the system info and HA state of every managed firewall, so the facts are built
+        without querying the firewalls. The management IP of an HA peer, which the listing lacks, is taken from the
+        listing entry of the peer. Devices whose entry misses a system info field, or whose peer is not listed, are
+        returned separately to be queried with `collect_fleet_facts`.
+
+        Args:
+            devices (List[Dict]): The device entries from the 'show devices connected' response.
+
+        Returns:
+            Tuple[List[Dict], List[Dict]]: The facts built from the listing, in the format of `collect_device_facts`
+            without a firewall object, and the device entries that must be queried.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Index listing entries by serial]
+                B --> C{System info fields all listed?}
+                C -->|No| D[Query device]
+                C -->|Yes| E{HA enabled?}
+                E -->|No| F[Build facts from listing]
+                E -->|Yes| G{Peer listed with its management IP?}
+                G -->|No| D
+                G -->|Yes| F
+            ```
+        """
+
+        def text(entry: Dict, field: str) -> Optional[str]:
+            # Empty elements are flattened to empty dictionaries
+            value = entry.get(field)
+            return value if isinstance(value, str) and value else None
+
+        by_serial = {text(device, "serial"): device for device in devices}
+
+        facts = []
+        incomplete = []
+        for device in devices:
+            system = {field: text(device, field) for field in cls.LISTING_SYSTEM_FIELDS}
+            if None in system.values():
+                incomplete.append(device)
+                continue
+            system["ipv6-address"] = text(device, "ipv6-address") or "unknown"
+
+            ha = device.get("ha") if isinstance(device.get("ha"), dict) else None
+            ha_details = None
+            if ha is not None:
+                peer = by_serial.get(text(ha.get("peer") or {}, "serial"))
+                peer_ha = peer.get("ha") if peer is not None else None
+                if (
+                    text(ha, "state") is None
+                    or peer is None
+                    or text(peer, "ip-address") is None
+                    or not isinstance(peer_ha, dict)
+                    or text(peer_ha, "state") is None
+                ):
+                    incomplete.append(device)
+                    continue
+
+                ha_details = {
+                    "result": {
+                        "group": {
+                            "local-info": {"state": ha["state"]},
+                            "peer-info": {
+                                "mgmt-ip": peer["ip-address"],
+                                "state": peer_ha["state"],
+                            },
+                        }
                     }
-                    devices.append(device_dict)
+                }
+
+            facts.append(
+                {
+                    "device": device,
+                    "firewall": None,
+                    "info": {"system": system},
+                    "ha_enabled": ha is not None,
+                    "ha_details": ha_details,
+                }
+            )
+
+        return facts, incomplete
+
+    def collect_fleet_facts(
+        self,
+        pan: Panorama,
+        devices: List[Dict],
+        max_workers: int,
+    ) -> List[Dict]:
+        """
+        Retrieve the facts of many firewalls through Panorama using a bounded thread pool.
+
+        Each firewall is attached to the Panorama object up front, then `collect_device_facts` is submitted for
+        every firewall to a pool of at most `max_workers` threads. Results are gathered as they complete and
+        logged from the calling thread; a failure on one firewall is logged and does not stop the others.
+        With `max_workers` set to 1 the firewalls are queried one after another.
+
+        Args:
+            pan (Panorama): The Panorama instance the firewalls are managed by.
+            devices (List[Dict]): The device entries from the 'show devices connected' response.
+            max_workers (int): The maximum number of concurrent proxied API calls.
+
+        Returns:
+            List[Dict]: The facts returned by `collect_device_facts`, in the order of `devices`.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Attach a Firewall object per device to Panorama]
+                B --> C[Submit collect_device_facts per firewall to the thread pool]
+                C --> D{Future completed}
+                D -->|Success| E[Log and keep facts]
+                D -->|Error| F[Log error and skip device]
+                E --> G{More futures?}
+                F --> G
+                G -->|Yes| D
+                G -->|No| H[Return facts in listing order]
+            ```
+        """
+        firewalls = []
+        for device in devices:
+            firewall = RateLimitedFirewall(serial=device["serial"])
+            pan.add(firewall)
+            firewalls.append((firewall, device))
+
+        self.logger.log_task(
+            action="working",
+            message=f"Collecting facts for {len(firewalls)} devices using up to {max_workers} concurrent workers",
+        )
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(self.collect_device_facts, firewall, device): index
+                for index, (firewall, device) in enumerate(firewalls)
+            }
+            for future in as_completed(futures):
+                device = firewalls[futures[future]][1]
+                try:
+                    facts = future.result()
+                except Exception as e:
+                    self.logger.log_task(
+                        action="error",
+                        message=f"Error retrieving facts for device {device['@name']}: {str(e)}",
+                    )
+                    continue
+
+                results[futures[future]] = facts
+                self.logger.log_task(
+                    action="search",
+                    message=f"Retrieved system info and HA state for device: "
+                    f"{facts['info']['system']['hostname']}",
+                )
+
+        return [results[index] for index in sorted(results)]
+
+    @classmethod
+    def fingerprint(
+        cls,
+        device: Device,
+    ) -> str:
+        """
+        Hash the synced facts of a device, so a sync can tell whether its row must be written.
+
+        Args:
+            device (Device): A Device instance carrying the values collected during the sync.
+
+        Returns:
+            str: The SHA-256 hex digest of the fingerprinted fields.
+        """
+        facts = [
+            getattr(device, Device._meta.get_field(field).attname)
+            for field in cls.FINGERPRINT_FIELDS
+        ]
+        return hashlib.sha256(json.dumps(facts, default=str).encode()).hexdigest()
+
+    @classmethod
+    def upsert_devices(
+        cls,
+        devices: List[Device],
+    ) -> Tuple[int, int]:
+        """
+        Create or update many Device rows, matched on hostname, in a constant number of queries.
+
+        Existing rows are fetched with a single query keyed by hostname. Rows whose stored fingerprint matches the
+        fingerprint of the collected facts only have their uptime refreshed, so their `updated_at` only moves when the
+        device changed; the synced fields of the others are overwritten and written back with `bulk_update`. The remaining
+        devices are inserted with `bulk_create`, which also resolves conflicts on hostname so that a row created
+        concurrently by another sync is updated rather than rejected. Both writes run inside one transaction.
+
+        A hostname may only be written once per statement, so when `devices` holds the same hostname more than once,
+        only its first occurrence is kept.
+
+        Args:
+            devices (List[Device]): Unsaved Device instances carrying the values collected during the sync.
+
+        Returns:
+            Tuple[int, int]: The number of devices created and the number of devices updated; the other devices
+            were unchanged.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> L[Drop repeated hostnames]
+                L --> B[Fetch existing devices by hostname]
+                B --> C{Device already exists?}
+                C -->|Yes| J{Fingerprint changed?}
+                J -->|Yes| D[Copy synced fields onto existing row]
+                J -->|No| K[Queue uptime refresh if it changed]
+                C -->|No| E[Queue device for creation]
+                D --> F[Open database transaction]
+                E --> F
+                K --> F
+                F --> G[bulk_update changed rows and refreshed uptimes]
+                G --> H[bulk_create new rows on hostname conflict]
+                H --> I[Return created and updated counts]
+            ```
+        """
+        # ON CONFLICT DO UPDATE cannot affect the same row twice in one statement
+        unique_devices = {}
+        for device in devices:
+            unique_devices.setdefault(device.hostname, device)
+        devices = list(unique_devices.values())
+
+        existing = Device.objects.in_bulk(
+            list(unique_devices),
+            field_name="hostname",
+        )
+
+        now = timezone.now()
+        fields = cls.SYNC_FIELDS + ["fingerprint", "updated_at"]
+        to_create = []
+        to_update = []
+        to_refresh = []
+        for device in devices:
+            device.fingerprint = cls.fingerprint(device)
+            current = existing.get(device.hostname)
+            if current is None:
+                to_create.append(device)
+                continue
+
+            # The uptime is not fingerprinted, it is refreshed without marking the device as updated
+            if current.fingerprint == device.fingerprint:
+                if current.uptime != device.uptime:
+                    current.uptime = device.uptime
+                    to_refresh.append(current)
+                continue
+
+            for field in cls.SYNC_FIELDS + ["fingerprint"]:
+                setattr(current, field, getattr(device, field))
+            current.updated_at = now
+            to_update.append(current)
+
+        if not to_create and not to_update and not to_refresh:
+            return 0, 0
+
+        with transaction.atomic():
+            if to_update:
+                Device.objects.bulk_update(to_update, fields)
+            if to_refresh:
+                Device.objects.bulk_update(to_refresh, ["uptime"])
+            if to_create:
+                Device.objects.bulk_create(
+                    to_create,
+                    update_conflicts=True,
+                    unique_fields=["hostname"],
+                    update_fields=fields,
+                )
+
+        return len(to_create), len(to_update)
+
+    def find_removed_devices(
+        self,
+        panorama_device: Device,
+        listed_serials: Set[str],
+    ) -> List[str]:
+        """
+        Find the devices managed by a Panorama appliance that it no longer lists.
+
+        The removed devices are the set difference between the serial numbers of the firewalls synced from the
+        appliance and the serial numbers of its 'show devices connected' response. They are reported only; their
+        rows, and the jobs and snapshots attached to them, are kept.
+
+        Args:
+            panorama_device (Device): The Panorama appliance the sync ran against.
+            listed_serials (Set[str]): The serial numbers listed by the appliance.
+
+        Returns:
+            List[str]: The hostnames of the removed devices.
+        """
+        synced = dict(
+            Device.objects.filter(
+                panorama_managed=True,
+                panorama_ipv4_address=panorama_device.ipv4_address,
+                panorama_ipv6_address=panorama_device.ipv6_address,
+            ).values_list("serial", "hostname")
+        )
+        removed = [synced[serial] for serial in sorted(set(synced) - listed_serials)]
+        for hostname in removed:
+            self.logger.log_task(
+                action="skipped",
+                message=f"Device {hostname} is no longer listed by Panorama {panorama_device.hostname}",
+            )
+        return removed
+
+    def link_ha_peers(
+        self,
+        ha_peers: Dict[str, Tuple[str, str]],
+    ) -> int:
+        """
+        Assign the peer device of every HA-enabled device in a single pass.
+
+        The synced devices and their peers are each fetched with one query, an in-memory index of management IP to
+        device is built from both, and the peer links are written back with a single `bulk_update`. Because this
+        runs after all devices of the sync have been saved, the order in which HA pairs were listed by Panorama
+        does not matter.
+
+        Args:
+            ha_peers (Dict[str, Tuple[str, str]]): A mapping of device hostname to its HA peer's management IP
+                address and HA state.
+
+        Returns:
+            int: The number of devices whose peer device was linked or changed.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Fetch HA devices by hostname]
+                B --> C[Fetch peers by management IP]
+                C --> D[Build management IP index]
+                D --> E{Peer found in index?}
+                E -->|Yes| K{Peer link changed?}
+                K -->|Yes| F[Set peer device and state]
+                K -->|No| H
+                E -->|No| G[Log missing peer]
+                F --> H{More devices?}
+                G --> H
+                H -->|Yes| E
+                H -->|No| I[bulk_update peer fields]
+                I --> J[Return linked count]
+            ```
+        """
+        devices = Device.objects.in_bulk(list(ha_peers), field_name="hostname")
+        peer_ips = {peer_ip for peer_ip, _ in ha_peers.values()}
+        devices_by_ip = {
+            device.ipv4_address: device
+            for device in Device.objects.filter(ipv4_address__in=peer_ips)
+        }
+
+        linked = []
+        for hostname, (peer_ip, peer_state) in ha_peers.items():
+            device = devices.get(hostname)
+            peer_device = devices_by_ip.get(peer_ip)
+            if device is None or peer_device is None:
+                self.logger.log_task(
+                    action="skipped",
+                    message=f"Peer device with IP {peer_ip} not found. Skipping HA deployment for {hostname}.",
+                )
+                continue
+
+            # Devices already linked to the same peer are left untouched
+            if (device.peer_device_id, device.peer_ip, device.peer_state) == (
+                peer_device.pk,
+                peer_ip,
+                peer_state,
+            ):
+                continue
 
-                entry_dict["devices"] = devices
+            device.peer_device = peer_device
+            device.peer_ip = peer_ip
+            device.peer_state = peer_state
+            linked.append(device)
+            self.logger.log_task(
+                action="search",
+                message=f"Linked {hostname} to peer device: {peer_device.hostname}",
+            )
 
-            device_group_mappings.append(entry_dict)
+        if linked:
+            Device.objects.bulk_update(linked, ["peer_device", "peer_ip", "peer_state"])
+            self.logger.log_task(
+                action="save",
+                message=f"Updated peer device for {len(linked)} devices",
+            )
 
-        return device_group_mappings
+        return len(linked)
@@ -1,8 +1,15 @@
 import logging
+import threading
+import time
+from typing import Dict, List, Optional
 
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
 from django.utils import timezone
 
 from panosupgradeweb.models import Job, JobLogEntry
+from panosupgradeweb.scripts.events import publish_job_logs
 
 
 def get_emoji(
@@ -61,13 +68,193 @@ def get_emoji(
     return emoji_map.get(action, "")
 
 
+class JobLogBuffer:
+    """
+    An in-memory queue of JobLogEntry rows belonging to a single job.
+
+    Log entries are appended as they are emitted and written to the database in a single `bulk_create` call once
+    the buffer holds `max_entries` rows, once `flush_interval` seconds have passed since the last write, when an
+    error is logged, or when the job completes. A timer also flushes entries still queued `flush_interval` seconds
+    after they were appended, so a line logged before a long wait is not held back until the next one. The Job row
+    is looked up once and cached for the lifetime of the buffer, so a busy upgrade no longer costs a SELECT and an
+    INSERT per log line.
+
+    Every entry receives a `sequence_number` that is unique and increasing within the job. The numbers are
+    allocated when the entries are written, while the Job row is locked, and continue from the highest sequence
+    number stored for the job. Tasks of the same job running on different workers therefore never hand out the
+    same number. Entries that fail to be written stay queued for the next flush.
+
+    Attributes:
+        job_id (str): The task ID of the job the entries belong to.
+        max_entries (int): The number of queued entries that triggers a flush.
+        flush_interval (float): The maximum number of seconds entries are held before a flush.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        max_entries: int = None,
+        flush_interval: float = None,
+    ):
+        self.job_id = job_id
+        self.max_entries = (
+            max_entries
+            if max_entries is not None
+            else getattr(settings, "JOB_LOG_BUFFER_SIZE", 50)
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else getattr(settings, "JOB_LOG_FLUSH_INTERVAL", 2.0)
+        )
+        self.entries: List[JobLogEntry] = []
+        self.job: Optional[Job] = None
+        self.job_loaded = False
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+        self.timer: Optional[threading.Timer] = None
+
+    def append(
+        self,
+        timestamp,
+        severity_level: str,
+        message: str,
+    ) -> None:
+        """
+        Queue a log entry and flush the buffer if a size or time threshold has been reached.
+
+        Args:
+            timestamp (datetime): The time the entry was emitted.
+            severity_level (str): The severity level (action) of the entry.
+            message (str): The formatted log message.
+        """
+        with self.lock:
+            if not self.job_loaded:
+                self.job = Job.objects.filter(task_id=self.job_id).first()
+                self.job_loaded = True
+
+            if self.job is not None:
+                self.entries.append(
+                    JobLogEntry(
+                        job=self.job,
+                        timestamp=timestamp,
+                        severity_level=severity_level,
+                        message=message,
+                    )
+                )
+
+            if (
+                len(self.entries) >= self.max_entries
+                or time.monotonic() - self.last_flush >= self.flush_interval
+                or severity_level in ("error", "critical")
+            ):
+                self.flush()
+            elif self.entries and self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> int:
+        """
+        Number all queued entries and write them to the database in a single `bulk_create` call.
+
+        Returns:
+            int: The number of entries written.
+
+        Raises:
+            DatabaseError: If the entries could not be written. They are kept queued for the next flush.
+        """
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.entries:
+                return 0
+
+            entries, self.entries = self.entries, []
+            try:
+                with transaction.atomic():
+                    # The row lock serializes the writers of a job across workers until the entries are committed
+                    Job.objects.select_for_update().only("pk").get(pk=self.job.pk)
+                    last_sequence_number = JobLogEntry.objects.filter(
+                        job=self.job
+                    ).aggregate(last=Max("sequence_number"))["last"]
+                    first = (
+                        last_sequence_number + 1
+                        if last_sequence_number is not None
+                        else 0
+                    )
+                    for sequence_number, entry in enumerate(entries, start=first):
+                        entry.sequence_number = sequence_number
+                    JobLogEntry.objects.bulk_create(entries)
+            except Exception:
+                self.entries[:0] = entries
+                raise
+
+            publish_job_logs(self.job_id, entries)
+            return len(entries)
+
+    def _flush_on_timer(self) -> None:
+        # Runs in the timer thread, which has its own database connection
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(
+                f"Unable to flush the log entries of job {self.job_id}: {str(e)}"
+            )
+        finally:
+            connection.close()
+
+
+# Buffers are shared by every logger writing to the same job within a worker process
+_job_log_buffers: Dict[str, JobLogBuffer] = {}
+_job_log_buffers_lock = threading.Lock()
+
+
+def get_job_log_buffer(job_id: str) -> JobLogBuffer:
+    """
+    Return the buffer for a job, creating it on first use.
+
+    Args:
+        job_id (str): The task ID of the job.
+
+    Returns:
+        JobLogBuffer: The buffer shared by all loggers of the job within this process.
+    """
+    with _job_log_buffers_lock:
+        buffer = _job_log_buffers.get(job_id)
+        if buffer is None:
+            buffer = JobLogBuffer(job_id)
+            _job_log_buffers[job_id] = buffer
+        return buffer
+
+
+def flush_job_logs(job_id: str) -> int:
+    """
+    Flush and release the log buffer of a job once the job has completed.
+
+    Args:
+        job_id (str): The task ID of the job.
+
+    Returns:
+        int: The number of entries written by the final flush.
+    """
+    with _job_log_buffers_lock:
+        buffer = _job_log_buffers.pop(job_id, None)
+    if buffer is None:
+        return 0
+    return buffer.flush()
+
+
 class PanOsUpgradeLogger(logging.Logger):
     """
     A custom logger class for logging upgrade-related messages.
 
     This class extends the built-in logging.Logger class and provides additional functionality
     for logging upgrade-related messages. It includes methods to set the job ID, log tasks with
-    emojis, and save logs to the database.
+    emojis, and save logs to the database. Database writes go through the job's JobLogBuffer and
+    are batched; call `flush()` or `flush_job_logs()` to force pending entries out.
 
     Attributes:
         name (str): The name of the logger.
@@ -78,6 +265,7 @@ class PanOsUpgradeLogger(logging.Logger):
     Methods:
         __init__: Initialize the UpgradeLogger instance.
         get_emoji: Map specific action keywords to their corresponding emoji symbols.
+        flush: Write any buffered log entries of the job to the database.
         log_task: Log a task message with an emoji and extra information.
         set_job_id: Set the job ID for the logger.
     """
@@ -103,21 +291,20 @@ class PanOsUpgradeLogger(logging.Logger):
 
         timestamp = timezone.now()
 
-        # Save the log entry to the database
-        try:
-            job = Job.objects.get(task_id=self.job_id)
-            log_entry = JobLogEntry(
-                job=job,
+        # Queue the log entry for the next batched write to the database
+        if self.job_id is not None:
+            get_job_log_buffer(self.job_id).append(
                 timestamp=timestamp,
                 severity_level=severity_level,
                 message=message,
             )
-            log_entry.save()
-        except Job.DoesNotExist:
-            pass
 
         self.log(level, message)
         self.sequence_number += 1
 
+    def flush(self):
+        if self.job_id is not None:
+            get_job_log_buffer(self.job_id).flush()
+
     def set_job_id(self, job_id):
         self.job_id = job_id
@@ -31,6 +31,8 @@ def main(author_id: int, device_uuid: str, job_id: str, profile_uuid: str) -> st
             password=profile.pan_password,
             device_type=device.platform.device_type,
             author_id=author_id,
+            profile_uuid=profile_uuid,
+            platform_name=device.platform.name,
         )
 
         version_sync.logger.log_task(
@@ -1,8 +1,14 @@
 # backend/panosupgradeweb/scripts/panos_version_sync/device.py
 
-from panos.firewall import Firewall
-from panos.panorama import Panorama
+import asyncio
+from typing import Dict, Optional
+
 from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.software_catalog import (
+    get_software_catalog_cache,
+    platform_family,
+)
+from panosupgradeweb.scripts.xml_api import AsyncXmlApiClient
 from panosupgradeweb.models import PanosVersion
 from django.utils.dateparse import parse_datetime
 
@@ -13,6 +19,23 @@ class PanosVersionSync:
         self.logger = PanOsUpgradeLogger("pan-os-upgrade-version-sync")
         self.logger.set_job_id(job_id)
 
+    @staticmethod
+    async def fetch_available_versions(
+        device_ip: str,
+        username: str,
+        password: str,
+        profile_uuid: Optional[str] = None,
+        rate_limited: bool = False,
+    ) -> Dict[str, Dict]:
+        async with AsyncXmlApiClient(
+            device_ip,
+            username=username,
+            password=password,
+            profile_uuid=profile_uuid,
+            rate_limited=rate_limited,
+        ) as client:
+            return await client.check_software()
+
     def sync_available_versions(
         self,
         device_ip: str,
@@ -20,6 +43,8 @@ class PanosVersionSync:
         password: str,
         device_type: str,
         author_id: int,
+        profile_uuid: Optional[str] = None,
+        platform_name: Optional[str] = None,
     ):
         self.logger.log_task(
             action="start",
@@ -27,15 +52,18 @@ class PanosVersionSync:
         )
 
         try:
-            if device_type == "Firewall":
-                pan_device = Firewall(device_ip, username, password)
-            elif device_type == "Panorama":
-                pan_device = Panorama(device_ip, username, password)
-            else:
+            if device_type not in ("Firewall", "Panorama"):
                 raise ValueError(f"Invalid device type: {device_type}")
 
-            pan_device.software.check()
-            available_versions = pan_device.software.versions
+            available_versions = asyncio.run(
+                self.fetch_available_versions(
+                    device_ip,
+                    username,
+                    password,
+                    profile_uuid,
+                    rate_limited=device_type == "Panorama",
+                )
+            )
 
             self.logger.log_task(
                 action="success",
@@ -65,6 +93,11 @@ class PanosVersionSync:
                 message=f"Successfully synced {len(available_versions)} PAN-OS versions to the database",
             )
 
+            # Share the catalog with the upgrade jobs of the same platform family
+            family = platform_family(platform_name)
+            if family:
+                get_software_catalog_cache().set(family, available_versions)
+
             return len(available_versions)
 
         except Exception as e:
@@ -0,0 +1,377 @@
+# backend/panosupgradeweb/scripts/rate_limit.py
+
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+# Third party imports
+import redis
+from panos import errors as err
+from panos.firewall import Firewall
+from panos.panorama import Panorama
+
+# Django imports
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.scripts.api_keys import CachedApiKeyXapi
+
+# Takes a token from the bucket of a Panorama appliance and an in-flight slot, atomically for all workers.
+# KEYS: the token bucket hash and the in-flight sorted set. ARGV: rate, burst, concurrency, lease and lease ID.
+# Returns {1, "0"} when granted, or {0, seconds} with the time to wait before trying again.
+ACQUIRE_SCRIPT = """
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local concurrency = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+
+if concurrency > 0 then
+    redis.call("ZREMRANGEBYSCORE", KEYS[2], "-inf", now)
+    if redis.call("ZCARD", KEYS[2]) >= concurrency then
+        return {0, "-1"}
+    end
+end
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+
+if tokens < 1 then
+    return {0, tostring((1 - tokens) / rate)}
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens - 1), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+if concurrency > 0 then
+    redis.call("ZADD", KEYS[2], now + lease, ARGV[5])
+    redis.call("EXPIRE", KEYS[2], math.ceil(lease) + 1)
+end
+return {1, "0"}
+"""
+
+
+class PanoramaRateLimiter:
+    """
+    A token bucket and concurrency limit per Panorama appliance, shared by every worker through Redis.
+
+    Every request sent to a Panorama appliance, including requests proxied to the firewalls it manages, takes a
+    token from the bucket of the appliance and holds one of its in-flight slots until the response is received.
+    Tokens refill at `rate` per second up to `burst`. A slot is leased for at most `lease` seconds, so the slots of
+    a worker that dies mid-request are reclaimed.
+
+    The time every request waited is added to per-appliance metrics in Redis. Redis being unreachable is never
+    fatal; requests are then sent without limits, as they were before the limiter existed.
+
+    Attributes:
+        rate (float): The number of requests per second allowed per appliance, 0 disables the limiter.
+        burst (int): The number of requests that may be sent at once after the appliance was idle.
+        concurrency (int): The number of requests allowed in flight per appliance, 0 for no limit.
+        lease (float): The number of seconds an in-flight slot is held at most.
+        max_wait (float): The number of seconds a request waits at most before being sent anyway.
+    """
+
+    PREFIX = "panorama-rate-limit"
+
+    # Seconds between two attempts while every in-flight slot is taken
+    SLOT_POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        lease: Optional[float] = None,
+        max_wait: Optional[float] = None,
+    ):
+        self.rate = rate if rate is not None else settings.PANORAMA_RATE_LIMIT_RATE
+        self.burst = burst if burst is not None else settings.PANORAMA_RATE_LIMIT_BURST
+        self.concurrency = (
+            concurrency
+            if concurrency is not None
+            else settings.PANORAMA_RATE_LIMIT_CONCURRENCY
+        )
+        self.lease = lease if lease is not None else settings.PANORAMA_RATE_LIMIT_LEASE
+        self.max_wait = (
+            max_wait if max_wait is not None else settings.PANORAMA_RATE_LIMIT_MAX_WAIT
+        )
+        self._client = client or redis.Redis.from_url(
+            settings.PANORAMA_RATE_LIMIT_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+        self._acquire_script = self._client.register_script(ACQUIRE_SCRIPT)
+
+    def _keys(self, hostname: str) -> List[str]:
+        return [
+            f"{self.PREFIX}:{hostname}:tokens",
+            f"{self.PREFIX}:{hostname}:in-flight",
+        ]
+
+    def try_acquire(
+        self,
+        hostname: str,
+        lease_id: str,
+    ) -> Optional[float]:
+        """
+        Take a token and an in-flight slot of an appliance if both are available.
+
+        Args:
+            hostname (str): The hostname or IP address of the Panorama appliance.
+            lease_id (str): The identifier of the in-flight slot, passed to `release()` afterwards.
+
+        Returns:
+            Optional[float]: None when the request may be sent, otherwise the number of seconds to wait before
+            trying again.
+        """
+        try:
+            granted, retry_after = self._acquire_script(
+                keys=self._keys(hostname),
+                args=[
+                    self.rate,
+                    max(1, self.burst),
+                    self.concurrency,
+                    self.lease,
+                    lease_id,
+                ],
+            )
+        except redis.RedisError as e:
+            logging.debug(f"Panorama rate limiter unavailable: {str(e)}")
+            return None
+
+        if granted:
+            return None
+
+        retry_after = float(retry_after)
+        return self.SLOT_POLL_INTERVAL if retry_after < 0 else retry_after
+
+    def release(
+        self,
+        hostname: str,
+        lease_id: str,
+    ) -> None:
+        """
+        Release the in-flight slot of a request once its response was received.
+        """
+        if not self.concurrency:
+            return
+
+        try:
+            self._client.zrem(self._keys(hostname)[1], lease_id)
+        except redis.RedisError as e:
+            logging.debug(f"Panorama rate limiter unavailable: {str(e)}")
+
+    def record_wait(
+        self,
+        hostname: str,
+        waited: float,
+    ) -> None:
+        """
+        Add the time a request waited for the limiter to the metrics of an appliance.
+        """
+        if waited >= 1:
+            logging.info(f"{hostname}: request delayed {waited:.2f}s by rate limiter")
+
+        try:
+            pipeline = self._client.pipeline(transaction=False)
+            key = f"{self.PREFIX}:{hostname}:metrics"
+            pipeline.hincrby(key, "requests", 1)
+            if waited > 0:
+                pipeline.hincrby(key, "delayed", 1)
+                pipeline.hincrbyfloat(key, "wait_seconds", waited)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logging.debug(f"Panorama rate limiter unavailable: {str(e)}")
+
+    def metrics(self, hostname: str) -> Dict:
+        """
+        Return the wait time metrics of an appliance.
+
+        Args:
+            hostname (str): The hostname or IP address of the Panorama appliance.
+
+        Returns:
+            Dict: The number of requests sent, the number of requests that had to wait, the total and average wait
+            in seconds, and the number of requests currently in flight.
+        """
+        try:
+            values = self._client.hgetall(f"{self.PREFIX}:{hostname}:metrics")
+            in_flight = self._client.zcount(
+                self._keys(hostname)[1], time.time(), "+inf"
+            )
+        except redis.RedisError as e:
+            logging.debug(f"Panorama rate limiter unavailable: {str(e)}")
+            values, in_flight = {}, 0
+
+        requests = int(values.get(b"requests", 0))
+        wait_seconds = float(values.get(b"wait_seconds", 0))
+        return {
+            "hostname": hostname,
+            "requests": requests,
+            "delayed": int(values.get(b"delayed", 0)),
+            "wait_seconds": round(wait_seconds, 3),
+            "average_wait_seconds": (
+                round(wait_seconds / requests, 3) if requests else 0.0
+            ),
+            "in_flight": in_flight,
+        }
+
+    @contextlib.contextmanager
+    def limit(self, hostname: str) -> Iterator[None]:
+        """
+        Wait until a request may be sent to an appliance, and hold an in-flight slot while it runs.
+
+        Args:
+            hostname (str): The hostname or IP address of the Panorama appliance.
+
+        Example:
+            ```python
+            with get_panorama_rate_limiter().limit("10.0.0.1"):
+                response = send_request()
+            ```
+        """
+        if self.rate <= 0:
+            yield
+            return
+
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            retry_after = self.try_acquire(hostname, lease_id)
+            if retry_after is None or waited >= self.max_wait:
+                break
+            time.sleep(min(retry_after, self.max_wait - waited))
+            waited = time.monotonic() - started
+
+        self.record_wait(hostname, waited)
+        try:
+            yield
+        finally:
+            self.release(hostname, lease_id)
+
+    @contextlib.asynccontextmanager
+    async def limit_async(self, hostname: str) -> AsyncIterator[None]:
+        """
+        Wait until a request may be sent to an appliance without blocking the event loop; see `limit()`.
+
+        The Redis calls run in a worker thread, so a slow or unreachable Redis delays only the requests waiting for
+        the limiter. They do not touch the database, so they are not tied to the thread of the ORM.
+        """
+        if self.rate <= 0:
+            yield
+            return
+
+        try_acquire = sync_to_async(self.try_acquire, thread_sensitive=False)
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            retry_after = await try_acquire(hostname, lease_id)
+            if retry_after is None or waited >= self.max_wait:
+                break
+            await asyncio.sleep(min(retry_after, self.max_wait - waited))
+            waited = time.monotonic() - started
+
+        await sync_to_async(self.record_wait, thread_sensitive=False)(hostname, waited)
+        try:
+            yield
+        finally:
+            await sync_to_async(self.release, thread_sensitive=False)(
+                hostname, lease_id
+            )
+
+
+_panorama_rate_limiter = None
+
+
+def get_panorama_rate_limiter() -> PanoramaRateLimiter:
+    """
+    Return the Panorama rate limiter shared by the worker scripts of this process.
+
+    Returns:
+        PanoramaRateLimiter: The shared limiter instance, created on first use.
+    """
+    global _panorama_rate_limiter
+    if _panorama_rate_limiter is None:
+        _panorama_rate_limiter = PanoramaRateLimiter()
+    return _panorama_rate_limiter
+
+
+class RateLimitedXapi(CachedApiKeyXapi):
+    """
+    The pan-os-python XML API wrapper, sending every request through the rate limiter of the appliance it targets.
+    """
+
+    def _send_api_request(self, query):
+        with get_panorama_rate_limiter().limit(self.hostname):
+            return super()._send_api_request(query)
+
+
+class RateLimitedPanorama(Panorama):
+    """
+    A Panorama appliance whose requests are limited by `PanoramaRateLimiter`.
+
+    Firewalls added to it as `RateLimitedFirewall` objects have their proxied requests limited as well. When created
+    with `api_key_cache_args`, a cached API key that Panorama rejects is replaced, see `CachedApiKeyXapi`.
+    """
+
+    def __init__(self, *args, api_key_cache_args=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_key_cache_args = api_key_cache_args
+
+    def generate_xapi(self):
+        return RateLimitedXapi(
+            api_key=self.api_key,
+            hostname=self.hostname,
+            port=self.port,
+            timeout=self.timeout,
+            pan_device=self,
+            api_key_cache_args=self.api_key_cache_args,
+        )
+
+
+class RateLimitedFirewall(Firewall):
+    """
+    A firewall whose requests are limited by `PanoramaRateLimiter` when they are proxied by its Panorama appliance.
+
+    Firewalls connected to directly are not limited. When created with `api_key_cache_args`, a cached API key that the
+    firewall rejects is replaced, see `CachedApiKeyXapi`; proxied requests use the key of the Panorama appliance.
+    """
+
+    def __init__(self, *args, api_key_cache_args=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_key_cache_args = api_key_cache_args
+
+    def generate_xapi(self):
+        try:
+            panorama = self.panorama()
+        except err.PanDeviceNotSet:
+            panorama = None
+
+        if panorama is None or self.serial is None or self.hostname is not None:
+            return CachedApiKeyXapi(
+                api_key=self.api_key,
+                hostname=self.hostname,
+                port=self.port,
+                timeout=self.timeout,
+                pan_device=self,
+                api_key_cache_args=self.api_key_cache_args,
+            )
+
+        return RateLimitedXapi(
+            api_key=panorama.api_key,
+            hostname=panorama.hostname,
+            port=panorama.port,
+            timeout=self.timeout,
+            serial=self.serial,
+            pan_device=self,
+            api_key_cache_args=getattr(panorama, "api_key_cache_args", None),
+        )
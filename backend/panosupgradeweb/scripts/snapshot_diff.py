@@ -0,0 +1,260 @@
+# backend/panosupgradeweb/scripts/snapshot_diff.py
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Django imports
+from django.conf import settings
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.models import Snapshot
+
+# How rows of each snapshot table are matched between the pre and post snapshots, and which columns are compared.
+# Columns that are expected to change on every snapshot (ARP TTLs, route ages) are left out.
+SNAPSHOT_TABLES = {
+    "arp_table_entries": {
+        "key": ("interface", "ip"),
+        "compare": ("mac", "port", "status"),
+    },
+    "content_versions": {
+        "key": (),
+        "compare": ("version",),
+    },
+    "licenses": {
+        "key": ("feature",),
+        "compare": ("expired", "expires", "serial"),
+    },
+    "network_interfaces": {
+        "key": ("name",),
+        "compare": ("status",),
+    },
+    "routes": {
+        "key": ("virtual_router", "route_table", "destination", "nexthop", "interface"),
+        "compare": ("flags", "metric"),
+    },
+}
+
+DEFAULT_THRESHOLDS = {
+    "arp_table_entries": 0.0,
+    "content_versions": 0.0,
+    "licenses": 0.0,
+    "network_interfaces": 0.0,
+    "routes": 0.0,
+    "session_stats": 10.0,
+}
+
+
+def get_thresholds(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Return the change thresholds, in percent, above which a table fails the comparison.
+
+    Args:
+        overrides (Optional[Dict[str, float]]): Thresholds overriding `SNAPSHOT_DIFF_THRESHOLDS` for this comparison.
+
+    Returns:
+        Dict[str, float]: The threshold of every table.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    thresholds.update(getattr(settings, "SNAPSHOT_DIFF_THRESHOLDS", {}))
+    thresholds.update(overrides or {})
+    return thresholds
+
+
+def load_table(snapshot: Snapshot, name: str) -> List[Dict]:
+    """
+    Load the rows of a snapshot table as dictionaries, from the compressed blob or the database.
+
+    Args:
+        snapshot (Snapshot): The snapshot.
+        name (str): The name of the table, a related name of Snapshot.
+
+    Returns:
+        List[Dict]: The rows of the table.
+    """
+    if snapshot.storage_format == "compressed" and name in Snapshot.COMPRESSED_TABLES:
+        return snapshot.get_table_rows(name)
+    return list(getattr(snapshot, name).values(*Snapshot.table_columns(name)))
+
+
+def diff_rows(
+    pre_rows: Iterable[Dict],
+    post_rows: Iterable[Dict],
+    key: Tuple[str, ...],
+    compare: Tuple[str, ...],
+) -> Dict:
+    """
+    Compare two sets of rows with a hash join on their key columns.
+
+    Args:
+        pre_rows (Iterable[Dict]): The rows of the pre-upgrade snapshot.
+        post_rows (Iterable[Dict]): The rows of the post-upgrade snapshot.
+        key (Tuple[str, ...]): The columns identifying a row.
+        compare (Tuple[str, ...]): The columns compared between matching rows.
+
+    Returns:
+        Dict: The row counts, the added and removed rows, and the changed columns of matching rows.
+    """
+    pre_index = {tuple(row[column] for column in key): row for row in pre_rows}
+    post_index = {tuple(row[column] for column in key): row for row in post_rows}
+
+    added = [row for row_key, row in post_index.items() if row_key not in pre_index]
+    removed = [row for row_key, row in pre_index.items() if row_key not in post_index]
+    changed = []
+    for row_key, pre_row in pre_index.items():
+        post_row = post_index.get(row_key)
+        if post_row is None:
+            continue
+
+        changes = {
+            column: [pre_row[column], post_row[column]]
+            for column in compare
+            if pre_row[column] != post_row[column]
+        }
+        if changes:
+            changed.append(
+                {"key": dict(zip(key, row_key)), "changes": changes},
+            )
+
+    return {
+        "pre_count": len(pre_index),
+        "post_count": len(post_index),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+def diff_session_stats(
+    pre_stats: Optional[Dict],
+    post_stats: Optional[Dict],
+    threshold: float,
+) -> Dict:
+    """
+    Compare the session statistics of two snapshots counter by counter.
+
+    Args:
+        pre_stats (Optional[Dict]): The session statistics of the pre-upgrade snapshot.
+        post_stats (Optional[Dict]): The session statistics of the post-upgrade snapshot.
+        threshold (float): The relative change, in percent, above which a counter is reported.
+
+    Returns:
+        Dict: The counters that changed by more than `threshold`, with their pre and post values and change.
+    """
+    changed = {}
+    if pre_stats and post_stats:
+        for column, pre_value in pre_stats.items():
+            post_value = post_stats[column]
+            change = abs(post_value - pre_value) * 100.0 / max(abs(pre_value), 1)
+            if change > threshold:
+                changed[column] = [pre_value, post_value, round(change, 2)]
+
+    return {
+        "changed": changed,
+        "passed": not changed,
+        "threshold": threshold,
+    }
+
+
+def diff_snapshots(
+    pre_snapshot: Snapshot,
+    post_snapshot: Snapshot,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> Dict:
+    """
+    Compare the pre-upgrade and post-upgrade snapshots of a device.
+
+    Every table is compared with a hash join on its key columns, so the cost is linear in the number of rows. A
+    table passes when the share of added, removed and changed rows, relative to the larger of the two snapshots,
+    does not exceed its threshold. Session statistics pass when no counter changed by more than its threshold.
+
+    Args:
+        pre_snapshot (Snapshot): The snapshot taken before the upgrade.
+        post_snapshot (Snapshot): The snapshot taken after the upgrade.
+        thresholds (Optional[Dict[str, float]]): Thresholds, in percent, overriding the configured ones.
+
+    Returns:
+        Dict: A compact delta with the following keys:
+            - 'device': The hostname of the device.
+            - 'pre_snapshot' / 'post_snapshot': The UUIDs of the compared snapshots.
+            - 'passed': Whether every table is within its threshold.
+            - 'tables': The delta of every table.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Resolve thresholds]
+            B --> C[For each table]
+            C --> D[Load pre and post rows]
+            D --> E[Index rows by key columns]
+            E --> F[Collect added, removed and changed rows]
+            F --> G[Compare change percentage with threshold]
+            G --> C
+            C --> H[Compare session statistics counters]
+            H --> I[Return delta]
+        ```
+    """
+    thresholds = get_thresholds(thresholds)
+    tables = {}
+
+    for name, table in SNAPSHOT_TABLES.items():
+        delta = diff_rows(
+            load_table(pre_snapshot, name),
+            load_table(post_snapshot, name),
+            key=table["key"],
+            compare=table["compare"],
+        )
+        differences = (
+            len(delta["added"]) + len(delta["removed"]) + len(delta["changed"])
+        )
+        delta["change_percent"] = round(
+            differences * 100.0 / max(delta["pre_count"], delta["post_count"], 1), 2
+        )
+        delta["threshold"] = thresholds[name]
+        delta["passed"] = delta["change_percent"] <= thresholds[name]
+        tables[name] = delta
+
+    columns = Snapshot.table_columns("session_stats")
+    tables["session_stats"] = diff_session_stats(
+        pre_snapshot.session_stats.values(*columns).first(),
+        post_snapshot.session_stats.values(*columns).first(),
+        threshold=thresholds["session_stats"],
+    )
+
+    return {
+        "device": pre_snapshot.device.hostname,
+        "pre_snapshot": str(pre_snapshot.uuid),
+        "post_snapshot": str(post_snapshot.uuid),
+        "passed": all(table["passed"] for table in tables.values()),
+        "tables": tables,
+    }
+
+
+def diff_job_snapshots(
+    job_id: str,
+    device_uuid: Optional[str] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> List[Dict]:
+    """
+    Compare the latest pre-upgrade and post-upgrade snapshots of every device of a job.
+
+    Args:
+        job_id (str): The task ID of the upgrade job.
+        device_uuid (Optional[str]): Only compare the snapshots of this device.
+        thresholds (Optional[Dict[str, float]]): Thresholds, in percent, overriding the configured ones.
+
+    Returns:
+        List[Dict]: The delta of every device that has both a pre-upgrade and a post-upgrade snapshot.
+    """
+    snapshots = Snapshot.objects.filter(job__task_id=job_id).select_related("device")
+    if device_uuid:
+        snapshots = snapshots.filter(device__uuid=device_uuid)
+
+    # Keep the latest snapshot of each type per device
+    latest = {}
+    for snapshot in snapshots.order_by("created_at"):
+        latest[(snapshot.device_id, snapshot.snapshot_type)] = snapshot
+
+    return [
+        diff_snapshots(pre_snapshot, latest[(device_id, "post_upgrade")], thresholds)
+        for (device_id, snapshot_type), pre_snapshot in latest.items()
+        if snapshot_type == "pre_upgrade" and (device_id, "post_upgrade") in latest
+    ]
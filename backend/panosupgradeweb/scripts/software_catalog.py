@@ -0,0 +1,206 @@
+# backend/panosupgradeweb/scripts/software_catalog.py
+
+import json
+import logging
+import re
+from typing import Dict, Optional
+
+# Third party imports
+import redis
+
+# Django imports
+from django.conf import settings
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.models import PanosVersion
+
+# Fields of a software version entry that describe the image, as opposed to its state on a given device
+CATALOG_FIELDS = (
+    "version",
+    "filename",
+    "size",
+    "size-kb",
+    "released-on",
+    "release-notes",
+    "sha256",
+)
+
+
+def platform_family(platform_name: Optional[str]) -> Optional[str]:
+    """
+    Return the family of a platform, i.e. the models that share the same PAN-OS images.
+
+    Four digit models share the images of their series (PA-3220 and PA-3260 both use the PA-3200 images), as do the
+    PA-400 and PA-800 series. Other platforms, such as PA-VM and Panorama, are their own family.
+
+    Args:
+        platform_name (Optional[str]): The platform of the device, e.g. "PA-3220".
+
+    Returns:
+        Optional[str]: The platform family, e.g. "PA-3200", or None when the platform is unknown.
+
+    Example:
+        ```python
+        platform_family("PA-5450")
+        'PA-5400'
+        ```
+    """
+    if not platform_name:
+        return None
+
+    name = platform_name.strip().upper()
+    match = re.fullmatch(r"PA-(\d{2})\d{2}", name)
+    if match:
+        return f"PA-{match.group(1)}00"
+
+    match = re.fullmatch(r"PA-([48])\d{2}", name)
+    if match:
+        return f"PA-{match.group(1)}00"
+
+    return name
+
+
+class SoftwareCatalogCache:
+    """
+    A TTL-bounded cache of the PAN-OS versions available to each platform family, stored in Redis.
+
+    `software.check()` makes a device fetch the list of available versions from the update server, which returns
+    the same catalog for every device of a platform family. The catalog is cached after one device fetched it, so
+    the other devices of the family only need `software.info()`, which lists the images known to the device without
+    contacting the update server.
+
+    Only the image details are cached, never whether an image is downloaded or running on a given device. Redis
+    being unreachable is never fatal; the cache then behaves as if it were empty.
+
+    Attributes:
+        ttl (int): The number of seconds a cached catalog stays valid, 0 disables the cache.
+    """
+
+    PREFIX = "panos-software-catalog"
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.ttl = ttl if ttl is not None else settings.PANOS_SOFTWARE_CATALOG_TTL
+        self._client = client or redis.Redis.from_url(
+            settings.PANOS_SOFTWARE_CATALOG_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+
+    def get(self, family: str) -> Optional[Dict[str, Dict]]:
+        """
+        Return the cached catalog of a platform family, or None on a cache miss.
+
+        Args:
+            family (str): The platform family, see `platform_family()`.
+
+        Returns:
+            Optional[Dict[str, Dict]]: The available versions keyed by version string.
+        """
+        if not self.ttl:
+            return None
+
+        try:
+            catalog = self._client.get(f"{self.PREFIX}:{family}")
+        except redis.RedisError as e:
+            logging.debug(f"Software catalog cache unavailable: {str(e)}")
+            return None
+
+        return json.loads(catalog) if catalog is not None else None
+
+    def set(
+        self,
+        family: str,
+        versions: Dict[str, Dict],
+    ) -> None:
+        """
+        Cache the catalog of a platform family for `ttl` seconds.
+
+        Args:
+            family (str): The platform family, see `platform_family()`.
+            versions (Dict[str, Dict]): The versions returned by `software.check()`, keyed by version string.
+        """
+        if not self.ttl:
+            return
+
+        catalog = {
+            version: {
+                field: details.get(field)
+                for field in CATALOG_FIELDS
+                if details.get(field) is not None
+            }
+            for version, details in versions.items()
+        }
+        try:
+            self._client.set(
+                f"{self.PREFIX}:{family}",
+                json.dumps(catalog),
+                ex=self.ttl,
+            )
+        except redis.RedisError as e:
+            logging.debug(f"Software catalog cache unavailable: {str(e)}")
+
+    def invalidate(self, family: str) -> None:
+        """
+        Remove the cached catalog of a platform family, for example after a new release.
+        """
+        try:
+            self._client.delete(f"{self.PREFIX}:{family}")
+        except redis.RedisError as e:
+            logging.debug(f"Software catalog cache unavailable: {str(e)}")
+
+
+_software_catalog_cache = None
+
+
+def get_software_catalog_cache() -> SoftwareCatalogCache:
+    """
+    Return the software catalog cache shared by the worker scripts of this process.
+
+    Returns:
+        SoftwareCatalogCache: The shared cache instance, created on first use.
+    """
+    global _software_catalog_cache
+    if _software_catalog_cache is None:
+        _software_catalog_cache = SoftwareCatalogCache()
+    return _software_catalog_cache
+
+
+def record_catalog_versions(versions: Dict[str, Dict]) -> int:
+    """
+    Add the versions of a catalog that are not in the `PanosVersion` table yet.
+
+    Existing rows are left untouched, as their download and current flags are maintained by the PAN-OS version sync.
+
+    Args:
+        versions (Dict[str, Dict]): The versions returned by `software.check()`, keyed by version string.
+
+    Returns:
+        int: The number of versions added.
+    """
+    max_length = PanosVersion._meta.get_field("version").max_length
+    known = set(
+        PanosVersion.objects.filter(version__in=list(versions)).values_list(
+            "version", flat=True
+        )
+    )
+    created = PanosVersion.objects.bulk_create(
+        [
+            PanosVersion(
+                version=version,
+                filename=details.get("filename") or "",
+                size=details.get("size") or "",
+                size_kb=details.get("size-kb") or "",
+                released_on=details.get("released-on") or "",
+                release_notes=details.get("release-notes") or "",
+                sha256=details.get("sha256"),
+            )
+            for version, details in versions.items()
+            if version not in known and len(version) <= max_length
+        ],
+        ignore_conflicts=True,
+    )
+    return len(created)
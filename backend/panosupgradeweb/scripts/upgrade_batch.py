@@ -0,0 +1,250 @@
+# backend/panosupgradeweb/scripts/upgrade_batch.py
+
+import functools
+import logging
+import uuid
+from typing import Callable, List, Optional
+
+# Django imports
+from django.conf import settings
+from django.db import transaction
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.models import Device, Job, UpgradeBatch, UpgradeBatchDevice
+
+# Waves of a batch grouped by HA role: standalone devices first, then the HA members that start a pair upgrade
+HA_ROLE_ORDER = (
+    "standalone",
+    "passive",
+    "active-secondary",
+    "active",
+    "active-primary",
+)
+
+
+def plan_waves(
+    devices: List[Device],
+    wave_by: str,
+) -> List[int]:
+    """
+    Assign every device of a batch to a wave.
+
+    Args:
+        devices (List[Device]): The devices of the batch, with their platform loaded.
+        wave_by (str): "none", "device_group", "platform" or "ha_role".
+
+    Returns:
+        List[int]: The wave of each device, in the order of `devices`. Waves are numbered from 0 without gaps.
+    """
+    if wave_by == "none":
+        return [0 for _ in devices]
+
+    if wave_by == "device_group":
+        keys = [device.device_group or "" for device in devices]
+        order = sorted(set(keys))
+    elif wave_by == "platform":
+        keys = [device.platform.name if device.platform else "" for device in devices]
+        order = sorted(set(keys))
+    else:
+        keys = [
+            device.local_state if device.ha_enabled else "standalone"
+            for device in devices
+        ]
+        order = [role for role in HA_ROLE_ORDER if role in keys]
+        order += sorted(set(keys) - set(order), key=str)
+
+    return [order.index(key) for key in keys]
+
+
+def refresh_batch_devices(batch: UpgradeBatch) -> None:
+    """
+    Copy the status of finished upgrade jobs onto the running devices of a batch.
+
+    Args:
+        batch (UpgradeBatch): The batch.
+    """
+    running = {
+        member.task_id: member
+        for member in batch.devices.filter(status="running", task_id__isnull=False)
+    }
+    finished = Job.objects.filter(
+        task_id__in=running,
+        job_status__in=("completed", "errored", "skipped"),
+    ).values_list("task_id", "job_status")
+
+    updated = []
+    for task_id, job_status in finished:
+        member = running[task_id]
+        member.status = job_status
+        member.phase = None
+        updated.append(member)
+
+    UpgradeBatchDevice.objects.bulk_update(updated, ["status", "phase"])
+
+
+def advance_batch(
+    batch_uuid: str,
+    start_upgrade: Callable[[UpgradeBatchDevice], None],
+) -> bool:
+    """
+    Start the upgrades of a batch that may run now, and finish or stop the batch.
+
+    This function is called periodically while the batch runs. It refreshes the status of the running devices, stops
+    the batch once the failure rate exceeds `max_failure_rate`, moves to the next wave once every device of the
+    current wave has finished, and starts the queued devices of the current wave.
+
+    When upgrades hold a Celery worker for their whole duration (`UPGRADE_RELEASE_WORKER_DURING_WAITS` disabled),
+    the workflow cannot wait for a concurrency slot, so at most `max_concurrent_installs` upgrades are started at
+    once instead.
+
+    Args:
+        batch_uuid (str): The UUID of the batch.
+        start_upgrade (Callable[[UpgradeBatchDevice], None]): Starts the upgrade of a device, with the device's
+            `task_id` as the task ID of its upgrade job. Called once the transaction is committed.
+
+    Returns:
+        bool: Whether the batch is over: completed, or stopped with no device still running.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Refresh running devices from their jobs]
+            B --> C{Failure rate above limit?}
+            C -->|Yes| D[Cancel queued devices and stop batch]
+            C -->|No| E{Current wave finished?}
+            E -->|Yes| F{More waves?}
+            F -->|No| G[Complete batch]
+            F -->|Yes| H[Move to next wave]
+            E -->|No| I[Start queued devices of current wave]
+            H --> I
+        ```
+    """
+    with transaction.atomic():
+        batch = UpgradeBatch.objects.select_for_update().get(uuid=batch_uuid)
+        if batch.status == "completed":
+            return True
+
+        refresh_batch_devices(batch)
+        if batch.status == "stopped":
+            # Devices already running are left to finish, only their status is still tracked
+            return not batch.devices.filter(status="running").exists()
+
+        progress = batch.progress()
+        if progress["failure_rate"] > batch.max_failure_rate:
+            logging.warning(
+                f"Upgrade batch {batch.uuid} stopped: failure rate {progress['failure_rate']}% exceeds "
+                f"{batch.max_failure_rate}%."
+            )
+            stop_batch(batch)
+            return not batch.devices.filter(status="running").exists()
+
+        wave = batch.devices.filter(wave=batch.current_wave)
+        while not wave.exclude(
+            status__in=UpgradeBatchDevice.FINISHED_STATUSES
+        ).exists():
+            next_wave = (
+                batch.devices.filter(wave__gt=batch.current_wave)
+                .order_by("wave")
+                .values_list("wave", flat=True)
+                .first()
+            )
+            if next_wave is None:
+                batch.status = "completed"
+                batch.save(update_fields=["status", "updated_at"])
+                return True
+
+            batch.current_wave = next_wave
+            wave = batch.devices.filter(wave=next_wave)
+
+        queued = list(wave.filter(status="queued").select_related("device"))
+        if not settings.UPGRADE_RELEASE_WORKER_DURING_WAITS:
+            running = batch.devices.filter(status="running").count()
+            queued = queued[: max(0, batch.max_concurrent_installs - running)]
+
+        # The task IDs are assigned up front and the upgrades only start once they are committed, so a workflow
+        # claiming a concurrency slot always finds its batch device
+        for member in queued:
+            member.task_id = str(uuid.uuid4())
+            member.status = "running"
+            transaction.on_commit(functools.partial(start_upgrade, member))
+        UpgradeBatchDevice.objects.bulk_update(queued, ["task_id", "status"])
+
+        batch.status = "running"
+        batch.save(update_fields=["current_wave", "status", "updated_at"])
+        return False
+
+
+def stop_batch(batch: UpgradeBatch) -> int:
+    """
+    Stop a batch from starting more devices; devices already running are left to finish.
+
+    Args:
+        batch (UpgradeBatch): The batch to stop.
+
+    Returns:
+        int: The number of queued devices that were cancelled.
+    """
+    cancelled = batch.devices.filter(status="queued").update(status="cancelled")
+    batch.status = "stopped"
+    batch.save(update_fields=["status", "updated_at"])
+    return cancelled
+
+
+def acquire_batch_slot(
+    job_id: str,
+    phase: str,
+) -> bool:
+    """
+    Claim a download or install slot of the batch an upgrade job belongs to.
+
+    The batch row is locked while the slots in use are counted, so concurrent workflows of the same batch never
+    exceed its limits. Download slots are counted per Panorama appliance; devices not managed by Panorama are not
+    limited. Claiming a slot the job already holds succeeds.
+
+    Args:
+        job_id (str): The task ID of the upgrade job.
+        phase (str): "download" or "install".
+
+    Returns:
+        bool: Whether the job may proceed; always True for jobs that are not part of a batch.
+    """
+    with transaction.atomic():
+        member = (
+            UpgradeBatchDevice.objects.filter(task_id=job_id)
+            .select_related("device")
+            .first()
+        )
+        if member is None or member.phase == phase:
+            return True
+
+        batch = UpgradeBatch.objects.select_for_update().get(uuid=member.batch_id)
+        holders = batch.devices.filter(phase=phase)
+        if phase == "download":
+            panorama_id = member.device.panorama_appliance_id
+            if panorama_id is not None:
+                in_use = holders.filter(device__panorama_appliance_id=panorama_id)
+                if in_use.count() >= batch.max_concurrent_downloads_per_panorama:
+                    return False
+        elif holders.count() >= batch.max_concurrent_installs:
+            return False
+
+        member.phase = phase
+        member.save(update_fields=["phase"])
+        return True
+
+
+def release_batch_slot(
+    job_id: str,
+    phase: Optional[str] = None,
+) -> None:
+    """
+    Release the slot held by an upgrade job, so another device of its batch can claim it.
+
+    Args:
+        job_id (str): The task ID of the upgrade job.
+        phase (Optional[str]): Only release the slot if it is this one; any slot is released when omitted.
+    """
+    members = UpgradeBatchDevice.objects.filter(task_id=job_id)
+    if phase is not None:
+        members = members.filter(phase=phase)
+    members.update(phase=None)
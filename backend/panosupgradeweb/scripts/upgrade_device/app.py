@@ -1,5 +1,12 @@
 # backend/panosupgradeweb/scripts/panos_upgrade/app.py
+import copy
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
 
 from panosupgradeweb.models import Device
 from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
@@ -26,6 +33,10 @@ def main(
     handles HA scenarios, performs pre-upgrade snapshots, upgrades the devices, performs post-upgrade snapshots,
     and stores the resulting information within the backend's database.
 
+    With `UPGRADE_HA_PARALLEL_PREWORK` enabled, the downloads, readiness checks and pre-upgrade snapshots of both
+    members of an HA pair run concurrently, and only HA suspension, install and reboot are performed one member at a
+    time.
+
     Args:
         author_id (int): The ID of the author initiating the upgrade job.
         device_uuid (str): The UUID of the firewall device to be upgraded.
@@ -90,62 +101,124 @@ def main(
     )
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Check if the target device is the primary device in an HA pair, and if so, skip the upgrade
+    # Workflow: Validate the HA roles, versions and software availability before changing anything on the devices
     # ------------------------------------------------------------------------------------------------------------------
-    # Retrieve database object for target device
-    targeted_device = Device.objects.get(uuid=device_uuid)
-    try:
-        # Check if the device is the active/primary device in an HA pair, and if so, skip the upgrade
-        if targeted_device.ha_enabled and targeted_device.local_state in [
-            "active",
-            "active-primary",
-        ]:
-            # Log that the upgrade can only be initiated by the workflow to upgrade the HA peer firewall
-            upgrade_job.logger.log_task(
-                action="report",
-                message=f"{targeted_device.hostname}: Device is the primary device in an HA pair. The upgrade of this "
-                "device can only be initiated by the workflow to upgrade the HA passive/secondary peer firewall.",
-            )
+    validation_status = validate_upgrade(
+        upgrade_job=upgrade_job,
+        device_uuid=device_uuid,
+        profile_uuid=profile_uuid,
+        target_version=target_version,
+    )
+    if validation_status:
+        return validation_status
 
-            # Skip the upgrade process for the primary device in an HA pair
-            return "skipped"
+    targeted_device = get_targeted_device(upgrade_job)
 
-    except Exception as e:
-        # Log the error message if the device is not found in the database
-        upgrade_job.logger.log_task(
-            action="error",
-            message=f"Error checking HA status of firewall devices: {str(e)}",
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Non-disruptive pre-work: image downloads, HA sync check, readiness checks and pre-upgrade snapshots
+    # ------------------------------------------------------------------------------------------------------------------
+    parallel_prework = bool(
+        settings.UPGRADE_HA_PARALLEL_PREWORK and upgrade_job.primary_device
+    )
+    if parallel_prework:
+        prework_status = run_ha_prework_concurrently(
+            upgrade_job=upgrade_job,
+            preparations=[
+                functools.partial(
+                    prepare_targeted_device,
+                    targeted_device=targeted_device,
+                    target_version=target_version,
+                ),
+                functools.partial(
+                    prepare_device,
+                    device=upgrade_job.primary_device,
+                ),
+            ],
         )
-        upgrade_job.update_current_step(
-            device_name=f"{targeted_device.hostname}",
-            step_name="Errored",
+    else:
+        prework_status = prepare_targeted_device(
+            upgrade_job=upgrade_job,
+            targeted_device=targeted_device,
+            target_version=target_version,
         )
-        return "errored"
+    if prework_status:
+        return prework_status
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Assign devices to either primary, secondary, or standalone; set latter two to `targeted_device`
+    # Workflow: Target device HA suspension
+    # ------------------------------------------------------------------------------------------------------------------
+    if not upgrade_job.standalone_device:
+        try:
+            if not dry_run:
+                # Log message to console
+                upgrade_job.logger.log_task(
+                    action="start",
+                    message=f"{targeted_device['db_device'].hostname}: Suspending the HA state of device",
+                )
+
+                # Suspend HA state of the active device
+                upgrade_job.suspend_ha_device(
+                    device=targeted_device,
+                )
+
+            else:
+                upgrade_job.logger.log_task(
+                    action="skipped",
+                    message=f"{targeted_device['db_device'].hostname}: Dry run mode enabled. Skipping HA state "
+                    f"suspension.",
+                )
+
+        except Exception as e:
+            # Log the error of the target device's upgrade
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
+                f"HA suspension of the device: {str(e)} ",
+            )
+            upgrade_job.update_current_step(
+                device_name=f"{targeted_device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Target device upgrade process
     # ------------------------------------------------------------------------------------------------------------------
     try:
-        # Perform assignment of devices
-        upgrade_job.assign_upgrade_devices(
-            device_uuid=device_uuid,
-            profile_uuid=profile_uuid,
-        )
+        if not dry_run:
+            # Log the error of the target device's upgrade
+            upgrade_job.logger.log_task(
+                action="start",
+                message=f"{targeted_device['db_device'].hostname}: Dry run disabled, beginning the upgrade workflow.",
+            )
+            # Perform upgrade of the target device
+            upgrade_status = upgrade_job.perform_upgrade(
+                device=targeted_device,
+                target_version=target_version,
+            )
 
-        # Assign secondary and standalone devices to `targeted_device` to reference as first device to upgrade
-        targeted_device = (
-            upgrade_job.secondary_device
-            if upgrade_job.secondary_device
-            else upgrade_job.standalone_device
-        )
+            # Gracefully exit if the target device fails its upgrade to target version
+            if upgrade_job.stop_upgrade_workflow:
+                # Log the message to the console
+                upgrade_job.logger.log_task(
+                    action="error",
+                    message=f"{targeted_device['db_device'].hostname}: Upgrade to {target_version} failed, "
+                    f"status: {upgrade_status}.",
+                )
 
-        upgrade_job.update_device_status(targeted_device, "active")
+                # Return an error status
+                upgrade_job.update_current_step(
+                    device_name=f"{targeted_device['db_device'].hostname}",
+                    step_name="Errored",
+                )
+                return "errored"
 
     except Exception as e:
-        # Log the error of determining the HA status of the target device
+        # Log the error of the target device's upgrade
         upgrade_job.logger.log_task(
             action="error",
-            message=f"Error assigning selected device(s) to a role as either primary, active, or standalone: {str(e)}",
+            message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
+            f"upgrade of the device: {str(e)} ",
         )
         upgrade_job.update_current_step(
             device_name=f"{targeted_device['db_device'].hostname}",
@@ -154,267 +227,401 @@ def main(
         return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device and will gracefully exit the upgrade workflow if it should be within a 'suspended' state
+    # Workflow: Target device reboot process
     # ------------------------------------------------------------------------------------------------------------------
-    try:
-        if upgrade_job.secondary_device is not None:
-            # Target the secondary devices within an HA pair and refresh the HA state using the
-            # `show_highavailability_state()` method
-            upgrade_job.get_ha_status(device=upgrade_job.secondary_device)
-
-            # Skip the upgrade process for devices that are suspended
-            if upgrade_job.ha_details["result"]["group"]:
-                if (
-                    upgrade_job.ha_details["result"]["group"]["local-info"]["state"]
-                    == "suspended"
-                ):
-                    # Log the message to the console
-                    upgrade_job.logger.log_task(
-                        action="report",
-                        message=f"{upgrade_job.secondary_device['db_device'].hostname}: Target device is in a HA "
-                        "suspended state, skipping upgrade_job.",
-                    )
-
-                    # Raise an exception to skip the upgrade process
-                    upgrade_job.update_current_step(
-                        device_name=f"{targeted_device['db_device'].hostname}",
-                        step_name="Errored",
-                    )
-                    return "errored"
-
-                elif (
-                    upgrade_job.ha_details["result"]["group"]["peer-info"]["state"]
-                    == "suspended"
-                ):
-                    # Log the message to the console
-                    upgrade_job.logger.log_task(
-                        action="report",
-                        message=f"{upgrade_job.secondary_device['db_device'].hostname}: Peer device is in a HA "
-                        "suspended state, skipping upgrade_job.",
-                    )
-
-                    # Raise an exception to skip the upgrade process
-                    upgrade_job.update_current_step(
-                        device_name=f"{targeted_device['db_device'].hostname}",
-                        step_name="Errored",
-                    )
-                    return "errored"
+    if not dry_run:
+        try:
+            # Perform reboot of the upgraded target device
+            upgrade_job.perform_reboot(
+                device=targeted_device,
+                target_version=target_version,
+            )
 
-            elif upgrade_job.ha_details["result"]["local-info"]["state"] == "suspended":
+            # Gracefully exit if the target device fails its reboot
+            if upgrade_job.stop_upgrade_workflow:
                 # Log the message to the console
                 upgrade_job.logger.log_task(
-                    action="report",
-                    message=f"{upgrade_job.secondary_device['db_device'].hostname}: Target device is in a HA "
-                    "suspended state, skipping upgrade_job.",
+                    action="error",
+                    message=f"{targeted_device['db_device'].hostname}: Request to reboot the device failed.",
                 )
 
-                # Raise an exception to skip the upgrade process
+                # Return an error status
                 upgrade_job.update_current_step(
                     device_name=f"{targeted_device['db_device'].hostname}",
                     step_name="Errored",
                 )
                 return "errored"
 
-            elif upgrade_job.ha_details["result"]["peer-info"]["state"] == "suspended":
+        except Exception as e:
+            # Log the error of the target device's reboot
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
+                f"reboot of the device: {str(e)} ",
+            )
+            upgrade_job.update_current_step(
+                device_name=f"{targeted_device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Target device snapshot after the upgrade process
+    # ------------------------------------------------------------------------------------------------------------------
+    if not dry_run:
+        try:
+            # Wait for the device to become ready for the post upgrade snapshot
+            upgrade_job.logger.log_task(
+                action="start",
+                message=f"{targeted_device['db_device'].hostname}: Waiting for the device to become ready for the post "
+                "upgrade snapshot.",
+            )
+            time.sleep(120)
+
+            # Snapshot the target device after the upgrade process
+            upgrade_job.take_snapshot(
+                device=targeted_device,
+                snapshot_type="post",
+            )
+
+            # Safely exit the script should the snapshot of the target device fail after the upgrade process
+            if not upgrade_job.snapshot_succeeded:
                 # Log the message to the console
                 upgrade_job.logger.log_task(
-                    action="report",
-                    message=f"{upgrade_job.secondary_device['db_device'].hostname}: Peer device is in a HA "
-                    "suspended state, skipping upgrade_job.",
+                    action="error",
+                    message=f"{targeted_device['db_device'].hostname}: Snapshot failed to complete "
+                    f"successfully after the upgrade completed.",
                 )
-
-                # Raise an exception to skip the upgrade process
                 upgrade_job.update_current_step(
                     device_name=f"{targeted_device['db_device'].hostname}",
                     step_name="Errored",
                 )
                 return "errored"
 
-    except Exception as e:
-        # Log the error of determining the HA status of the target device
-        upgrade_job.logger.log_task(
-            action="error",
-            message=f"{upgrade_job.secondary_device['pan_device']}: Error determining the HA status of the target "
-            f"device: {str(e)}",
-        )
-        upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
-            step_name="Errored",
-        )
-        return "errored"
+            # Report the differences between the pre and post upgrade snapshots
+            upgrade_job.report_snapshot_diff(device=targeted_device)
+
+        except Exception as e:
+            # Log the error of the snapshot on target device after the upgrade
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the snapshot "
+                f"of the network state of device: {str(e)} ",
+            )
+            upgrade_job.update_current_step(
+                device_name=f"{targeted_device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device returns a tuple of four integers representing the major, minor, maintenance, and hotfix
-    # parts of the version.
+    # Workflow: Update status to "completed"
     # ------------------------------------------------------------------------------------------------------------------
-    try:
-        # Parse the targeted version string into its major, minor, maintenance, and hotfix.
-        upgrade_job.version_target_parsed = parse_version(version=target_version)
+    upgrade_job.update_device_status(targeted_device, "completed")
 
-        if upgrade_job.secondary_device is not None:
-            # Parse the device's current version string into its major, minor, maintenance, and hotfix.
-            upgrade_job.version_local_parsed = parse_version(
-                version=upgrade_job.secondary_device["db_device"].sw_version
-            )
+    if not upgrade_job.primary_device:
+        upgrade_job.update_current_step(
+            device_name=f"{targeted_device['db_device'].hostname}",
+            step_name="Upgrade Completed!",
+        )
+        return "completed"
 
-            # Parse the targeted version string into its major, minor, maintenance, and hotfix.
-            upgrade_job.version_peer_parsed = parse_version(
-                version=upgrade_job.primary_device["db_device"].sw_version,
-            )
+    # --------------------------------------------------------------------------------------------------------------
+    # Workflow: Primary device readiness checks and snapshot, unless already done alongside the secondary device
+    # --------------------------------------------------------------------------------------------------------------
+    upgrade_job.update_current_step(
+        device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+        step_name="Beginning upgrade workflow on active device",
+    )
 
-            # Log the target version sliced object representing the target PAN-OS version
-            upgrade_job.logger.log_task(
-                action="report",
-                message=f"{upgrade_job.secondary_device['db_device'].hostname}: Device is currently running "
-                f"{upgrade_job.version_local_parsed} and the targeted PAN-OS upgrade version is "
-                f"{upgrade_job.version_target_parsed}. Peer firewall is running {upgrade_job.version_peer_parsed}.",
-            )
+    if not parallel_prework:
+        prework_status = prepare_device(
+            upgrade_job=upgrade_job,
+            device=upgrade_job.primary_device,
+        )
+        if prework_status:
+            return prework_status
 
-        else:
-            # Parse the device's current version string into its major, minor, maintenance, and hotfix.
-            upgrade_job.version_local_parsed = parse_version(
-                version=upgrade_job.standalone_device["db_device"].sw_version
-            )
-            # Log the target version sliced object representing the target PAN-OS version
-            upgrade_job.logger.log_task(
-                action="report",
-                message=f"{upgrade_job.standalone_device['db_device'].hostname}: Device is currently running "
-                f"{upgrade_job.version_local_parsed} and the targeted PAN-OS upgrade version is "
-                f"{upgrade_job.version_target_parsed}. Device is not in an HA pair.",
+    # --------------------------------------------------------------------------------------------------------------
+    # Workflow: Primary device upgrade
+    # --------------------------------------------------------------------------------------------------------------
+    if not dry_run:
+        try:
+            # Perform upgrade of the primary device
+            upgrade_status = upgrade_job.perform_upgrade(
+                device=upgrade_job.primary_device,
+                target_version=target_version,
             )
 
-    except Exception as e:
-        # Log the error of parsing PAN-OS versions
-        upgrade_job.logger.log_task(
-            action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error parsing the current and/or targeted upgrade "
-            f"version of PAN-OS: {str(e)}",
-        )
-        upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
-            step_name="Errored",
-        )
-        return "errored"
+            # Gracefully exit if the primary device fails its upgrade to target version
+            if upgrade_job.stop_upgrade_workflow:
+                # Log the message to the console
+                upgrade_job.logger.log_task(
+                    action="error",
+                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Upgrade to {target_version} failed, "
+                    f"status: {upgrade_status}.",
+                )
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device compares current and target version to determine if an upgrade is necessary.
-    # ------------------------------------------------------------------------------------------------------------------
-    try:
-        # Check if the specified version is older than the current version
-        upgrade_job.determine_upgrade(
-            current_version=upgrade_job.version_local_parsed,
-            hostname=targeted_device["db_device"].hostname,
-            target_version=upgrade_job.version_target_parsed,
-        )
+                # Return an error status
+                upgrade_job.update_current_step(
+                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                    step_name="Errored",
+                )
+                return "errored"
 
-        # Gracefully exit if the firewall does not require an upgrade to target version
-        if not upgrade_job.upgrade_required:
+        except Exception as e:
+            # Log the error of the target device's upgrade
             upgrade_job.logger.log_task(
                 action="error",
-                message=f"{targeted_device['db_device'].hostname}: It was determined that this device is not "
-                f"suitable to kick off an upgrade workflow to version {target_version}.",
+                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
+                f"upgrade of the device: {str(e)} ",
             )
             upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
+                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
                 step_name="Errored",
             )
             return "errored"
 
-    except Exception as e:
-        # Log the error of checking if upgrade to targeted version is required
-        upgrade_job.logger.log_task(
-            action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error determining if the device is ready to be upgraded "
-            f"to PAN-OS version {target_version}: {str(e)}",
-        )
-        upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
-            step_name="Errored",
-        )
-        return "errored"
-
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device compares current and target version of devices in an HA pair, determine if the
-    # upgrade is compatible
+    # Workflow: Primary device reboot process
     # ------------------------------------------------------------------------------------------------------------------
-    try:
-        # Check if the upgrade is compatible with the HA setup
-        if targeted_device["db_device"].ha_enabled:
-            # Perform HA compatibility check for the target version
-            upgrade_job.check_ha_compatibility(
-                current_version=upgrade_job.version_local_parsed,
-                hostname=targeted_device["db_device"].hostname,
-                target_version=upgrade_job.version_target_parsed,
+    if not dry_run:
+        try:
+            # Perform reboot of the upgraded primary device
+            upgrade_job.perform_reboot(
+                device=upgrade_job.primary_device,
+                target_version=target_version,
             )
 
-            # Gracefully exit if the firewall does not require an upgrade to target version
+            # Gracefully exit if the primary device fails its reboot
             if upgrade_job.stop_upgrade_workflow:
                 # Log the message to the console
                 upgrade_job.logger.log_task(
                     action="error",
-                    message=f"{targeted_device['db_device'].hostname}: {target_version} is not an compatible upgrade "
-                    f"path for the current release used in the H"
-                    f"A setup {targeted_device['db_device'].sw_version}.",
+                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Request to reboot the device failed.",
                 )
 
                 # Return an error status
                 upgrade_job.update_current_step(
-                    device_name=f"{targeted_device['db_device'].hostname}",
+                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                    step_name="Errored",
+                )
+                return "errored"
+
+        except Exception as e:
+            # Log the error of the target device's reboot
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
+                f"reboot of the device: {str(e)} ",
+            )
+            upgrade_job.update_current_step(
+                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Primary device snapshot after the upgrade process
+    # ------------------------------------------------------------------------------------------------------------------
+    if not dry_run:
+        try:
+            # Wait for the device to become ready for the post upgrade snapshot
+            upgrade_job.logger.log_task(
+                action="start",
+                message=f"{upgrade_job.primary_device['db_device'].hostname}: Waiting for the device to become ready "
+                f"for the post upgrade snapshot.",
+            )
+            time.sleep(120)
+
+            # Log the start of the snapshot process on target device after the upgrade
+            upgrade_job.logger.log_task(
+                action="start",
+                message=f"{upgrade_job.primary_device['db_device'].hostname}: Performing snapshot of network state "
+                "information after the upgrade.",
+            )
+
+            # Snapshot the primary device after the upgrade process
+            upgrade_job.take_snapshot(
+                device=upgrade_job.primary_device,
+                snapshot_type="post",
+            )
+
+            # Safely exit the script should the snapshot of the target device fail before the upgrade process
+            if not upgrade_job.snapshot_succeeded:
+                # Log the message to the console
+                upgrade_job.logger.log_task(
+                    action="error",
+                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Snapshot failed to complete "
+                    f"successfully after the upgrade was completed.",
+                )
+                upgrade_job.update_current_step(
+                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
                     step_name="Errored",
                 )
                 return "errored"
 
+            # Report the differences between the pre and post upgrade snapshots
+            upgrade_job.report_snapshot_diff(device=upgrade_job.primary_device)
+
+        except Exception as e:
+            # Log the error of the snapshot on target device after the upgrade
+            upgrade_job.logger.log_task(
+                action="error",
+                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
+                f"snapshot of the network state of device: {str(e)} ",
+            )
+            upgrade_job.update_current_step(
+                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Update status of primary e
+    # ------------------------------------------------------------------------------------------------------------------
+    upgrade_job.update_device_status(upgrade_job.primary_device, "completed")
+
+
+def get_targeted_device(upgrade_job: PanosUpgrade) -> Dict:
+    """
+    Return the device upgraded first: the secondary device of an HA pair, or the standalone device.
+
+    Args:
+        upgrade_job (PanosUpgrade): The upgrade job, after `assign_upgrade_devices` has been called.
+
+    Returns:
+        Dict: The device dictionary of the first device to upgrade.
+    """
+    return (
+        upgrade_job.secondary_device
+        if upgrade_job.secondary_device
+        else upgrade_job.standalone_device
+    )
+
+
+def prepare_device(
+    upgrade_job: PanosUpgrade,
+    device: Dict,
+) -> Optional[str]:
+    """
+    Perform the readiness checks and the pre-upgrade snapshot of a device.
+
+    Args:
+        upgrade_job (PanosUpgrade): The upgrade job, after `validate_upgrade` has assigned the devices.
+        device (Dict): The device dictionary of the device to prepare.
+
+    Returns:
+        Optional[str]: "errored" when the upgrade must not proceed, otherwise None.
+    """
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Device readiness checks
+    # ------------------------------------------------------------------------------------------------------------------
+    try:
+        upgrade_job.perform_readiness_checks(
+            device=device,
+        )
+        if not upgrade_job.readiness_checks_succeeded:
+            upgrade_job.update_current_step(
+                device_name=f"{device['db_device'].hostname}",
+                step_name="Errored",
+            )
+            return "errored"
+
     except Exception as e:
-        # Log the error of checking if targeted version compatible with HA upgrade
+        # Log the error of the device's readiness checks failing before upgrade
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error determining if the devices in an HA pair are "
-            f"compatible for the target PAN-OS version {target_version}: {str(e)}",
+            message=f"{device['db_device'].hostname}: Error occurred when performing the "
+            f"readiness checks of the device: {str(e)} ",
         )
         upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
+            device_name=f"{device['db_device'].hostname}",
             step_name="Errored",
         )
         return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device issues a request to pull down the latest version of software from CSP
+    # Workflow: Device snapshot before the upgrade process
     # ------------------------------------------------------------------------------------------------------------------
     try:
-        # Check if a software update is available for the device
-        version_available = upgrade_job.software_available_check(
-            device=targeted_device,
-            target_version=target_version,
+        # Snapshot the device before the upgrade process
+        upgrade_job.take_snapshot(
+            device=device,
+            snapshot_type="pre",
         )
 
-        # Gracefully exit if the target version is not available
-        if not version_available:
+        # Safely exit the script should the snapshot of the device fail before the upgrade process
+        if not upgrade_job.snapshot_succeeded:
+            # Log the message to the console
             upgrade_job.logger.log_task(
                 action="error",
-                message=f"{targeted_device['db_device'].hostname}: Target version {target_version} is not available.",
+                message=f"{device['db_device'].hostname}: Snapshot failed to complete successfully before the "
+                f"upgrade initiated.",
             )
             upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
+                device_name=f"{device['db_device'].hostname}",
                 step_name="Errored",
             )
             return "errored"
 
     except Exception as e:
-        # Log the error of checking if targeted version is available in CSP
+        # Log the error of the device's snapshot failing before upgrade
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error determining if the PAN-OS version is available for"
-            f" download {target_version}: {str(e)}",
+            message=f"{device['db_device'].hostname}: Error occurred when performing the "
+            f"snapshot of the network state of device: {str(e)} ",
         )
         upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
+            device_name=f"{device['db_device'].hostname}",
             step_name="Errored",
         )
         return "errored"
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device determination if the targeted version's base image is on the device already, else download
-    # ------------------------------------------------------------------------------------------------------------------
+    return None
+
+
+def prepare_targeted_device(
+    upgrade_job: PanosUpgrade,
+    targeted_device: Dict,
+    target_version: str,
+) -> Optional[str]:
+    """
+    Perform the non-disruptive pre-work on the device upgraded first, before anything is changed on it.
+
+    This function downloads the base and target images (which are synced to the HA peer), waits for the HA
+    configuration to be synchronized, refuses a device running a newer version than its peer, and runs the readiness
+    checks and the pre-upgrade snapshot.
+
+    Args:
+        upgrade_job (PanosUpgrade): The upgrade job, after `validate_upgrade` has succeeded.
+        targeted_device (Dict): The device dictionary of the secondary or standalone device.
+        target_version (str): The target PAN-OS version for the upgrade job.
+
+    Returns:
+        Optional[str]: "errored" when the upgrade must not proceed, otherwise None.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B{Base image downloaded?}
+            B -->|No| C[Download base image]
+            B -->|Yes| D{Target image downloaded?}
+            C --> D
+            D -->|No| E[Download target image]
+            D -->|Yes| F{HA enabled?}
+            E --> F
+            F -->|Yes| G[Wait for HA sync and compare peer versions]
+            F -->|No| H[Perform readiness checks]
+            G --> H
+            H --> I[Take pre-upgrade snapshot]
+            I --> J[Return None]
+        ```
+    """
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Target device determination if the targeted version's base image is on the device already, else download
+    # ------------------------------------------------------------------------------------------------------------------
     try:
         # Create a base version key for the target version
         base_version_key = f"{upgrade_job.version_target_parsed[0]}.{upgrade_job.version_target_parsed[1]}.0"
@@ -468,8 +675,7 @@ def main(
 
                     # Download the base image for the target version
                     downloaded = upgrade_job.software_download(
-                        device=targeted_device["pan_device"],
-                        hostname=targeted_device["db_device"].hostname,
+                        device=targeted_device,
                         target_version=base_version_key,
                     )
 
@@ -604,8 +810,7 @@ def main(
                 ):
                     # Download the target image
                     downloaded = upgrade_job.software_download(
-                        device=targeted_device["pan_device"],
-                        hostname=targeted_device["db_device"].hostname,
+                        device=targeted_device,
                         target_version=target_version,
                     )
 
@@ -827,145 +1032,139 @@ def main(
         )
         return "errored"
 
-    # --------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device readiness checks
-    # --------------------------------------------------------------------------------------------------------------
-    try:
-        upgrade_job.perform_readiness_checks(
-            device=targeted_device,
-        )
-        if not upgrade_job.readiness_checks_succeeded:
-            upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
+    return prepare_device(
+        upgrade_job=upgrade_job,
+        device=targeted_device,
+    )
 
-    except Exception as e:
-        # Log the error of the target device's readiness checks failing before upgrade
-        upgrade_job.logger.log_task(
-            action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
-            f"readiness checks of the device: {str(e)} ",
-        )
-        upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
-            step_name="Errored",
-        )
-        return "errored"
 
+def run_ha_prework_concurrently(
+    upgrade_job: PanosUpgrade,
+    preparations: List[Callable[..., Optional[str]]],
+) -> Optional[str]:
+    """
+    Perform the non-disruptive pre-work of both members of an HA pair at the same time.
+
+    Each preparation (for example `prepare_targeted_device` for the secondary device and `prepare_device` for the
+    primary device) runs in its own thread, so only HA suspension, install and reboot remain serialized. Every
+    preparation is called with its own shallow copy of the upgrade job as `upgrade_job`, because the outcome of the
+    readiness checks and snapshots is recorded on the job instance.
+
+    Args:
+        upgrade_job (PanosUpgrade): The upgrade job, after `validate_upgrade` has assigned the HA members.
+        preparations (List[Callable[..., Optional[str]]]): The preparations, each returning "errored" on failure.
+
+    Returns:
+        Optional[str]: "errored" when any preparation failed, otherwise None.
+
+    Mermaid Workflow:
+        ```mermaid
+        graph TD
+            A[Start] --> B[Prepare secondary device]
+            A --> C[Prepare primary device]
+            B --> D{Both succeeded?}
+            C --> D
+            D -->|Yes| E[Return None]
+            D -->|No| F[Return "errored"]
+        ```
+    """
+    upgrade_job.logger.log_task(
+        action="start",
+        message=f"{upgrade_job.primary_device['db_device'].hostname}: Preparing both HA members concurrently.",
+    )
+
+    def run_in_thread(preparation):
+        try:
+            return preparation(upgrade_job=copy.copy(upgrade_job))
+        finally:
+            # Worker threads open their own database connections
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(preparations)) as executor:
+        statuses = list(executor.map(run_in_thread, preparations))
+
+    return next((status for status in statuses if status), None)
+
+
+def validate_upgrade(
+    upgrade_job: PanosUpgrade,
+    device_uuid: str,
+    profile_uuid: str,
+    target_version: str,
+) -> Optional[str]:
+    """
+    Validate that a device can be upgraded to the target version without changing anything on it.
+
+    This function skips primary members of an HA pair, assigns the devices to their roles, refuses suspended HA
+    pairs, parses the current and target versions, checks the upgrade path and HA compatibility, and confirms that
+    the target version is available for download. It is shared by `main` and the stepped upgrade workflow.
+
+    Args:
+        upgrade_job (PanosUpgrade): The upgrade job to validate and populate with device assignments and versions.
+        device_uuid (str): The UUID of the firewall device to be upgraded.
+        profile_uuid (str): The UUID of the upgrade profile.
+        target_version (str): The target PAN-OS version for the upgrade job.
+
+    Returns:
+        Optional[str]: "skipped" or "errored" when the upgrade must not proceed, otherwise None.
+    """
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device snapshot before the upgrade process
+    # Workflow: Check if the target device is the primary device in an HA pair, and if so, skip the upgrade
     # ------------------------------------------------------------------------------------------------------------------
+    # Retrieve database object for target device
+    targeted_device = Device.objects.get(uuid=device_uuid)
     try:
-        # Snapshot the target device before the upgrade process
-        upgrade_job.take_snapshot(
-            device=targeted_device,
-            snapshot_type="pre",
-        )
-
-        # Safely exit the script should the snapshot of the target device fail before the upgrade process
-        if not upgrade_job.snapshot_succeeded:
-            # Log the message to the console
+        # Check if the device is the active/primary device in an HA pair, and if so, skip the upgrade
+        if targeted_device.ha_enabled and targeted_device.local_state in [
+            "active",
+            "active-primary",
+        ]:
+            # Log that the upgrade can only be initiated by the workflow to upgrade the HA peer firewall
             upgrade_job.logger.log_task(
-                action="error",
-                message=f"{targeted_device['db_device'].hostname}: Snapshot failed to complete successfully before the "
-                f"upgrade initiated.",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
-                step_name="Errored",
+                action="report",
+                message=f"{targeted_device.hostname}: Device is the primary device in an HA pair. The upgrade of this "
+                "device can only be initiated by the workflow to upgrade the HA passive/secondary peer firewall.",
             )
-            return "errored"
+
+            # Skip the upgrade process for the primary device in an HA pair
+            return "skipped"
 
     except Exception as e:
-        # Log the error of the target device's snapshot failing before upgrade
+        # Log the error message if the device is not found in the database
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
-            f"snapshot of the network state of device: {str(e)} ",
+            message=f"Error checking HA status of firewall devices: {str(e)}",
         )
         upgrade_job.update_current_step(
-            device_name=f"{targeted_device['db_device'].hostname}",
+            device_name=f"{targeted_device.hostname}",
             step_name="Errored",
         )
         return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device HA suspension
-    # ------------------------------------------------------------------------------------------------------------------
-    if not upgrade_job.standalone_device:
-        try:
-            if not dry_run:
-                # Log message to console
-                upgrade_job.logger.log_task(
-                    action="start",
-                    message=f"{targeted_device['db_device'].hostname}: Suspending the HA state of device",
-                )
-
-                # Suspend HA state of the active device
-                upgrade_job.suspend_ha_device(
-                    device=targeted_device,
-                )
-
-            else:
-                upgrade_job.logger.log_task(
-                    action="skipped",
-                    message=f"{targeted_device['db_device'].hostname}: Dry run mode enabled. Skipping HA state "
-                    f"suspension.",
-                )
-
-        except Exception as e:
-            # Log the error of the target device's upgrade
-            upgrade_job.logger.log_task(
-                action="error",
-                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
-                f"HA suspension of the device: {str(e)} ",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
-
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device upgrade process
+    # Workflow: Assign devices to either primary, secondary, or standalone; set latter two to `targeted_device`
     # ------------------------------------------------------------------------------------------------------------------
     try:
-        if not dry_run:
-            # Log the error of the target device's upgrade
-            upgrade_job.logger.log_task(
-                action="start",
-                message=f"{targeted_device['db_device'].hostname}: Dry run disabled, beginning the upgrade workflow.",
-            )
-            # Perform upgrade of the target device
-            upgrade_status = upgrade_job.perform_upgrade(
-                device=targeted_device,
-                target_version=target_version,
-            )
+        # Perform assignment of devices
+        upgrade_job.assign_upgrade_devices(
+            device_uuid=device_uuid,
+            profile_uuid=profile_uuid,
+        )
 
-            # Gracefully exit if the target device fails its upgrade to target version
-            if upgrade_job.stop_upgrade_workflow:
-                # Log the message to the console
-                upgrade_job.logger.log_task(
-                    action="error",
-                    message=f"{targeted_device['db_device'].hostname}: Upgrade to {target_version} failed, "
-                    f"status: {upgrade_status}.",
-                )
+        # Assign secondary and standalone devices to `targeted_device` to reference as first device to upgrade
+        targeted_device = (
+            upgrade_job.secondary_device
+            if upgrade_job.secondary_device
+            else upgrade_job.standalone_device
+        )
 
-                # Return an error status
-                upgrade_job.update_current_step(
-                    device_name=f"{targeted_device['db_device'].hostname}",
-                    step_name="Errored",
-                )
-                return "errored"
+        upgrade_job.update_device_status(targeted_device, "active")
 
     except Exception as e:
-        # Log the error of the target device's upgrade
+        # Log the error of determining the HA status of the target device
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
-            f"upgrade of the device: {str(e)} ",
+            message=f"Error assigning selected device(s) to a role as either primary, active, or standalone: {str(e)}",
         )
         upgrade_job.update_current_step(
             device_name=f"{targeted_device['db_device'].hostname}",
@@ -974,307 +1173,262 @@ def main(
         return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device reboot process
+    # Workflow: Target device and will gracefully exit the upgrade workflow if it should be within a 'suspended' state
     # ------------------------------------------------------------------------------------------------------------------
-    if not dry_run:
-        try:
-            # Perform reboot of the upgraded target device
-            upgrade_job.perform_reboot(
-                device=targeted_device,
-                target_version=target_version,
-            )
-
-            # Gracefully exit if the target device fails its reboot
-            if upgrade_job.stop_upgrade_workflow:
-                # Log the message to the console
-                upgrade_job.logger.log_task(
-                    action="error",
-                    message=f"{targeted_device['db_device'].hostname}: Request to reboot the device failed.",
-                )
+    try:
+        if upgrade_job.secondary_device is not None:
+            # Target the secondary devices within an HA pair and refresh the HA state using the
+            # `show_highavailability_state()` method
+            upgrade_job.get_ha_status(device=upgrade_job.secondary_device)
 
-                # Return an error status
-                upgrade_job.update_current_step(
-                    device_name=f"{targeted_device['db_device'].hostname}",
-                    step_name="Errored",
-                )
-                return "errored"
+            # Skip the upgrade process for devices that are suspended
+            if upgrade_job.ha_details["result"]["group"]:
+                if (
+                    upgrade_job.ha_details["result"]["group"]["local-info"]["state"]
+                    == "suspended"
+                ):
+                    # Log the message to the console
+                    upgrade_job.logger.log_task(
+                        action="report",
+                        message=f"{upgrade_job.secondary_device['db_device'].hostname}: Target device is in a HA "
+                        "suspended state, skipping upgrade_job.",
+                    )
 
-        except Exception as e:
-            # Log the error of the target device's reboot
-            upgrade_job.logger.log_task(
-                action="error",
-                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the "
-                f"reboot of the device: {str(e)} ",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
+                    # Raise an exception to skip the upgrade process
+                    upgrade_job.update_current_step(
+                        device_name=f"{targeted_device['db_device'].hostname}",
+                        step_name="Errored",
+                    )
+                    return "errored"
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Target device snapshot after the upgrade process
-    # ------------------------------------------------------------------------------------------------------------------
-    if not dry_run:
-        try:
-            # Wait for the device to become ready for the post upgrade snapshot
-            upgrade_job.logger.log_task(
-                action="start",
-                message=f"{targeted_device['db_device'].hostname}: Waiting for the device to become ready for the post "
-                "upgrade snapshot.",
-            )
-            time.sleep(120)
+                elif (
+                    upgrade_job.ha_details["result"]["group"]["peer-info"]["state"]
+                    == "suspended"
+                ):
+                    # Log the message to the console
+                    upgrade_job.logger.log_task(
+                        action="report",
+                        message=f"{upgrade_job.secondary_device['db_device'].hostname}: Peer device is in a HA "
+                        "suspended state, skipping upgrade_job.",
+                    )
 
-            # Snapshot the target device after the upgrade process
-            upgrade_job.take_snapshot(
-                device=targeted_device,
-                snapshot_type="post",
-            )
+                    # Raise an exception to skip the upgrade process
+                    upgrade_job.update_current_step(
+                        device_name=f"{targeted_device['db_device'].hostname}",
+                        step_name="Errored",
+                    )
+                    return "errored"
 
-            # Safely exit the script should the snapshot of the target device fail after the upgrade process
-            if not upgrade_job.snapshot_succeeded:
+            elif upgrade_job.ha_details["result"]["local-info"]["state"] == "suspended":
                 # Log the message to the console
                 upgrade_job.logger.log_task(
-                    action="error",
-                    message=f"{targeted_device['db_device'].hostname}: Snapshot failed to complete "
-                    f"successfully after the upgrade completed.",
+                    action="report",
+                    message=f"{upgrade_job.secondary_device['db_device'].hostname}: Target device is in a HA "
+                    "suspended state, skipping upgrade_job.",
                 )
+
+                # Raise an exception to skip the upgrade process
                 upgrade_job.update_current_step(
                     device_name=f"{targeted_device['db_device'].hostname}",
                     step_name="Errored",
                 )
                 return "errored"
 
-        except Exception as e:
-            # Log the error of the snapshot on target device after the upgrade
-            upgrade_job.logger.log_task(
-                action="error",
-                message=f"{targeted_device['db_device'].hostname}: Error occurred when performing the snapshot "
-                f"of the network state of device: {str(e)} ",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{targeted_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
-
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Update status to "completed"
-    # ------------------------------------------------------------------------------------------------------------------
-    upgrade_job.update_device_status(targeted_device, "completed")
+            elif upgrade_job.ha_details["result"]["peer-info"]["state"] == "suspended":
+                # Log the message to the console
+                upgrade_job.logger.log_task(
+                    action="report",
+                    message=f"{upgrade_job.secondary_device['db_device'].hostname}: Peer device is in a HA "
+                    "suspended state, skipping upgrade_job.",
+                )
 
-    if not upgrade_job.primary_device:
+                # Raise an exception to skip the upgrade process
+                upgrade_job.update_current_step(
+                    device_name=f"{targeted_device['db_device'].hostname}",
+                    step_name="Errored",
+                )
+                return "errored"
+
+    except Exception as e:
+        # Log the error of determining the HA status of the target device
+        upgrade_job.logger.log_task(
+            action="error",
+            message=f"{upgrade_job.secondary_device['pan_device']}: Error determining the HA status of the target "
+            f"device: {str(e)}",
+        )
         upgrade_job.update_current_step(
             device_name=f"{targeted_device['db_device'].hostname}",
-            step_name="Upgrade Completed!",
+            step_name="Errored",
         )
-        return "completed"
-
-    # --------------------------------------------------------------------------------------------------------------
-    # Workflow: Primary device readiness checks
-    # --------------------------------------------------------------------------------------------------------------
-    # Perform readiness checks on the primary device before the upgrade process
-    upgrade_job.update_current_step(
-        device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-        step_name="Beginning upgrade workflow on active device",
-    )
+        return "errored"
 
+    # ------------------------------------------------------------------------------------------------------------------
+    # Workflow: Target device returns a tuple of four integers representing the major, minor, maintenance, and hotfix
+    # parts of the version.
+    # ------------------------------------------------------------------------------------------------------------------
     try:
-        upgrade_job.perform_readiness_checks(
-            device=upgrade_job.primary_device,
-        )
+        # Parse the targeted version string into its major, minor, maintenance, and hotfix.
+        upgrade_job.version_target_parsed = parse_version(version=target_version)
 
-        # Attempt to perform readiness checks
-        if not upgrade_job.readiness_checks_succeeded:
-            upgrade_job.update_current_step(
-                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-                step_name="Errored",
+        if upgrade_job.secondary_device is not None:
+            # Parse the device's current version string into its major, minor, maintenance, and hotfix.
+            upgrade_job.version_local_parsed = parse_version(
+                version=upgrade_job.secondary_device["db_device"].sw_version
+            )
+
+            # Parse the targeted version string into its major, minor, maintenance, and hotfix.
+            upgrade_job.version_peer_parsed = parse_version(
+                version=upgrade_job.primary_device["db_device"].sw_version,
+            )
+
+            # Log the target version sliced object representing the target PAN-OS version
+            upgrade_job.logger.log_task(
+                action="report",
+                message=f"{upgrade_job.secondary_device['db_device'].hostname}: Device is currently running "
+                f"{upgrade_job.version_local_parsed} and the targeted PAN-OS upgrade version is "
+                f"{upgrade_job.version_target_parsed}. Peer firewall is running {upgrade_job.version_peer_parsed}.",
+            )
+
+        else:
+            # Parse the device's current version string into its major, minor, maintenance, and hotfix.
+            upgrade_job.version_local_parsed = parse_version(
+                version=upgrade_job.standalone_device["db_device"].sw_version
+            )
+            # Log the target version sliced object representing the target PAN-OS version
+            upgrade_job.logger.log_task(
+                action="report",
+                message=f"{upgrade_job.standalone_device['db_device'].hostname}: Device is currently running "
+                f"{upgrade_job.version_local_parsed} and the targeted PAN-OS upgrade version is "
+                f"{upgrade_job.version_target_parsed}. Device is not in an HA pair.",
             )
-            return "errored"
 
     except Exception as e:
-        # Log the error of the primary device's readiness checks failing before upgrade
+        # Log the error of parsing PAN-OS versions
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
-            f"readiness checks of the device: {str(e)} ",
+            message=f"{targeted_device['db_device'].hostname}: Error parsing the current and/or targeted upgrade "
+            f"version of PAN-OS: {str(e)}",
         )
         upgrade_job.update_current_step(
-            device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+            device_name=f"{targeted_device['db_device'].hostname}",
             step_name="Errored",
         )
         return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Primary device snapshot before the upgrade process
+    # Workflow: Target device compares current and target version to determine if an upgrade is necessary.
     # ------------------------------------------------------------------------------------------------------------------
-    # Snapshot the primary firewall device before the upgrade process
     try:
-        upgrade_job.take_snapshot(
-            device=upgrade_job.primary_device,
-            snapshot_type="pre",
+        # Check if the specified version is older than the current version
+        upgrade_job.determine_upgrade(
+            current_version=upgrade_job.version_local_parsed,
+            hostname=targeted_device["db_device"].hostname,
+            target_version=upgrade_job.version_target_parsed,
         )
 
-        # Safely exit the script should the snapshot of the primary device fail before the upgrade process
-        if not upgrade_job.snapshot_succeeded:
-            # Log the message to the console
+        # Gracefully exit if the firewall does not require an upgrade to target version
+        if not upgrade_job.upgrade_required:
             upgrade_job.logger.log_task(
                 action="error",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Snapshot failed to complete "
-                f"successfully before the upgrade initiated.",
+                message=f"{targeted_device['db_device'].hostname}: It was determined that this device is not "
+                f"suitable to kick off an upgrade workflow to version {target_version}.",
             )
             upgrade_job.update_current_step(
-                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                device_name=f"{targeted_device['db_device'].hostname}",
                 step_name="Errored",
             )
             return "errored"
 
     except Exception as e:
-        # Log the error of the primary device's snapshot failing before upgrade
+        # Log the error of checking if upgrade to targeted version is required
         upgrade_job.logger.log_task(
             action="error",
-            message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
-            f"snapshot of the network state of device: {str(e)} ",
+            message=f"{targeted_device['db_device'].hostname}: Error determining if the device is ready to be upgraded "
+            f"to PAN-OS version {target_version}: {str(e)}",
         )
         upgrade_job.update_current_step(
-            device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+            device_name=f"{targeted_device['db_device'].hostname}",
             step_name="Errored",
         )
         return "errored"
 
-    # --------------------------------------------------------------------------------------------------------------
-    # Workflow: Primary device upgrade
-    # --------------------------------------------------------------------------------------------------------------
-    if not dry_run:
-        try:
-            # Perform upgrade of the primary device
-            upgrade_status = upgrade_job.perform_upgrade(
-                device=upgrade_job.primary_device,
-                target_version=target_version,
-            )
-
-            # Gracefully exit if the primary device fails its upgrade to target version
-            if upgrade_job.stop_upgrade_workflow:
-                # Log the message to the console
-                upgrade_job.logger.log_task(
-                    action="error",
-                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Upgrade to {target_version} failed, "
-                    f"status: {upgrade_status}.",
-                )
-
-                # Return an error status
-                upgrade_job.update_current_step(
-                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-                    step_name="Errored",
-                )
-                return "errored"
-
-        except Exception as e:
-            # Log the error of the target device's upgrade
-            upgrade_job.logger.log_task(
-                action="error",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
-                f"upgrade of the device: {str(e)} ",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
-
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Primary device reboot process
+    # Workflow: Target device compares current and target version of devices in an HA pair, determine if the
+    # upgrade is compatible
     # ------------------------------------------------------------------------------------------------------------------
-    if not dry_run:
-        try:
-            # Perform reboot of the upgraded primary device
-            upgrade_job.perform_reboot(
-                device=upgrade_job.primary_device,
-                target_version=target_version,
+    try:
+        # Check if the upgrade is compatible with the HA setup
+        if targeted_device["db_device"].ha_enabled:
+            # Perform HA compatibility check for the target version
+            upgrade_job.check_ha_compatibility(
+                current_version=upgrade_job.version_local_parsed,
+                hostname=targeted_device["db_device"].hostname,
+                target_version=upgrade_job.version_target_parsed,
             )
 
-            # Gracefully exit if the primary device fails its reboot
+            # Gracefully exit if the firewall does not require an upgrade to target version
             if upgrade_job.stop_upgrade_workflow:
                 # Log the message to the console
                 upgrade_job.logger.log_task(
                     action="error",
-                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Request to reboot the device failed.",
+                    message=f"{targeted_device['db_device'].hostname}: {target_version} is not an compatible upgrade "
+                    f"path for the current release used in the H"
+                    f"A setup {targeted_device['db_device'].sw_version}.",
                 )
 
                 # Return an error status
                 upgrade_job.update_current_step(
-                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                    device_name=f"{targeted_device['db_device'].hostname}",
                     step_name="Errored",
                 )
                 return "errored"
 
-        except Exception as e:
-            # Log the error of the target device's reboot
-            upgrade_job.logger.log_task(
-                action="error",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
-                f"reboot of the device: {str(e)} ",
-            )
-            upgrade_job.update_current_step(
-                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-                step_name="Errored",
-            )
-            return "errored"
+    except Exception as e:
+        # Log the error of checking if targeted version compatible with HA upgrade
+        upgrade_job.logger.log_task(
+            action="error",
+            message=f"{targeted_device['db_device'].hostname}: Error determining if the devices in an HA pair are "
+            f"compatible for the target PAN-OS version {target_version}: {str(e)}",
+        )
+        upgrade_job.update_current_step(
+            device_name=f"{targeted_device['db_device'].hostname}",
+            step_name="Errored",
+        )
+        return "errored"
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Primary device snapshot after the upgrade process
+    # Workflow: Target device issues a request to pull down the latest version of software from CSP
     # ------------------------------------------------------------------------------------------------------------------
-    if not dry_run:
-        try:
-            # Wait for the device to become ready for the post upgrade snapshot
-            upgrade_job.logger.log_task(
-                action="start",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Waiting for the device to become ready "
-                f"for the post upgrade snapshot.",
-            )
-            time.sleep(120)
-
-            # Log the start of the snapshot process on target device after the upgrade
-            upgrade_job.logger.log_task(
-                action="start",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Performing snapshot of network state "
-                "information after the upgrade.",
-            )
-
-            # Snapshot the primary device after the upgrade process
-            upgrade_job.take_snapshot(
-                device=upgrade_job.primary_device,
-                snapshot_type="post",
-            )
-
-            # Safely exit the script should the snapshot of the target device fail before the upgrade process
-            if not upgrade_job.snapshot_succeeded:
-                # Log the message to the console
-                upgrade_job.logger.log_task(
-                    action="error",
-                    message=f"{upgrade_job.primary_device['db_device'].hostname}: Snapshot failed to complete "
-                    f"successfully after the upgrade was completed.",
-                )
-                upgrade_job.update_current_step(
-                    device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
-                    step_name="Errored",
-                )
-                return "errored"
+    try:
+        # Check if a software update is available for the device
+        version_available = upgrade_job.software_available_check(
+            device=targeted_device,
+            target_version=target_version,
+        )
 
-        except Exception as e:
-            # Log the error of the snapshot on target device after the upgrade
+        # Gracefully exit if the target version is not available
+        if not version_available:
             upgrade_job.logger.log_task(
                 action="error",
-                message=f"{upgrade_job.primary_device['db_device'].hostname}: Error occurred when performing the "
-                f"snapshot of the network state of device: {str(e)} ",
+                message=f"{targeted_device['db_device'].hostname}: Target version {target_version} is not available.",
             )
             upgrade_job.update_current_step(
-                device_name=f"{upgrade_job.primary_device['db_device'].hostname}",
+                device_name=f"{targeted_device['db_device'].hostname}",
                 step_name="Errored",
             )
             return "errored"
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # Workflow: Update status of primary e
-    # ------------------------------------------------------------------------------------------------------------------
-    upgrade_job.update_device_status(upgrade_job.primary_device, "completed")
+    except Exception as e:
+        # Log the error of checking if targeted version is available in CSP
+        upgrade_job.logger.log_task(
+            action="error",
+            message=f"{targeted_device['db_device'].hostname}: Error determining if the PAN-OS version is available for"
+            f" download {target_version}: {str(e)}",
+        )
+        upgrade_job.update_current_step(
+            device_name=f"{targeted_device['db_device'].hostname}",
+            step_name="Errored",
+        )
+        return "errored"
+
+    return None
@@ -1,12 +1,11 @@
 import time
 from http.client import RemoteDisconnected
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, Optional, Tuple
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 
 # Palo Alto Networks SDK imports
-from panos.firewall import Firewall
-from panos.panorama import Panorama
 from panos.errors import (
     PanDeviceError,
     PanDeviceXapiError,
@@ -36,8 +35,19 @@ from panosupgradeweb.models import (
     Route,
     Snapshot,
     SessionStats,
+    StagedImage,
 )
+from panosupgradeweb.scripts.api_keys import get_api_key
+from panosupgradeweb.scripts.events import publish_job_status
 from panosupgradeweb.scripts.logger import PanOsUpgradeLogger
+from panosupgradeweb.scripts.rate_limit import RateLimitedFirewall, RateLimitedPanorama
+from panosupgradeweb.scripts.snapshot_diff import diff_job_snapshots
+from panosupgradeweb.scripts.software_catalog import (
+    get_software_catalog_cache,
+    platform_family,
+    record_catalog_versions,
+)
+from panosupgradeweb.scripts.utilities import backoff_interval
 
 
 class PanosUpgrade:
@@ -69,6 +79,8 @@ class PanosUpgrade:
         compatibility of upgrading a firewall in an HA pair to a target version.
         - compare_versions(self, local_version_sliced: Tuple, hostname: str, peer_version_sliced: Tuple) -> str: Compare
         two version tuples and determine their relative order.
+        - connect_device(self, db_device: Device, profile: Profile) -> Dict: Create the firewall object of a device
+        and return its device dictionary.
         - determine_upgrade(self, hostname: str, current_version: Tuple, target_version: Tuple) -> None: Determine if a
         firewall requires an upgrade based on the current and target versions.
         - get_ha_status(self, device: Firewall) -> None: Retrieve the deployment information and HA status of
@@ -79,8 +91,8 @@ class PanosUpgrade:
         checks or snapshots on a firewall device.
         - software_available_check(self, device: Union[Firewall, Panorama], target_version: str) -> bool:
         Check if a software update to the target version is available and compatible.
-        - software_download(self, device: Union[Firewall, Panorama], target_version: str) -> bool: Download the target
-        software version to the firewall device.
+        - software_download(self, device: Dict, target_version: str) -> bool: Download the target software version
+        to the firewall device, following the PAN-OS download job.
         - suspend_ha_device(self, device: Dict) -> bool: Suspend the active device in a high-availability (HA) pair.
         - take_snapshot(self, device: Dict, snapshot_type: str) -> str: Take a snapshot of the network state information
         for a firewall device.
@@ -270,37 +282,11 @@ class PanosUpgrade:
             if each is None:
                 continue
 
-            # Create the firewall object based on whether the device is Panorama-managed or standalone
-            if each.panorama_managed:
-                firewall = Firewall(
-                    serial=each.serial,
-                    api_username=self.profile["authentication"]["pan_username"],
-                    api_password=self.profile["authentication"]["pan_password"],
-                )
-                pan = Panorama(
-                    hostname=(
-                        each.panorama_ipv4_address
-                        if each.panorama_ipv4_address
-                        else each.ipv6_address
-                    ),
-                    api_username=self.profile["authentication"]["pan_username"],
-                    api_password=self.profile["authentication"]["pan_password"],
-                )
-                pan.add(firewall)
-            else:
-                firewall = Firewall(
-                    hostname=each.ipv4_address,
-                    api_username=self.profile["authentication"]["pan_username"],
-                    api_password=self.profile["authentication"]["pan_password"],
-                )
-
-            # Create a dictionary containing the device, job ID, firewall object, and profile
-            device_dict = {
-                "db_device": each,
-                "job_id": self.job_id,
-                "pan_device": firewall,
-                "profile": profile,
-            }
+            # Create the firewall object and the device dictionary of the device
+            device_dict = self.connect_device(
+                db_device=each,
+                profile=profile,
+            )
             self.logger.log_task(
                 action="report",
                 message=f"{device_dict['db_device'].hostname}: Device object created.",
@@ -507,6 +493,69 @@ class PanosUpgrade:
         else:
             return "equal"
 
+    def connect_device(
+        self,
+        db_device: Device,
+        profile: Profile,
+    ) -> Dict:
+        """
+        Create the firewall object of a device and return its device dictionary.
+
+        Panorama-managed firewalls are reached through their Panorama appliance, whose requests go through its shared
+        rate limiter; other firewalls are connected to directly. Both reuse the cached API key of the profile for the
+        appliance that is connected to, which is regenerated once if the appliance rejects it.
+
+        Args:
+            db_device (Device): The device to connect to.
+            profile (Profile): The profile whose credentials are used.
+
+        Returns:
+            Dict: The device dictionary, with the "db_device", "job_id", "pan_device" and "profile" keys.
+        """
+        # Create the firewall object based on whether the device is Panorama-managed or standalone, reusing the
+        # cached API key of the profile for the appliance that is connected to; requests proxied by Panorama go
+        # through its shared rate limiter, and a cached key the appliance rejects is regenerated once
+        if db_device.panorama_managed:
+            hostname = (
+                db_device.panorama_ipv4_address
+                if db_device.panorama_ipv4_address
+                else db_device.ipv6_address
+            )
+        else:
+            hostname = db_device.ipv4_address
+        api_key_cache_args = (
+            hostname,
+            str(profile.uuid),
+            self.profile["authentication"]["pan_username"],
+            self.profile["authentication"]["pan_password"],
+        )
+        api_key = get_api_key(*api_key_cache_args)
+
+        if db_device.panorama_managed:
+            firewall = RateLimitedFirewall(serial=db_device.serial)
+            pan = RateLimitedPanorama(
+                hostname=hostname,
+                api_key=api_key,
+                api_key_cache_args=api_key_cache_args,
+            )
+            pan.add(firewall)
+        else:
+            firewall = RateLimitedFirewall(
+                hostname=hostname,
+                api_key=api_key,
+                api_key_cache_args=api_key_cache_args,
+            )
+
+        # Create a dictionary containing the device, job ID, firewall object, and profile
+        device_dict = {
+            "db_device": db_device,
+            "job_id": self.job_id,
+            "pan_device": firewall,
+            "profile": profile,
+        }
+
+        return device_dict
+
     def determine_upgrade(
         self,
         current_version: Tuple[int, int, int, int],
@@ -836,13 +885,59 @@ class PanosUpgrade:
             ```
         """
 
-        self.update_current_step(
-            device_name=device["db_device"].hostname,
-            step_name=f"Initiate reboot on and verify it boots up {target_version}.",
+        self.request_reboot(
+            device=device,
+            target_version=target_version,
         )
 
+        # Wait for the target device reboot process to initiate before checking status
+        time.sleep(60)
+
         rebooted = False
         attempt = 0
+        while not rebooted and attempt < self.profile["reboot"]["maximum_attempts"]:
+            status = self.check_reboot(
+                device=device,
+                target_version=target_version,
+            )
+
+            if status is None:
+                # Log that we are going to retry in a certain amount of time
+                self.logger.log_task(
+                    action="start",
+                    message=f"{device['db_device'].hostname}: Retry attempt {attempt + 1}, device not yet online.",
+                )
+
+                attempt += 1
+                time.sleep(self.profile["reboot"]["retry_interval"])
+            else:
+                rebooted = True
+
+        if not rebooted:
+            # Log that we are going to retry in a certain amount of time
+            self.logger.log_task(
+                action="error",
+                message=f"{device['db_device'].hostname}: Failed to reboot to the target version after "
+                f"{self.profile['reboot']['maximum_attempts']} attempts.",
+            )
+            self.stop_upgrade_workflow = True
+
+    def request_reboot(
+        self,
+        device: Dict,
+        target_version: str,
+    ) -> None:
+        """
+        Send the reboot command to a device without waiting for it to come back online.
+
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+            target_version (str): The PAN-OS version that the device should be running after the reboot.
+        """
+        self.update_current_step(
+            device_name=device["db_device"].hostname,
+            step_name=f"Initiate reboot on and verify it boots up {target_version}.",
+        )
 
         # Log the readiness checks success message
         self.logger.log_task(
@@ -856,63 +951,60 @@ class PanosUpgrade:
             cmd_xml=False,
         )
 
-        # Wait for the target device reboot process to initiate before checking status
-        time.sleep(60)
-
-        while not rebooted and attempt < self.profile["reboot"]["maximum_attempts"]:
-            try:
-                # Refresh system information to check if the device is back online
-                device["pan_device"].refresh_system_info()
-
-                # Log the readiness checks success message
-                self.logger.log_task(
-                    action="report",
-                    message=f"{device['db_device'].hostname}: Current device version: {device['pan_device'].version}.",
-                )
-
-                # Check if the device has rebooted to the target version
-                if device["pan_device"].version == target_version:
-                    # Log the successful upgrade/reboot
-                    self.logger.log_task(
-                        action="success",
-                        message=f"{device['db_device'].hostname}: Device upgraded to {target_version} and rebooted "
-                        f"successfully.",
-                    )
-
-                    rebooted = True
-
-                else:
-                    # Log the successful upgrade/reboot
-                    self.logger.log_task(
-                        action="error",
-                        message=f"{device['db_device'].hostname}: Device rebooted but not to {target_version}.",
-                    )
+    def check_reboot(
+        self,
+        device: Dict,
+        target_version: str,
+    ) -> Optional[bool]:
+        """
+        Check once whether a rebooted device is back online and running the target version.
 
-                    self.stop_upgrade_workflow = True
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+            target_version (str): The PAN-OS version that the device should be running after the reboot.
 
-            except (
-                PanXapiError,
-                PanConnectionTimeout,
-                PanURLError,
-                RemoteDisconnected,
-            ) as e:
-                # Log that we are going to retry in a certain amount of time
-                self.logger.log_task(
-                    action="start",
-                    message=f"{device['db_device'].hostname}: Retry attempt {attempt + 1} due to error: {e}.",
-                )
+        Returns:
+            Optional[bool]: True if the device is running the target version, False if it came back on another
+            version (in which case `stop_upgrade_workflow` is set), or None if the device is not reachable yet.
+        """
+        try:
+            # Refresh system information to check if the device is back online
+            device["pan_device"].refresh_system_info()
+        except (
+            PanXapiError,
+            PanConnectionTimeout,
+            PanURLError,
+            RemoteDisconnected,
+        ) as e:
+            self.logger.log_task(
+                action="working",
+                message=f"{device['db_device'].hostname}: Device not reachable yet: {e}.",
+            )
+            return None
 
-                attempt += 1
-                time.sleep(self.profile["reboot"]["retry_interval"])
+        # Log the readiness checks success message
+        self.logger.log_task(
+            action="report",
+            message=f"{device['db_device'].hostname}: Current device version: {device['pan_device'].version}.",
+        )
 
-        if not rebooted:
-            # Log that we are going to retry in a certain amount of time
+        # Check if the device has rebooted to the target version
+        if device["pan_device"].version == target_version:
+            # Log the successful upgrade/reboot
             self.logger.log_task(
-                action="error",
-                message=f"{device['db_device'].hostname}: Failed to reboot to the target version after "
-                f"{self.profile['reboot']['max_retries']} attempts.",
+                action="success",
+                message=f"{device['db_device'].hostname}: Device upgraded to {target_version} and rebooted "
+                f"successfully.",
             )
-            self.stop_upgrade_workflow = True
+            return True
+
+        # Log the successful upgrade/reboot
+        self.logger.log_task(
+            action="error",
+            message=f"{device['db_device'].hostname}: Device rebooted but not to {target_version}.",
+        )
+        self.stop_upgrade_workflow = True
+        return False
 
     def perform_upgrade(
         self,
@@ -1095,6 +1187,48 @@ class PanosUpgrade:
             )
             return "errored"
 
+    def report_snapshot_diff(
+        self,
+        device: Dict,
+    ) -> Optional[Dict]:
+        """
+        Compare the pre-upgrade and post-upgrade snapshots of a device and report the differences in the job log.
+
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+
+        Returns:
+            Optional[Dict]: The delta returned by `diff_snapshots`, or None if the device lacks either snapshot.
+        """
+        hostname = device["db_device"].hostname
+        deltas = diff_job_snapshots(
+            job_id=self.job_id,
+            device_uuid=device["db_device"].uuid,
+        )
+        if not deltas:
+            self.logger.log_task(
+                action="skipped",
+                message=f"{hostname}: No pre and post upgrade snapshots to compare.",
+            )
+            return None
+
+        delta = deltas[0]
+        for name, table in delta["tables"].items():
+            if name == "session_stats":
+                summary = f"{len(table['changed'])} counters changed by more than {table['threshold']}%"
+            else:
+                summary = (
+                    f"{len(table['added'])} added, {len(table['removed'])} removed, "
+                    f"{len(table['changed'])} changed ({table['change_percent']}% of "
+                    f"{max(table['pre_count'], table['post_count'])}, threshold {table['threshold']}%)"
+                )
+            self.logger.log_task(
+                action="report" if table["passed"] else "warning",
+                message=f"{hostname}: Snapshot comparison of {name}: {summary}",
+            )
+
+        return delta
+
     def run_assurance(
         self,
         device: Dict,
@@ -1205,143 +1339,18 @@ class PanosUpgrade:
 
                 if snapshot_results:
                     try:
-                        # Retrieve the Job object using the job_id
-                        job = Job.objects.get(task_id=self.job_id)
-
-                        # Create a new Snapshot instance and associate it with the job and device
-                        snapshot = Snapshot.objects.create(
-                            job=job,
-                            device=device["db_device"],
+                        row_counts = self.save_snapshot(
+                            device=device,
                             snapshot_type=snapshot_type,
+                            snapshot_results=snapshot_results,
+                        )
+                        self.logger.log_task(
+                            action="save",
+                            message=f"{device['db_device'].hostname}: Saved {snapshot_type} snapshot rows: "
+                            + ", ".join(
+                                f"{count} {name}" for name, count in row_counts.items()
+                            ),
                         )
-
-                        # Create a new ContentVersion instance if the content version is available
-                        if "content_version" in snapshot_results:
-                            ContentVersion.objects.create(
-                                snapshot=snapshot,
-                                version=snapshot_results["content_version"]["version"],
-                            )
-
-                        # Create License instances for each license in the snapshot results
-                        if "license" in snapshot_results:
-                            for license_name, license_data in snapshot_results[
-                                "license"
-                            ].items():
-                                base_license_name = license_data.get(
-                                    "base-license-name", ""
-                                )  # Use an empty string as default if the field is missing
-                                License.objects.create(
-                                    snapshot=snapshot,
-                                    feature=license_data["feature"],
-                                    description=license_data["description"],
-                                    serial=license_data["serial"],
-                                    issued=license_data["issued"],
-                                    expires=license_data["expires"],
-                                    expired=license_data["expired"],
-                                    base_license_name=base_license_name,
-                                    authcode=license_data["authcode"],
-                                    custom=license_data.get("custom"),
-                                )
-
-                        # Create NetworkInterface instances for each network interface in the snapshot results
-                        if "nics" in snapshot_results:
-                            for nic_name, nic_status in snapshot_results[
-                                "nics"
-                            ].items():
-                                NetworkInterface.objects.create(
-                                    snapshot=snapshot,
-                                    name=nic_name,
-                                    status=nic_status,
-                                )
-
-                        # Create ArpTableEntry instances for each ARP table entry in the snapshot results
-                        if "arp_table" in snapshot_results:
-                            for arp_entry in snapshot_results["arp_table"].values():
-                                ArpTableEntry.objects.create(
-                                    snapshot=snapshot,
-                                    interface=arp_entry["interface"],
-                                    ip=arp_entry["ip"],
-                                    mac=arp_entry["mac"],
-                                    port=arp_entry["port"],
-                                    status=arp_entry["status"],
-                                    ttl=int(arp_entry["ttl"]),
-                                )
-
-                        # Create Route instances for each route in the snapshot results
-                        if "routes" in snapshot_results:
-                            for route in snapshot_results["routes"].values():
-                                Route.objects.create(
-                                    snapshot=snapshot,
-                                    virtual_router=route["virtual-router"],
-                                    destination=route["destination"],
-                                    nexthop=route["nexthop"],
-                                    metric=int(route["metric"]),
-                                    flags=route["flags"],
-                                    age=int(route["age"]) if route["age"] else None,
-                                    interface=route["interface"],
-                                    route_table=route["route-table"],
-                                )
-
-                        # Create SessionStats instance for the session statistics in the snapshot results
-                        if "session_stats" in snapshot_results:
-                            stats = snapshot_results["session_stats"]
-                            SessionStats.objects.create(
-                                snapshot=snapshot,
-                                age_accel_thresh=int(stats["age-accel-thresh"]),
-                                age_accel_tsf=int(stats["age-accel-tsf"]),
-                                age_scan_ssf=int(stats["age-scan-ssf"]),
-                                age_scan_thresh=int(stats["age-scan-thresh"]),
-                                age_scan_tmo=int(stats["age-scan-tmo"]),
-                                cps=int(stats["cps"]),
-                                dis_def=int(stats["dis-def"]),
-                                dis_sctp=int(stats["dis-sctp"]),
-                                dis_tcp=int(stats["dis-tcp"]),
-                                dis_udp=int(stats["dis-udp"]),
-                                icmp_unreachable_rate=int(
-                                    stats["icmp-unreachable-rate"]
-                                ),
-                                kbps=int(stats["kbps"]),
-                                max_pending_mcast=int(stats["max-pending-mcast"]),
-                                num_active=int(stats["num-active"]),
-                                num_bcast=int(stats["num-bcast"]),
-                                num_gtpc=int(stats["num-gtpc"]),
-                                num_gtpu_active=int(stats["num-gtpu-active"]),
-                                num_gtpu_pending=int(stats["num-gtpu-pending"]),
-                                num_http2_5gc=int(stats["num-http2-5gc"]),
-                                num_icmp=int(stats["num-icmp"]),
-                                num_imsi=int(stats["num-imsi"]),
-                                num_installed=int(stats["num-installed"]),
-                                num_max=int(stats["num-max"]),
-                                num_mcast=int(stats["num-mcast"]),
-                                num_pfcpc=int(stats["num-pfcpc"]),
-                                num_predict=int(stats["num-predict"]),
-                                num_sctp_assoc=int(stats["num-sctp-assoc"]),
-                                num_sctp_sess=int(stats["num-sctp-sess"]),
-                                num_tcp=int(stats["num-tcp"]),
-                                num_udp=int(stats["num-udp"]),
-                                pps=int(stats["pps"]),
-                                tcp_cong_ctrl=int(stats["tcp-cong-ctrl"]),
-                                tcp_reject_siw_thresh=int(
-                                    stats["tcp-reject-siw-thresh"]
-                                ),
-                                tmo_5gcdelete=int(stats["tmo-5gcdelete"]),
-                                tmo_cp=int(stats["tmo-cp"]),
-                                tmo_def=int(stats["tmo-def"]),
-                                tmo_icmp=int(stats["tmo-icmp"]),
-                                tmo_sctp=int(stats["tmo-sctp"]),
-                                tmo_sctpcookie=int(stats["tmo-sctpcookie"]),
-                                tmo_sctpinit=int(stats["tmo-sctpinit"]),
-                                tmo_sctpshutdown=int(stats["tmo-sctpshutdown"]),
-                                tmo_tcp=int(stats["tmo-tcp"]),
-                                tmo_tcp_delayed_ack=int(stats["tmo-tcp-delayed-ack"]),
-                                tmo_tcp_unverif_rst=int(stats["tmo-tcp-unverif-rst"]),
-                                tmo_tcphalfclosed=int(stats["tmo-tcphalfclosed"]),
-                                tmo_tcphandshake=int(stats["tmo-tcphandshake"]),
-                                tmo_tcpinit=int(stats["tmo-tcpinit"]),
-                                tmo_tcptimewait=int(stats["tmo-tcptimewait"]),
-                                tmo_udp=int(stats["tmo-udp"]),
-                                vardata_rate=int(stats["vardata-rate"]),
-                            )
 
                         self.logger.log_task(
                             action="success",
@@ -1468,6 +1477,202 @@ class PanosUpgrade:
                 )
                 self.readiness_checks_succeeded = False
 
+    def save_snapshot(
+        self,
+        device: Dict,
+        snapshot_type: str,
+        snapshot_results: Dict,
+    ) -> Dict[str, int]:
+        """
+        Persist the results of an assurance snapshot to the database.
+
+        The Snapshot row and all of its child rows are written in a single transaction, with each kind of child row
+        inserted by `bulk_create` in batches of `SNAPSHOT_BULK_CREATE_BATCH_SIZE` rows. Firewalls with large ARP or
+        routing tables are therefore saved with a handful of INSERT statements instead of one per entry. When
+        `SNAPSHOT_STORAGE_FORMAT` is "compressed", the ARP and route tables are packed into the snapshot itself.
+
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+            snapshot_type (str): The type of snapshot, either "pre_upgrade" or "post_upgrade".
+            snapshot_results (Dict): The results returned by `CheckFirewall.run_snapshots()`.
+
+        Returns:
+            Dict[str, int]: The number of rows written per kind of snapshot data.
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Build unsaved rows from the snapshot results]
+                B --> H{Compressed storage?}
+                H -->|Yes| I[Pack ARP and route tables into the snapshot]
+                H -->|No| C
+                I --> C[Open transaction]
+                C --> D[Create Snapshot]
+                D --> E[Bulk create child rows in batches]
+                E --> F[Commit transaction]
+                F --> G[Return row counts]
+            ```
+        """
+        batch_size = getattr(settings, "SNAPSHOT_BULK_CREATE_BATCH_SIZE", 1000)
+        rows = {
+            "arp_table": [],
+            "content_version": [],
+            "license": [],
+            "nics": [],
+            "routes": [],
+            "session_stats": [],
+        }
+
+        # Create a ContentVersion row if the content version is available
+        if "content_version" in snapshot_results:
+            rows["content_version"].append(
+                ContentVersion(
+                    version=snapshot_results["content_version"]["version"],
+                )
+            )
+
+        # Create License rows for each license in the snapshot results
+        for license_data in snapshot_results.get("license", {}).values():
+            rows["license"].append(
+                License(
+                    feature=license_data["feature"],
+                    description=license_data["description"],
+                    serial=license_data["serial"],
+                    issued=license_data["issued"],
+                    expires=license_data["expires"],
+                    expired=license_data["expired"],
+                    # Use an empty string as default if the field is missing
+                    base_license_name=license_data.get("base-license-name", ""),
+                    authcode=license_data["authcode"],
+                    custom=license_data.get("custom"),
+                )
+            )
+
+        # Create NetworkInterface rows for each network interface in the snapshot results
+        for nic_name, nic_status in snapshot_results.get("nics", {}).items():
+            rows["nics"].append(
+                NetworkInterface(
+                    name=nic_name,
+                    status=nic_status,
+                )
+            )
+
+        # Create ArpTableEntry rows for each ARP table entry in the snapshot results
+        for arp_entry in snapshot_results.get("arp_table", {}).values():
+            rows["arp_table"].append(
+                ArpTableEntry(
+                    interface=arp_entry["interface"],
+                    ip=arp_entry["ip"],
+                    mac=arp_entry["mac"],
+                    port=arp_entry["port"],
+                    status=arp_entry["status"],
+                    ttl=int(arp_entry["ttl"]),
+                )
+            )
+
+        # Create Route rows for each route in the snapshot results
+        for route in snapshot_results.get("routes", {}).values():
+            rows["routes"].append(
+                Route(
+                    virtual_router=route["virtual-router"],
+                    destination=route["destination"],
+                    nexthop=route["nexthop"],
+                    metric=int(route["metric"]),
+                    flags=route["flags"],
+                    age=int(route["age"]) if route["age"] else None,
+                    interface=route["interface"],
+                    route_table=route["route-table"],
+                )
+            )
+
+        # Create a SessionStats row for the session statistics in the snapshot results
+        if "session_stats" in snapshot_results:
+            stats = snapshot_results["session_stats"]
+            rows["session_stats"].append(
+                SessionStats(
+                    age_accel_thresh=int(stats["age-accel-thresh"]),
+                    age_accel_tsf=int(stats["age-accel-tsf"]),
+                    age_scan_ssf=int(stats["age-scan-ssf"]),
+                    age_scan_thresh=int(stats["age-scan-thresh"]),
+                    age_scan_tmo=int(stats["age-scan-tmo"]),
+                    cps=int(stats["cps"]),
+                    dis_def=int(stats["dis-def"]),
+                    dis_sctp=int(stats["dis-sctp"]),
+                    dis_tcp=int(stats["dis-tcp"]),
+                    dis_udp=int(stats["dis-udp"]),
+                    icmp_unreachable_rate=int(stats["icmp-unreachable-rate"]),
+                    kbps=int(stats["kbps"]),
+                    max_pending_mcast=int(stats["max-pending-mcast"]),
+                    num_active=int(stats["num-active"]),
+                    num_bcast=int(stats["num-bcast"]),
+                    num_gtpc=int(stats["num-gtpc"]),
+                    num_gtpu_active=int(stats["num-gtpu-active"]),
+                    num_gtpu_pending=int(stats["num-gtpu-pending"]),
+                    num_http2_5gc=int(stats["num-http2-5gc"]),
+                    num_icmp=int(stats["num-icmp"]),
+                    num_imsi=int(stats["num-imsi"]),
+                    num_installed=int(stats["num-installed"]),
+                    num_max=int(stats["num-max"]),
+                    num_mcast=int(stats["num-mcast"]),
+                    num_pfcpc=int(stats["num-pfcpc"]),
+                    num_predict=int(stats["num-predict"]),
+                    num_sctp_assoc=int(stats["num-sctp-assoc"]),
+                    num_sctp_sess=int(stats["num-sctp-sess"]),
+                    num_tcp=int(stats["num-tcp"]),
+                    num_udp=int(stats["num-udp"]),
+                    pps=int(stats["pps"]),
+                    tcp_cong_ctrl=int(stats["tcp-cong-ctrl"]),
+                    tcp_reject_siw_thresh=int(stats["tcp-reject-siw-thresh"]),
+                    tmo_5gcdelete=int(stats["tmo-5gcdelete"]),
+                    tmo_cp=int(stats["tmo-cp"]),
+                    tmo_def=int(stats["tmo-def"]),
+                    tmo_icmp=int(stats["tmo-icmp"]),
+                    tmo_sctp=int(stats["tmo-sctp"]),
+                    tmo_sctpcookie=int(stats["tmo-sctpcookie"]),
+                    tmo_sctpinit=int(stats["tmo-sctpinit"]),
+                    tmo_sctpshutdown=int(stats["tmo-sctpshutdown"]),
+                    tmo_tcp=int(stats["tmo-tcp"]),
+                    tmo_tcp_delayed_ack=int(stats["tmo-tcp-delayed-ack"]),
+                    tmo_tcp_unverif_rst=int(stats["tmo-tcp-unverif-rst"]),
+                    tmo_tcphalfclosed=int(stats["tmo-tcphalfclosed"]),
+                    tmo_tcphandshake=int(stats["tmo-tcphandshake"]),
+                    tmo_tcpinit=int(stats["tmo-tcpinit"]),
+                    tmo_tcptimewait=int(stats["tmo-tcptimewait"]),
+                    tmo_udp=int(stats["tmo-udp"]),
+                    vardata_rate=int(stats["vardata-rate"]),
+                )
+            )
+
+        row_counts = {name: len(objects) for name, objects in rows.items() if objects}
+
+        # Create a new Snapshot instance and associate it with the job and device
+        snapshot = Snapshot(
+            device=device["db_device"],
+            snapshot_type=snapshot_type,
+        )
+
+        # Pack the largest tables into a compressed blob on the snapshot instead of creating a row per entry
+        if getattr(settings, "SNAPSHOT_STORAGE_FORMAT", "rows") == "compressed":
+            snapshot.pack_tables(
+                {
+                    "arp_table_entries": rows.pop("arp_table"),
+                    "routes": rows.pop("routes"),
+                }
+            )
+
+        with transaction.atomic():
+            snapshot.job = Job.objects.get(task_id=self.job_id)
+            snapshot.save()
+
+            for objects in rows.values():
+                if not objects:
+                    continue
+                for obj in objects:
+                    obj.snapshot = snapshot
+                type(objects[0]).objects.bulk_create(objects, batch_size=batch_size)
+
+        return row_counts
+
     def set_profile_settings(self):
         """
         Set the profile settings based on the provided profile UUID.
@@ -1601,10 +1806,13 @@ class PanosUpgrade:
         1. Parses the target version into major, minor, and maintenance components.
         2. Checks if the target version is older than the current version.
         3. Verifies the compatibility of the target version with the current version and HA setup.
-        4. Retrieves the list of available software versions from the device.
-        5. If the target version is available, attempts to download the base image.
-        6. If the base image is already downloaded or successfully downloaded, returns the available versions.
-        7. If the target version is not available or the download fails after multiple attempts, returns None.
+        4. When a pre-stage job staged the base and target images, only confirms with the device that they are still
+           downloaded.
+        5. Retrieves the list of available software versions from the cached catalog of the platform family, and
+           only confirms with the device that it knows the images; otherwise from the device, caching the catalog.
+        6. If the target version is available, attempts to download the base image.
+        7. If the base image is already downloaded or successfully downloaded, returns the available versions.
+        8. If the target version is not available or the download fails after multiple attempts, returns None.
 
         Args:
             device (Union[Firewall, Panorama]): The firewall or Panorama device object.
@@ -1621,8 +1829,17 @@ class PanosUpgrade:
                 C -->|No| E[Verify compatibility with current version and HA setup]
                 E --> F{Is compatible?}
                 F -->|No| G[Return False]
-                F -->|Yes| H[Retrieve available software versions]
-                H --> I[Update current step]
+                F -->|Yes| V{Base and target images pre-staged?}
+                V -->|Yes| W[Confirm images downloaded with software.info]
+                W -->|Downloaded| O
+                W -->|Missing| S
+                V -->|No| S{Target in cached catalog of platform family?}
+                S -->|Yes| T[Confirm images known to device with software.info]
+                T -->|Known| O
+                T -->|Unknown| H
+                S -->|No| H[Retrieve available software versions]
+                H --> U[Cache catalog of platform family]
+                U --> I[Update current step]
                 I --> J[Check available versions]
                 J --> K{Is target version available?}
                 K -->|No| L[Log version not found]
@@ -1652,9 +1869,55 @@ class PanosUpgrade:
             step_name="Check if a software update to the version is available and compatible.",
         )
 
-        # Retrieve available versions of PAN-OS
-        device["pan_device"].software.check()
-        available_versions = device["pan_device"].software.versions
+        pan_device = device["pan_device"]
+        platform = device["db_device"].platform
+        family = platform_family(platform.name if platform else None)
+        catalog_cache = get_software_catalog_cache()
+        catalog = catalog_cache.get(family) if family else None
+
+        major, minor = self.version_target_parsed[:2]
+        images = {f"{major}.{minor}.0", target_version}
+
+        # When a pre-stage job downloaded the base and target images, only confirm that they are still on the device;
+        # the downloads are then skipped, as the device reports the images as downloaded
+        staged = StagedImage.objects.filter(
+            device=device["db_device"],
+            version__in=images,
+            status="staged",
+        )
+        if staged.count() == len(images):
+            pan_device.software.info()
+            if all(
+                pan_device.software.versions.get(version, {}).get("downloaded")
+                for version in images
+            ):
+                self.logger.log_task(
+                    action="report",
+                    message=f"{device['db_device'].hostname}: Images of {target_version} were pre-staged, skipping "
+                    "their download.",
+                )
+                return True
+
+            # The images were removed from the device since they were staged
+            staged.delete()
+
+        # When the catalog of the platform family lists the target version, only confirm that the device knows the
+        # base and target images, without making it query the update server again
+        if catalog is not None and target_version in catalog:
+            pan_device.software.info()
+            if all(version in pan_device.software.versions for version in images):
+                self.logger.log_task(
+                    action="report",
+                    message=f"{device['db_device'].hostname}: {target_version} found in cached {family} catalog.",
+                )
+                return True
+
+        # Retrieve available versions of PAN-OS from the update server and share them with the platform family
+        pan_device.software.check()
+        available_versions = pan_device.software.versions
+        if family:
+            catalog_cache.set(family, available_versions)
+        record_catalog_versions(available_versions)
 
         # Check if the target version is available
         if target_version in available_versions:
@@ -1666,97 +1929,186 @@ class PanosUpgrade:
 
     def software_download(
         self,
-        device: Union[Firewall, Panorama],
-        hostname: str,
+        device: Dict,
         target_version: str,
     ) -> bool:
         """
         Download the target software version to the firewall device.
 
-        This function checks if the target software version is already downloaded on the firewall device.
-        If the version is not downloaded, it initiates the download process and monitors the download status.
-        It logs the progress and status of the download operation.
+        The download is enqueued with `request_software_job` and followed through its PAN-OS job ID with
+        `check_software_job`. The job is polled after `SOFTWARE_JOB_POLL_INITIAL` seconds, then with waits growing
+        by `SOFTWARE_JOB_POLL_BACKOFF` up to `SOFTWARE_JOB_POLL_MAXIMUM` seconds, so small images are detected
+        quickly while large ones are polled less often. The download is given up once it has run for
+        `SOFTWARE_DOWNLOAD_DEADLINE` seconds.
 
         Args:
-            device (Union[Firewall, Panorama]): The firewall or Panorama device object.
-            hostname (str): The hostname of the device.
+            device (Dict): A dictionary containing information about the firewall device, with the "db_device" and
+                "pan_device" keys.
             target_version (str): The target software version to be downloaded.
 
         Returns:
-            bool: True if the download is successful, False otherwise.
-
-        Raises:
-            PanDeviceXapiError: If an error occurs during the download initiation.
+            bool: True if the download is successful, False if it failed, could not be started or missed the
+            deadline.
 
         Mermaid Workflow:
             ```mermaid
             flowchart TD
-                A[Start] --> B{Is target version already downloaded?}
-                B -->|Yes| C[Log success and return True]
-                B -->|No| D[Initiate download]
-                D --> E{Download initiated successfully?}
-                E -->|Yes| F[Monitor download progress]
-                E -->|No| G[Log error and return False]
-                F --> H{Download complete?}
-                H -->|Yes| I[Log success and return True]
-                H -->|No| J[Wait for 30 seconds]
-                J --> F
-
-                subgraph software_download function
-                A
-                B
-                C
-                D
-                E
-                F
-                G
-                H
-                I
-                J
-                end
-
-                %% Error handling
-                D -->|PanDeviceXapiError| G
-
-                %% Function parameters
-                K[device: Union[Firewall, Panorama]]
-                L[hostname: str]
-                M[target_version: str]
-                K --> A
-                L --> A
-                M --> A
-
-                %% Return value
-                I --> N[Return True]
-                G --> O[Return False]
-                C --> N
+                A[Start] --> B[Request download and get PAN-OS job ID]
+                B -->|Request rejected| G[Return False]
+                B --> C[Wait with exponential backoff]
+                C --> D[Check job status with show jobs id]
+                D -->|Finished OK| I[Return True]
+                D -->|Finished with error| G
+                D -->|Running| E{Deadline passed?}
+                E -->|No| C
+                E -->|Yes| F[Log timeout]
+                F --> G
             ```
         """
-
-        self.update_current_step(
-            device_name=hostname,
-            step_name="Download the target software version to the firewall device.",
-        )
+        hostname = device["db_device"].hostname
 
         try:
             # Initiate the download of the target software version
-            device.software.download(target_version)
-        except PanDeviceXapiError:
+            job_id = self.request_software_job(
+                device=device,
+                operation="download",
+                target_version=target_version,
+            )
+        except (PanDeviceXapiError, ValueError):
             # return False if the download fails to initiate
             return False
 
+        deadline = time.monotonic() + settings.SOFTWARE_DOWNLOAD_DEADLINE
+        attempt = 0
         while True:
-            # Refresh the software information on the device
-            device.software.info()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.log_task(
+                    action="error",
+                    message=f"{hostname}: Download of {target_version} (job {job_id}) did not finish within "
+                    f"{settings.SOFTWARE_DOWNLOAD_DEADLINE} seconds.",
+                )
+                return False
 
-            # Check the download status of the target version
-            dl_status = device.software.versions[target_version]["downloaded"]
+            time.sleep(
+                min(
+                    remaining,
+                    backoff_interval(
+                        attempt,
+                        initial=settings.SOFTWARE_JOB_POLL_INITIAL,
+                        maximum=settings.SOFTWARE_JOB_POLL_MAXIMUM,
+                        factor=settings.SOFTWARE_JOB_POLL_BACKOFF,
+                    ),
+                )
+            )
+            attempt += 1
 
-            if dl_status is True:
-                return True
+            finished = self.check_software_job(device=device, job_id=job_id)
+            if finished is not None:
+                return finished
 
-            # Wait for 30 seconds before checking the download status again
-            time.sleep(30)
+    def request_software_job(
+        self,
+        device: Dict,
+        operation: str,
+        target_version: str,
+    ) -> str:
+        """
+        Enqueue a software download or install job on the device and return its PAN-OS job ID.
+
+        Unlike `software_download` and `perform_upgrade`, this function returns as soon as the device has accepted
+        the request; progress is then followed with `check_software_job`.
+
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+            operation (str): Either "download" or "install".
+            target_version (str): The PAN-OS version to download or install.
+
+        Returns:
+            str: The ID of the job enqueued on the device.
+
+        Raises:
+            ValueError: If the operation is not supported or the response does not contain a job ID.
+        """
+        if operation not in ("download", "install"):
+            raise ValueError(f"Unsupported software operation: {operation}")
+
+        self.update_current_step(
+            device_name=device["db_device"].hostname,
+            step_name=f"Request {operation} of PAN-OS version {target_version}.",
+        )
+
+        # As with `SoftwareUpdater.download`, the image is copied to the HA peer,
+        # which is why the peer skips its own download.
+        sync_to_peer = ""
+        if operation == "download":
+            sync_to_peer = "<sync-to-peer>yes</sync-to-peer>"
+        response = device["pan_device"].op(
+            f"<request><system><software><{operation}>{sync_to_peer}"
+            f"<version>{target_version}</version>"
+            f"</{operation}></software></system></request>",
+            cmd_xml=False,
+        )
+        job_id = response.findtext("./result/job")
+        if not job_id:
+            raise ValueError(
+                f"No job ID returned for the {operation} of PAN-OS version {target_version}"
+            )
+
+        self.logger.log_task(
+            action="working",
+            message=f"{device['db_device'].hostname}: PAN-OS {target_version} {operation} enqueued as job {job_id}.",
+        )
+        return job_id
+
+    def check_software_job(
+        self,
+        device: Dict,
+        job_id: str,
+    ) -> Optional[bool]:
+        """
+        Check once on the status of a job enqueued with `request_software_job`.
+
+        Args:
+            device (Dict): A dictionary containing information about the firewall device.
+            job_id (str): The PAN-OS job ID.
+
+        Returns:
+            Optional[bool]: True if the job finished successfully, False if it finished with an error, or None while
+            it is still running.
+        """
+        response = device["pan_device"].op(
+            f"<show><jobs><id>{job_id}</id></jobs></show>",
+            cmd_xml=False,
+        )
+        status = response.findtext("./result/job/status")
+        result = response.findtext("./result/job/result")
+        progress = response.findtext("./result/job/progress")
+
+        if status != "FIN":
+            self.logger.log_task(
+                action="working",
+                message=f"{device['db_device'].hostname}: Job {job_id} is {status}, progress {progress}%.",
+            )
+            return None
+
+        if result == "OK":
+            self.logger.log_task(
+                action="success",
+                message=f"{device['db_device'].hostname}: Job {job_id} completed successfully.",
+            )
+            return True
+
+        details = " ".join(
+            line.text.strip()
+            for line in response.findall("./result/job/details/line")
+            if line.text
+        )
+        self.logger.log_task(
+            action="error",
+            message=f"{device['db_device'].hostname}: Job {job_id} failed: {details or result}.",
+        )
+        return False
 
     def suspend_ha_device(
         self,
@@ -2052,6 +2404,8 @@ class PanosUpgrade:
                 job.updated_at = timezone.now()
                 job.save()
 
+            publish_job_status(job)
+
         except Job.DoesNotExist:
             self.logger.log_task(
                 action="error",
@@ -2130,6 +2484,7 @@ class PanosUpgrade:
                 job.updated_at = timezone.now()
                 job.save()
 
+            publish_job_status(job)
             self.logger.log_task(
                 action="success",
                 message=f"{device['db_device'].hostname}: Updated device status to {status}.",
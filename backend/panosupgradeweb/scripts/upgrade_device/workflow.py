@@ -0,0 +1,533 @@
+# backend/panosupgradeweb/scripts/upgrade_device/workflow.py
+
+import functools
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from django.conf import settings
+
+from panosupgradeweb.scripts.upgrade_batch import (
+    acquire_batch_slot,
+    release_batch_slot,
+)
+from panosupgradeweb.scripts.utilities import backoff_interval, parse_version
+from .app import (
+    get_targeted_device,
+    prepare_device,
+    run_ha_prework_concurrently,
+    validate_upgrade,
+)
+from .upgrade import PanosUpgrade
+
+
+class UpgradeWorkflow:
+    """
+    A resumable, step-by-step version of the PAN-OS upgrade workflow.
+
+    Instead of running the whole upgrade in a single call and sleeping while the devices download, install and
+    reboot, each call to `advance` runs steps until one of them has to wait. The workflow then returns how long to
+    wait, and the caller persists `state` and schedules the next call (for example with Celery's
+    `apply_async(countdown=...)`), so no worker is held idle during the wait.
+
+    The devices are upgraded in the same order as `main`: first the secondary device of an HA pair (or the
+    standalone device), then the primary device. For each device the steps are:
+
+    validate -> download -> await_download -> ha_sync -> pre_checks -> install -> await_install -> reboot ->
+    await_reboot -> post_snapshot -> compare -> complete
+
+    When the job belongs to an upgrade batch, the download and install steps first claim a download or install slot
+    of the batch and wait until one is free; the install slot is held until the device is back from its reboot.
+
+    The validate, download and ha_sync steps only run for the first device, as the image is synced to the HA peer.
+    In dry run mode the steps after pre_checks are skipped. With `UPGRADE_HA_PARALLEL_PREWORK` enabled, the
+    pre_checks step of the first device also prepares the primary device concurrently, and is skipped for it later.
+
+    Attributes:
+        job_id (str): The ID of the upgrade job.
+        state (Dict): The JSON-serializable workflow state, persisted between calls.
+        upgrade_job (PanosUpgrade): The upgrade job used to talk to the devices.
+    """
+
+    # Seconds to wait for a reboot to start before polling the device
+    REBOOT_GRACE_PERIOD = 60
+
+    # Seconds to let a rebooted device settle before taking the post upgrade snapshot
+    POST_REBOOT_SETTLE_TIME = 120
+
+    def __init__(
+        self,
+        job_id: str,
+        state: Dict,
+    ):
+        self.job_id = job_id
+        self.state = state
+        self.upgrade_job = PanosUpgrade(
+            job_id=job_id,
+            profile_uuid=state["profile_uuid"],
+        )
+
+        # Device assignments are rebuilt from the database on every call once validation has run
+        if state["step"] != "validate":
+            self.upgrade_job.assign_upgrade_devices(
+                device_uuid=state["device_uuid"],
+                profile_uuid=state["profile_uuid"],
+            )
+            self.upgrade_job.version_target_parsed = parse_version(
+                version=state["target_version"]
+            )
+
+    @staticmethod
+    def initial_state(
+        author_id: int,
+        device_uuid: str,
+        dry_run: bool,
+        profile_uuid: str,
+        target_version: str,
+    ) -> Dict:
+        """
+        Build the state of a workflow that has not started yet.
+
+        Args:
+            author_id (int): The ID of the author initiating the upgrade job.
+            device_uuid (str): The UUID of the firewall device to be upgraded.
+            dry_run (bool): Flag indicating whether to perform a dry run (True) or actual upgrade (False).
+            profile_uuid (str): The UUID of the upgrade profile.
+            target_version (str): The target PAN-OS version for the upgrade job.
+
+        Returns:
+            Dict: The initial workflow state.
+        """
+        return {
+            "attempt": 0,
+            "author_id": author_id,
+            "device_index": 0,
+            "device_uuid": device_uuid,
+            "downloads": [],
+            "dry_run": dry_run,
+            "primary_prepared": False,
+            "profile_uuid": profile_uuid,
+            "software_job": None,
+            "software_job_polls": 0,
+            "software_job_started": None,
+            "step": "validate",
+            "target_version": target_version,
+        }
+
+    @property
+    def device(self) -> Dict:
+        """The device dictionary of the device currently being upgraded."""
+        if self.state["device_index"] == 0:
+            return get_targeted_device(self.upgrade_job)
+        return self.upgrade_job.primary_device
+
+    @property
+    def hostname(self) -> str:
+        device = self.device
+        return device["db_device"].hostname if device else "pending"
+
+    def advance(self) -> Tuple[str, Union[int, str]]:
+        """
+        Run workflow steps until one has to wait or the workflow ends.
+
+        Returns:
+            Tuple[str, Union[int, str]]: Either ("wait", seconds) when the next call should be scheduled after a
+            delay, or ("done", status) with status "completed", "skipped" or "errored".
+
+        Mermaid Workflow:
+            ```mermaid
+            graph TD
+                A[Start] --> B[Run current step]
+                B --> C{Step outcome}
+                C -->|Next step| B
+                C -->|Wait| D[Return wait and delay]
+                C -->|Done| E[Return done and status]
+                B -->|Exception| F[Mark device errored]
+                F --> E
+            ```
+        """
+        while True:
+            step = getattr(self, f"step_{self.state['step']}")
+            try:
+                outcome = step()
+            except Exception as e:
+                outcome = self._fail(
+                    f"Error during the '{self.state['step']}' step: {str(e)}"
+                )
+
+            if outcome is not None:
+                return outcome
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Transitions
+    # ------------------------------------------------------------------------------------------------------------------
+    def _next(self, step: str) -> None:
+        """Move to `step` immediately, resetting the retry counter."""
+        self.state["step"] = step
+        self.state["attempt"] = 0
+        return None
+
+    def _wait(self, seconds: int, step: Optional[str] = None) -> Tuple[str, int]:
+        """Wait `seconds` before running `step`, or the current step again."""
+        if step is not None:
+            self._next(step)
+        return "wait", max(1, int(seconds))
+
+    def _retry(
+        self,
+        step: str,
+        maximum_attempts: int,
+        retry_interval: int,
+        message: str,
+    ) -> Tuple[str, Union[int, str]]:
+        """Count a failed attempt and run `step` again after `retry_interval`, or fail once attempts run out."""
+        self.state["attempt"] += 1
+        if self.state["attempt"] >= maximum_attempts:
+            return self._fail(f"{message} Giving up after {maximum_attempts} attempts.")
+
+        self.upgrade_job.logger.log_task(
+            action="working",
+            message=f"{self.hostname}: {message} Retrying in {retry_interval} seconds "
+            f"(attempt {self.state['attempt'] + 1} of {maximum_attempts}).",
+        )
+        self.state["step"] = step
+        return "wait", max(1, int(retry_interval))
+
+    def _claim_slot(self, phase: str) -> Optional[Tuple[str, int]]:
+        """Claim a concurrency slot of the job's upgrade batch, or wait for one to be released."""
+        if acquire_batch_slot(self.job_id, phase):
+            self.state.pop("waiting_for_slot", None)
+            return None
+
+        if self.state.get("waiting_for_slot") != phase:
+            self.state["waiting_for_slot"] = phase
+            self.upgrade_job.logger.log_task(
+                action="working",
+                message=f"{self.hostname}: Waiting for a free {phase} slot of the upgrade batch.",
+            )
+        return "wait", settings.UPGRADE_BATCH_POLL_INTERVAL
+
+    def _poll_software_job(self) -> Tuple[str, int]:
+        """Wait before the next check of the current software job, longer after every check."""
+        interval = backoff_interval(
+            self.state.get("software_job_polls", 0),
+            initial=settings.SOFTWARE_JOB_POLL_INITIAL,
+            maximum=settings.SOFTWARE_JOB_POLL_MAXIMUM,
+            factor=settings.SOFTWARE_JOB_POLL_BACKOFF,
+        )
+        self.state["software_job_polls"] = self.state.get("software_job_polls", 0) + 1
+        return "wait", max(1, int(interval))
+
+    def _fail(self, message: str) -> Tuple[str, str]:
+        """Log `message`, mark the current device as errored and end the workflow."""
+        self.upgrade_job.logger.log_task(
+            action="error",
+            message=f"{self.hostname}: {message}",
+        )
+        self.upgrade_job.update_current_step(
+            device_name=self.hostname,
+            step_name="Errored",
+        )
+        return "done", "errored"
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Steps
+    # ------------------------------------------------------------------------------------------------------------------
+    def step_validate(self):
+        status = validate_upgrade(
+            upgrade_job=self.upgrade_job,
+            device_uuid=self.state["device_uuid"],
+            profile_uuid=self.state["profile_uuid"],
+            target_version=self.state["target_version"],
+        )
+        if status:
+            return "done", status
+
+        # Queue the base and target images that are not on the device yet
+        target_version = self.state["target_version"]
+        major, minor = self.upgrade_job.version_target_parsed[:2]
+        versions = self.device["pan_device"].software.versions
+        self.state["downloads"] = [
+            version
+            for version in dict.fromkeys([f"{major}.{minor}.0", target_version])
+            if not versions[version]["downloaded"]
+        ]
+
+        return self._next("download")
+
+    def step_download(self):
+        if not self.state["downloads"]:
+            release_batch_slot(self.job_id, "download")
+            return self._next("ha_sync")
+
+        waiting = self._claim_slot("download")
+        if waiting:
+            return waiting
+
+        version = self.state["downloads"][0]
+        try:
+            self.state["software_job"] = self.upgrade_job.request_software_job(
+                device=self.device,
+                operation="download",
+                target_version=version,
+            )
+        except Exception as e:
+            return self._retry(
+                step="download",
+                maximum_attempts=self.upgrade_job.profile["download"][
+                    "maximum_attempts"
+                ],
+                retry_interval=self.upgrade_job.profile["download"]["retry_interval"],
+                message=f"Failed to start the download of {version}: {str(e)}.",
+            )
+
+        self.state["step"] = "await_download"
+        self.state["software_job_polls"] = 0
+        self.state["software_job_started"] = time.time()
+        return self._poll_software_job()
+
+    def step_await_download(self):
+        version = self.state["downloads"][0]
+        retry_interval = self.upgrade_job.profile["download"]["retry_interval"]
+        finished = self.upgrade_job.check_software_job(
+            device=self.device,
+            job_id=self.state["software_job"],
+        )
+
+        if finished is None:
+            started = self.state.get("software_job_started")
+            if started and time.time() - started > settings.SOFTWARE_DOWNLOAD_DEADLINE:
+                return self._retry(
+                    step="download",
+                    maximum_attempts=self.upgrade_job.profile["download"][
+                        "maximum_attempts"
+                    ],
+                    retry_interval=retry_interval,
+                    message=f"Download of {version} did not finish within "
+                    f"{settings.SOFTWARE_DOWNLOAD_DEADLINE} seconds.",
+                )
+            return self._poll_software_job()
+
+        if not finished:
+            return self._retry(
+                step="download",
+                maximum_attempts=self.upgrade_job.profile["download"][
+                    "maximum_attempts"
+                ],
+                retry_interval=retry_interval,
+                message=f"Download of {version} failed.",
+            )
+
+        # Let the image load into the software manager before downloading the next one
+        self.upgrade_job.logger.log_task(
+            action="success",
+            message=f"{self.hostname}: Image {version} downloaded, waiting {retry_interval} seconds for it to load "
+            "into the software manager.",
+        )
+        self.state["downloads"].pop(0)
+        self.state["software_job"] = None
+        return self._wait(retry_interval, "download")
+
+    def step_ha_sync(self):
+        device = self.device
+        if not device["db_device"].ha_enabled:
+            return self._next("pre_checks")
+
+        self.upgrade_job.get_ha_status(device=device)
+        group = self.upgrade_job.ha_details["result"]["group"]
+
+        if group["local-info"]["state"] == "suspended":
+            return self._fail("Target device is in a suspended HA state.")
+
+        if group["running-sync"] != "synchronized":
+            return self._retry(
+                step="ha_sync",
+                maximum_attempts=self.upgrade_job.profile["snapshots"][
+                    "maximum_attempts"
+                ],
+                retry_interval=self.upgrade_job.profile["snapshots"]["retry_interval"],
+                message="HA synchronization still in progress.",
+            )
+
+        self.upgrade_job.logger.log_task(
+            action="success",
+            message=f"{self.hostname}: HA synchronization complete.",
+        )
+
+        # Compare the local and peer PAN-OS versions
+        if self.upgrade_job.primary_device is None:
+            return self._next("pre_checks")
+        version_comparison = self.upgrade_job.compare_versions(
+            hostname=self.hostname,
+            local_version_sliced=parse_version(version=device["db_device"].sw_version),
+            peer_version_sliced=parse_version(
+                version=self.upgrade_job.primary_device["db_device"].sw_version
+            ),
+        )
+        if version_comparison == "newer":
+            return self._fail("Target device is on a newer version than its peer.")
+
+        return self._next("pre_checks")
+
+    def step_pre_checks(self):
+        device = self.device
+        primary_device = self.upgrade_job.primary_device
+
+        # Prepare both members of an HA pair at once, so only suspension, install and reboot are serialized
+        if (
+            self.state["device_index"] == 0
+            and primary_device
+            and settings.UPGRADE_HA_PARALLEL_PREWORK
+        ):
+            status = run_ha_prework_concurrently(
+                upgrade_job=self.upgrade_job,
+                preparations=[
+                    functools.partial(prepare_device, device=device),
+                    functools.partial(prepare_device, device=primary_device),
+                ],
+            )
+            if status:
+                return "done", status
+            self.state["primary_prepared"] = True
+
+        elif self.state["device_index"] == 0 or not self.state.get("primary_prepared"):
+            self.upgrade_job.perform_readiness_checks(device=device)
+            if not self.upgrade_job.readiness_checks_succeeded:
+                return self._fail("Readiness checks failed before the upgrade.")
+
+            self.upgrade_job.take_snapshot(device=device, snapshot_type="pre")
+            if not self.upgrade_job.snapshot_succeeded:
+                return self._fail(
+                    "Snapshot failed to complete successfully before the upgrade initiated."
+                )
+
+        if self.state["dry_run"]:
+            self.upgrade_job.logger.log_task(
+                action="skipped",
+                message=f"{self.hostname}: Dry run mode enabled. Skipping HA suspension, upgrade and reboot.",
+            )
+            return self._next("complete")
+
+        # Suspend the HA state of the first device of an HA pair before it is upgraded
+        if self.state["device_index"] == 0 and not self.upgrade_job.standalone_device:
+            self.upgrade_job.logger.log_task(
+                action="start",
+                message=f"{self.hostname}: Suspending the HA state of device",
+            )
+            self.upgrade_job.suspend_ha_device(device=device)
+
+        return self._next("install")
+
+    def step_install(self):
+        device = self.device
+        retry_interval = self.upgrade_job.profile["install"]["retry_interval"]
+
+        waiting = self._claim_slot("install")
+        if waiting:
+            return waiting
+
+        self.upgrade_job.update_device_status(device, "active")
+        try:
+            self.state["software_job"] = self.upgrade_job.request_software_job(
+                device=device,
+                operation="install",
+                target_version=self.state["target_version"],
+            )
+        except Exception as e:
+            return self._retry(
+                step="install",
+                maximum_attempts=self.upgrade_job.profile["install"][
+                    "maximum_attempts"
+                ],
+                retry_interval=retry_interval,
+                message=f"Failed to start the install: {str(e)}.",
+            )
+
+        self.state["step"] = "await_install"
+        return "wait", retry_interval
+
+    def step_await_install(self):
+        finished = self.upgrade_job.check_software_job(
+            device=self.device,
+            job_id=self.state["software_job"],
+        )
+
+        if finished is None:
+            return "wait", self.upgrade_job.profile["install"]["retry_interval"]
+
+        if not finished:
+            return self._retry(
+                step="install",
+                maximum_attempts=self.upgrade_job.profile["install"][
+                    "maximum_attempts"
+                ],
+                retry_interval=self.upgrade_job.profile["install"]["retry_interval"],
+                message=f"Install of {self.state['target_version']} failed.",
+            )
+
+        self.state["software_job"] = None
+        return self._next("reboot")
+
+    def step_reboot(self):
+        self.upgrade_job.request_reboot(
+            device=self.device,
+            target_version=self.state["target_version"],
+        )
+        return self._wait(self.REBOOT_GRACE_PERIOD, "await_reboot")
+
+    def step_await_reboot(self):
+        rebooted = self.upgrade_job.check_reboot(
+            device=self.device,
+            target_version=self.state["target_version"],
+        )
+
+        if rebooted is None:
+            return self._retry(
+                step="await_reboot",
+                maximum_attempts=self.upgrade_job.profile["reboot"]["maximum_attempts"],
+                retry_interval=self.upgrade_job.profile["reboot"]["retry_interval"],
+                message="Device is not back online yet.",
+            )
+
+        if not rebooted:
+            return self._fail(
+                f"Device rebooted but is not running {self.state['target_version']}."
+            )
+
+        self.upgrade_job.logger.log_task(
+            action="working",
+            message=f"{self.hostname}: Waiting {self.POST_REBOOT_SETTLE_TIME} seconds for the device to become "
+            "ready for the post upgrade snapshot.",
+        )
+        return self._wait(self.POST_REBOOT_SETTLE_TIME, "post_snapshot")
+
+    def step_post_snapshot(self):
+        release_batch_slot(self.job_id, "install")
+        self.upgrade_job.take_snapshot(device=self.device, snapshot_type="post")
+        if not self.upgrade_job.snapshot_succeeded:
+            return self._fail(
+                "Snapshot failed to complete successfully after the upgrade completed."
+            )
+
+        return self._next("compare")
+
+    def step_compare(self):
+        self.upgrade_job.report_snapshot_diff(device=self.device)
+        return self._next("complete")
+
+    def step_complete(self):
+        self.upgrade_job.update_device_status(self.device, "completed")
+
+        # Continue with the primary device of an HA pair once the secondary device is done
+        if self.state["device_index"] == 0 and self.upgrade_job.primary_device:
+            self.state["device_index"] = 1
+            self.upgrade_job.update_current_step(
+                device_name=self.hostname,
+                step_name="Beginning upgrade workflow on active device",
+            )
+            return self._next("pre_checks")
+
+        self.upgrade_job.update_current_step(
+            device_name=self.hostname,
+            step_name="Upgrade Completed!",
+        )
+        return "done", "completed"
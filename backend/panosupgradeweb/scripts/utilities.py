@@ -1,5 +1,5 @@
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Tuple
 from xml.etree import ElementTree as ET
 
 
@@ -113,63 +113,6 @@ def parse_version(
     return major, minor, maintenance, hotfix
 
 
-def find_devicegroup_by_serial(
-    data: List[Dict],
-    serial: str,
-) -> Optional[str]:
-    """
-    Find the device group name for a given device serial number.
-
-    This function iterates through a list of dictionaries representing device groups and their associated devices.
-    It searches for a device with the specified serial number and returns the name of the device group if found.
-
-    Args:
-        data (List[Dict]): A list of dictionaries containing device group information and associated devices.
-                           Each dictionary should have the following structure:
-                           {
-                               "@name": "device_group_name",
-                               "devices": [
-                                   {
-                                       "serial": "device_serial_number",
-                                       ...
-                                   },
-                                   ...
-                               ],
-                               ...
-                           }
-        serial (str): The serial number of the device to search for.
-
-    Returns: Optional[str]: The name of the device group if the device with the specified serial number is found,
-    None otherwise.
-
-    Mermaid Workflow:
-        ```mermaid
-        graph TD
-            A[Start] --> B{Iterate through data}
-            B --> C{Device group has "devices" key?}
-            C -->|Yes| D{Iterate through devices}
-            C -->|No| B
-            D --> E{Device serial matches target serial?}
-            E -->|Yes| F[Return device group name]
-            E -->|No| D
-            D --> B
-            B --> G{All device groups checked?}
-            G -->|Yes| H[Return None]
-            G -->|No| B
-        ```
-    """
-    for entry in data:
-        # Check if the device group has a "devices" key
-        if "devices" in entry:
-            for device in entry["devices"]:
-                # Check if the device serial matches the target serial
-                if device["serial"] == serial:
-                    return entry["@name"]
-
-    # Return None if the device is not found in any device group
-    return None
-
-
 def flatten_xml_to_dict(element: ET.Element) -> dict:
     """
     Converts an XML ElementTree element into a nested dictionary, maintaining its hierarchical structure.
@@ -289,3 +232,31 @@ def get_emoji(action: str) -> str:
         "start": "🚀",
     }
     return emoji_map.get(action, "")
+
+
+def backoff_interval(
+    attempt: int,
+    initial: float,
+    maximum: float,
+    factor: float = 2.0,
+) -> float:
+    """
+    Return the wait before the next poll of a long-running operation, growing exponentially with each attempt.
+
+    Args:
+        attempt (int): The number of polls already made, starting at 0.
+        initial (float): The wait before the first poll, in seconds.
+        maximum (float): The longest wait, in seconds.
+        factor (float): The factor the wait grows by after each poll.
+
+    Returns:
+        float: The number of seconds to wait.
+
+    Example:
+        ```python
+        [backoff_interval(attempt, initial=5, maximum=60) for attempt in range(5)]
+        [5, 10, 20, 40, 60]
+        ```
+    """
+    # Cap the exponent so large attempt counts do not overflow
+    return min(maximum, initial * factor ** min(attempt, 32))
@@ -0,0 +1,664 @@
+# backend/panosupgradeweb/scripts/xml_api.py
+
+import asyncio
+import contextlib
+import shlex
+import tempfile
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from xml.etree import ElementTree as ET
+
+# Third party imports
+import httpx
+
+# Django imports
+from django.conf import settings
+
+# pan-os-upgrade-web imports
+from panosupgradeweb.scripts.api_keys import get_api_key_cache
+from panosupgradeweb.scripts.rate_limit import get_panorama_rate_limiter
+from panosupgradeweb.scripts.utilities import flatten_xml_to_dict
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class XmlApiError(Exception):
+    """Raised when the PAN-OS XML API returns an error response or cannot be reached."""
+
+
+class XmlApiAuthError(XmlApiError):
+    """Raised when the PAN-OS XML API rejects the API key or credentials of a request."""
+
+
+def cmd_to_xml(cmd: str) -> str:
+    """
+    Convert an operational command into its XML representation.
+
+    Each unquoted word opens a nested element and a quoted word becomes the text of the innermost element, which
+    mirrors the conversion pan-os-python performs with `cmd_xml=True`.
+
+    Args:
+        cmd (str): The operational command, for example 'show jobs id "12"'.
+
+    Returns:
+        str: The XML command, for example '<show><jobs><id>12</id></jobs></show>'.
+
+    Example:
+        ```python
+        cmd_to_xml("show system info")
+        '<show><system><info></info></system></show>'
+        ```
+    """
+    lexer = shlex.shlex(cmd, posix=False)
+    lexer.whitespace_split = True
+
+    tags = []
+    text = ""
+    for token in lexer:
+        if token[0] in ("'", '"') and token[-1] == token[0]:
+            text = token[1:-1]
+        else:
+            tags.append(token)
+
+    opening = "".join(f"<{tag}>" for tag in tags)
+    closing = "".join(f"</{tag}>" for tag in reversed(tags))
+    return f"{opening}{text}{closing}"
+
+
+def entry_to_dict(entry: ET.Element) -> Dict:
+    """
+    Convert a list entry of an XML API response into a dictionary.
+
+    The children are converted with `flatten_xml_to_dict`, and the attributes of the entry itself, such as its name,
+    are added with a leading '@'.
+
+    Args:
+        entry (ET.Element): The `<entry>` element.
+
+    Returns:
+        Dict: The entry as a dictionary.
+
+    Example:
+        ```python
+        entry_to_dict(ET.fromstring('<entry name="001"><serial>001</serial></entry>'))
+        {'@name': '001', 'serial': '001'}
+        ```
+    """
+    return {
+        **{f"@{name}": value for name, value in entry.attrib.items()},
+        **flatten_xml_to_dict(element=entry),
+    }
+
+
+class XmlEntryParser:
+    """
+    An incremental parser of an XML API response that yields its list entries while the response is received.
+
+    Only the entries at `path` below the `<response>` element are yielded, each as soon as its closing tag is parsed.
+    A yielded entry is cleared and detached from the tree when the next one is requested, so however long the list,
+    only the entry being processed is held in memory. The rest of the response, such as the error message of a
+    failed request, is kept and checked by `close()`.
+
+    Example:
+        ```python
+        parser = XmlEntryParser("result/devices/entry", hostname="panorama")
+        for chunk in chunks:
+            for entry in parser.feed(chunk):
+                print(entry.findtext("serial"))
+        for entry in parser.close():
+            print(entry.findtext("serial"))
+        ```
+
+    Attributes:
+        hostname (str): The appliance the response comes from, used in error messages.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hostname: str = "",
+    ):
+        self.hostname = hostname
+        self._path = ["response"] + path.strip("/").split("/")
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+        self._stack = []
+        self._tags = []
+
+    def feed(self, data: bytes) -> Iterator[ET.Element]:
+        """
+        Parse a chunk of the response and yield the entries it completes.
+
+        Args:
+            data (bytes): The next chunk of the response body.
+
+        Returns:
+            Iterator[ET.Element]: The completed `<entry>` elements, in document order.
+
+        Raises:
+            XmlApiError: If the response is not well-formed XML.
+        """
+        try:
+            self._parser.feed(data)
+        except ET.ParseError as e:
+            raise XmlApiError(f"{self.hostname}: invalid XML response: {str(e)}") from e
+
+        yield from self._read_entries()
+
+    def close(self) -> Iterator[ET.Element]:
+        """
+        Finish parsing the response, yielding the entries left, then check its status.
+
+        Returns:
+            Iterator[ET.Element]: The remaining `<entry>` elements.
+
+        Raises:
+            XmlApiError: If the response is incomplete or its status is not 'success'.
+            XmlApiAuthError: If the appliance rejected the API key.
+        """
+        try:
+            self._parser.close()
+        except ET.ParseError as e:
+            raise XmlApiError(f"{self.hostname}: invalid XML response: {str(e)}") from e
+
+        yield from self._read_entries()
+
+        if self._root is None:
+            raise XmlApiError(f"{self.hostname}: empty XML response")
+
+        if self._root.get("code") == "403":
+            raise XmlApiAuthError(f"{self.hostname}: invalid credentials")
+
+        if self._root.get("status") != "success":
+            message = " ".join(
+                text.strip() for text in self._root.itertext() if text and text.strip()
+            )
+            raise XmlApiError(f"{self.hostname}: {message or 'request failed'}")
+
+    def _read_entries(self) -> Iterator[ET.Element]:
+        """Process the pending parser events, yielding then discarding the entries at `path`."""
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+                self._stack.append(element)
+                self._tags.append(element.tag)
+                continue
+
+            matched = self._tags == self._path
+            self._stack.pop()
+            self._tags.pop()
+            if not matched or self._root.get("status") != "success":
+                continue
+
+            yield element
+            element.clear()
+            self._stack[-1].remove(element)
+
+
+class AsyncXmlApiClient:
+    """
+    An asyncio client for the PAN-OS XML API.
+
+    A single client keeps one keep-alive connection pool to a firewall or Panorama appliance, so many requests can
+    be in flight at once from a single worker. Requests for firewalls managed by Panorama are proxied by passing the
+    firewall serial number as `target`. Set `rate_limited` when the client connects to a Panorama appliance, so its
+    requests go through the rate limiter shared by every worker talking to that appliance.
+
+    When `profile_uuid` is provided, the API key is taken from the shared API key cache of the profile, and a newly
+    generated key is stored there, so repeated connections skip the `type=keygen` request.
+
+    The client is used as an async context manager:
+
+        ```python
+        async with AsyncXmlApiClient("10.0.0.1", username="admin", password="secret") as client:
+            system_info = await client.show_system_info()
+        ```
+
+    Attributes:
+        api_key (Optional[str]): The API key, generated on first use when only credentials were provided.
+        hostname (str): The hostname or IP address of the appliance.
+        profile_uuid (Optional[str]): The UUID of the profile the credentials come from, enabling the API key cache.
+        rate_limited (bool): Whether requests go through the Panorama rate limiter of `hostname`.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        port: int = 443,
+        scheme: str = "https",
+        timeout: Optional[float] = None,
+        verify: Optional[bool] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        profile_uuid: Optional[str] = None,
+        rate_limited: bool = False,
+    ):
+        self.api_key = api_key
+        self.hostname = hostname
+        self.password = password
+        self.profile_uuid = profile_uuid
+        self.rate_limited = rate_limited
+        self.username = username
+        self.url = f"{scheme}://{hostname}:{port}/api/"
+
+        self._client = client or httpx.AsyncClient(
+            timeout=(
+                timeout
+                if timeout is not None
+                else getattr(settings, "PANOS_XML_API_TIMEOUT", 60.0)
+            ),
+            verify=(
+                verify
+                if verify is not None
+                else getattr(settings, "PANOS_XML_API_VERIFY_SSL", False)
+            ),
+        )
+        self._keygen_lock = asyncio.Lock()
+        self._api_key_from_cache = False
+
+    async def __aenter__(self) -> "AsyncXmlApiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the underlying connection pool."""
+        await self._client.aclose()
+
+    async def _request(self, params: Dict[str, str]) -> ET.Element:
+        """
+        Send a request to the XML API and return the parsed response.
+
+        Args:
+            params (Dict[str, str]): The form parameters of the request.
+
+        Returns:
+            ET.Element: The root `<response>` element of a successful response.
+
+        Raises:
+            XmlApiError: If the appliance cannot be reached or the response status is not 'success'.
+            XmlApiAuthError: If the appliance rejected the API key or credentials.
+        """
+        try:
+            if self.rate_limited:
+                async with get_panorama_rate_limiter().limit_async(self.hostname):
+                    response = await self._client.post(self.url, data=params)
+            else:
+                response = await self._client.post(self.url, data=params)
+            if response.status_code == 403:
+                raise XmlApiAuthError(f"{self.hostname}: invalid credentials")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise XmlApiError(f"{self.hostname}: {str(e)}") from e
+
+        try:
+            root = ET.fromstring(response.content)
+        except ET.ParseError as e:
+            raise XmlApiError(f"{self.hostname}: invalid XML response: {str(e)}") from e
+
+        if root.get("code") == "403":
+            raise XmlApiAuthError(f"{self.hostname}: invalid credentials")
+
+        if root.get("status") != "success":
+            message = " ".join(
+                text.strip() for text in root.itertext() if text and text.strip()
+            )
+            raise XmlApiError(f"{self.hostname}: {message or 'request failed'}")
+
+        return root
+
+    async def _stream_request(
+        self,
+        params: Dict[str, str],
+        path: str,
+    ) -> AsyncIterator[ET.Element]:
+        """
+        Send a request to the XML API and yield the entries at `path` of the response.
+
+        The response body is spooled to a temporary file, kept in memory up to `PANOS_XML_API_SPOOL_SIZE` bytes, while
+        the in-flight slot of the rate limiter is held. The slot is released once the body has been received and before
+        the first entry is yielded, so the time the caller spends processing the entries never holds it.
+
+        Args:
+            params (Dict[str, str]): The form parameters of the request.
+            path (str): The path of the entries below the `<response>` element, see `XmlEntryParser`.
+
+        Returns:
+            AsyncIterator[ET.Element]: The `<entry>` elements, each valid until the next one is requested.
+
+        Raises:
+            XmlApiError: If the appliance cannot be reached or the response status is not 'success'.
+            XmlApiAuthError: If the appliance rejected the API key or credentials.
+        """
+        parser = XmlEntryParser(path, hostname=self.hostname)
+        limit = (
+            get_panorama_rate_limiter().limit_async(self.hostname)
+            if self.rate_limited
+            else contextlib.nullcontext()
+        )
+        with tempfile.SpooledTemporaryFile(
+            max_size=getattr(settings, "PANOS_XML_API_SPOOL_SIZE", 8 * 1024 * 1024)
+        ) as body:
+            try:
+                async with limit:
+                    async with self._client.stream(
+                        "POST", self.url, data=params
+                    ) as response:
+                        if response.status_code == 403:
+                            raise XmlApiAuthError(
+                                f"{self.hostname}: invalid credentials"
+                            )
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes():
+                            body.write(chunk)
+            except httpx.HTTPError as e:
+                raise XmlApiError(f"{self.hostname}: {str(e)}") from e
+
+            body.seek(0)
+            while chunk := body.read(64 * 1024):
+                for entry in parser.feed(chunk):
+                    yield entry
+
+        for entry in parser.close():
+            yield entry
+
+    async def keygen(self) -> str:
+        """
+        Generate an API key from the username and password of the client.
+
+        Returns:
+            str: The generated API key, which is also stored on the client.
+
+        Raises:
+            XmlApiError: If no credentials were provided or the appliance rejected them.
+        """
+        if not self.username or not self.password:
+            raise XmlApiError(f"{self.hostname}: no API key or credentials provided")
+
+        root = await self._request(
+            {"type": "keygen", "user": self.username, "password": self.password}
+        )
+        key = root.find("./result/key")
+        if key is None or not key.text:
+            raise XmlApiError(f"{self.hostname}: keygen response has no key")
+
+        self.api_key = key.text
+        return self.api_key
+
+    def _cache_args(self) -> Optional[Tuple[str, str, str, str]]:
+        """Return the API key cache arguments of the client, or None when the cache does not apply."""
+        if not self.profile_uuid or not self.username or not self.password:
+            return None
+        return self.hostname, self.profile_uuid, self.username, self.password
+
+    async def ensure_api_key(self) -> str:
+        """
+        Return the API key of the client, reusing a cached key before falling back to keygen.
+
+        Returns:
+            str: The API key, which is also stored on the client.
+        """
+        async with self._keygen_lock:
+            if self.api_key is not None:
+                return self.api_key
+
+            cache_args = self._cache_args()
+            if cache_args:
+                self.api_key = get_api_key_cache().get(*cache_args)
+                self._api_key_from_cache = self.api_key is not None
+
+            if self.api_key is None:
+                await self.keygen()
+                if cache_args:
+                    get_api_key_cache().set(*cache_args, self.api_key)
+
+            return self.api_key
+
+    async def op(
+        self,
+        cmd: str,
+        target: Optional[str] = None,
+        cmd_xml: bool = True,
+    ) -> ET.Element:
+        """
+        Run an operational command.
+
+        Args:
+            cmd (str): The operational command, as text or as XML when `cmd_xml` is False.
+            target (Optional[str]): The serial number of a Panorama-managed firewall to proxy the command to.
+            cmd_xml (bool): Whether to convert `cmd` from text to XML before sending it.
+
+        Returns:
+            ET.Element: The root `<response>` element, matching what pan-os-python's `op()` returns.
+        """
+        api_key = await self.ensure_api_key()
+
+        params = {
+            "type": "op",
+            "cmd": cmd_to_xml(cmd) if cmd_xml else cmd,
+            "key": api_key,
+        }
+        if target:
+            params["target"] = target
+
+        try:
+            return await self._request(params)
+        except XmlApiAuthError:
+            if not self._api_key_from_cache:
+                raise
+
+        # The cached key may have been revoked, drop it and retry once with a freshly generated key
+        async with self._keygen_lock:
+            if self._api_key_from_cache and self.api_key == api_key:
+                get_api_key_cache().invalidate(*self._cache_args())
+                self.api_key = None
+                self._api_key_from_cache = False
+
+        params["key"] = await self.ensure_api_key()
+        return await self._request(params)
+
+    async def op_entries(
+        self,
+        cmd: str,
+        path: str,
+        target: Optional[str] = None,
+        cmd_xml: bool = True,
+    ) -> AsyncIterator[ET.Element]:
+        """
+        Run an operational command returning a list, and yield its entries one at a time.
+
+        Unlike `op()`, the response is never parsed into memory as a whole, which matters for the listings of a
+        Panorama appliance managing thousands of firewalls. The body is spooled while the rate limiter slot is held and
+        parsed after it is released, see `_stream_request()`.
+
+        Args:
+            cmd (str): The operational command, as text or as XML when `cmd_xml` is False.
+            path (str): The path of the entries below the `<response>` element, e.g. "result/devices/entry".
+            target (Optional[str]): The serial number of a Panorama-managed firewall to proxy the command to.
+            cmd_xml (bool): Whether to convert `cmd` from text to XML before sending it.
+
+        Returns:
+            AsyncIterator[ET.Element]: The `<entry>` elements, each valid until the next one is requested.
+
+        Example:
+            ```python
+            async for entry in client.op_entries("show devices connected", "result/devices/entry"):
+                print(entry.findtext("serial"))
+            ```
+        """
+        api_key = await self.ensure_api_key()
+
+        params = {
+            "type": "op",
+            "cmd": cmd_to_xml(cmd) if cmd_xml else cmd,
+            "key": api_key,
+        }
+        if target:
+            params["target"] = target
+
+        # An authentication error is raised before any entry is yielded, so the request can safely be retried
+        try:
+            async for entry in self._stream_request(params, path):
+                yield entry
+            return
+        except XmlApiAuthError:
+            if not self._api_key_from_cache:
+                raise
+
+        # The cached key may have been revoked, drop it and retry once with a freshly generated key
+        async with self._keygen_lock:
+            if self._api_key_from_cache and self.api_key == api_key:
+                get_api_key_cache().invalidate(*self._cache_args())
+                self.api_key = None
+                self._api_key_from_cache = False
+
+        params["key"] = await self.ensure_api_key()
+        async for entry in self._stream_request(params, path):
+            yield entry
+
+    async def show_system_info(self, target: Optional[str] = None) -> Dict:
+        """
+        Retrieve the system information of the appliance or of a proxied firewall.
+
+        Args:
+            target (Optional[str]): The serial number of a Panorama-managed firewall.
+
+        Returns:
+            Dict: The system information in the same shape as pan-os-python's `show_system_info()`, i.e.
+            `{"system": {"hostname": ..., "sw-version": ..., ...}}`.
+        """
+        root = await self.op("show system info", target=target)
+        return flatten_xml_to_dict(element=root.find("./result"))
+
+    async def show_highavailability_state(
+        self,
+        target: Optional[str] = None,
+    ) -> Tuple[str, Optional[ET.Element]]:
+        """
+        Retrieve the HA state of the appliance or of a proxied firewall.
+
+        Args:
+            target (Optional[str]): The serial number of a Panorama-managed firewall.
+
+        Returns:
+            Tuple[str, Optional[ET.Element]]: The local HA state and the full response element, or
+            `("disabled", None)` when HA is not enabled, matching pan-os-python's `show_highavailability_state()`.
+        """
+        root = await self.op("show high-availability state", target=target)
+        enabled = root.find("./result/enabled")
+        if enabled is None or enabled.text != "yes":
+            return "disabled", None
+
+        state = root.find("./result/group/local-info/state")
+        return (state.text if state is not None else "unknown"), root
+
+    async def check_software(self, target: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Refresh and return the PAN-OS versions available to the appliance.
+
+        Args:
+            target (Optional[str]): The serial number of a Panorama-managed firewall.
+
+        Returns:
+            Dict[str, Dict]: The available versions keyed by version string, in the same shape as pan-os-python's
+            `software.versions` after `software.check()`; 'yes'/'no' flags are converted to booleans.
+        """
+        root = await self.op("request system software check", target=target)
+
+        versions = {}
+        for entry in root.findall("./result/sw-updates/versions/entry"):
+            version = {
+                child.tag: (
+                    child.text == "yes"
+                    if child.text in ("yes", "no")
+                    else (child.text or "").strip()
+                )
+                for child in entry
+            }
+            versions[version["version"]] = version
+
+        return versions
+
+
+def iter_op_entries(
+    hostname: str,
+    cmd: str,
+    path: str,
+    target: Optional[str] = None,
+    **client_kwargs,
+) -> Iterator[ET.Element]:
+    """
+    Run `AsyncXmlApiClient.op_entries()` from synchronous code, such as the inventory sync.
+
+    The client runs on a private event loop that is advanced one entry at a time, so the caller processes each entry
+    before the next one is parsed.
+
+    Args:
+        hostname (str): The firewall or Panorama appliance to connect to.
+        cmd (str): The operational command.
+        path (str): The path of the entries below the `<response>` element, e.g. "result/devices/entry".
+        target (Optional[str]): The serial number of a Panorama-managed firewall to proxy the command to.
+        **client_kwargs: The keyword arguments of `AsyncXmlApiClient`, e.g. `api_key` and `rate_limited`.
+
+    Returns:
+        Iterator[ET.Element]: The `<entry>` elements, each valid until the next one is requested.
+    """
+    loop = asyncio.new_event_loop()
+    client = AsyncXmlApiClient(hostname, **client_kwargs)
+    entries = client.op_entries(cmd, path, target=target)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(entries.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(entries.aclose())
+        loop.run_until_complete(client.close())
+        loop.close()
+
+
+async def gather_bounded(
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    limit: int,
+) -> List[R]:
+    """
+    Await `func(item)` for every item with at most `limit` calls in flight.
+
+    Exceptions are returned in place of results, as with `asyncio.gather(..., return_exceptions=True)`, so one
+    unreachable device does not cancel the others.
+
+    Args:
+        func (Callable[[T], Awaitable[R]]): The coroutine function to call for each item.
+        items (Iterable[T]): The items to process.
+        limit (int): The maximum number of concurrent calls.
+
+    Returns:
+        List[R]: The results (or exceptions) in the order of `items`.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(
+        *(_run(item) for item in items),
+        return_exceptions=True,
+    )
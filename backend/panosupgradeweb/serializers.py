@@ -17,7 +17,11 @@ from .models import (
     Route,
     SessionStats,
     Snapshot,
+    StagedImage,
+    UpgradeBatch,
+    UpgradeBatchDevice,
 )
+from .scripts.upgrade_batch import plan_waves
 
 
 class CustomTokenSerializer(TokenSerializer):
@@ -210,10 +214,25 @@ class DeviceUpgradeSerializer(serializers.Serializer):
     target_version = serializers.CharField(required=True)
 
 
+class ImagePrestageSerializer(serializers.Serializer):
+    author = serializers.IntegerField(required=True)
+    devices = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    profile = serializers.UUIDField(required=True)
+    target_version = serializers.CharField(required=True)
+    verify = serializers.BooleanField(required=False, default=False)
+
+
 class InventorySyncSerializer(serializers.Serializer):
     author = serializers.IntegerField(required=True)
     panorama_device = serializers.UUIDField(required=True)
     profile = serializers.UUIDField(required=True)
+    fast = serializers.BooleanField(required=False, default=True)
+
+
+class InventorySyncAllSerializer(serializers.Serializer):
+    author = serializers.IntegerField(required=True)
+    profile = serializers.UUIDField(required=True)
+    fast = serializers.BooleanField(required=False, default=True)
 
 
 class JobLogEntrySerializer(serializers.ModelSerializer):
@@ -223,11 +242,13 @@ class JobLogEntrySerializer(serializers.ModelSerializer):
             "timestamp",
             "severity_level",
             "message",
+            "sequence_number",
         )
 
 
 class JobSerializer(serializers.ModelSerializer):
     task_id = serializers.CharField(read_only=True)
+    panoramas = serializers.SerializerMethodField()
 
     class Meta:
         model = Job
@@ -239,8 +260,13 @@ class JobSerializer(serializers.ModelSerializer):
             "job_status",
             "job_type",
             "current_step",
+            "panoramas",
         )
 
+    def get_panoramas(self, obj):
+        # The status of each Panorama device of an inventory sync of all Panorama devices
+        return (obj.workflow_state or {}).get("panoramas")
+
 
 class UserSerializer(serializers.ModelSerializer):
     profile_image = serializers.SerializerMethodField()
@@ -265,6 +291,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 class ProfileSerializer(serializers.ModelSerializer):
     authentication = serializers.SerializerMethodField()
+    concurrency = serializers.SerializerMethodField()
     download = serializers.SerializerMethodField()
     install = serializers.SerializerMethodField()
     readiness_checks = serializers.SerializerMethodField()
@@ -279,6 +306,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             "description",
             "name",
             "authentication",
+            "concurrency",
             "download",
             "install",
             "readiness_checks",
@@ -293,6 +321,13 @@ class ProfileSerializer(serializers.ModelSerializer):
             "pan_password": obj.pan_password,
         }
 
+    def get_concurrency(self, obj):
+        return {
+            "inventory_sync_panorama_workers": obj.inventory_sync_panorama_workers,
+            "inventory_sync_workers": obj.inventory_sync_workers,
+            "prestage_workers": obj.prestage_workers,
+        }
+
     def get_download(self, obj):
         return {
             "max_download_tries": obj.max_download_tries,
@@ -352,6 +387,7 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     def to_internal_value(self, data):
         authentication_data = data.get("authentication", {})
+        concurrency_data = data.get("concurrency", {})
         download_data = data.get("download", {})
         install_data = data.get("install", {})
         readiness_checks_data = data.get("readiness_checks", {})
@@ -425,6 +461,16 @@ class ProfileSerializer(serializers.ModelSerializer):
                 "connection_timeout": timeout_settings_data.get("connection_timeout"),
             }
         )
+
+        # Concurrency settings are optional and keep their model defaults when omitted
+        for field in (
+            "inventory_sync_panorama_workers",
+            "inventory_sync_workers",
+            "prestage_workers",
+        ):
+            if concurrency_data.get(field) is not None:
+                internal_value[field] = concurrency_data[field]
+
         return internal_value
 
     def to_representation(self, instance):
@@ -488,11 +534,29 @@ class SessionStatsSerializer(serializers.ModelSerializer):
 
 
 class SnapshotSerializer(serializers.ModelSerializer):
+    """
+    A snapshot with its nested tables.
+
+    The serializer context may hold `fields`, the only fields to return, and `expand`, the nested tables to include
+    ("all" includes every table). Without `expand` every nested table is returned; with it, tables not listed are
+    left out, so a summary is serialized without touching the child tables.
+    """
+
+    # Fields holding the rows of a child table
+    NESTED_FIELDS = (
+        "content_versions",
+        "licenses",
+        "network_interfaces",
+        "arp_table_entries",
+        "routes",
+        "session_stats",
+    )
+
     content_versions = ContentVersionSerializer(many=True, read_only=True)
     licenses = LicenseSerializer(many=True, read_only=True)
     network_interfaces = NetworkInterfaceSerializer(many=True, read_only=True)
-    arp_table_entries = ArpTableEntrySerializer(many=True, read_only=True)
-    routes = RouteSerializer(many=True, read_only=True)
+    arp_table_entries = serializers.SerializerMethodField()
+    routes = serializers.SerializerMethodField()
     session_stats = SessionStatsSerializer(many=True, read_only=True)
     device_hostname = serializers.CharField(source="device.hostname", read_only=True)
 
@@ -513,6 +577,39 @@ class SnapshotSerializer(serializers.ModelSerializer):
             "session_stats",
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        expand = self.context.get("expand")
+        if expand is not None and "all" not in expand:
+            for name in self.NESTED_FIELDS:
+                if name not in expand:
+                    self.fields.pop(name)
+
+        fields = self.context.get("fields")
+        if fields:
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+    @staticmethod
+    def get_arp_table_entries(instance):
+        if instance.storage_format == "compressed":
+            return instance.get_table_rows("arp_table_entries")
+        return ArpTableEntrySerializer(
+            instance.arp_table_entries.all(),
+            many=True,
+        ).data
+
+    @staticmethod
+    def get_routes(instance):
+        if instance.storage_format == "compressed":
+            return instance.get_table_rows("routes")
+        return RouteSerializer(
+            instance.routes.all(),
+            many=True,
+        ).data
+
 
 class PanosVersionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -537,3 +634,115 @@ class PanosVersionSyncSerializer(serializers.Serializer):
     author = serializers.IntegerField(required=True)
     device = serializers.UUIDField(required=True)
     profile = serializers.UUIDField(required=True)
+
+
+class StagedImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StagedImage
+        fields = (
+            "version",
+            "status",
+            "verified",
+            "job",
+            "updated_at",
+        )
+
+
+class UpgradeBatchDeviceSerializer(serializers.ModelSerializer):
+    hostname = serializers.CharField(source="device.hostname", read_only=True)
+
+    class Meta:
+        model = UpgradeBatchDevice
+        fields = (
+            "device",
+            "hostname",
+            "wave",
+            "task_id",
+            "status",
+            "phase",
+        )
+
+
+class UpgradeBatchSerializer(serializers.ModelSerializer):
+    devices = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        write_only=True,
+    )
+    members = UpgradeBatchDeviceSerializer(
+        source="devices",
+        many=True,
+        read_only=True,
+    )
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UpgradeBatch
+        fields = (
+            "uuid",
+            "author",
+            "created_at",
+            "updated_at",
+            "profile",
+            "target_version",
+            "dry_run",
+            "wave_by",
+            "max_concurrent_installs",
+            "max_concurrent_downloads_per_panorama",
+            "max_failure_rate",
+            "current_wave",
+            "status",
+            "devices",
+            "members",
+            "progress",
+        )
+        read_only_fields = (
+            "uuid",
+            "author",
+            "created_at",
+            "updated_at",
+            "current_wave",
+            "status",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get("members", True):
+            self.fields.pop("members")
+
+    def get_progress(self, obj):
+        return obj.progress()
+
+    def validate_devices(self, value):
+        devices = Device.objects.select_related("platform").in_bulk(value)
+        missing = [
+            str(device_uuid) for device_uuid in value if device_uuid not in devices
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f"Invalid device UUIDs: {', '.join(missing)}"
+            )
+        # Drop duplicates while keeping the requested order
+        return list(
+            {device_uuid: devices[device_uuid] for device_uuid in value}.values()
+        )
+
+    def validate_max_concurrent_installs(self, value):
+        if value < 1:
+            raise serializers.ValidationError("At least one install must be allowed.")
+        return value
+
+    def validate_max_concurrent_downloads_per_panorama(self, value):
+        if value < 1:
+            raise serializers.ValidationError("At least one download must be allowed.")
+        return value
+
+    def create(self, validated_data):
+        devices = validated_data.pop("devices")
+        batch = UpgradeBatch.objects.create(**validated_data)
+        waves = plan_waves(devices, batch.wave_by)
+        UpgradeBatchDevice.objects.bulk_create(
+            UpgradeBatchDevice(batch=batch, device=device, wave=wave)
+            for device, wave in zip(devices, waves)
+        )
+        return batch
@@ -7,17 +7,26 @@ import logging
 import traceback
 
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from panosupgradeweb.models import Device, Job
+from django.db import transaction
+from panosupgradeweb.models import Device, Job, UpgradeBatch, UpgradeBatchDevice
 
 # import the inventory sync script
 from panosupgradeweb.scripts import (
+    run_image_prestage,
     run_inventory_sync,
+    run_inventory_sync_all,
     run_device_refresh,
     run_panos_version_sync,
     run_upgrade_device,
 )
 
+from panosupgradeweb.scripts.events import publish_job_status
+from panosupgradeweb.scripts.logger import flush_job_logs
+from panosupgradeweb.scripts.upgrade_batch import advance_batch, release_batch_slot
+from panosupgradeweb.scripts.upgrade_device.workflow import UpgradeWorkflow
+
 from celery.exceptions import WorkerTerminate
 
 # ----------------------------------------------------------------------------
@@ -42,6 +51,7 @@ def execute_inventory_sync(
     panorama_device_uuid,
     profile_uuid,
     author_id,
+    fast=True,
 ):
     logging.debug("Inventory sync task started!")
     # Retrieve the user object by id
@@ -60,14 +70,74 @@ def execute_inventory_sync(
     try:
         job.job_status = "running"
         job.save()
+        publish_job_status(job)
 
         job_status = run_inventory_sync(
             author_id=author_id,
             job_id=job.task_id,
             panorama_device_uuid=panorama_device_uuid,
             profile_uuid=profile_uuid,
+            fast=fast,
+        )
+
+        if job_status == "errored":
+            job.job_status = "errored"
+            raise WorkerTerminate()
+        elif job_status == "skipped":
+            job.job_status = "skipped"
+        else:
+            job.job_status = "completed"
+
+    except Exception as e:
+        job.job_status = "errored"
+        logging.error(f"{job.pk}\nError: {e}")
+        logging.error(f"Exception Type: {type(e).__name__}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        raise WorkerTerminate()
+
+    finally:
+        flush_job_logs(job.task_id)
+        job.save()
+        publish_job_status(job)
+
+
+# ----------------------------------------------------------------------------
+# Inventory Sync of All Panorama Devices Task
+# ----------------------------------------------------------------------------
+@shared_task(bind=True)
+def execute_inventory_sync_all(
+    self,
+    profile_uuid,
+    author_id,
+    fast=True,
+):
+    logging.debug("Inventory sync of all Panorama devices task started!")
+    author = User.objects.get(id=author_id)
+    logging.debug(f"Author: {author}")
+
+    job = Job.objects.create(
+        author=author,
+        job_status="pending",
+        job_type="inventory_sync_all",
+        task_id=self.request.id,
+    )
+    logging.debug(f"Job ID: {job.pk}")
+
+    try:
+        job.job_status = "running"
+        job.save()
+        publish_job_status(job)
+
+        job_status = run_inventory_sync_all(
+            author_id=author_id,
+            job_id=job.task_id,
+            profile_uuid=profile_uuid,
+            fast=fast,
         )
 
+        # Reload the status of each Panorama device, written by the script
+        job.refresh_from_db(fields=["workflow_state"])
+
         if job_status == "errored":
             job.job_status = "errored"
             raise WorkerTerminate()
@@ -84,7 +154,9 @@ def execute_inventory_sync(
         raise WorkerTerminate()
 
     finally:
+        flush_job_logs(job.task_id)
         job.save()
+        publish_job_status(job)
 
 
 # ----------------------------------------------------------------------------
@@ -112,6 +184,7 @@ def execute_refresh_device_task(
     try:
         job.job_status = "running"
         job.save()
+        publish_job_status(job)
 
         job_status = run_device_refresh(
             author_id=author_id,
@@ -136,7 +209,9 @@ def execute_refresh_device_task(
         raise WorkerTerminate()
 
     finally:
+        flush_job_logs(job.task_id)
         job.save()
+        publish_job_status(job)
 
 
 # ----------------------------------------------------------------------------
@@ -164,6 +239,7 @@ def execute_panos_version_sync(
     try:
         job.job_status = "running"
         job.save()
+        publish_job_status(job)
 
         job_status = run_panos_version_sync(
             author_id=author_id,
@@ -188,7 +264,66 @@ def execute_panos_version_sync(
         raise WorkerTerminate()
 
     finally:
+        flush_job_logs(job.task_id)
+        job.save()
+        publish_job_status(job)
+
+
+# ----------------------------------------------------------------------------
+# Image Pre-stage Task
+# ----------------------------------------------------------------------------
+@shared_task(bind=True)
+def execute_prestage_task(
+    self,
+    author_id: int,
+    device_uuids: list,
+    profile_uuid: str,
+    target_version: str,
+    verify: bool,
+):
+    logging.debug(f"Image pre-stage task started for {len(device_uuids)} devices")
+    author = User.objects.get(id=author_id)
+    logging.debug(f"Author: {author}")
+
+    job = Job.objects.create(
+        author=author,
+        job_status="pending",
+        job_type="prestage",
+        task_id=self.request.id,
+    )
+    logging.debug(f"Job ID: {job.pk}")
+
+    try:
+        job.job_status = "running"
+        job.save()
+        publish_job_status(job)
+
+        job_status = run_image_prestage(
+            author_id=author_id,
+            device_uuids=device_uuids,
+            job_id=job.task_id,
+            profile_uuid=profile_uuid,
+            target_version=target_version,
+            verify=verify,
+        )
+
+        if job_status == "errored":
+            job.job_status = "errored"
+            raise WorkerTerminate()
+        else:
+            job.job_status = "completed"
+
+    except Exception as e:
+        job.job_status = "errored"
+        logging.error(f"{job.pk}\nError: {e}")
+        logging.error(f"Exception Type: {type(e).__name__}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        raise WorkerTerminate()
+
+    finally:
+        flush_job_logs(job.task_id)
         job.save()
+        publish_job_status(job)
 
 
 # ----------------------------------------------------------------------------
@@ -256,6 +391,20 @@ def execute_upgrade_device_task(
         job.job_status = "running"
         job.target_current_status = "active"
         job.save()
+        publish_job_status(job)
+
+        if settings.UPGRADE_RELEASE_WORKER_DURING_WAITS:
+            # Hand the upgrade over to the stepped workflow, which reschedules itself instead of sleeping
+            job.workflow_state = UpgradeWorkflow.initial_state(
+                author_id=author_id,
+                device_uuid=device_uuid,
+                dry_run=dry_run,
+                profile_uuid=profile_uuid,
+                target_version=target_version,
+            )
+            job.save()
+            advance_upgrade_workflow.delay(job.task_id)
+            return
 
         # Run the PAN-OS upgrade script
         job_status = run_upgrade_device(
@@ -267,15 +416,7 @@ def execute_upgrade_device_task(
             target_version=target_version,
         )
 
-        if job_status == "errored":
-            job.job_status = "errored"
-            job.target_current_status = "errored"
-        elif job_status == "skipped":
-            job.job_status = "skipped"
-            job.target_current_status = "completed"
-        else:
-            job.job_status = "completed"
-            job.target_current_status = "completed"
+        set_upgrade_job_status(job, job_status)
 
     except WorkerTerminate as e:
         job.job_status = "errored"
@@ -293,4 +434,127 @@ def execute_upgrade_device_task(
         raise WorkerTerminate()
 
     finally:
-        job.save()
+        flush_job_logs(job.task_id)
+        # Once handed over to the workflow, the job is saved by advance_upgrade_workflow
+        if job.workflow_state is None or job.job_status == "errored":
+            job.save()
+            publish_job_status(job)
+
+
+@shared_task(bind=True)
+def advance_upgrade_workflow(
+    self,
+    job_id: str,
+):
+    logging.debug(f"Advancing upgrade workflow for job: {job_id}")
+    job = Job.objects.get(task_id=job_id)
+    update_fields = ["updated_at", "workflow_state"]
+    countdown = None
+
+    try:
+        workflow = UpgradeWorkflow(job_id=job_id, state=job.workflow_state)
+        outcome, value = workflow.advance()
+        job.workflow_state = workflow.state
+
+        if outcome == "wait":
+            # Release the worker and pick the workflow up again once the wait is over
+            countdown = value
+        else:
+            set_upgrade_job_status(job, value)
+            update_fields += ["job_status", "target_current_status"]
+
+    except Exception as e:
+        job.job_status = "errored"
+        job.target_current_status = "errored"
+        update_fields += ["job_status", "target_current_status"]
+        logging.debug(f"Job ID: {job.pk}\nError: {e}")
+        logging.error(f"Exception Type: {type(e).__name__}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+
+    finally:
+        # Only save the fields owned by this task, the device statuses and current step are written by the script
+        job.save(update_fields=update_fields)
+        flush_job_logs(job_id)
+        # Queue the next run only once the workflow state is committed, otherwise it could load the previous step
+        # and send its request to the device again
+        if countdown is not None:
+            transaction.on_commit(
+                lambda: advance_upgrade_workflow.apply_async(
+                    args=[job_id], countdown=countdown
+                )
+            )
+        if "job_status" in update_fields:
+            release_batch_slot(job_id)
+            publish_job_status(job)
+
+
+# ----------------------------------------------------------------------------
+# Upgrade Batch Task
+# ----------------------------------------------------------------------------
+@shared_task(bind=True)
+def advance_upgrade_batch(
+    self,
+    batch_uuid: str,
+):
+    logging.debug(f"Advancing upgrade batch: {batch_uuid}")
+
+    try:
+        finished = advance_batch(batch_uuid, start_upgrade=start_batch_upgrade)
+
+    except UpgradeBatch.DoesNotExist:
+        logging.error(f"Upgrade batch {batch_uuid} no longer exists")
+        return
+
+    except Exception as e:
+        # Keep polling, the batch state is only changed by committed transactions
+        finished = False
+        logging.error(f"Upgrade batch {batch_uuid}\nError: {e}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+
+    if not finished:
+        advance_upgrade_batch.apply_async(
+            args=[batch_uuid],
+            countdown=settings.UPGRADE_BATCH_POLL_INTERVAL,
+        )
+
+
+def start_batch_upgrade(member: UpgradeBatchDevice) -> None:
+    """
+    Start the upgrade job of a device of an upgrade batch, using the task ID assigned to it by the batch.
+
+    Args:
+        member (UpgradeBatchDevice): The batch device to upgrade.
+    """
+    batch = member.batch
+    execute_upgrade_device_task.apply_async(
+        kwargs={
+            "author_id": batch.author_id,
+            "device_uuid": str(member.device_id),
+            "dry_run": batch.dry_run,
+            "profile_uuid": str(batch.profile_id),
+            "target_version": batch.target_version,
+        },
+        task_id=member.task_id,
+    )
+
+
+def set_upgrade_job_status(
+    job: Job,
+    job_status: str,
+) -> None:
+    """
+    Map the status returned by an upgrade onto the job and target device statuses.
+
+    Args:
+        job (Job): The upgrade job to update.
+        job_status (str): The status returned by the upgrade, "completed", "skipped" or "errored".
+    """
+    if job_status == "errored":
+        job.job_status = "errored"
+        job.target_current_status = "errored"
+    elif job_status == "skipped":
+        job.job_status = "skipped"
+        job.target_current_status = "completed"
+    else:
+        job.job_status = "completed"
+        job.target_current_status = "completed"
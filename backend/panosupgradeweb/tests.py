@@ -1,39 +1,136 @@
+import asyncio
+import contextlib
+import functools
+import io
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs
+from xml.etree import ElementTree as ET
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from panos.firewall import Firewall
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Panorama, Prisma, Job
+from .models import (
+    Device,
+    DeviceType,
+    Job,
+    JobLogEntry,
+    PanosVersion,
+    Profile,
+    Snapshot,
+    StagedImage,
+    UpgradeBatch,
+    UpgradeBatchDevice,
+)
+from .scripts.api_keys import ApiKeyCache, CachedApiKeyXapi
+from .scripts.device_groups import DeviceGroupIndexCache, device_group_index
+from .scripts.events import sign_job_events_token, unsign_job_events_token
+from .scripts.image_prestage.app import prestage_device
+from .scripts.inventory_sync.app import main_all as run_inventory_sync_all
+from .scripts.inventory_sync.inventory import InventorySync
+from .scripts.logger import JobLogBuffer, PanOsUpgradeLogger, flush_job_logs
+from .scripts.rate_limit import (
+    PanoramaRateLimiter,
+    RateLimitedFirewall,
+    RateLimitedPanorama,
+    RateLimitedXapi,
+)
+from .scripts.software_catalog import (
+    SoftwareCatalogCache,
+    platform_family,
+    record_catalog_versions,
+)
+from .scripts.upgrade_batch import acquire_batch_slot, advance_batch, plan_waves
+from .scripts.upgrade_device.app import run_ha_prework_concurrently
+from .scripts.upgrade_device.upgrade import PanosUpgrade
+from .scripts.upgrade_device.workflow import UpgradeWorkflow
+from .scripts.xml_api import (
+    AsyncXmlApiClient,
+    XmlApiError,
+    XmlEntryParser,
+    cmd_to_xml,
+    entry_to_dict,
+    iter_op_entries,
+)
+from .serializers import SnapshotSerializer
 
 
 User = get_user_model()
 
 
+def create_profile(**kwargs):
+    fields = dict(
+        active_support=True,
+        arp_table_snapshot=True,
+        candidate_config=True,
+        certificates_requirements=False,
+        command_timeout=120,
+        connection_timeout=30,
+        content_version=True,
+        content_version_snapshot=True,
+        download_retry_interval=60,
+        dynamic_updates=True,
+        expired_licenses=True,
+        free_disk_space=True,
+        ha=True,
+        install_retry_interval=60,
+        ip_sec_tunnels_snapshot=False,
+        jobs=False,
+        license_snapshot=True,
+        max_download_tries=3,
+        max_install_attempts=3,
+        max_reboot_tries=30,
+        max_snapshot_tries=3,
+        name="default",
+        nics_snapshot=True,
+        ntp_sync=False,
+        pan_password="secret",
+        pan_username="admin",
+        panorama=True,
+        planes_clock_sync=True,
+        reboot_retry_interval=60,
+        routes_snapshot=False,
+        session_stats_snapshot=False,
+        snapshot_retry_interval=60,
+    )
+    fields.update(kwargs)
+    return Profile.objects.create(**fields)
+
+
 class PanOsUpgradeWebModelTest(APITestCase):
     @classmethod
     def setUpTestData(cls):
         cls.user = User.objects.create_user(
             username="testuser", email="test@email.com", password="secret"
         )
-        cls.panorama = Panorama.objects.create(
-            hostname="panorama1",
+        cls.platform = DeviceType.objects.create(name="PA-VM", device_type="Firewall")
+        cls.device = Device.objects.create(
+            hostname="firewall1",
             ipv4_address="1.1.1.1",
             ipv6_address="::1",
-            api_key="1234567890",
-            author=cls.user,
-        )
-        cls.prisma = Prisma.objects.create(
-            tenant_name="prisma1",
-            client_id="1234567890",
-            client_secret="1234567890",
-            tsg_id="1234567890",
+            platform=cls.platform,
+            serial="0123456789",
             author=cls.user,
         )
         cls.job = Job.objects.create(
             task_id="1234567890",
-            job_type="test",
-            json_data='{"test": "test"}',
+            job_type="upgrade",
             author=cls.user,
         )
 
@@ -41,181 +138,2071 @@ class PanOsUpgradeWebModelTest(APITestCase):
         self.client = APIClient()
         self.client.force_authenticate(user=self.user)
 
-    def test_panorama(self):
-        self.assertEqual(self.panorama.__str__(), "panorama1")
-        self.assertEqual(self.panorama.hostname, "panorama1")
-        self.assertEqual(self.panorama.ipv4_address, "1.1.1.1")
-        self.assertEqual(self.panorama.ipv6_address, "::1")
-        self.assertEqual(self.panorama.api_key, "1234567890")
-
-    def test_prisma(self):
-        self.assertEqual(self.prisma.__str__(), "prisma1")
-        self.assertEqual(self.prisma.tenant_name, "prisma1")
-        self.assertEqual(self.prisma.client_id, "1234567890")
-        self.assertEqual(self.prisma.client_secret, "1234567890")
-        self.assertEqual(self.prisma.tsg_id, "1234567890")
+    def test_device(self):
+        self.assertEqual(self.device.__str__(), "firewall1")
+        self.assertEqual(self.device.hostname, "firewall1")
+        self.assertEqual(self.device.ipv4_address, "1.1.1.1")
+        self.assertEqual(self.device.ipv6_address, "::1")
+        self.assertEqual(self.device.platform.__str__(), "PA-VM")
 
     def test_Job(self):
         self.assertEqual(self.job.__str__(), self.job.task_id)
         self.assertEqual(self.job.task_id, "1234567890")
-        self.assertEqual(self.job.job_type, "test")
-        self.assertEqual(self.job.json_data, '{"test": "test"}')
+        self.assertEqual(self.job.job_type, "upgrade")
 
-    def test_api_panorama_list_view(self):
-        response = self.client.get(reverse("panorama-list"))
+    # Device API tests
+    def test_api_device_list_view(self):
+        response = self.client.get(reverse("inventory-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]["hostname"], "panorama1")
+        self.assertEqual(response.data[0]["hostname"], "firewall1")
         self.assertEqual(response.data[0]["ipv4_address"], "1.1.1.1")
         self.assertEqual(response.data[0]["ipv6_address"], "::1")
-        self.assertEqual(response.data[0]["api_key"], "1234567890")
-        self.assertEqual(Panorama.objects.count(), 1)
-        self.assertContains(response, self.panorama)
+        self.assertEqual(response.data[0]["platform_name"], "PA-VM")
+        self.assertEqual(response.data[0]["device_type"], "Firewall")
+        self.assertEqual(Device.objects.count(), 1)
 
-    def test_api_panorama_detail_view(self):
+    def test_api_device_detail_view(self):
         response = self.client.get(
-            reverse("panorama-detail", kwargs={"pk": self.panorama.id}), format="json"
+            reverse("inventory-detail", kwargs={"pk": self.device.uuid}), format="json"
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(Panorama.objects.count(), 1)
-        self.assertContains(response, self.panorama)
+        self.assertEqual(response.data["hostname"], "firewall1")
+        self.assertEqual(response.data["serial"], "0123456789")
 
-    # Panorama API tests
-    def test_api_panorama_create(self):
+    def test_api_device_create(self):
         data = {
-            "hostname": "panorama2",
+            "hostname": "firewall2",
             "ipv4_address": "2.2.2.2",
-            "ipv6_address": "::2",
-            "api_key": "0987654321",
-            "author": self.user.id,
+            "platform": "PA-VM",
         }
-        response = self.client.post(reverse("panorama-list"), data, format="json")
-        panorama = Panorama.objects.get(hostname="panorama2")
+        response = self.client.post(reverse("inventory-list"), data, format="json")
+        device = Device.objects.get(hostname="firewall2")
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Panorama.objects.count(), 2)
-        self.assertEqual(panorama.hostname, "panorama2")
+        self.assertEqual(Device.objects.count(), 2)
+        self.assertEqual(device.platform, self.platform)
+        self.assertEqual(device.author, self.user)
 
-    def test_api_panorama_update(self):
-        data = {"hostname": "updated_panorama"}
+    def test_api_device_update(self):
+        data = {"hostname": "updated_firewall"}
         response = self.client.patch(
-            reverse("panorama-detail", kwargs={"pk": self.panorama.id}),
+            reverse("inventory-detail", kwargs={"pk": self.device.uuid}),
             data,
             format="json",
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            Panorama.objects.get(id=self.panorama.id).hostname, "updated_panorama"
+            Device.objects.get(uuid=self.device.uuid).hostname, "updated_firewall"
         )
 
-    def test_api_panorama_delete(self):
+    def test_api_device_delete(self):
         response = self.client.delete(
-            reverse("panorama-detail", kwargs={"pk": self.panorama.id})
+            reverse("inventory-detail", kwargs={"pk": self.device.uuid})
         )
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Panorama.objects.count(), 0)
+        self.assertEqual(Device.objects.count(), 0)
 
-    def test_api_prisma_list_view(self):
-        response = self.client.get(reverse("prisma-list"))
+    # Job API tests
+    def test_api_Job_list_view(self):
+        response = self.client.get(reverse("jobs-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]["tenant_name"], "prisma1")
-        self.assertEqual(response.data[0]["client_id"], "1234567890")
-        self.assertEqual(response.data[0]["client_secret"], "1234567890")
-        self.assertEqual(response.data[0]["tsg_id"], "1234567890")
-        self.assertEqual(Prisma.objects.count(), 1)
-        self.assertContains(response, self.prisma)
-
-    def test_api_prisma_detail_view(self):
+        self.assertEqual(response.data[0]["task_id"], "1234567890")
+        self.assertEqual(response.data[0]["job_type"], "upgrade")
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_api_Job_detail_view(self):
         response = self.client.get(
-            reverse("prisma-detail", kwargs={"pk": self.prisma.id}), format="json"
+            reverse("jobs-detail", kwargs={"pk": self.job.task_id}), format="json"
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(Prisma.objects.count(), 1)
-        self.assertContains(response, self.prisma)
+        self.assertEqual(json.loads(response.content)["task_id"], self.job.task_id)
+        self.assertEqual(json.loads(response.content)["job_status"], "pending")
 
-    # Prisma API tests
-    def test_api_prisma_create(self):
-        data = {
-            "tenant_name": "prisma2",
-            "client_id": "2345678901",
-            "client_secret": "2345678901",
-            "tsg_id": "2345678901",
-            "author": self.user.id,
-        }
-        response = self.client.post(reverse("prisma-list"), data, format="json")
-        prisma = Prisma.objects.get(tenant_name="prisma2")
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Prisma.objects.count(), 2)
-        self.assertEqual(prisma.tenant_name, "prisma2")
+    def test_api_Job_delete(self):
+        response = self.client.delete(
+            reverse("jobs-detail", kwargs={"pk": self.job.task_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Job.objects.count(), 0)
 
-    def test_api_prisma_update(self):
-        data = {"tenant_name": "updated_prisma"}
-        response = self.client.patch(
-            reverse("prisma-detail", kwargs={"pk": self.prisma.id}), data, format="json"
+
+class JobLogBufferTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cls.job = Job.objects.create(
+            task_id="1234567890",
+            job_type="upgrade",
+            author=cls.user,
+        )
+
+    def test_entries_are_buffered_until_threshold(self):
+        buffer = JobLogBuffer(self.job.task_id, max_entries=3, flush_interval=60)
+        buffer.append(timestamp=timezone.now(), severity_level="info", message="one")
+        buffer.append(timestamp=timezone.now(), severity_level="info", message="two")
+        self.assertEqual(JobLogEntry.objects.count(), 0)
+
+        buffer.append(timestamp=timezone.now(), severity_level="info", message="three")
+        self.assertEqual(JobLogEntry.objects.count(), 3)
+
+    def test_errors_flush_immediately(self):
+        buffer = JobLogBuffer(self.job.task_id, max_entries=100, flush_interval=60)
+        buffer.append(timestamp=timezone.now(), severity_level="error", message="boom")
+        self.assertEqual(JobLogEntry.objects.count(), 1)
+
+    def test_sequence_numbers_continue_across_buffers(self):
+        logger = PanOsUpgradeLogger("test")
+        logger.set_job_id(self.job.task_id)
+        logger.log_task(action="info", message="first")
+        logger.log_task(action="info", message="second")
+        flush_job_logs(self.job.task_id)
+
+        logger.log_task(action="info", message="third")
+        flush_job_logs(self.job.task_id)
+
         self.assertEqual(
-            Prisma.objects.get(id=self.prisma.id).tenant_name, "updated_prisma"
+            list(self.job.log_entries.values_list("sequence_number", flat=True)),
+            [0, 1, 2],
         )
+        self.assertTrue(self.job.log_entries.last().message.endswith("third"))
 
-    def test_api_prisma_delete(self):
-        response = self.client.delete(
-            reverse("prisma-detail", kwargs={"pk": self.prisma.id})
+    def test_buffers_of_different_workers_do_not_share_numbers(self):
+        # Each buffer stands for a task of the same job on a different worker
+        first = JobLogBuffer(self.job.task_id, max_entries=100, flush_interval=60)
+        second = JobLogBuffer(self.job.task_id, max_entries=100, flush_interval=60)
+        first.append(timestamp=timezone.now(), severity_level="info", message="a1")
+        second.append(timestamp=timezone.now(), severity_level="info", message="b1")
+        first.append(timestamp=timezone.now(), severity_level="info", message="a2")
+        second.flush()
+        first.flush()
+
+        self.assertEqual(
+            list(self.job.log_entries.values_list("sequence_number", "message")),
+            [(0, "b1"), (1, "a1"), (2, "a2")],
         )
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Prisma.objects.count(), 0)
 
-    # Job API tests
-    def test_api_Job_list_view(self):
-        response = self.client.get(reverse("Job-list"))
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]["task_id"], "1234567890")
-        self.assertEqual(response.data[0]["job_type"], "test")
-        self.assertEqual(response.data[0]["json_data"], '{"test": "test"}')
-        self.assertEqual(Job.objects.count(), 1)
-        self.assertContains(response, self.job)
+    def test_failed_flush_keeps_entries_queued(self):
+        buffer = JobLogBuffer(self.job.task_id, max_entries=100, flush_interval=60)
+        buffer.append(timestamp=timezone.now(), severity_level="info", message="one")
+        with mock.patch.object(
+            JobLogEntry.objects, "bulk_create", side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            buffer.flush()
+        buffer.append(timestamp=timezone.now(), severity_level="info", message="two")
 
-    def test_api_Job_detail_view(self):
-        response = self.client.get(
-            reverse("Job-detail", kwargs={"pk": self.job.task_id}), format="json"
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(
+            list(self.job.log_entries.values_list("sequence_number", "message")),
+            [(0, "one"), (1, "two")],
+        )
+
+    def test_queued_entries_are_flushed_by_timer(self):
+        buffer = JobLogBuffer(self.job.task_id, max_entries=100, flush_interval=0.05)
+        with mock.patch.object(buffer, "flush") as flush:
+            buffer.append(
+                timestamp=timezone.now(), severity_level="info", message="waiting"
+            )
+            time.sleep(0.2)
+        flush.assert_called_once_with()
+
+    def test_backfill_numbers_entries_stored_before_sequence_numbers(self):
+        now = timezone.now()
+        JobLogEntry.objects.bulk_create(
+            JobLogEntry(
+                job=self.job,
+                timestamp=now + timedelta(seconds=offset),
+                severity_level="info",
+                message=message,
+            )
+            for offset, message in ((2, "third"), (0, "first"), (1, "second"))
+        )
+
+        call_command("backfill_job_log_sequence_numbers", stdout=io.StringIO())
+
+        self.assertEqual(
+            list(self.job.log_entries.values_list("sequence_number", "message")),
+            [(0, "first"), (1, "second"), (2, "third")],
+        )
+
+
+class InventorySyncUpsertTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
         )
+        cls.platform = DeviceType.objects.create(name="PA-VM", device_type="Firewall")
+        cls.existing = Device.objects.create(
+            hostname="fw1",
+            sw_version="10.2.0",
+            platform=cls.platform,
+            author=cls.user,
+        )
+
+    def test_upsert_creates_and_updates_devices(self):
+        devices = [
+            Device(
+                hostname="fw1",
+                sw_version="11.1.0",
+                platform=self.platform,
+                author=self.user,
+            ),
+            Device(
+                hostname="fw2",
+                sw_version="11.1.0",
+                platform=self.platform,
+                author=self.user,
+            ),
+        ]
+
+        # A hostname listed twice is written once
+        devices.append(
+            Device(
+                hostname="fw2",
+                sw_version="11.1.2",
+                platform=self.platform,
+                author=self.user,
+            )
+        )
+
+        with self.assertNumQueries(5):
+            created, updated = InventorySync.upsert_devices(devices)
+
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(Device.objects.count(), 2)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.sw_version, "11.1.0")
+        self.assertEqual(Device.objects.get(hostname="fw2").sw_version, "11.1.0")
+
+    def test_unchanged_devices_are_not_written(self):
+        def collected(sw_version, days=1):
+            return [
+                Device(
+                    hostname=hostname,
+                    serial=serial,
+                    sw_version=sw_version,
+                    uptime=f"{uptime} days",
+                    platform=self.platform,
+                    panorama_managed=True,
+                    panorama_ipv4_address="10.0.0.100",
+                    author=self.user,
+                )
+                for hostname, serial, uptime in (
+                    ("fw1", "001", days),
+                    ("fw2", "002", days + 1),
+                )
+            ]
+
+        self.assertEqual(InventorySync.upsert_devices(collected("11.1.0")), (1, 1))
+        updated_at = Device.objects.get(hostname="fw2").updated_at
+
+        # Nothing differs, so nothing is written
+        with self.assertNumQueries(1):
+            self.assertEqual(InventorySync.upsert_devices(collected("11.1.0")), (0, 0))
+        self.assertEqual(Device.objects.get(hostname="fw2").updated_at, updated_at)
+
+        # Only the uptime differs, so only the uptime is written
+        with self.assertNumQueries(4):
+            self.assertEqual(
+                InventorySync.upsert_devices(collected("11.1.0", days=5)), (0, 0)
+            )
+        fw2 = Device.objects.get(hostname="fw2")
+        self.assertEqual(fw2.uptime, "6 days")
+        self.assertEqual(fw2.updated_at, updated_at)
+
+        self.assertEqual(InventorySync.upsert_devices(collected("11.1.2")), (0, 2))
+        self.assertEqual(Device.objects.get(hostname="fw2").sw_version, "11.1.2")
+
+        job = Job.objects.create(
+            task_id="inventory-sync",
+            job_type="inventory_sync",
+            author=self.user,
+        )
+        panorama = Device(hostname="panorama", ipv4_address="10.0.0.100")
+        removed = InventorySync(job.task_id).find_removed_devices(
+            panorama_device=panorama,
+            listed_serials={"001"},
+        )
+        flush_job_logs(job.task_id)
+        self.assertEqual(removed, ["fw2"])
+
+    def test_api_updates_clear_the_fingerprint(self):
+        InventorySync.upsert_devices(
+            [Device(hostname="fw1", platform=self.platform, author=self.user)]
+        )
+        self.existing.refresh_from_db()
+        self.assertIsNotNone(self.existing.fingerprint)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(
+            reverse("inventory-detail", args=[self.existing.pk]),
+            {"sw_version": "11.0.0"},
+        )
+
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(Job.objects.count(), 1)
-        self.assertEqual(json.loads(response.content)["task_id"], self.job.task_id)
+        self.existing.refresh_from_db()
+        self.assertIsNone(self.existing.fingerprint)
 
-    def test_api_Job_create(self):
-        data = {
-            "task_id": "2345678901",
-            "job_type": "test2",
-            "json_data": '{"test2": "test2"}',
-            "author": self.user.id,
+    def test_link_ha_peers_in_single_pass(self):
+        job = Job.objects.create(
+            task_id="inventory-sync",
+            job_type="inventory_sync",
+            author=self.user,
+        )
+        Device.objects.filter(pk=self.existing.pk).update(ipv4_address="10.0.0.1")
+        peer = Device.objects.create(
+            hostname="fw1-peer",
+            ipv4_address="10.0.0.2",
+            platform=self.platform,
+            author=self.user,
+        )
+
+        inventory_sync = InventorySync(job.task_id)
+        linked = inventory_sync.link_ha_peers(
+            {
+                "fw1": ("10.0.0.2", "passive"),
+                "fw1-peer": ("10.0.0.1", "active"),
+                "fw3": ("10.0.0.3", "active"),
+            }
+        )
+        flush_job_logs(job.task_id)
+
+        self.assertEqual(linked, 2)
+        self.existing.refresh_from_db()
+        peer.refresh_from_db()
+        self.assertEqual(self.existing.peer_device, peer)
+        self.assertEqual(self.existing.peer_state, "passive")
+        self.assertEqual(peer.peer_device, self.existing)
+
+
+class InventoryListingFactsTestCase(APITestCase):
+    @staticmethod
+    def listing_entry(hostname, serial, ip_address, **extra):
+        entry = {
+            "serial": serial,
+            "hostname": hostname,
+            "ip-address": ip_address,
+            "ipv6-address": {},
+            "model": "PA-VM",
+            "sw-version": "10.2.7-h3",
+            "app-version": "8799-8509",
+            "threat-version": "8799-8509",
+            "uptime": "10 days, 1:02:03",
         }
-        response = self.client.post(reverse("Job-list"), data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Job.objects.count(), 2)
+        entry.update(extra)
+        return entry
 
-    def test_api_Job_update(self):
-        data = {
-            "job_type": "updated_test",
-            "json_data": '{"updated_test": "updated_test"}',
+    def test_facts_are_built_from_listing(self):
+        devices = [
+            self.listing_entry("fw1", "001", "10.0.0.1"),
+            self.listing_entry(
+                "fw2",
+                "002",
+                "10.0.0.2",
+                ha={"state": "active", "peer": {"serial": "003"}},
+            ),
+            self.listing_entry(
+                "fw3",
+                "003",
+                "10.0.0.3",
+                ha={"state": "passive", "peer": {"serial": "002"}},
+            ),
+            # The peer of this device is not listed, and the next one misses its software version
+            self.listing_entry(
+                "fw4",
+                "004",
+                "10.0.0.4",
+                ha={"state": "active", "peer": {"serial": "005"}},
+            ),
+            self.listing_entry("fw6", "006", "10.0.0.6", **{"sw-version": {}}),
+        ]
+
+        facts, incomplete = InventorySync.facts_from_listing(devices)
+
+        self.assertEqual([entry["hostname"] for entry in incomplete], ["fw4", "fw6"])
+        self.assertEqual(
+            [fact["info"]["system"]["hostname"] for fact in facts],
+            ["fw1", "fw2", "fw3"],
+        )
+        self.assertFalse(facts[0]["ha_enabled"])
+        self.assertEqual(facts[0]["info"]["system"]["ipv6-address"], "unknown")
+        self.assertEqual(
+            facts[1]["ha_details"]["result"]["group"],
+            {
+                "local-info": {"state": "active"},
+                "peer-info": {"mgmt-ip": "10.0.0.3", "state": "passive"},
+            },
+        )
+
+
+class InventorySyncAllTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.firewall = DeviceType.objects.create(name="PA-VM", device_type="Firewall")
+        panorama = DeviceType.objects.create(name="M-200", device_type="Panorama")
+        cls.panoramas = {
+            hostname: Device.objects.create(
+                hostname=hostname,
+                ipv4_address=ip_address,
+                platform=panorama,
+                author=cls.user,
+            )
+            for hostname, ip_address in (
+                ("panorama-emea", "10.1.0.100"),
+                ("panorama-us", "10.2.0.100"),
+                ("panorama-apac", "10.3.0.100"),
+            )
         }
-        response = self.client.patch(
-            reverse("Job-detail", kwargs={"pk": self.job.task_id}), data, format="json"
+        Device.objects.create(
+            hostname="fw-decommissioned",
+            serial="009",
+            platform=cls.firewall,
+            panorama_managed=True,
+            panorama_ipv4_address="10.2.0.100",
+            author=cls.user,
+        )
+        cls.profile = create_profile()
+        cls.job = Job.objects.create(
+            author=cls.user, job_type="inventory_sync_all", task_id="sync-all-task"
+        )
+
+    def collect(self, inventory_sync, author_id, panorama_device, profile, fast):
+        if panorama_device.hostname == "panorama-apac":
+            raise ConnectionError("unreachable")
+
+        listed = {
+            "panorama-emea": [("fw1", "001"), ("fw-shared", "003")],
+            "panorama-us": [("fw2", "002"), ("fw-shared", "003")],
+        }[panorama_device.hostname]
+        return {
+            "panorama_device": panorama_device,
+            "devices": [
+                Device(
+                    hostname=hostname,
+                    serial=serial,
+                    platform=self.firewall,
+                    panorama_managed=True,
+                    panorama_ipv4_address=panorama_device.ipv4_address,
+                    author_id=author_id,
+                )
+                for hostname, serial in listed
+            ],
+            "ha_peers": {},
+            "listed_serials": {serial for _, serial in listed},
+        }
+
+    def test_panoramas_are_collected_concurrently_and_written_once(self):
+        with mock.patch(
+            "panosupgradeweb.scripts.inventory_sync.app.collect_panorama_devices",
+            side_effect=self.collect,
+        ), mock.patch.object(
+            InventorySync, "upsert_devices", wraps=InventorySync.upsert_devices
+        ) as upsert_devices:
+            status = run_inventory_sync_all(
+                author_id=self.user.id,
+                job_id=self.job.task_id,
+                profile_uuid=self.profile.uuid,
+            )
+        flush_job_logs(self.job.task_id)
+
+        self.assertEqual(status, "errored")
+        upsert_devices.assert_called_once()
+        self.assertEqual(
+            dict(
+                Device.objects.filter(panorama_managed=True).values_list(
+                    "hostname", "panorama_ipv4_address"
+                )
+            ),
+            {
+                "fw1": "10.1.0.100",
+                "fw2": "10.2.0.100",
+                "fw-shared": "10.1.0.100",
+                "fw-decommissioned": "10.2.0.100",
+            },
+        )
+
+        self.job.refresh_from_db()
+        panoramas = self.job.workflow_state["panoramas"]
+        self.assertEqual(
+            panoramas["panorama-apac"], {"status": "errored", "error": "unreachable"}
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            Job.objects.get(task_id=self.job.task_id).job_type, "updated_test"
+            panoramas["panorama-emea"],
+            {"status": "completed", "devices": 2, "removed": 0},
         )
         self.assertEqual(
-            Job.objects.get(task_id=self.job.task_id).json_data,
-            '{"updated_test": "updated_test"}',
+            panoramas["panorama-us"],
+            {"status": "completed", "devices": 2, "removed": 1},
         )
 
-    def test_api_Job_delete(self):
-        response = self.client.delete(
-            reverse("Job-detail", kwargs={"pk": self.job.task_id})
+    def test_panorama_threads_are_capped_by_the_profile(self):
+        Profile.objects.filter(pk=self.profile.pk).update(
+            inventory_sync_panorama_workers=2
         )
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Job.objects.count(), 0)
+        with mock.patch(
+            "panosupgradeweb.scripts.inventory_sync.app.collect_panorama_devices",
+            side_effect=self.collect,
+        ), mock.patch(
+            "panosupgradeweb.scripts.inventory_sync.app.ThreadPoolExecutor",
+            wraps=ThreadPoolExecutor,
+        ) as executor:
+            run_inventory_sync_all(
+                author_id=self.user.id,
+                job_id=self.job.task_id,
+                profile_uuid=self.profile.uuid,
+            )
+        flush_job_logs(self.job.task_id)
+
+        executor.assert_called_once_with(max_workers=2)
+
+
+class StubXmlApiHandler(BaseHTTPRequestHandler):
+    responses = {
+        "<show><system><info></info></system></show>": (
+            "<result><system><hostname>fw1</hostname><serial>0001</serial>"
+            "<sw-version>11.1.0</sw-version></system></result>"
+        ),
+        "<show><high-availability><state></state></high-availability></show>": (
+            "<result><enabled>yes</enabled><group><local-info><state>active</state>"
+            "</local-info><peer-info><mgmt-ip>10.0.0.2/24</mgmt-ip></peer-info>"
+            "</group></result>"
+        ),
+        "<show><devices><connected></connected></devices></show>": (
+            "<result><devices>"
+            '<entry name="001"><serial>001</serial><model>PA-VM</model></entry>'
+            '<entry name="002"><serial>002</serial><model>PA-440</model>'
+            "<ha><state>active</state></ha></entry>"
+            "</devices></result>"
+        ),
+    }
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        params = {
+            key: values[0]
+            for key, values in parse_qs(self.rfile.read(length).decode()).items()
+        }
+
+        if params.get("key") == "REVOKED":
+            self.send_response(403)
+            self.end_headers()
+            return
+
+        if params["type"] == "keygen" and params["password"] == "secret":
+            body = '<response status="success"><result><key>KEY</key></result></response>'
+        elif params.get("key") == "KEY" and params.get("cmd") in self.responses:
+            body = f'<response status="success">{self.responses[params["cmd"]]}</response>'
+        else:
+            body = '<response status="error"><msg>Invalid credentials.</msg></response>'
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncXmlApiClientTestCase(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubXmlApiHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def xml_api_client(self, password="secret"):
+        return AsyncXmlApiClient(
+            "127.0.0.1",
+            username="admin",
+            password=password,
+            port=self.server.server_address[1],
+            scheme="http",
+        )
+
+    def test_cmd_to_xml(self):
+        self.assertEqual(
+            cmd_to_xml('show jobs id "12"'),
+            "<show><jobs><id>12</id></jobs></show>",
+        )
+
+    def test_concurrent_requests_share_one_client(self):
+        async def run():
+            async with self.xml_api_client() as client:
+                return await asyncio.gather(
+                    client.show_system_info(),
+                    client.show_highavailability_state(),
+                )
+
+        system_info, (ha_state, ha_element) = asyncio.run(run())
+
+        self.assertEqual(system_info["system"]["hostname"], "fw1")
+        self.assertEqual(ha_state, "active")
+        self.assertEqual(ha_element.find("./result/enabled").text, "yes")
+
+    def test_error_response_raises(self):
+        async def run():
+            async with self.xml_api_client(password="wrong") as client:
+                await client.show_system_info()
+
+        with self.assertRaises(XmlApiError):
+            asyncio.run(run())
+
+    def test_list_entries_are_streamed(self):
+        entries = [
+            entry_to_dict(entry)
+            for entry in iter_op_entries(
+                "127.0.0.1",
+                "show devices connected",
+                "result/devices/entry",
+                username="admin",
+                password="secret",
+                port=self.server.server_address[1],
+                scheme="http",
+            )
+        ]
+
+        self.assertEqual(
+            entries,
+            [
+                {"@name": "001", "serial": "001", "model": "PA-VM"},
+                {
+                    "@name": "002",
+                    "serial": "002",
+                    "model": "PA-440",
+                    "ha": {"state": "active"},
+                },
+            ],
+        )
+
+    def test_rate_limiter_slot_is_released_before_entries_are_yielded(self):
+        held = []
+
+        class Limiter:
+            @contextlib.asynccontextmanager
+            async def limit_async(self, hostname):
+                held.append(hostname)
+                try:
+                    yield
+                finally:
+                    held.remove(hostname)
+
+        with mock.patch(
+            "panosupgradeweb.scripts.xml_api.get_panorama_rate_limiter",
+            return_value=Limiter(),
+        ):
+            for _ in iter_op_entries(
+                "127.0.0.1",
+                "show devices connected",
+                "result/devices/entry",
+                username="admin",
+                password="secret",
+                port=self.server.server_address[1],
+                scheme="http",
+                rate_limited=True,
+            ):
+                self.assertEqual(held, [])
+
+    def test_entry_parser_discards_processed_entries(self):
+        body = (
+            b'<response status="success"><result><devices>'
+            + b"".join(
+                f"<entry><serial>{serial:03}</serial></entry>".encode()
+                for serial in range(50)
+            )
+            + b"</devices></result></response>"
+        )
+        parser = XmlEntryParser("result/devices/entry")
+        entries = []
+        serials = []
+        for offset in range(0, len(body), 7):
+            for entry in parser.feed(body[offset : offset + 7]):
+                entries.append(entry)
+                serials.append(entry.findtext("serial"))
+        list(parser.close())
+
+        self.assertEqual(serials, [f"{serial:03}" for serial in range(50)])
+        # Every entry was cleared once the next one was requested
+        self.assertTrue(all(len(entry) == 0 for entry in entries))
+
+        parser = XmlEntryParser("result/devices/entry")
+        list(parser.feed(b'<response status="error"><msg>Bad command</msg></response>'))
+        with self.assertRaisesRegex(XmlApiError, "Bad command"):
+            list(parser.close())
+
+
+class InMemoryRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class ApiKeyCacheTestCase(APITestCase):
+    def setUp(self):
+        self.redis = InMemoryRedis()
+        self.cache = ApiKeyCache(client=self.redis, ttl=60)
+
+    def test_api_keys_are_cached_encrypted_per_host_and_profile(self):
+        self.cache.set("10.0.0.1", "profile-a", "admin", "secret", "KEY")
+
+        self.assertEqual(self.cache.get("10.0.0.1", "profile-a", "admin", "secret"), "KEY")
+        self.assertIsNone(self.cache.get("10.0.0.1", "profile-b", "admin", "secret"))
+        self.assertIsNone(self.cache.get("10.0.0.2", "profile-a", "admin", "secret"))
+        self.assertIsNone(self.cache.get("10.0.0.1", "profile-a", "admin", "changed"))
+        self.assertNotIn(b"KEY", list(self.redis.data.values())[0])
+
+        self.cache.invalidate("10.0.0.1", "profile-a", "admin", "secret")
+        self.assertIsNone(self.cache.get("10.0.0.1", "profile-a", "admin", "secret"))
+
+    def test_unreachable_redis_behaves_as_a_miss(self):
+        import redis
+
+        cache = ApiKeyCache(
+            client=redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1),
+            ttl=60,
+        )
+        cache.set("10.0.0.1", "profile-a", "admin", "secret", "KEY")
+        self.assertIsNone(cache.get("10.0.0.1", "profile-a", "admin", "secret"))
+
+    def test_rejected_cached_api_key_is_regenerated_once(self):
+        self.cache.set("10.0.0.1", "profile-a", "admin", "secret", "OLD")
+        keys = []
+
+        def api_request(xapi, query):
+            keys.append(query["key"])
+            if query["key"] == "OLD":
+                xapi.status_detail = "URLError: code: 403 reason: Forbidden"
+                return False
+            return "response"
+
+        xapi = RateLimitedPanorama(
+            "10.0.0.1",
+            api_key="OLD",
+            api_key_cache_args=("10.0.0.1", "profile-a", "admin", "secret"),
+        ).xapi
+        with mock.patch(
+            "pan.xapi.PanXapi._PanXapi__api_request", api_request
+        ), mock.patch(
+            "panosupgradeweb.scripts.api_keys.get_api_key_cache",
+            return_value=self.cache,
+        ), mock.patch(
+            "panosupgradeweb.scripts.api_keys.get_api_key", return_value="NEW"
+        ) as get_api_key:
+            response = xapi._PanXapi__api_request({"type": "op", "key": "OLD"})
+
+        self.assertEqual(response, "response")
+        self.assertEqual(keys, ["OLD", "NEW"])
+        self.assertEqual(xapi.api_key, "NEW")
+        get_api_key.assert_called_once_with("10.0.0.1", "profile-a", "admin", "secret")
+        self.assertIsNone(self.cache.get("10.0.0.1", "profile-a", "admin", "secret"))
+
+    def test_rejected_api_key_is_regenerated_through_the_public_api(self):
+        # Fails if pan-python stops sending requests through the method CachedApiKeyXapi overrides
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubXmlApiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        api_key_cache_args = ("127.0.0.1", "profile-a", "admin", "secret")
+        self.cache.set(*api_key_cache_args, "REVOKED")
+        xapi = CachedApiKeyXapi(
+            api_key="REVOKED",
+            hostname="127.0.0.1",
+            port=server.server_address[1],
+            use_http=True,
+            pan_device=Firewall("127.0.0.1", api_key="REVOKED"),
+            api_key_cache_args=api_key_cache_args,
+        )
+        with mock.patch(
+            "panosupgradeweb.scripts.api_keys.get_api_key_cache",
+            return_value=self.cache,
+        ), mock.patch(
+            "panosupgradeweb.scripts.api_keys.get_api_key", return_value="KEY"
+        ):
+            xapi.op("<show><system><info></info></system></show>")
+
+        self.assertEqual(xapi.element_root.findtext(".//hostname"), "fw1")
+        self.assertEqual(xapi.api_key, "KEY")
+
+
+class DeviceGroupIndexTestCase(APITestCase):
+    def test_index_is_keyed_by_serial_and_cached_per_panorama(self):
+        index = device_group_index(
+            [
+                {
+                    "@name": "branches",
+                    "devices": [
+                        {"@name": "fw1", "serial": "001", "connected": "yes"},
+                        {"@name": "fw2", "serial": "002", "connected": "no"},
+                    ],
+                },
+                {"@name": "empty"},
+                {
+                    "@name": "datacenter",
+                    "devices": [{"@name": "fw3", "serial": "003", "connected": "yes"}],
+                },
+            ]
+        )
+        self.assertEqual(
+            index, {"001": "branches", "002": "branches", "003": "datacenter"}
+        )
+
+        cache = DeviceGroupIndexCache(client=InMemoryRedis(), ttl=60)
+        self.assertIsNone(cache.get("10.0.0.1"))
+        cache.set("10.0.0.1", index)
+        self.assertEqual(cache.get("10.0.0.1"), index)
+        self.assertIsNone(cache.get("10.0.0.2"))
+
+        cache.invalidate("10.0.0.1")
+        self.assertIsNone(cache.get("10.0.0.1"))
+
+
+class PanoramaRateLimiterTestCase(APITestCase):
+    def test_unreachable_redis_does_not_limit_requests(self):
+        import redis
+
+        limiter = PanoramaRateLimiter(
+            client=redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1),
+            rate=1,
+            burst=1,
+            concurrency=1,
+        )
+        started = time.monotonic()
+        for _ in range(3):
+            with limiter.limit("10.0.0.1"):
+                pass
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(limiter.metrics("10.0.0.1")["requests"], 0)
+
+    def test_async_limit_does_not_block_the_event_loop_on_redis(self):
+        limiter = PanoramaRateLimiter(client=mock.Mock(), rate=1, burst=1)
+
+        def slow_redis(*args):
+            time.sleep(0.3)
+
+        async def limited_request():
+            async with limiter.limit_async("10.0.0.1"):
+                pass
+
+        async def longest_loop_stall():
+            stalls = []
+            for _ in range(10):
+                started = time.monotonic()
+                await asyncio.sleep(0.05)
+                stalls.append(time.monotonic() - started)
+            return max(stalls)
+
+        async def limited_request_and_stall():
+            stall, _ = await asyncio.gather(longest_loop_stall(), limited_request())
+            return stall
+
+        with mock.patch.multiple(
+            limiter, try_acquire=slow_redis, record_wait=slow_redis, release=slow_redis
+        ):
+            self.assertLess(asyncio.run(limited_request_and_stall()), 0.2)
+
+    def test_requests_proxied_by_panorama_are_rate_limited(self):
+        panorama = RateLimitedPanorama("10.0.0.1", api_key="KEY")
+        firewall = RateLimitedFirewall(serial="0123456789")
+        panorama.add(firewall)
+
+        self.assertIsInstance(panorama.xapi, RateLimitedXapi)
+        self.assertIsInstance(firewall.xapi, RateLimitedXapi)
+        self.assertEqual(firewall.xapi.hostname, "10.0.0.1")
+        self.assertEqual(firewall.xapi.serial, "0123456789")
+        self.assertNotIsInstance(
+            RateLimitedFirewall("10.0.0.2", api_key="KEY").xapi, RateLimitedXapi
+        )
+
+
+class SoftwareCatalogTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.platform = DeviceType.objects.create(name="PA-3220", device_type="Firewall")
+        cls.device = Device.objects.create(
+            hostname="fw1",
+            sw_version="10.1.9",
+            platform=cls.platform,
+            author=cls.user,
+        )
+        cls.profile = create_profile()
+        cls.job = Job.objects.create(
+            author=cls.user, job_type="upgrade", task_id="catalog-task"
+        )
+
+    @staticmethod
+    def version(version, downloaded=False):
+        return {
+            "version": version,
+            "filename": f"PanOS_3200-{version}",
+            "size": "500",
+            "size-kb": "512000",
+            "released-on": "2024/01/01 00:00:00",
+            "release-notes": "https://example.com/release-notes",
+            "downloaded": downloaded,
+            "current": False,
+            "latest": False,
+            "uploaded": False,
+        }
+
+    def test_platform_families_share_images(self):
+        self.assertEqual(platform_family("PA-3220"), "PA-3200")
+        self.assertEqual(platform_family("pa-5450"), "PA-5400")
+        self.assertEqual(platform_family("PA-440"), "PA-400")
+        self.assertEqual(platform_family("PA-220"), "PA-220")
+        self.assertEqual(platform_family("PA-VM"), "PA-VM")
+        self.assertIsNone(platform_family(None))
+
+    def test_catalog_is_cached_without_device_state(self):
+        PanosVersion.objects.create(
+            version="10.2.0",
+            filename="PanOS_3200-10.2.0",
+            size="500",
+            size_kb="512000",
+            released_on="2023/01/01 00:00:00",
+            release_notes="https://example.com/release-notes",
+            downloaded=True,
+        )
+        versions = {
+            version: self.version(version, downloaded=True)
+            for version in ("10.2.0", "10.2.7-h3")
+        }
+        cache = SoftwareCatalogCache(client=InMemoryRedis(), ttl=60)
+        cache.set("PA-3200", versions)
+
+        self.assertEqual(
+            cache.get("PA-3200")["10.2.7-h3"]["filename"], "PanOS_3200-10.2.7-h3"
+        )
+        self.assertNotIn("downloaded", cache.get("PA-3200")["10.2.7-h3"])
+        self.assertIsNone(cache.get("PA-5200"))
+
+        # Only the unknown version is added, the download flag of the existing one is left to the version sync
+        self.assertEqual(record_catalog_versions(versions), 1)
+        self.assertTrue(PanosVersion.objects.get(version="10.2.0").downloaded)
+        self.assertFalse(PanosVersion.objects.get(version="10.2.7-h3").downloaded)
+
+    def test_cached_catalog_skips_the_update_server(self):
+        cache = SoftwareCatalogCache(client=InMemoryRedis(), ttl=60)
+        cache.set("PA-3200", {"10.2.7-h3": self.version("10.2.7-h3")})
+        calls = []
+
+        def info():
+            calls.append("info")
+            software.versions = {
+                version: self.version(version) for version in ("10.2.0", "10.2.7-h3")
+            }
+
+        software = SimpleNamespace(
+            versions={},
+            info=info,
+            check=lambda: calls.append("check"),
+        )
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        upgrade_job.version_target_parsed = (10, 2, 7, 3)
+
+        with mock.patch(
+            "panosupgradeweb.scripts.upgrade_device.upgrade.get_software_catalog_cache",
+            return_value=cache,
+        ):
+            available = upgrade_job.software_available_check(
+                device={
+                    "db_device": self.device,
+                    "pan_device": SimpleNamespace(software=software),
+                },
+                target_version="10.2.7-h3",
+            )
+
+        self.assertTrue(available)
+        self.assertEqual(calls, ["info"])
+
+
+@override_settings(
+    SOFTWARE_JOB_POLL_INITIAL=5,
+    SOFTWARE_JOB_POLL_MAXIMUM=20,
+    SOFTWARE_JOB_POLL_BACKOFF=2,
+    SOFTWARE_DOWNLOAD_DEADLINE=30,
+)
+class SoftwareDownloadTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.device = Device.objects.create(hostname="fw1", author=cls.user)
+        cls.profile = create_profile()
+        cls.job = Job.objects.create(
+            author=cls.user, job_type="upgrade", task_id="download-task"
+        )
+
+    def download(self, statuses):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        statuses = iter(statuses)
+        clock = [0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with mock.patch.object(
+            upgrade_job, "request_software_job", return_value="42"
+        ), mock.patch.object(
+            upgrade_job,
+            "check_software_job",
+            side_effect=lambda device, job_id: next(statuses),
+        ), mock.patch(
+            "panosupgradeweb.scripts.upgrade_device.upgrade.time"
+        ) as fake_time:
+            fake_time.sleep.side_effect = sleep
+            fake_time.monotonic.side_effect = lambda: clock[0]
+            downloaded = upgrade_job.software_download(
+                device={"db_device": self.device, "pan_device": None},
+                target_version="10.2.7-h3",
+            )
+        return downloaded, sleeps
+
+    def test_download_job_is_polled_with_backoff(self):
+        self.assertEqual(self.download([None, True]), (True, [5, 10]))
+        self.assertEqual(self.download([False]), (False, [5]))
+
+    def test_download_is_given_up_after_the_deadline(self):
+        self.assertEqual(self.download([None] * 10), (False, [5, 10, 15]))
+
+    def test_download_job_id_is_followed_and_image_synced_to_peer(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        pan_device = mock.Mock()
+        pan_device.op.side_effect = [
+            ET.fromstring(
+                '<response status="success"><result><job>42</job></result></response>'
+            ),
+            ET.fromstring(
+                '<response status="success"><result><job><id>42</id>'
+                "<status>FIN</status><result>OK</result><progress>100</progress>"
+                "</job></result></response>"
+            ),
+        ]
+
+        with mock.patch("panosupgradeweb.scripts.upgrade_device.upgrade.time.sleep"):
+            self.assertTrue(
+                upgrade_job.software_download(
+                    device={"db_device": self.device, "pan_device": pan_device},
+                    target_version="10.2.7-h3",
+                )
+            )
+        download, show_job = pan_device.op.call_args_list
+        self.assertIn(
+            "<download><sync-to-peer>yes</sync-to-peer><version>10.2.7-h3</version>",
+            download.args[0],
+        )
+        self.assertEqual(
+            show_job, mock.call("<show><jobs><id>42</id></jobs></show>", cmd_xml=False)
+        )
+
+    def test_software_jobs_are_requested_with_sync_to_peer_for_downloads(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        pan_device = mock.Mock()
+        pan_device.op.return_value = ET.fromstring(
+            '<response status="success"><result><job>42</job></result></response>'
+        )
+        device = {"db_device": self.device, "pan_device": pan_device}
+
+        for operation in ("download", "install"):
+            self.assertEqual(
+                upgrade_job.request_software_job(
+                    device=device, operation=operation, target_version="10.2.7-h3"
+                ),
+                "42",
+            )
+        self.assertEqual(
+            pan_device.op.call_args_list,
+            [
+                mock.call(
+                    "<request><system><software><download>"
+                    "<sync-to-peer>yes</sync-to-peer><version>10.2.7-h3</version>"
+                    "</download></software></system></request>",
+                    cmd_xml=False,
+                ),
+                mock.call(
+                    "<request><system><software><install>"
+                    "<version>10.2.7-h3</version>"
+                    "</install></software></system></request>",
+                    cmd_xml=False,
+                ),
+            ],
+        )
+
+
+class ImagePrestageTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.device = Device.objects.create(
+            hostname="fw1", sw_version="10.1.9", author=cls.user
+        )
+        cls.profile = create_profile()
+        cls.job = Job.objects.create(
+            author=cls.user, job_type="prestage", task_id="prestage-task"
+        )
+
+    def upgrade_job(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        upgrade_job.version_target_parsed = (10, 2, 7, 3)
+        return upgrade_job
+
+    def test_missing_images_are_downloaded_and_recorded(self):
+        software = SimpleNamespace(
+            versions={
+                "10.2.0": {"downloaded": True},
+                "10.2.7-h3": {"downloaded": False},
+            }
+        )
+        software.info = lambda: software.versions["10.2.7-h3"].update(downloaded=True)
+        device = {
+            "db_device": self.device,
+            "pan_device": SimpleNamespace(software=software),
+        }
+        upgrade_job = self.upgrade_job()
+
+        with mock.patch.object(
+            upgrade_job, "connect_device", return_value=device
+        ), mock.patch.object(
+            upgrade_job, "software_available_check", return_value=True
+        ), mock.patch.object(
+            upgrade_job, "software_download", return_value=True
+        ) as software_download, mock.patch(
+            "panosupgradeweb.scripts.image_prestage.app.time"
+        ):
+            status = prestage_device(
+                upgrade_job=upgrade_job,
+                db_device=self.device,
+                profile=self.profile,
+                target_version="10.2.7-h3",
+                verify=True,
+            )
+
+        self.assertEqual(status, "staged")
+        software_download.assert_called_once_with(
+            device=device, target_version="10.2.7-h3"
+        )
+        self.assertEqual(
+            list(
+                self.device.staged_images.values_list("version", "status", "verified")
+            ),
+            [("10.2.0", "staged", True), ("10.2.7-h3", "staged", True)],
+        )
+
+    def test_staged_images_skip_the_update_server(self):
+        for version in ("10.2.0", "10.2.7-h3"):
+            StagedImage.objects.create(
+                device=self.device, version=version, status="staged"
+            )
+        calls = []
+        software = SimpleNamespace(
+            versions={},
+            check=lambda: calls.append("check"),
+        )
+
+        def info(downloaded):
+            calls.append("info")
+            software.versions = {
+                version: {"downloaded": downloaded}
+                for version in ("10.2.0", "10.2.7-h3")
+            }
+
+        device = {
+            "db_device": self.device,
+            "pan_device": SimpleNamespace(software=software),
+        }
+        software.info = functools.partial(info, True)
+        self.assertTrue(
+            self.upgrade_job().software_available_check(
+                device=device, target_version="10.2.7-h3"
+            )
+        )
+        self.assertEqual(calls, ["info"])
+
+        # Images removed from the device since they were staged are forgotten, and the update server is queried
+        software.info = functools.partial(info, False)
+        with mock.patch(
+            "panosupgradeweb.scripts.upgrade_device.upgrade.get_software_catalog_cache",
+            return_value=SoftwareCatalogCache(client=InMemoryRedis(), ttl=0),
+        ):
+            self.upgrade_job().software_available_check(
+                device=device, target_version="10.2.7-h3"
+            )
+        self.assertEqual(calls, ["info", "info", "check"])
+        self.assertFalse(self.device.staged_images.exists())
+
+
+@override_settings(JOB_EVENTS_REDIS_URL="redis://127.0.0.1:1/0")
+class JobEventStreamTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.job = Job.objects.create(
+            author=cls.user,
+            job_status="completed",
+            job_type="upgrade",
+            task_id="stream-task",
+        )
+        for sequence_number in range(3):
+            JobLogEntry.objects.create(
+                job=cls.job,
+                message=f"line {sequence_number}",
+                sequence_number=sequence_number,
+                severity_level="info",
+                timestamp=timezone.now(),
+            )
+
+    async def read_stream(self, **extra):
+        token = sign_job_events_token("stream-task", self.user.pk)
+        response = await self.async_client.get(
+            f"/api/v1/jobs/stream-task/events/?token={token}", **extra
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return "".join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_stream_replays_stored_state_of_finished_job(self):
+        body = await self.read_stream()
+
+        self.assertTrue(body.startswith("event: status\n"))
+        self.assertIn('"job_status": "completed"', body)
+        self.assertEqual(body.count("event: log\n"), 3)
+
+    async def test_stream_resumes_after_last_event_id(self):
+        body = await self.read_stream(headers={"Last-Event-ID": "1"})
+
+        self.assertEqual(body.count("event: log\n"), 1)
+        self.assertIn("id: 2\n", body)
+
+    def test_stream_requires_authentication(self):
+        response = self.client.get("/api/v1/jobs/stream-task/events/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stream_is_refused_outside_asgi(self):
+        token = sign_job_events_token("stream-task", self.user.pk)
+        response = self.client.get(f"/api/v1/jobs/stream-task/events/?token={token}")
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    def test_stream_token_is_issued_for_the_job(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.post("/api/v1/jobs/stream-task/events/token/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            unsign_job_events_token(response.data["token"], "stream-task"),
+            self.user.pk,
+        )
+        self.assertIsNone(
+            unsign_job_events_token(response.data["token"], "other-task")
+        )
+
+    def test_stream_rejects_api_token_and_expired_tokens(self):
+        with mock.patch("time.time", return_value=time.time() - 120):
+            expired = sign_job_events_token("stream-task", self.user.pk)
+
+        for token in (self.token.key, expired):
+            response = self.client.get(
+                f"/api/v1/jobs/stream-task/events/?token={token}"
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class JobLogTailTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.job = Job.objects.create(
+            author=cls.user,
+            job_status="running",
+            job_type="upgrade",
+            task_id="tail-task",
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        for sequence_number in range(5):
+            JobLogEntry.objects.create(
+                job=cls.job,
+                message=f"line {sequence_number}",
+                sequence_number=sequence_number,
+                severity_level="info",
+                timestamp=timezone.now(),
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("jobs-logs", args=[self.job.pk])
+
+    def test_since_returns_only_newer_entries(self):
+        response = self.client.get(self.url, {"since": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entry["sequence_number"] for entry in response.data], [3, 4]
+        )
+        self.assertEqual(response["X-Log-Cursor"], "4")
+
+    def test_unchanged_logs_return_not_modified(self):
+        response = self.client.get(self.url, {"since": 4})
+        self.assertEqual(response.data, [])
+
+        response = self.client.get(
+            self.url, {"since": 4}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_entries_written_after_the_cursor_wait_for_the_next_poll(self):
+        aggregate = QuerySet.aggregate
+
+        def aggregate_then_log(queryset, *args, **kwargs):
+            result = aggregate(queryset, *args, **kwargs)
+            JobLogEntry.objects.create(
+                job=self.job,
+                message="line 5",
+                sequence_number=5,
+                severity_level="info",
+                timestamp=timezone.now(),
+            )
+            return result
+
+        with mock.patch.object(QuerySet, "aggregate", aggregate_then_log):
+            response = self.client.get(self.url, {"since": 2})
+
+        self.assertEqual(
+            [entry["sequence_number"] for entry in response.data], [3, 4]
+        )
+        self.assertEqual(response["X-Log-Cursor"], "4")
+
+        response = self.client.get(self.url, {"since": response["X-Log-Cursor"]})
+        self.assertEqual([entry["sequence_number"] for entry in response.data], [5])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {"since": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_logs_are_exported_as_csv(self):
+        response = await self.async_client.get(
+            reverse("jobs-export-logs", args=[self.job.pk]),
+            {"export_format": "csv", "since": 1},
+            headers={"Authorization": f"Token {self.token.key}"},
+        )
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        body = "".join([chunk.decode() async for chunk in response.streaming_content])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "sequence_number,timestamp,severity_level,message")
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["2", "3", "4"])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_logs_are_exported_from_a_sync_iterator_under_wsgi(self):
+        response = self.client.get(
+            reverse("jobs-export-logs", args=[self.job.pk]), {"since": 1}
+        )
+
+        self.assertFalse(response.is_async)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual([row["sequence_number"] for row in rows], [2, 3, 4])
+
+
+@override_settings(SNAPSHOT_BULK_CREATE_BATCH_SIZE=100)
+class SnapshotPersistenceTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.platform = DeviceType.objects.create(name="PA-VM", device_type="Firewall")
+        cls.device = Device.objects.create(
+            hostname="fw1",
+            sw_version="10.2.0",
+            platform=cls.platform,
+            author=cls.user,
+        )
+        cls.profile = Profile.objects.create(
+            active_support=True,
+            arp_table_snapshot=True,
+            candidate_config=True,
+            certificates_requirements=False,
+            command_timeout=120,
+            connection_timeout=30,
+            content_version=True,
+            content_version_snapshot=True,
+            download_retry_interval=60,
+            dynamic_updates=True,
+            expired_licenses=True,
+            free_disk_space=True,
+            ha=True,
+            install_retry_interval=60,
+            ip_sec_tunnels_snapshot=False,
+            jobs=False,
+            license_snapshot=True,
+            max_download_tries=3,
+            max_install_attempts=3,
+            max_reboot_tries=30,
+            max_snapshot_tries=3,
+            name="default",
+            nics_snapshot=True,
+            ntp_sync=False,
+            pan_password="secret",
+            pan_username="admin",
+            panorama=True,
+            planes_clock_sync=True,
+            reboot_retry_interval=60,
+            routes_snapshot=False,
+            session_stats_snapshot=False,
+            snapshot_retry_interval=60,
+        )
+        cls.job = Job.objects.create(
+            author=cls.user, job_type="upgrade", task_id="snapshot-task"
+        )
+
+    @staticmethod
+    def snapshot_results():
+        return {
+            "arp_table": {
+                f"ethernet1/1_10.0.{i // 256}.{i % 256}": {
+                    "interface": "ethernet1/1",
+                    "ip": f"10.0.{i // 256}.{i % 256}",
+                    "mac": "00:00:00:00:00:01",
+                    "port": "ethernet1/1",
+                    "status": "c",
+                    "ttl": "1800",
+                }
+                for i in range(250)
+            },
+            "content_version": {"version": "8799-8509"},
+            "nics": {"ethernet1/1": "up", "ethernet1/2": "down"},
+        }
+
+    def test_snapshot_rows_are_bulk_created_in_batches(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+
+        # Savepoint and release, the job SELECT, the snapshot INSERT and one INSERT per batch of child rows
+        with self.assertNumQueries(9):
+            row_counts = upgrade_job.save_snapshot(
+                device={"db_device": self.device},
+                snapshot_type="pre_upgrade",
+                snapshot_results=self.snapshot_results(),
+            )
+
+        self.assertEqual(
+            row_counts, {"arp_table": 250, "content_version": 1, "nics": 2}
+        )
+        snapshot = self.job.snapshots.get()
+        self.assertEqual(snapshot.arp_table_entries.count(), 250)
+
+    def test_diff_endpoint_reports_changed_rows(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        pre_results = self.snapshot_results()
+        post_results = self.snapshot_results()
+        post_results["nics"]["ethernet1/2"] = "up"
+        post_results["arp_table"].popitem()
+        upgrade_job.save_snapshot(
+            device={"db_device": self.device},
+            snapshot_type="pre_upgrade",
+            snapshot_results=pre_results,
+        )
+        upgrade_job.save_snapshot(
+            device={"db_device": self.device},
+            snapshot_type="post_upgrade",
+            snapshot_results=post_results,
+        )
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("snapshots-diff", kwargs={"job_id": self.job.task_id}),
+            {"threshold_arp_table_entries": 1},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["passed"])
+        tables = response.data["devices"][0]["tables"]
+        self.assertEqual(len(tables["arp_table_entries"]["removed"]), 1)
+        self.assertTrue(tables["arp_table_entries"]["passed"])
+        self.assertEqual(
+            tables["network_interfaces"]["changed"],
+            [{"key": {"name": "ethernet1/2"}, "changes": {"status": ["down", "up"]}}],
+        )
+        self.assertFalse(tables["network_interfaces"]["passed"])
+
+    def test_diff_endpoint_rejects_invalid_device(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("snapshots-diff", kwargs={"job_id": self.job.task_id}),
+            {"device": "not-a-uuid"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_snapshot_list_is_paginated_summaries(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        for snapshot_type in ("pre_upgrade", "post_upgrade", "post_upgrade"):
+            upgrade_job.save_snapshot(
+                device={"db_device": self.device},
+                snapshot_type=snapshot_type,
+                snapshot_results=self.snapshot_results(),
+            )
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("snapshots-list"), {"page_size": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+        self.assertNotIn("arp_table_entries", response.data["results"][0])
+        self.assertEqual(response.data["results"][0]["device_hostname"], "fw1")
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_snapshot_list_expands_requested_tables(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        for snapshot_type in ("pre_upgrade", "post_upgrade"):
+            upgrade_job.save_snapshot(
+                device={"db_device": self.device},
+                snapshot_type=snapshot_type,
+                snapshot_results=self.snapshot_results(),
+            )
+
+        self.client.force_authenticate(user=self.user)
+        # One query for the page and one per expanded table, whatever the number of snapshots
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("snapshots-list"),
+                {
+                    "expand": "network_interfaces,routes",
+                    "fields": "uuid,network_interfaces,arp_table_entries",
+                },
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        snapshot = response.data["results"][0]
+        self.assertEqual(
+            set(snapshot), {"uuid", "network_interfaces", "arp_table_entries"}
+        )
+        self.assertEqual(len(snapshot["arp_table_entries"]), 250)
+
+        response = self.client.get(reverse("snapshots-list"), {"expand": "unknown"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EXPORT_CHUNK_SIZE=100)
+    async def test_snapshot_table_is_exported_as_ndjson(self):
+        def save_snapshot():
+            upgrade_job = PanosUpgrade(
+                job_id=self.job.task_id, profile_uuid=self.profile.uuid
+            )
+            upgrade_job.save_snapshot(
+                device={"db_device": self.device},
+                snapshot_type="pre_upgrade",
+                snapshot_results=self.snapshot_results(),
+            )
+
+        await sync_to_async(save_snapshot)()
+        snapshot = await Snapshot.objects.aget(job=self.job)
+        token = await Token.objects.acreate(user=self.user)
+
+        response = await self.async_client.get(
+            reverse("snapshots-export", args=[snapshot.uuid]),
+            {"table": "arp_table_entries"},
+            headers={"Authorization": f"Token {token.key}"},
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        chunks = [chunk.decode() async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 5)
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(rows[0]["ip"], "10.0.0.0")
+
+    @override_settings(SNAPSHOT_STORAGE_FORMAT="compressed")
+    def test_compressed_snapshot_tables_are_read_lazily(self):
+        upgrade_job = PanosUpgrade(
+            job_id=self.job.task_id, profile_uuid=self.profile.uuid
+        )
+        upgrade_job.save_snapshot(
+            device={"db_device": self.device},
+            snapshot_type="pre_upgrade",
+            snapshot_results=self.snapshot_results(),
+        )
+
+        snapshot = Snapshot.objects.get(job=self.job)
+        self.assertEqual(snapshot.storage_format, "compressed")
+        self.assertFalse(snapshot.arp_table_entries.exists())
+        self.assertEqual(snapshot.network_interfaces.count(), 2)
+
+        arp_table_entries = SnapshotSerializer(snapshot).data["arp_table_entries"]
+        self.assertEqual(len(arp_table_entries), 250)
+        self.assertEqual(
+            arp_table_entries[0],
+            {
+                "interface": "ethernet1/1",
+                "ip": "10.0.0.0",
+                "mac": "00:00:00:00:00:01",
+                "port": "ethernet1/1",
+                "status": "c",
+                "ttl": 1800,
+            },
+        )
+
+
+class FakeFirewall:
+    """Answers the software job requests of the upgrade workflow like a firewall."""
+
+    def __init__(self, job_statuses=()):
+        # The status and result of each `show jobs` call, then FIN and OK
+        self.job_statuses = list(job_statuses)
+        self.requests = []
+
+    def op(self, cmd, cmd_xml=True):
+        self.requests.append(cmd)
+        if cmd.startswith("<request>"):
+            job_id = sum(request.startswith("<request>") for request in self.requests)
+            return ET.fromstring(
+                f'<response status="success"><result><job>{job_id}</job>'
+                "</result></response>"
+            )
+
+        job_status, result = (
+            self.job_statuses.pop(0) if self.job_statuses else ("FIN", "OK")
+        )
+        return ET.fromstring(
+            f'<response status="success"><result><job><status>{job_status}</status>'
+            f"<result>{result}</result><progress>50</progress>"
+            "</job></result></response>"
+        )
+
+
+@override_settings(
+    SOFTWARE_DOWNLOAD_DEADLINE=600,
+    SOFTWARE_JOB_POLL_BACKOFF=2,
+    SOFTWARE_JOB_POLL_INITIAL=5,
+    SOFTWARE_JOB_POLL_MAXIMUM=20,
+    UPGRADE_HA_PARALLEL_PREWORK=False,
+)
+class UpgradeWorkflowStateTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.profile = create_profile(max_install_attempts=2)
+        cls.secondary = Device.objects.create(
+            author=cls.user, ha_enabled=True, hostname="fw-b", sw_version="10.1.9"
+        )
+        cls.primary = Device.objects.create(
+            author=cls.user,
+            ha_enabled=True,
+            hostname="fw-a",
+            peer_device=cls.secondary,
+            sw_version="10.1.9",
+        )
+        cls.secondary.peer_device = cls.primary
+        cls.secondary.save()
+        cls.standalone = Device.objects.create(
+            author=cls.user, hostname="fw-c", sw_version="10.1.9"
+        )
+
+    def create_job(self, device, **state):
+        workflow_state = UpgradeWorkflow.initial_state(
+            author_id=self.user.id,
+            device_uuid=str(device.uuid),
+            dry_run=False,
+            profile_uuid=str(self.profile.uuid),
+            target_version="10.2.7-h3",
+        )
+        workflow_state.update(state)
+        return Job.objects.create(
+            author=self.user,
+            job_type="upgrade",
+            task_id="workflow-task",
+            workflow_state=workflow_state,
+        )
+
+    def run_workflow(self, job, firewalls, max_runs=50):
+        # Run the task like Celery would until it stops queuing itself
+        from .tasks import advance_upgrade_workflow
+
+        def connect_device(upgrade_job, db_device, profile):
+            return {
+                "db_device": db_device,
+                "job_id": upgrade_job.job_id,
+                "pan_device": firewalls[db_device.hostname],
+                "profile": profile,
+            }
+
+        def get_ha_status(upgrade_job, device):
+            upgrade_job.ha_details = {
+                "result": {
+                    "group": {
+                        "local-info": {"state": "passive"},
+                        "running-sync": "synchronized",
+                    }
+                }
+            }
+
+        def readiness_checks(upgrade_job, device):
+            upgrade_job.readiness_checks_succeeded = True
+
+        def take_snapshot(upgrade_job, device, snapshot_type):
+            upgrade_job.snapshot_succeeded = True
+
+        countdowns = []
+        with mock.patch.multiple(
+            PanosUpgrade,
+            assign_device=mock.DEFAULT,
+            check_reboot=mock.DEFAULT,
+            connect_device=mock.DEFAULT,
+            get_ha_status=mock.DEFAULT,
+            perform_readiness_checks=mock.DEFAULT,
+            report_snapshot_diff=mock.DEFAULT,
+            request_reboot=mock.DEFAULT,
+            suspend_ha_device=mock.DEFAULT,
+            take_snapshot=mock.DEFAULT,
+            autospec=True,
+        ) as patched, mock.patch.object(
+            advance_upgrade_workflow,
+            "apply_async",
+            side_effect=lambda args, countdown: countdowns.append(countdown),
+        ), mock.patch(
+            "panosupgradeweb.scripts.events.publish_job_event"
+        ):
+            patched["assign_device"].side_effect = lambda upgrade_job, device_dict: (
+                "primary" if device_dict["db_device"] == self.primary else "secondary"
+            )
+            patched["check_reboot"].return_value = True
+            patched["connect_device"].side_effect = connect_device
+            patched["get_ha_status"].side_effect = get_ha_status
+            patched["perform_readiness_checks"].side_effect = readiness_checks
+            patched["take_snapshot"].side_effect = take_snapshot
+
+            for _ in range(max_runs):
+                queued = len(countdowns)
+                with self.captureOnCommitCallbacks(execute=True):
+                    advance_upgrade_workflow(job.task_id)
+                if len(countdowns) == queued:
+                    break
+
+        job.refresh_from_db()
+        return countdowns, patched
+
+    def test_initial_state_is_persisted_on_job(self):
+        state = UpgradeWorkflow.initial_state(
+            author_id=self.user.id,
+            device_uuid="device-uuid",
+            dry_run=False,
+            profile_uuid="profile-uuid",
+            target_version="10.2.7-h3",
+        )
+        Job.objects.create(
+            author=self.user,
+            job_type="upgrade",
+            task_id="workflow-task",
+            workflow_state=state,
+        )
+
+        job = Job.objects.get(task_id="workflow-task")
+        self.assertEqual(job.workflow_state, state)
+        self.assertEqual(job.workflow_state["step"], "validate")
+        self.assertEqual(job.workflow_state["device_index"], 0)
+
+    def test_next_run_is_queued_after_the_state_is_saved(self):
+        from .tasks import advance_upgrade_workflow
+
+        Job.objects.create(
+            author=self.user,
+            job_type="upgrade",
+            task_id="workflow-task",
+            workflow_state={"step": "download"},
+        )
+        queued_states = []
+
+        class Workflow:
+            def __init__(self, job_id, state):
+                self.state = state
+
+            def advance(self):
+                self.state = {"step": "download_wait"}
+                return "wait", 1
+
+        def apply_async(args, countdown):
+            queued_states.append(Job.objects.get(task_id=args[0]).workflow_state)
+
+        with mock.patch(
+            "panosupgradeweb.tasks.UpgradeWorkflow", Workflow
+        ), mock.patch.object(
+            advance_upgrade_workflow, "apply_async", side_effect=apply_async
+        ), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            advance_upgrade_workflow("workflow-task")
+
+        self.assertEqual(queued_states, [{"step": "download_wait"}])
+
+    def test_ha_pair_is_upgraded_from_the_persisted_state(self):
+        job = self.create_job(self.secondary, step="download", downloads=["10.2.7-h3"])
+        firewalls = {
+            "fw-a": FakeFirewall(),
+            "fw-b": FakeFirewall(job_statuses=[("ACT", "PEND")]),
+        }
+
+        countdowns, patched = self.run_workflow(job, firewalls)
+
+        # Download, poll it twice, install, reboot and settle, then from install again
+        self.assertEqual(countdowns, [5, 10, 60, 60, 60, 120, 60, 60, 120])
+        self.assertEqual(job.job_status, "completed")
+        self.assertEqual(job.target_current_status, "completed")
+        self.assertEqual(job.peer_current_status, "completed")
+        self.assertEqual(job.workflow_state["step"], "complete")
+        self.assertEqual(job.workflow_state["device_index"], 1)
+
+        # Only the secondary device downloads the image, which is synced to its peer
+        self.assertEqual(
+            firewalls["fw-b"].requests,
+            [
+                "<request><system><software><download><sync-to-peer>yes</sync-to-peer>"
+                "<version>10.2.7-h3</version></download></software></system></request>",
+                "<show><jobs><id>1</id></jobs></show>",
+                "<show><jobs><id>1</id></jobs></show>",
+                "<request><system><software><install><version>10.2.7-h3</version>"
+                "</install></software></system></request>",
+                "<show><jobs><id>2</id></jobs></show>",
+            ],
+        )
+        self.assertEqual(
+            firewalls["fw-a"].requests,
+            [
+                "<request><system><software><install><version>10.2.7-h3</version>"
+                "</install></software></system></request>",
+                "<show><jobs><id>1</id></jobs></show>",
+            ],
+        )
+        self.assertEqual(patched["get_ha_status"].call_count, 1)
+        self.assertEqual(patched["suspend_ha_device"].call_count, 1)
+        rebooted = [
+            call.kwargs["device"]["db_device"]
+            for call in patched["request_reboot"].call_args_list
+        ]
+        self.assertEqual(rebooted, [self.secondary, self.primary])
+
+    def test_failed_install_is_retried_then_errors(self):
+        job = self.create_job(self.standalone, step="install")
+        firewalls = {"fw-c": FakeFirewall(job_statuses=[("FIN", "FAIL")] * 2)}
+
+        countdowns, patched = self.run_workflow(job, firewalls)
+
+        self.assertEqual(countdowns, [60, 60, 60])
+        self.assertEqual(job.job_status, "errored")
+        self.assertEqual(job.workflow_state["step"], "await_install")
+        self.assertEqual(job.workflow_state["attempt"], 2)
+        requests = firewalls["fw-c"].requests
+        self.assertEqual(sum(r.startswith("<request>") for r in requests), 2)
+        patched["request_reboot"].assert_not_called()
+        self.assertTrue(
+            job.log_entries.filter(
+                message__contains="Install of 10.2.7-h3 failed. Giving up after 2"
+            ).exists()
+        )
+
+    def test_download_past_its_deadline_is_requested_again(self):
+        job = self.create_job(
+            self.standalone,
+            step="await_download",
+            downloads=["10.2.7-h3"],
+            software_job="7",
+            software_job_polls=3,
+            software_job_started=time.time() - 601,
+        )
+        firewalls = {"fw-c": FakeFirewall(job_statuses=[("ACT", "PEND")])}
+
+        countdowns, _ = self.run_workflow(job, firewalls, max_runs=1)
+
+        self.assertEqual(countdowns, [60])
+        self.assertEqual(job.workflow_state["step"], "download")
+        self.assertEqual(job.workflow_state["attempt"], 1)
+        self.assertEqual(
+            firewalls["fw-c"].requests, ["<show><jobs><id>7</id></jobs></show>"]
+        )
+
+    def test_ha_prework_runs_concurrently_on_job_copies(self):
+        upgrade_job = SimpleNamespace(
+            logger=PanOsUpgradeLogger("pan-os-upgrade-upgrade"),
+            primary_device={"db_device": Device(hostname="fw-primary")},
+            snapshot_succeeded=False,
+        )
+        # Both preparations must be running at the same time to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        prepared_jobs = []
+
+        def prepare(upgrade_job, status=None):
+            barrier.wait()
+            upgrade_job.snapshot_succeeded = True
+            prepared_jobs.append(upgrade_job)
+            return status
+
+        status = run_ha_prework_concurrently(
+            upgrade_job=upgrade_job,
+            preparations=[prepare, functools.partial(prepare, status="errored")],
+        )
+
+        self.assertEqual(status, "errored")
+        self.assertEqual(len({id(job) for job in prepared_jobs}), 2)
+        self.assertFalse(upgrade_job.snapshot_succeeded)
+
+
+class UpgradeBatchTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", email="test@email.com", password="secret"
+        )
+        cls.platform = DeviceType.objects.create(name="PA-VM", device_type="Firewall")
+        cls.panorama = Device.objects.create(hostname="panorama1", author=cls.user)
+        cls.devices = [
+            Device.objects.create(
+                hostname=f"fw{i}",
+                sw_version="10.2.0",
+                platform=cls.platform,
+                panorama_appliance=cls.panorama if i < 3 else None,
+                author=cls.user,
+            )
+            for i in range(4)
+        ]
+        cls.profile = create_profile()
+
+    def create_batch(self, waves, **kwargs):
+        batch = UpgradeBatch.objects.create(
+            author=self.user,
+            profile=self.profile,
+            target_version="10.2.7-h3",
+            **kwargs,
+        )
+        for device, wave in zip(self.devices, waves):
+            UpgradeBatchDevice.objects.create(batch=batch, device=device, wave=wave)
+        return batch
+
+    def advance(self, batch):
+        started = []
+        with self.captureOnCommitCallbacks(execute=True):
+            finished = advance_batch(str(batch.uuid), start_upgrade=started.append)
+        return finished, started
+
+    def finish(self, member, job_status):
+        Job.objects.create(
+            author=self.user,
+            job_type="upgrade",
+            job_status=job_status,
+            task_id=member.task_id,
+        )
+
+    def test_devices_are_planned_in_waves_by_ha_role(self):
+        devices = [
+            Device(hostname="fw-active", ha_enabled=True, local_state="active"),
+            Device(hostname="fw-standalone", ha_enabled=False),
+            Device(hostname="fw-passive", ha_enabled=True, local_state="passive"),
+        ]
+
+        self.assertEqual(plan_waves(devices, "ha_role"), [2, 0, 1])
+        self.assertEqual(plan_waves(devices, "none"), [0, 0, 0])
+
+    def test_batch_runs_wave_by_wave_and_stops_on_failures(self):
+        batch = self.create_batch(waves=[0, 0, 1, 2], max_failure_rate=25.0)
+
+        finished, started = self.advance(batch)
+        self.assertFalse(finished)
+        self.assertEqual(
+            [member.device_id for member in started],
+            [device.uuid for device in self.devices[:2]],
+        )
+        for member in started:
+            self.finish(member, "completed")
+
+        finished, started = self.advance(batch)
+        self.assertFalse(finished)
+        self.assertEqual(
+            [member.device_id for member in started], [self.devices[2].uuid]
+        )
+        self.finish(started[0], "errored")
+
+        # One failure out of three finished devices exceeds the failure rate, the last wave never starts
+        finished, started = self.advance(batch)
+        batch.refresh_from_db()
+        self.assertTrue(finished)
+        self.assertEqual(started, [])
+        self.assertEqual(batch.status, "stopped")
+        self.assertEqual(
+            batch.progress()["counts"],
+            {"completed": 2, "errored": 1, "cancelled": 1},
+        )
+
+    def test_slots_are_limited_per_batch_and_panorama(self):
+        batch = self.create_batch(
+            waves=[0, 0, 0, 0],
+            max_concurrent_installs=1,
+            max_concurrent_downloads_per_panorama=2,
+        )
+        self.advance(batch)
+        task_ids = list(batch.devices.values_list("task_id", flat=True))
+
+        # Two of the three devices managed by the Panorama may download, devices without Panorama are not limited
+        self.assertEqual(
+            [acquire_batch_slot(task_id, "download") for task_id in task_ids],
+            [True, True, False, True],
+        )
+        self.assertTrue(acquire_batch_slot(task_ids[0], "install"))
+        self.assertTrue(acquire_batch_slot(task_ids[2], "download"))
+        self.assertFalse(acquire_batch_slot(task_ids[1], "install"))
+        self.assertTrue(acquire_batch_slot("not-in-a-batch", "install"))
 
 
 class UserRegistrationTestCase(APITestCase):
@@ -261,7 +2248,8 @@ class UserLoginTestCase(APITestCase):
         )
 
     def test_login_to_drf_api(self):
-        response = self.client.get(reverse("panorama-list"))
+        response = self.client.get(reverse("jobs-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
         response = self.client.post(
             reverse("rest_login"),
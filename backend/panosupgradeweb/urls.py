@@ -12,6 +12,8 @@ from .views import (
     UserViewSet,
     UserProfileView,
     SnapshotViewSet,
+    UpgradeBatchViewSet,
+    job_events,
 )
 
 router = SimpleRouter()
@@ -51,12 +53,23 @@ router.register(
     basename="snapshots",
 )
 
+router.register(
+    "upgrade-batches",
+    UpgradeBatchViewSet,
+    basename="upgrade-batches",
+)
+
 urlpatterns = [
     path(
         "inventory/platforms/",
         DeviceTypeViewSet.as_view({"get": "list"}),
         name="inventory-platforms-list",
     ),
+    path(
+        "inventory/prestage/",
+        DeviceViewSet.as_view({"post": "prestage_images"}),
+        name="inventory-prestage",
+    ),
     path(
         "inventory/refresh/",
         DeviceViewSet.as_view({"post": "refresh_device"}),
@@ -72,6 +85,11 @@ urlpatterns = [
         DeviceViewSet.as_view({"post": "sync_inventory"}),
         name="inventory-sync",
     ),
+    path(
+        "inventory/sync-all/",
+        DeviceViewSet.as_view({"post": "sync_all_inventory"}),
+        name="inventory-sync-all",
+    ),
     path(
         "inventory/upgrade/",
         DeviceViewSet.as_view({"post": "upgrade_devices"}),
@@ -94,6 +112,11 @@ urlpatterns = [
         {"device_type": "Panorama"},
         name="panorama-platforms",
     ),
+    path(
+        "jobs/<str:pk>/events/",
+        job_events,
+        name="job-events",
+    ),
     path(
         "panos-versions/sync/",
         PanosVersionViewSet.as_view({"post": "sync_versions"}),
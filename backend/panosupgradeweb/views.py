@@ -2,20 +2,26 @@
 
 from packaging import version
 import re
+import uuid
 
 # django imports
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Value as V
-from django.db.models import Case, When
+from django.db.models import Case, Max, When
 from django.db.models.functions import Lower, Replace
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 # django rest framework imports
-from rest_framework import viewsets, status, permissions
+from rest_framework import exceptions, viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.generics import RetrieveAPIView
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 # directory object imports
@@ -26,13 +32,33 @@ from .models import (
     PanosVersion,
     Profile,
     Snapshot,
+    UpgradeBatch,
 )
+from .pagination import SnapshotCursorPagination
 from .permissions import IsAuthorOrReadOnly
+from .scripts.events import (
+    sign_job_events_token,
+    stream_job_events,
+    unsign_job_events_token,
+)
+from .scripts.exports import (
+    EXPORT_FORMATS,
+    EXPORT_TABLES,
+    JOB_LOG_COLUMNS,
+    export_response,
+    job_log_rows,
+    snapshot_table_rows,
+)
+from .scripts.rate_limit import get_panorama_rate_limiter
+from .scripts.snapshot_diff import DEFAULT_THRESHOLDS, diff_job_snapshots
+from .scripts.upgrade_batch import stop_batch
 from .serializers import (
     DeviceSerializer,
     DeviceRefreshSerializer,
     DeviceTypeSerializer,
     DeviceUpgradeSerializer,
+    ImagePrestageSerializer,
+    InventorySyncAllSerializer,
     InventorySyncSerializer,
     JobSerializer,
     JobLogEntrySerializer,
@@ -40,10 +66,15 @@ from .serializers import (
     PanosVersionSyncSerializer,
     ProfileSerializer,
     SnapshotSerializer,
+    StagedImageSerializer,
+    UpgradeBatchSerializer,
     UserSerializer,
 )
 from .tasks import (
+    advance_upgrade_batch,
     execute_inventory_sync,
+    execute_inventory_sync_all,
+    execute_prestage_task,
     execute_refresh_device_task,
     execute_panos_version_sync,
     execute_upgrade_device_task,
@@ -128,6 +159,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_update(self, serializer):
+        # The edited row no longer matches the fingerprint of the last inventory sync, which will rewrite it
+        serializer.save(fingerprint=None)
+
     @action(detail=False, methods=["get"], url_path="job-status")
     def get_job_status(self, request):
         job_id = request.query_params.get("job_id")
@@ -149,6 +184,70 @@ class DeviceViewSet(viewsets.ModelViewSet):
         else:
             return JsonResponse({"error": "Missing job ID."}, status=400)
 
+    @action(detail=True, methods=["get"], url_path="rate-limit")
+    def rate_limit(self, request, pk=None):
+        """
+        Return the wait time metrics of the shared rate limiter of a Panorama appliance.
+        """
+        device = self.get_object()
+        if device.platform is None or device.platform.device_type != "Panorama":
+            return Response(
+                {"error": "Rate limits only apply to Panorama appliances."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        hostname = device.ipv4_address if device.ipv4_address else device.ipv6_address
+        return Response(get_panorama_rate_limiter().metrics(hostname))
+
+    @action(detail=False, methods=["post"], url_path="prestage")
+    def prestage_images(self, request):
+        """
+        Download the images of a target version onto devices ahead of their upgrade, in a single pre-stage job.
+        """
+        serializer = ImagePrestageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        devices = serializer.validated_data["devices"]
+        profile_uuid = serializer.validated_data["profile"]
+        if not Profile.objects.filter(uuid=profile_uuid).exists():
+            return Response(
+                {"error": "Invalid profile."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        device_uuids = [
+            str(device_uuid)
+            for device_uuid in Device.objects.filter(uuid__in=devices).values_list(
+                "uuid", flat=True
+            )
+        ]
+        if not device_uuids:
+            return Response(
+                {"error": "Invalid devices."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        task = execute_prestage_task.delay(
+            author_id=serializer.validated_data["author"],
+            device_uuids=device_uuids,
+            profile_uuid=str(profile_uuid),
+            target_version=serializer.validated_data["target_version"],
+            verify=serializer.validated_data["verify"],
+        )
+        return Response(
+            {"job_id": task.id, "devices": len(device_uuids)},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"], url_path="staged-images")
+    def staged_images(self, request, pk=None):
+        """
+        Return the images pre-staged onto a device.
+        """
+        device = self.get_object()
+        return Response(
+            StagedImageSerializer(device.staged_images.all(), many=True).data
+        )
+
     @action(detail=False, methods=["post"], url_path="refresh")
     def refresh_device(self, request):
         serializer = DeviceRefreshSerializer(data=request.data)
@@ -211,6 +310,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
                     panorama_device_uuid,
                     profile_uuid,
                     author_id,
+                    fast=serializer.validated_data["fast"],
                 )
 
                 return Response(
@@ -234,6 +334,32 @@ class DeviceViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], url_path="sync-all")
+    def sync_all_inventory(self, request):
+        """
+        Sync the inventory of every Panorama device as a single job.
+        """
+        serializer = InventorySyncAllSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        profile_uuid = serializer.validated_data["profile"]
+        if not Profile.objects.filter(uuid=profile_uuid).exists():
+            return Response(
+                {"error": "Invalid profile"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        task = execute_inventory_sync_all.delay(
+            str(profile_uuid),
+            serializer.validated_data["author"],
+            fast=serializer.validated_data["fast"],
+        )
+
+        return Response(
+            {"job_id": task.id},
+            status=status.HTTP_200_OK,
+        )
+
     # Add a new action in the DeviceViewSet
     @action(detail=False, methods=["post"], url_path="upgrade")
     def upgrade_devices(self, request):
@@ -285,18 +411,129 @@ class DeviceViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_export_format(request):
+    """
+    Read the format of a streaming export from its `export_format` query parameter.
+
+    The DRF `format` parameter selects a renderer, so exports use their own parameter.
+
+    Args:
+        request (Request): The DRF request.
+
+    Returns:
+        str: "ndjson", the default, or "csv".
+
+    Raises:
+        ValidationError: If the format is not supported.
+    """
+    export_format = request.query_params.get("export_format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        raise exceptions.ValidationError(
+            {"error": f"The export format must be one of: {', '.join(EXPORT_FORMATS)}"}
+        )
+    return export_format
+
+
+def snapshot_serializer_context(request, summary):
+    """
+    Read the sparse fieldset of a snapshot request from its `fields` and `expand` query parameters.
+
+    Both parameters are comma-separated lists. `fields` limits the response to the named fields and `expand` names
+    the nested tables to include, or "all". Nested tables named in `fields` are expanded too.
+
+    Args:
+        request (Request): The DRF request.
+        summary (bool): Whether nested tables are left out unless expanded, as in list responses.
+
+    Returns:
+        Dict: The `fields` and `expand` entries of the SnapshotSerializer context.
+
+    Raises:
+        ValidationError: If a field or nested table is unknown.
+    """
+
+    def split(name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    fields = split("fields")
+    expand = split("expand")
+
+    unknown = [
+        name
+        for name in expand or []
+        if name != "all" and name not in SnapshotSerializer.NESTED_FIELDS
+    ]
+    unknown += [
+        name for name in fields or [] if name not in SnapshotSerializer.Meta.fields
+    ]
+    if unknown:
+        raise exceptions.ValidationError(
+            {"error": f"Unknown snapshot fields: {', '.join(unknown)}"}
+        )
+
+    if expand is None and summary:
+        expand = []
+    if fields and expand is not None:
+        expand += [name for name in fields if name in SnapshotSerializer.NESTED_FIELDS]
+
+    return {"fields": fields, "expand": expand}
+
+
+def snapshot_queryset(queryset, context):
+    """
+    Prefetch the nested tables a snapshot response includes, and nothing else.
+
+    Args:
+        queryset (QuerySet): The snapshots to serialize.
+        context (Dict): The serializer context returned by `snapshot_serializer_context`.
+
+    Returns:
+        QuerySet: The snapshots with their device joined and the expanded tables prefetched, so serializing a page
+        costs one query per nested table instead of one per snapshot and table.
+    """
+    expand = context["expand"]
+    fields = context["fields"]
+    nested = [
+        name
+        for name in SnapshotSerializer.NESTED_FIELDS
+        if (expand is None or "all" in expand or name in expand)
+        and (not fields or name in fields)
+    ]
+    if not any(name in Snapshot.COMPRESSED_TABLES for name in nested):
+        queryset = queryset.defer("tables_blob")
+    return queryset.select_related("device").prefetch_related(*nested)
+
+
 class SnapshotViewSet(viewsets.ViewSet):
-    @staticmethod
-    def list(request):
-        snapshots = Snapshot.objects.all()
-        serializer = SnapshotSerializer(snapshots, many=True)
-        return Response(serializer.data)
+    """
+    Snapshots of the devices of upgrade jobs.
+
+    The list is cursor paginated and returns snapshot summaries; the nested tables are included with `expand` (for
+    example `?expand=routes,session_stats` or `?expand=all`). Every action accepts `fields` to select fields.
+    """
+
+    pagination_class = SnapshotCursorPagination
+
+    def list(self, request):
+        context = snapshot_serializer_context(request, summary=True)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            snapshot_queryset(Snapshot.objects.all(), context),
+            request,
+            view=self,
+        )
+        serializer = SnapshotSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     @staticmethod
     def retrieve(request, pk=None):
+        context = snapshot_serializer_context(request, summary=False)
         try:
-            snapshot = Snapshot.objects.get(uuid=pk)
-            serializer = SnapshotSerializer(snapshot)
+            snapshot = snapshot_queryset(Snapshot.objects.all(), context).get(uuid=pk)
+            serializer = SnapshotSerializer(snapshot, context=context)
             return Response(serializer.data)
         except Snapshot.DoesNotExist:
             return Response(
@@ -305,9 +542,10 @@ class SnapshotViewSet(viewsets.ViewSet):
 
     @staticmethod
     def retrieve_with_details(request, pk=None):
+        context = snapshot_serializer_context(request, summary=False)
         try:
-            snapshot = Snapshot.objects.get(uuid=pk)
-            serializer = SnapshotSerializer(snapshot)
+            snapshot = snapshot_queryset(Snapshot.objects.all(), context).get(uuid=pk)
+            serializer = SnapshotSerializer(snapshot, context=context)
             return Response(serializer.data)
         except Snapshot.DoesNotExist:
             return Response(
@@ -316,16 +554,102 @@ class SnapshotViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=["get"], url_path="job/(?P<job_id>[^/.]+)")
     def list_by_job(self, request, job_id=None):
-        snapshots = Snapshot.objects.filter(job__task_id=job_id)
-        serializer = SnapshotSerializer(snapshots, many=True)
+        context = snapshot_serializer_context(request, summary=False)
+        snapshots = snapshot_queryset(
+            Snapshot.objects.filter(job__task_id=job_id), context
+        )
+        serializer = SnapshotSerializer(snapshots, many=True, context=context)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], url_path="device/(?P<device_id>[^/.]+)")
     def list_by_device(self, request, device_id=None):
-        snapshots = Snapshot.objects.filter(device__uuid=device_id)
-        serializer = SnapshotSerializer(snapshots, many=True)
+        context = snapshot_serializer_context(request, summary=False)
+        snapshots = snapshot_queryset(
+            Snapshot.objects.filter(device__uuid=device_id), context
+        )
+        serializer = SnapshotSerializer(snapshots, many=True, context=context)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """
+        Stream one table of a snapshot as NDJSON or CSV.
+
+        The `table` query parameter names the table (for example `routes`) and `export_format` is "ndjson", the
+        default, or "csv".
+        """
+        export_format = get_export_format(request)
+        table = request.query_params.get("table")
+        if table not in EXPORT_TABLES:
+            return Response(
+                {"error": f"The table must be one of: {', '.join(EXPORT_TABLES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            snapshot = Snapshot.objects.get(uuid=pk)
+        except Snapshot.DoesNotExist:
+            return Response(
+                {"error": "Snapshot not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        return export_response(
+            request,
+            snapshot_table_rows(snapshot, table),
+            Snapshot.table_columns(table),
+            export_format,
+            f"{snapshot.device.hostname}-{snapshot.snapshot_type}-{table}",
+        )
+
+    @action(detail=False, methods=["get"], url_path="(?P<job_id>[^/.]+)/diff")
+    def diff(self, request, job_id=None):
+        """
+        Compare the pre-upgrade and post-upgrade snapshots of the devices of a job.
+
+        The optional `device` query parameter limits the comparison to one device, and `threshold_<table>`
+        parameters (for example `threshold_routes=5`) override the allowed change percentage of a table.
+        """
+        thresholds = {}
+        for name in DEFAULT_THRESHOLDS:
+            value = request.query_params.get(f"threshold_{name}")
+            if value is None:
+                continue
+            try:
+                thresholds[name] = float(value)
+            except ValueError:
+                return Response(
+                    {"error": f"Invalid threshold for {name}: {value}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        device_uuid = request.query_params.get("device")
+        if device_uuid is not None:
+            try:
+                device_uuid = str(uuid.UUID(device_uuid))
+            except ValueError:
+                return Response(
+                    {"error": f"Invalid device UUID: {device_uuid}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        if not Job.objects.filter(task_id=job_id).exists():
+            return Response(
+                {"error": "Job not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        devices = diff_job_snapshots(
+            job_id,
+            device_uuid=device_uuid,
+            thresholds=thresholds,
+        )
+        return Response(
+            {
+                "job": job_id,
+                "passed": all(device["passed"] for device in devices),
+                "devices": devices,
+            }
+        )
+
 
 class DeviceTypeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
@@ -407,26 +731,194 @@ class JobViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def logs(self, request, pk=None):
         job = self.get_queryset().get(pk=pk)
-        log_entries = job.log_entries.all()
-        serializer = JobLogEntrySerializer(log_entries, many=True)
-        return Response(serializer.data)
+        return job_log_entries_response(
+            request,
+            job,
+            lambda log_entries: JobLogEntrySerializer(log_entries, many=True).data,
+        )
+
+    @action(detail=True, methods=["post"], url_path="events/token")
+    def events_token(self, request, pk=None):
+        """
+        Issue a token opening the event stream of a job, valid for `JOB_EVENTS_TOKEN_MAX_AGE` seconds.
+
+        The token is passed to `/jobs/<id>/events/` as the `token` query parameter, since browsers cannot set headers
+        on an `EventSource`. It is only checked when a stream is opened, so an open stream outlives it.
+        """
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(
+            {
+                "token": sign_job_events_token(job.task_id, request.user.pk),
+                "expires_in": settings.JOB_EVENTS_TOKEN_MAX_AGE,
+            }
+        )
+
+    @action(detail=True, methods=["get"], url_path="logs/export")
+    def export_logs(self, request, pk=None):
+        """
+        Stream the log entries of a job as NDJSON or CSV.
+
+        `export_format` is "ndjson", the default, or "csv", and `since` only exports the entries after that
+        sequence number.
+        """
+        export_format = get_export_format(request)
+        since = request.query_params.get("since")
+        if since is not None and not since.isdigit():
+            return Response(
+                {"error": "The since cursor must be a log entry sequence number."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return export_response(
+            request,
+            job_log_rows(job, since=int(since) if since is not None else None),
+            JOB_LOG_COLUMNS,
+            export_format,
+            f"{job.task_id}-logs",
+        )
 
 
 class JobLogViewSet(viewsets.ViewSet):
     @staticmethod
     def list(request, job_id):
         job = get_object_or_404(Job, task_id=job_id)
-        log_entries = job.log_entries.all()
+        return job_log_entries_response(
+            request,
+            job,
+            lambda log_entries: [
+                {
+                    "timestamp": log.timestamp,
+                    "severity_level": log.severity_level,
+                    "message": log.message,
+                }
+                for log in log_entries
+            ],
+        )
 
-        data = [
-            {
-                "timestamp": log.timestamp,
-                "severity_level": log.severity_level,
-                "message": log.message,
-            }
-            for log in log_entries
-        ]
-        return Response(data)
+
+def job_log_entries_response(request, job, serialize):
+    """
+    Return the log entries of a job, optionally only those after a cursor, with ETag support.
+
+    The `since` query parameter is the `sequence_number` of the last entry the client already has; only newer
+    entries are returned, so polling costs are proportional to the new lines rather than the whole history. The
+    cursor to send on the next poll is returned in the `X-Log-Cursor` header. The ETag identifies the requested
+    cursor and the last stored entry, so a poll without new entries is answered with 304 Not Modified. Entries are
+    returned up to that last entry only, so the cursor and ETag always describe the rows of the response; entries
+    written in the meantime are returned by the next poll.
+
+    Args:
+        request (Request): The DRF request.
+        job (Job): The job whose log entries are returned.
+        serialize (Callable[[QuerySet], list]): Converts the log entries to the response data.
+
+    Returns:
+        Response: The serialized log entries, 304 when unchanged, or 400 for an invalid cursor.
+    """
+    since = request.query_params.get("since")
+    if since is not None:
+        if not since.isdigit():
+            return Response(
+                {"error": "The since cursor must be a log entry sequence number."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        since = int(since)
+
+    last = job.log_entries.aggregate(last=Max("sequence_number"))["last"]
+    cursor = last if last is not None else since
+    etag = f'"{job.pk}:{since}:{last}"'
+    headers = {"ETag": etag}
+    if cursor is not None:
+        headers["X-Log-Cursor"] = str(cursor)
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if last is None:
+        log_entries = job.log_entries.none()
+    else:
+        log_entries = job.log_entries.filter(sequence_number__lte=last)
+    if since is not None:
+        log_entries = log_entries.filter(sequence_number__gt=since)
+
+    return Response(serialize(log_entries), headers=headers)
+
+
+def authenticate_event_stream(request, job_id):
+    """
+    Authenticate a request to the event stream of a job.
+
+    Browsers cannot set headers on an `EventSource`, so besides the API's authentication classes the stream accepts
+    the short-lived token issued by `/jobs/<id>/events/token/` as the `token` query parameter. The API token itself is
+    never accepted in the URL.
+
+    Args:
+        request (HttpRequest): The Django request.
+        job_id (str): The task ID of the job whose events are requested.
+
+    Returns:
+        Optional[User]: The authenticated user, or None.
+    """
+    token = request.GET.get("token")
+    if token:
+        user_id = unsign_job_events_token(token, job_id)
+        if user_id is None:
+            return None
+        return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+    drf_request = Request(
+        request,
+        authenticators=[
+            authentication()
+            for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def job_events(request, pk=None):
+    """
+    Stream the status and log entries of a job as Server-Sent Events.
+
+    The stream starts with the stored status and log entries of the job, then relays the events the workers publish
+    through Redis until the job reaches a final status. A reconnecting browser sends the `Last-Event-ID` header and
+    only receives the log entries it has not seen yet; a client opening a new stream, for example with a fresh token,
+    passes the same value as the `last_event_id` query parameter.
+    """
+    user = await sync_to_async(authenticate_event_stream)(request, pk)
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    if not await Job.objects.filter(task_id=pk).aexists():
+        return JsonResponse({"error": "Invalid job ID."}, status=404)
+
+    # A WSGI server would hold a worker until the job finishes and send the whole stream at once
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Job event streams require the ASGI server."},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    response = StreamingHttpResponse(
+        stream_job_events(
+            pk,
+            int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 class PanosVersionViewSet(viewsets.ModelViewSet):
@@ -561,6 +1053,53 @@ class ProfileViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class UpgradeBatchViewSet(viewsets.ModelViewSet):
+    """
+    Fleet-wide upgrades run in waves with concurrency limits.
+
+    Creating a batch plans its waves and starts the orchestrator; the `stop` action cancels the devices that have not
+    started yet, devices already upgrading are left to finish.
+    """
+
+    queryset = UpgradeBatch.objects.all()
+    serializer_class = UpgradeBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = "uuid"
+    http_method_names = ["get", "post", "head", "options"]
+
+    def get_queryset(self):
+        queryset = UpgradeBatch.objects.order_by("-created_at")
+        if self.action != "list":
+            queryset = queryset.prefetch_related("devices__device")
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        # The list only summarizes the batches, the devices are returned by retrieve
+        context = {**self.get_serializer_context(), "members": False}
+        serializer = self.get_serializer(queryset, many=True, context=context)
+        return Response(serializer.data)
+
+    def perform_create(self, serializer):
+        batch = serializer.save(author=self.request.user)
+        advance_upgrade_batch.delay(str(batch.uuid))
+
+    @action(detail=True, methods=["post"])
+    def stop(self, request, *args, **kwargs):
+        batch = self.get_object()
+        if batch.status == "completed":
+            return Response(
+                {"error": "The batch has already completed."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cancelled = stop_batch(batch)
+        return Response(
+            {"status": batch.status, "cancelled": cancelled},
+            status=status.HTTP_200_OK,
+        )
+
+
 class UserViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = get_user_model().objects.all()
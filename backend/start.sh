@@ -5,6 +5,8 @@ echo "Apply database migrations"
 python manage.py makemigrations panosupgradeweb
 python manage.py makemigrations
 python manage.py migrate
+# Number the log entries stored before sequence numbers existed
+python manage.py backfill_job_log_sequence_numbers
 
 # Create superuser
 echo "Create superuser"
@@ -35,7 +37,15 @@ echo "Collect static files"
 python manage.py collectstatic --noinput
 
 # Start server
+# The job event streams (/api/v1/jobs/<id>/events/) need an ASGI server, so the application is served through
+# gunicorn's uvicorn worker. Images built before uvicorn was added to requirements.txt keep the WSGI server, where the
+# streams are refused and the frontend polls the job status instead.
 echo "Starting server"
 # exec python manage.py runserver 0.0.0.0:8000
-gunicorn django_project.wsgi:application --bind 0.0.0.0:8000
+if python -c "import uvicorn" 2>/dev/null; then
+    gunicorn django_project.asgi:application --bind 0.0.0.0:8000 --worker-class uvicorn.workers.UvicornWorker
+else
+    echo "uvicorn is not installed, serving WSGI without job event streams"
+    gunicorn django_project.wsgi:application --bind 0.0.0.0:8000
+fi
 
@@ -163,13 +163,13 @@ export class InventoryDetailsFacade {
                 if (jobId === null) {
                     throw new Error("Job ID is null");
                 }
-                return this.pollJobStatus(jobId);
+                return this.watchJobStatus(jobId);
             }),
         );
     }
 
-    private pollJobStatus(jobId: string): Observable<boolean> {
-        return this.inventoryService.pollJobStatus(jobId, 2000).pipe(
+    private watchJobStatus(jobId: string): Observable<boolean> {
+        return this.inventoryService.watchJobStatus(jobId).pipe(
             map((response) => response.status === "completed"),
             catchError((error) => {
                 if (error instanceof NotFoundError) {
@@ -89,6 +89,7 @@ export class SnapshotListComponent implements OnInit {
     jobIds = this.facade.jobIds;
     deviceHostnames = this.facade.deviceHostnames;
     filteredSnapshots = this.facade.filteredSnapshots;
+    openedSnapshots = this.facade.openedSnapshots;
 
     // Expose chart config properties
     view = this.chartConfig.view;
@@ -110,7 +111,10 @@ export class SnapshotListComponent implements OnInit {
         });
 
         effect(() => {
-            const firstSnapshot = this.facade.filteredSnapshots()[0];
+            const firstSummary = this.facade.filteredSnapshots()[0];
+            const firstSnapshot =
+                firstSummary &&
+                this.facade.openedSnapshots()[firstSummary.uuid];
             if (
                 firstSnapshot &&
                 firstSnapshot.session_stats &&
@@ -136,6 +140,10 @@ export class SnapshotListComponent implements OnInit {
         this.setupFormListeners();
     }
 
+    openSnapshot(uuid: string) {
+        this.facade.openSnapshot(uuid);
+    }
+
     setupFormListeners() {
         this.snapshotFilterForm
             .get("jobId")
@@ -6,11 +6,13 @@ import { SnapshotProcessorService } from "./snapshot-processor.service";
 import {
     SessionStats,
     Snapshot,
+    SnapshotSummary,
 } from "../../shared/interfaces/snapshot.interface";
 
 @Injectable()
 export class SnapshotListFacade {
-    private snapshots = signal<Snapshot[]>([]);
+    private snapshots = signal<SnapshotSummary[]>([]);
+    private snapshotDetails = signal<Record<string, Snapshot>>({});
     private selectedJobId = signal<string | null>(null);
     private selectedDeviceHostname = signal<string | null>(null);
     private selectedSnapshotType = signal<"pre" | "post">("pre");
@@ -28,23 +30,20 @@ export class SnapshotListFacade {
     });
 
     filteredSnapshots = computed(() =>
-        this.snapshots()
-            .filter(
-                (snapshot) =>
-                    (!this.selectedJobId() ||
-                        snapshot.job === this.selectedJobId()) &&
-                    (!this.selectedDeviceHostname() ||
-                        snapshot.device_hostname ===
-                            this.selectedDeviceHostname()) &&
-                    snapshot.snapshot_type === this.selectedSnapshotType(),
-            )
-            .map(
-                this.snapshotProcessorService.processSnapshot.bind(
-                    this.snapshotProcessorService,
-                ),
-            ),
+        this.snapshots().filter(
+            (snapshot) =>
+                (!this.selectedJobId() ||
+                    snapshot.job === this.selectedJobId()) &&
+                (!this.selectedDeviceHostname() ||
+                    snapshot.device_hostname ===
+                        this.selectedDeviceHostname()) &&
+                snapshot.snapshot_type === this.selectedSnapshotType(),
+        ),
     );
 
+    // The nested tables of the snapshots that were opened, by snapshot UUID
+    openedSnapshots = this.snapshotDetails.asReadonly();
+
     constructor(
         private snapshotService: SnapshotService,
         private snapshotProcessorService: SnapshotProcessorService,
@@ -59,6 +58,23 @@ export class SnapshotListFacade {
         );
     }
 
+    openSnapshot(uuid: string) {
+        if (this.snapshotDetails()[uuid]) {
+            return;
+        }
+        this.snapshotService.getSnapshot(uuid).subscribe(
+            (snapshot) => {
+                this.snapshotDetails.update((details) => ({
+                    ...details,
+                    [uuid]: this.snapshotProcessorService.processSnapshot(
+                        snapshot,
+                    ),
+                }));
+            },
+            (error) => console.error("Error loading snapshot:", error),
+        );
+    }
+
     updateSelectedJobId(jobId: string | null) {
         this.selectedJobId.set(jobId);
         this.selectedDeviceHostname.set(null);
@@ -109,3 +109,20 @@ export interface Snapshot {
     routes: Route[];
     session_stats?: SessionStats[];
 }
+
+// The snapshot list returns summaries, without the nested tables
+export type SnapshotSummary = Pick<
+    Snapshot,
+    | "uuid"
+    | "created_at"
+    | "snapshot_type"
+    | "job"
+    | "device"
+    | "device_hostname"
+>;
+
+export interface SnapshotPage {
+    next: string | null;
+    previous: string | null;
+    results: SnapshotSummary[];
+}
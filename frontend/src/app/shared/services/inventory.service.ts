@@ -15,7 +15,7 @@ import {
     HttpHeaders,
     HttpParams,
 } from "@angular/common/http";
-import { Observable, throwError, timer } from "rxjs";
+import { Observable, Subscription, throwError, timer } from "rxjs";
 import {
     catchError,
     map,
@@ -321,6 +321,113 @@ export class InventoryService {
         );
     }
 
+    /**
+     * Requests a short-lived token opening the event stream of a job.
+     * @param jobId {string} The ID of the job
+     * @returns An Observable that emits the token
+     */
+    private getJobEventsToken(jobId: string): Observable<string> {
+        return this.http
+            .post<{ token: string }>(
+                `${this.apiUrl}/api/v1/jobs/${jobId}/events/token/`,
+                {},
+                { headers: this.getAuthHeaders() },
+            )
+            .pipe(map((response) => response.token));
+    }
+
+    /**
+     * Follows a job status through its Server-Sent Events stream until the job finishes.
+     * Falls back to polling when the stream cannot be opened, for example when the backend is not served over ASGI.
+     * @param jobId {string} The ID of the job to follow
+     * @returns An Observable emitting job status updates
+     */
+    watchJobStatus(jobId: string): Observable<{ status: string }> {
+        const finalStatuses = ["completed", "errored", "skipped"];
+
+        return new Observable<{ status: string }>((subscriber) => {
+            let eventSource: EventSource | null = null;
+            let polling: Subscription | null = null;
+            let lastEventId: string | null = null;
+            let unsubscribed = false;
+
+            const poll = () => {
+                polling = this.pollJobStatus(jobId).subscribe(subscriber);
+            };
+
+            const open = () => {
+                let received = false;
+                this.getJobEventsToken(jobId).subscribe({
+                    next: (token) => {
+                        if (unsubscribed) {
+                            return;
+                        }
+                        const params = new HttpParams({
+                            fromObject: lastEventId
+                                ? { token, last_event_id: lastEventId }
+                                : { token },
+                        });
+                        eventSource = new EventSource(
+                            `${this.apiUrl}/api/v1/jobs/${jobId}/events/?${params.toString()}`,
+                        );
+                        eventSource.addEventListener("log", (event) => {
+                            received = true;
+                            lastEventId = (event as MessageEvent).lastEventId;
+                        });
+                        eventSource.addEventListener("status", (event) => {
+                            received = true;
+                            const status = JSON.parse(
+                                (event as MessageEvent).data,
+                            ).job_status;
+                            subscriber.next({ status });
+                            if (!finalStatuses.includes(status)) {
+                                return;
+                            }
+                            eventSource?.close();
+                            if (status === "errored") {
+                                const error = new InventoryError(
+                                    event,
+                                    `Job ${jobId} errored`,
+                                    422,
+                                );
+                                this.snackBar.open(error.message, "Close", {
+                                    duration: 5000,
+                                    verticalPosition: "bottom",
+                                });
+                                subscriber.error(error);
+                            } else {
+                                subscriber.complete();
+                            }
+                        });
+                        eventSource.onerror = () => {
+                            // The browser reconnects by itself unless the server refused the stream, which happens
+                            // once the token expired; a stream that never delivered an event falls back to polling
+                            if (
+                                eventSource?.readyState !== EventSource.CLOSED
+                            ) {
+                                return;
+                            }
+                            if (received) {
+                                open();
+                            } else {
+                                poll();
+                            }
+                        };
+                    },
+                    error: () => poll(),
+                });
+            };
+
+            open();
+
+            return () => {
+                unsubscribed = true;
+                eventSource?.close();
+                polling?.unsubscribe();
+            };
+        });
+    }
+
     /**
      * Synchronizes inventory by sending a POST request to the API endpoint.
      * @param syncForm {DeviceSyncForm} The form data for device synchronization
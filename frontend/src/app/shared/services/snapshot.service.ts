@@ -7,9 +7,20 @@ import {
     HttpErrorResponse,
     HttpHeaders,
 } from "@angular/common/http";
-import { Observable, throwError, timer } from "rxjs";
-import { catchError, mergeMap, retryWhen } from "rxjs/operators";
-import { Snapshot } from "../interfaces/snapshot.interface";
+import { EMPTY, Observable, throwError, timer } from "rxjs";
+import {
+    catchError,
+    expand,
+    map,
+    mergeMap,
+    reduce,
+    retryWhen,
+} from "rxjs/operators";
+import {
+    Snapshot,
+    SnapshotPage,
+    SnapshotSummary,
+} from "../interfaces/snapshot.interface";
 import { environment } from "../../../environments/environment";
 import { CookieService } from "ngx-cookie-service";
 import { MatSnackBar } from "@angular/material/snack-bar";
@@ -81,11 +92,46 @@ export class SnapshotService {
         return error.status >= 500 || error.error instanceof ErrorEvent;
     }
 
-    getSnapshots(): Observable<Snapshot[]> {
+    // The snapshot list is cursor paginated and returns summaries; the nested
+    // tables of a snapshot are loaded with getSnapshot when it is opened
+    getSnapshots(): Observable<SnapshotSummary[]> {
+        return this.getSnapshotPage(this.apiEndpointSnapshots).pipe(
+            expand((page) =>
+                page.next ? this.getSnapshotPage(page.next) : EMPTY,
+            ),
+            map((page) => page.results),
+            reduce(
+                (snapshots, results) => snapshots.concat(results),
+                [] as SnapshotSummary[],
+            ),
+            catchError(this.handleError.bind(this)),
+        );
+    }
+
+    private getSnapshotPage(url: string): Observable<SnapshotPage> {
+        return this.http
+            .get<SnapshotPage>(url, { headers: this.getAuthHeaders() })
+            .pipe(
+                retryWhen((errors) =>
+                    errors.pipe(
+                        mergeMap((error: HttpErrorResponse, i) => {
+                            const retryAttempt = i + 1;
+                            if (retryAttempt <= 3 && this.shouldRetry(error)) {
+                                const delayTime =
+                                    Math.pow(2, retryAttempt) * 1000;
+                                return timer(delayTime);
+                            }
+                            return throwError(() => error);
+                        }),
+                    ),
+                ),
+            );
+    }
+
+    getSnapshot(uuid: string): Observable<Snapshot> {
+        const url = `${this.apiEndpointSnapshots}${uuid}/`;
         return this.http
-            .get<
-                Snapshot[]
-            >(this.apiEndpointSnapshots, { headers: this.getAuthHeaders() })
+            .get<Snapshot>(url, { headers: this.getAuthHeaders() })
             .pipe(
                 retryWhen((errors) =>
                     errors.pipe(